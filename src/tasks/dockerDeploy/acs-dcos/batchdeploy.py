@@ -0,0 +1,229 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import yaml
+
+import acsclient
+import acsinfo
+import createmarathon
+import deploymenttimings
+import dockercomposeparser
+from requestobserver import RequestStats, SlowRequestLogger
+
+# Holds the group that is being deployed on the current thread
+_context = threading.local()
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Deploys multiple docker-compose files listed in a manifest to DC/OS',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--manifest',
+                        help='[required] YAML file with the list of groups to deploy')
+    parser.add_argument('--parallelism', type=int, default=4,
+                        help='Max number of groups deployed at the same time')
+    parser.add_argument('--results-file',
+                        help='Write per-group results and timing to this JSON file')
+    parser.add_argument('--timings-file', default=deploymenttimings.DEFAULT_TIMINGS_FILE,
+                        help='File with the deployment timings of previous deployments, used ' \
+                             'for timeouts and progress estimates')
+    parser.add_argument('--dcos-master-url',
+                        help='DC/OS master URL')
+
+    parser.add_argument('--acs-host',
+                        help='ACS host')
+    parser.add_argument('--acs-port',
+                        help='ACS username')
+    parser.add_argument('--acs-username',
+                        help='ACS username')
+    parser.add_argument('--acs-password',
+                        help='ACS password')
+    parser.add_argument('--acs-private-key',
+                        help='ACS private key')
+
+    parser.add_argument('--verbose',
+                        help='Turn on verbose logging',
+                        action='store_true')
+    parser.add_argument('--slow-request-threshold', type=float, default=5.0,
+                        help='Log requests to the cluster that take longer than this (in seconds)')
+    return parser
+
+
+def process_arguments():
+    """
+    Makes sure required arguments are provided
+    """
+    arg_parser = get_arg_parser()
+    args = arg_parser.parse_args()
+
+    if args.manifest is None:
+        arg_parser.error('argument --manifest is required')
+    if args.parallelism < 1:
+        arg_parser.error('argument --parallelism must be at least 1')
+    return args
+
+
+def load_manifest(manifest_file):
+    """
+    Loads the manifest and returns the list of groups to deploy. Manifest
+    has a list of 'groups' (each with compose_file, group_name, group_qualifier,
+    group_version, minimum_health_capacity and optional registry_host,
+    registry_username and registry_password) and optional 'defaults'
+    that apply to all groups. compose_file is relative to the manifest.
+    """
+    with open(manifest_file, 'r') as manifest_stream:
+        manifest = yaml.safe_load(manifest_stream)
+
+    if not manifest or not manifest.get('groups'):
+        raise ValueError('Manifest "{}" has no groups.'.format(manifest_file))
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file))
+    required_keys = ['compose_file', 'group_name', 'group_qualifier',
+                     'group_version', 'minimum_health_capacity']
+    groups = []
+    for entry in manifest['groups']:
+        group = dict(manifest.get('defaults') or {})
+        group.update(entry)
+        for key in required_keys:
+            if group.get(key) is None:
+                raise ValueError('Group {} in manifest "{}" is missing "{}".'.format(
+                    entry, manifest_file, key))
+        group['compose_file'] = os.path.join(manifest_dir, group['compose_file'])
+        group['group_version'] = str(group['group_version'])
+        for key in ['registry_host', 'registry_username', 'registry_password']:
+            group.setdefault(key, None)
+        groups.append(group)
+    return groups
+
+
+class GroupLogFilter(logging.Filter):
+    """
+    Prefixes log messages with the name of the group deployed on the
+    current thread, so logs of concurrent deployments can be told apart
+    """
+    def filter(self, record):
+        group_name = getattr(_context, 'group_name', None)
+        if group_name and not getattr(record, 'group_name', None):
+            record.group_name = group_name
+            record.msg = '[{}] {}'.format(group_name, record.msg)
+        return True
+
+
+def deploy_group(arguments, acs_client, group, timing_store=None):
+    """
+    Deploys a single group and returns the result
+    """
+    _context.group_name = '{}.{}'.format(group['group_name'], group['group_version'])
+    result = {
+        'compose_file': group['compose_file'],
+        'group_name': group['group_name'],
+        'group_qualifier': group['group_qualifier'],
+        'group_version': group['group_version'],
+        'succeeded': False,
+        'error': None
+    }
+    start_time = time.time()
+    # Each group gets its own retry budget and request stats, which also
+    # count the requests made on helper threads of the deployment
+    group_client = acs_client.create_deploy_client()
+    group_stats = RequestStats()
+    group_client.add_request_observer(group_stats)
+    try:
+        logging.info('Deploying "%s"', group['compose_file'])
+        with dockercomposeparser.DockerComposeParser(
+            group['compose_file'], arguments.dcos_master_url, arguments.acs_host,
+            arguments.acs_port, arguments.acs_username, arguments.acs_password,
+            arguments.acs_private_key, group['group_name'], group['group_qualifier'],
+            group['group_version'], group['registry_host'], group['registry_username'],
+            group['registry_password'], group['minimum_health_capacity'],
+            acs_client=group_client, timing_store=timing_store) as compose_parser:
+            compose_parser.deploy()
+            # Deployment succeeded, don't remove it when leaving the 'with' block
+            compose_parser.cleanup_needed = False
+        result['succeeded'] = True
+    except Exception as deployment_exc:
+        logging.error('Error occurred during deployment: %s', deployment_exc)
+        result['error'] = str(deployment_exc)
+    finally:
+        result['duration'] = round(time.time() - start_time, 3)
+        result['requests'] = group_stats.get_totals()['count']
+        result['retry_counters'] = group_client.retry_policy.counters
+        _context.group_name = None
+    return result
+
+
+def deploy_all(arguments, groups, request_observers=None):
+    """
+    Deploys all groups, at most arguments.parallelism at the same time,
+    through a single client (one SSH tunnel and connection pool)
+    and returns the list of results
+    """
+    acs_client = acsclient.ACSClient(acsinfo.AcsInfo(
+        arguments.acs_host, arguments.acs_port, arguments.acs_username,
+        arguments.acs_password, arguments.acs_private_key, arguments.dcos_master_url))
+    acs_client.use_connection_pool(arguments.parallelism)
+    for observer in request_observers or []:
+        acs_client.add_request_observer(observer)
+
+    # Shared by all groups, so timings recorded by concurrent deployments are not lost
+    timing_store = deploymenttimings.TimingStore(arguments.timings_file)
+    pool = ThreadPool(arguments.parallelism)
+    try:
+        acs_client.ensure_dcos_version()
+        return pool.map(
+            lambda group: deploy_group(arguments, acs_client, group, timing_store),
+            groups)
+    finally:
+        pool.close()
+        pool.join()
+        acs_client.shutdown()
+
+
+def log_results(results, duration):
+    """
+    Logs the per-group results
+    """
+    failed = [result for result in results if not result['succeeded']]
+    logging.info('Deployed %s of %s groups in %.3fs',
+                 len(results) - len(failed), len(results), duration)
+    for result in results:
+        logging.info('  %s.%s: %s in %.3fs (%s requests)', result['group_name'],
+                     result['group_version'], 'succeeded' if result['succeeded'] else 'FAILED',
+                     result['duration'], result['requests'])
+    for result in failed:
+        logging.error('Deployment of "%s.%s" failed: %s',
+                      result['group_name'], result['group_version'], result['error'])
+
+
+if __name__ == '__main__':
+    arguments = process_arguments()
+    createmarathon.init_logger(arguments.verbose)
+    for handler in logging.root.handlers:
+        handler.addFilter(GroupLogFilter())
+
+    try:
+        all_groups = load_manifest(arguments.manifest)
+        request_stats = RequestStats()
+        start_time = time.time()
+        results = deploy_all(arguments, all_groups, request_observers=[
+            request_stats, SlowRequestLogger(arguments.slow_request_threshold)])
+        log_results(results, time.time() - start_time)
+        request_stats.log_summary()
+    except Exception as deployment_exc:
+        logging.error('Error occurred during deployment: %s', deployment_exc)
+        sys.exit(1)
+
+    if arguments.results_file:
+        with open(arguments.results_file, 'w') as results_stream:
+            json.dump(results, results_stream, indent=2)
+    sys.exit(0 if all([result['succeeded'] for result in results]) else 1)
@@ -0,0 +1,158 @@
+import copy
+import logging
+import time
+
+import requests
+
+from marathon import Marathon, get_scaled_instances
+
+DEFAULT_STEPS = [10, 25, 50, 100]
+
+
+def parse_steps(steps):
+    """
+    Parses the steps (percentages of the target instances, e.g. "10,25,50,100").
+    The last step is always 100.
+    """
+    try:
+        percentages = [int(step) for step in str(steps).split(',') if step.strip()]
+    except ValueError:
+        raise ValueError('Invalid canary steps "{}"'.format(steps))
+    if [p for p in percentages if p <= 0 or p > 100] or percentages != sorted(set(percentages)):
+        raise ValueError(
+            'Canary steps "{}" must be increasing percentages (1-100)'.format(steps))
+    if not percentages or percentages[-1] != 100:
+        percentages.append(100)
+    return percentages
+
+
+class CanaryFailed(Exception):
+    """
+    A step of the canary rollout failed and the old group was restored
+    """
+    pass
+
+
+class ErrorRateProbe(object):
+    """
+    Sends requests to a URL (e.g. the public endpoint of the services) and
+    fails if the share of failed requests (errors and 5xx responses) is
+    higher than max_error_rate
+    """
+    # Time (in seconds) to wait for a response
+    request_timeout = 5
+    # Time (in seconds) between the requests
+    request_interval = 0.5
+
+    def __init__(self, url, max_error_rate=0.05, request_count=20):
+        self.url = url
+        self.max_error_rate = max_error_rate
+        self.request_count = request_count
+
+    def get_error_rate(self):
+        """
+        Sends the requests and gets the share of failed requests
+        """
+        errors = 0
+        for i in range(self.request_count):
+            if i > 0:
+                time.sleep(self.request_interval)
+            try:
+                response = requests.get(self.url, timeout=self.request_timeout)
+                if response.status_code >= 500:
+                    errors += 1
+            except requests.exceptions.RequestException as request_exc:
+                logging.debug('Probe request to "%s" failed: %s', self.url, request_exc)
+                errors += 1
+        return float(errors) / self.request_count
+
+    def check(self):
+        """
+        Raises an exception if the error rate is too high
+        """
+        error_rate = self.get_error_rate()
+        logging.info('Error rate of "%s": %.1f%%', self.url, error_rate * 100)
+        if error_rate > self.max_error_rate:
+            raise Exception('Error rate of "{}" is {:.1f}% (max {:.1f}%)'.format(
+                self.url, error_rate * 100, self.max_error_rate * 100))
+
+
+class CanaryRollout(object):
+    """
+    Moves instances from the existing group to the new group in steps: at
+    each step the new apps are scaled to the step's percentage of their
+    target instances (the deployment waits for the tasks to be healthy,
+    using the Marathon events), the probe is checked and the existing apps
+    are scaled down by the same percentage. If a step fails, the existing
+    group is scaled back to its instances and CanaryFailed is raised. A
+    rollout that was interrupted continues after its completed steps.
+    """
+    def __init__(self, marathon_helper, steps=None, probe=None):
+        self.marathon_helper = marathon_helper
+        self.steps = steps or DEFAULT_STEPS
+        self.probe = probe
+
+    def _scale(self, group_json, instances, percentage):
+        """
+        Gets a copy of the group with the apps scaled to percentage of instances
+        """
+        scaled_json = copy.deepcopy(group_json)
+        for app in scaled_json['apps']:
+            app['instances'] = get_scaled_instances(instances[app['id']], percentage)
+        return scaled_json
+
+    def _scale_existing(self, instances, percentage):
+        """
+        Scales the apps of the existing group to percentage of instances, only
+        their instances are updated
+        """
+        self.marathon_helper.scale_apps(dict(
+            (app_id, get_scaled_instances(count, percentage))
+            for app_id, count in instances.items()))
+
+    def run(self, marathon_json, target_instances, existing_group_id, existing_instances=None,
+            completed_steps=0, step_completed=None):
+        """
+        Rolls out the new group (marathon_json) to its target_instances (by app ID)
+        and scales the existing group to 0. existing_instances (by app ID) are
+        the instances of the existing group before the rollout started, by
+        default its current instances. The first completed_steps are skipped
+        and step_completed is called with the number of completed steps after
+        each step, so they can be recorded.
+        """
+        if existing_instances is None:
+            existing_json = self.marathon_helper.get_group(existing_group_id, Marathon.GROUP_APPS)
+            existing_instances = dict(
+                (app['id'], app.get('instances', 1)) for app in existing_json['apps'])
+        if completed_steps:
+            logging.info('Skipping canary steps %s, completed by a previous run',
+                         self.steps[:completed_steps])
+        step = None
+        try:
+            for index in range(completed_steps, len(self.steps)):
+                step = self.steps[index]
+                logging.info('Canary step %s%%: scaling up "%s"', step, marathon_json['id'])
+                self.marathon_helper.update_group(
+                    self._scale(marathon_json, target_instances, step))
+                if self.probe:
+                    self.probe.check()
+                logging.info('Canary step %s%%: scaling down "%s"', step, existing_group_id)
+                self._scale_existing(existing_instances, 100 - step)
+                if step_completed:
+                    step_completed(index + 1)
+        except Exception as step_exc:
+            logging.error('Canary step %s%% failed, rolling back to "%s": %s',
+                          step, existing_group_id, step_exc)
+            try:
+                self._scale_existing(existing_instances, 100)
+            except Exception as restore_exc:
+                # Keeps the error of the step, the deployment can be resumed
+                raise Exception('Canary rollout failed at {}% ({}) and "{}" could not be '
+                                'restored: {}'.format(step, step_exc, existing_group_id,
+                                                      restore_exc))
+            raise CanaryFailed('Canary rollout failed at {}%, "{}" was restored: {}'.format(
+                step, existing_group_id, step_exc))
+
+        # The new group has all instances, keep the definitions up to date
+        for app in marathon_json['apps']:
+            app['instances'] = target_instances[app['id']]
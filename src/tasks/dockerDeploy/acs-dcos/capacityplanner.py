@@ -0,0 +1,180 @@
+import logging
+
+from marathon import get_scaled_instances
+
+# Resources of the app JSON that are checked against the free agent resources
+RESOURCES = ['cpus', 'mem']
+# Resources Marathon uses for apps that don't set them
+DEFAULT_RESOURCES = {'cpus': 1.0, 'mem': 128.0}
+# Tolerance for comparing the (float) resources
+EPSILON = 1e-6
+
+
+class CapacityError(Exception):
+    """
+    A step of the deployment doesn't fit on the free resources of the agents
+    """
+    pass
+
+
+def get_task_resources(app):
+    """
+    Gets the resources (in the order of RESOURCES) a task of the app uses
+    """
+    return tuple(float(app.get(name, DEFAULT_RESOURCES[name])) for name in RESOURCES)
+
+
+def get_scaled(apps, percentage, instances=None):
+    """
+    Gets (app, instances) with the instances (by app ID, by default the
+    instances of the apps) scaled to the percentage, rounded up like Marathon
+    """
+    return [(app, get_scaled_instances(
+        (instances or {}).get(app['id'], app.get('instances', 0)), percentage))
+            for app in apps]
+
+
+def get_stopped(apps, percentage):
+    """
+    Gets (app, instances) stopped when the apps are scaled to the percentage
+    """
+    return [(app, app.get('instances', 0) - scaled)
+            for app, scaled in get_scaled(apps, percentage)]
+
+
+class CapacityPlanner(object):
+    """
+    Checks if the tasks the steps of a deployment start fit on the free
+    resources of the agents, which are read once from the Mesos state.json.
+    Tasks are placed on the agents first-fit decreasing, like a packed
+    cluster would place them. The placement of the tasks the existing group
+    stops is not known, so their resources are returned to the agents in
+    proportion to the resources the agents use.
+    """
+    def __init__(self, agents):
+        self.agents = [agent for agent in agents if agent.get('active', True)]
+
+    @classmethod
+    def from_mesos(cls, mesos):
+        """
+        Creates the planner with the agents of the cluster
+        """
+        return cls(mesos.get_agent_resources())
+
+    def _get_free(self, released):
+        """
+        Gets the free resources of each agent once the released resources
+        (totals, in the order of RESOURCES) are returned
+        """
+        used = [[float(agent.get('used_resources', {}).get(name, 0)) for name in RESOURCES]
+                for agent in self.agents]
+        total_used = [sum(agent_used[i] for agent_used in used) for i in range(len(RESOURCES))]
+        free = []
+        for agent, agent_used in zip(self.agents, used):
+            agent_free = []
+            for i, name in enumerate(RESOURCES):
+                share = agent_used[i] / total_used[i] if total_used[i] else 0
+                agent_free.append(float(agent['resources'].get(name, 0)) - agent_used[i]
+                                  + released[i] * share)
+            free.append(agent_free)
+        return free
+
+    def _get_totals(self, tasks):
+        """
+        Gets the total resources of (app, instances)
+        """
+        totals = [0.0] * len(RESOURCES)
+        for app, instances in tasks:
+            for i, amount in enumerate(get_task_resources(app)):
+                totals[i] += amount * instances
+        return totals
+
+    def fits(self, started, stopped=None):
+        """
+        Checks if the started tasks (app, instances) fit on the agents,
+        after the stopped tasks (app, instances) released their resources
+        """
+        free = self._get_free(self._get_totals(stopped or []))
+        tasks = []
+        for app, instances in started:
+            tasks.extend([get_task_resources(app)] * max(instances, 0))
+        tasks.sort(reverse=True)
+        for task in tasks:
+            for agent_free in free:
+                if all(agent_free[i] + EPSILON >= task[i] for i in range(len(RESOURCES))):
+                    for i in range(len(RESOURCES)):
+                        agent_free[i] -= task[i]
+                    break
+            else:
+                return False
+        return True
+
+    def _get_error(self, description, started, stopped=None):
+        """
+        Gets the error for a step that doesn't fit
+        """
+        needed = self._get_totals(started)
+        free = self._get_free(self._get_totals(stopped or []))
+        return CapacityError(
+            '{} does not fit the cluster: it needs {:.2f} cpus and {:.0f} MB of memory, '
+            '{:.2f} cpus and {:.0f} MB are free on {} agents'.format(
+                description, needed[0], needed[1], sum(agent_free[0] for agent_free in free),
+                sum(agent_free[1] for agent_free in free), len(free)))
+
+    def plan_blue_green(self, marathon_json, target_instances, existing_json,
+                        minimum_health_capacity):
+        """
+        Gets the largest minimum health capacity (up to minimum_health_capacity)
+        for which the steps of the deployment fit: first the existing group is
+        scaled to the capacity and the new group started with that share of its
+        target_instances (by app ID), then the existing group is scaled to 0 and
+        the new group to its target instances. Raises CapacityError if no
+        capacity fits.
+        """
+        new_apps = marathon_json['apps']
+        existing_apps = existing_json['apps'] if existing_json else []
+        final_step = get_scaled(new_apps, 100, target_instances)
+        if not self.fits(final_step, get_stopped(existing_apps, 0)):
+            raise self._get_error('Group "{}" with its target instances'.format(
+                marathon_json['id']), final_step, get_stopped(existing_apps, 0))
+        if not existing_apps:
+            return minimum_health_capacity
+
+        capacities = range(int(minimum_health_capacity), 0, -1) or [minimum_health_capacity]
+        for capacity in capacities:
+            if self.fits(get_scaled(new_apps, capacity, target_instances),
+                         get_stopped(existing_apps, capacity)):
+                if capacity != minimum_health_capacity:
+                    logging.warning('Minimum health capacity %s%% does not fit the cluster, '
+                                    'using %s%%', minimum_health_capacity, capacity)
+                return capacity
+        raise self._get_error('Group "{}" with its initial instances'.format(
+            marathon_json['id']), get_scaled(new_apps, capacities[-1], target_instances),
+                              get_stopped(existing_apps, capacities[-1]))
+
+    def plan_canary(self, marathon_json, target_instances, existing_json, steps):
+        """
+        Gets the canary steps (percentages) with the steps that don't fit
+        split into smaller ones: at each step the new group is scaled up
+        while the existing group still has the share of the previous step.
+        Raises CapacityError if not even a 1% step fits.
+        """
+        new_apps = marathon_json['apps']
+        existing_apps = existing_json['apps'] if existing_json else []
+        planned = []
+        previous = 0
+        for step in steps:
+            while previous < step:
+                stopped = get_stopped(existing_apps, 100 - previous)
+                fitting = step
+                while fitting > previous and not self.fits(
+                        get_scaled(new_apps, fitting, target_instances), stopped):
+                    fitting -= 1
+                if fitting == previous:
+                    raise self._get_error('Canary step {}%'.format(previous + 1), get_scaled(
+                        new_apps, previous + 1, target_instances), stopped)
+                planned.append(fitting)
+                previous = fitting
+        if planned != list(steps):
+            logging.warning('Canary steps %s do not fit the cluster, using %s', steps, planned)
+        return planned
@@ -0,0 +1,276 @@
+import BaseHTTPServer
+import gzip
+import json
+import logging
+import SocketServer
+import threading
+import time
+import urllib
+
+from requestbody import read_request_body
+from requestobserver import RequestObserver
+
+
+def _normalize_path(path):
+    """
+    Normalizes the request path, so paths recorded on the client
+    match the paths received by the replay server
+    """
+    return urllib.unquote(path or '').lstrip('/')
+
+
+def _to_text(content):
+    """
+    Converts response content to text that can be stored in JSON
+    """
+    if content is None:
+        return ''
+    if isinstance(content, unicode):
+        return content
+    return content.decode('utf-8', 'replace')
+
+
+class ClusterRecorder(RequestObserver):
+    """
+    Records all requests and responses made through the ACS client
+    and all events received on event streams, so they can be
+    replayed later with ReplayServer.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._streams = {}
+        self._stream_start = {}
+
+    def request_completed(self, record):
+        if record.response is None:
+            return
+        response = record.response
+        with self._lock:
+            self._entries.append({
+                'type': 'request',
+                'method': record.method,
+                'path': _normalize_path(record.path),
+                'status': record.status_code,
+                'elapsed': round(record.elapsed, 4),
+                'content_type': (getattr(response, 'headers', None) or {}).get(
+                    'content-type', 'application/json'),
+                'body': _to_text(getattr(response, 'content', None))
+            })
+
+    def event_stream_opened(self, stream_id, path):
+        with self._lock:
+            self._streams[stream_id] = len(self._streams)
+            self._stream_start[stream_id] = time.time()
+            self._entries.append({
+                'type': 'stream',
+                'stream': self._streams[stream_id],
+                'path': _normalize_path(path)
+            })
+
+    def event_received(self, stream_id, data):
+        with self._lock:
+            if not stream_id in self._streams:
+                return
+            self._entries.append({
+                'type': 'event',
+                'stream': self._streams[stream_id],
+                'offset': round(time.time() - self._stream_start[stream_id], 4),
+                'data': _to_text(data)
+            })
+
+    def save(self, file_path):
+        """
+        Saves the recording as gzipped JSON lines
+        """
+        with self._lock:
+            entries = list(self._entries)
+        recording_file = gzip.open(file_path, 'wb')
+        try:
+            for entry in entries:
+                recording_file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        finally:
+            recording_file.close()
+        logging.debug('Saved %s recorded entries to "%s"', len(entries), file_path)
+
+
+class Recording(object):
+    """
+    Recorded requests and event streams loaded from a file
+    """
+    def __init__(self, entries):
+        self.responses = {}
+        self.streams = []
+        for entry in entries:
+            if entry['type'] == 'request':
+                key = (entry['method'], entry['path'])
+                self.responses.setdefault(key, []).append(entry)
+            elif entry['type'] == 'stream':
+                self.streams.append({'path': entry['path'], 'events': []})
+            elif entry['type'] == 'event':
+                self.streams[entry['stream']]['events'].append(entry)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Loads the recording saved with ClusterRecorder.save
+        """
+        recording_file = gzip.open(file_path, 'rb')
+        try:
+            entries = [json.loads(line) for line in recording_file if line.strip()]
+        finally:
+            recording_file.close()
+        return Recording(entries)
+
+
+class _ReplayHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves recorded responses and event streams
+    """
+    def _reply(self):
+        read_request_body(self)
+
+        path = _normalize_path(self.path)
+        if self.command == 'GET':
+            stream = self.server.replay.next_stream(path)
+            if stream is not None:
+                self._replay_stream(stream)
+                return
+
+        entry = self.server.replay.next_response(self.command, path)
+        if entry is None:
+            self._send(404, 'application/json', json.dumps(
+                {'message': 'Request {} {} was not recorded'.format(self.command, path)}))
+            return
+
+        delay = entry['elapsed'] * self.server.replay.time_scale
+        if delay > 0:
+            time.sleep(delay)
+        self._send(entry['status'], entry['content_type'], entry['body'].encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _replay_stream(self, stream):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        start_time = time.time()
+        for event in stream['events']:
+            delay = event['offset'] * self.server.replay.time_scale - (time.time() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+            self.wfile.write('data: {}\n\n'.format(event['data'].encode('utf-8')))
+            self.wfile.flush()
+        # Keep the stream open (as Marathon does), until the server stops
+        while not self.server.replay.stopped:
+            time.sleep(0.1)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_HEAD(self):
+        self._reply()
+
+    def do_DELETE(self):
+        self._reply()
+
+    def do_PUT(self):
+        self._reply()
+
+    def do_POST(self):
+        self._reply()
+
+    def do_PATCH(self):
+        self._reply()
+
+    def log_message(self, format, *args):
+        logging.debug('Replay: ' + format, *args)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ReplayServer(object):
+    """
+    Local HTTP server that replays a recording. Responses for the same
+    method and path are served in recorded order (the last one is repeated
+    when the recording runs out) and the n-th event stream that is
+    opened replays the n-th recorded stream.
+
+    time_scale of 1 replays with recorded latencies and event timing,
+    values smaller than 1 compress the timing (0 replays without delays).
+    """
+    def __init__(self, recording, time_scale=1.0, port=0):
+        self.recording = recording
+        self.time_scale = time_scale
+        self.stopped = False
+        self.unmatched = []
+        self._cursors = {}
+        self._next_stream = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', port), _ReplayHandler)
+        self._server.replay = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,))
+        self._thread.daemon = True
+
+    def get_url(self):
+        """
+        Gets the URL the server is listening on
+        """
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def next_response(self, method, path):
+        """
+        Gets the next recorded response for method and path
+        """
+        key = (method, path)
+        with self._lock:
+            responses = self.recording.responses.get(key)
+            if not responses:
+                self.unmatched.append(key)
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = min(cursor + 1, len(responses) - 1)
+            return responses[cursor]
+
+    def next_stream(self, path):
+        """
+        Gets the next recorded event stream, if path is an event stream path
+        """
+        with self._lock:
+            if not [s for s in self.recording.streams if s['path'] == path]:
+                return None
+            while self._next_stream < len(self.recording.streams):
+                stream = self.recording.streams[self._next_stream]
+                self._next_stream += 1
+                if stream['path'] == path:
+                    return stream
+            return {'path': path, 'events': []}
+
+    def start(self):
+        """
+        Starts serving the recording
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server
+        """
+        self.stopped = True
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
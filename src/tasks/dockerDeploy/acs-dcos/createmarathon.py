@@ -1,9 +1,12 @@
 import argparse
 import logging
+import socket
 import sys
 import traceback
 
-import dockercomposeparser
+import deployclient
+import deploymenttimings
+import startupprofile
 
 
 class VstsLogFormatter(logging.Formatter):
@@ -64,6 +67,46 @@ def get_arg_parser():
     parser.add_argument('--verbose',
                         help='Turn on verbose logging',
                         action='store_true')
+    parser.add_argument('--slow-request-threshold', type=float, default=5.0,
+                        help='Log requests to the cluster that take longer than this (in seconds)')
+    parser.add_argument('--record-file',
+                        help='Record all requests to the cluster to this file (for replaying)')
+    parser.add_argument('--daemon-socket',
+                        help='Submit the deployment to the deploy daemon listening on this ' \
+                             'Unix socket (see deploydaemon.py)')
+    parser.add_argument('--timings-file', default=deploymenttimings.DEFAULT_TIMINGS_FILE,
+                        help='File with the deployment timings of previous deployments, used ' \
+                             'for timeouts and progress estimates')
+    parser.add_argument('--state-file',
+                        help='Record the completed phases of the deployment in this file; ' \
+                             'if the deployment fails it is kept, so it can be resumed')
+    parser.add_argument('--resume',
+                        help='Continue the failed deployment recorded in --state-file after ' \
+                             'its last completed phase',
+                        action='store_true')
+    parser.add_argument('--canary-steps',
+                        help='Move the instances of an update to the new group in steps, ' \
+                             'as percentages of the instances (e.g. 10,25,50,100); a failed ' \
+                             'step restores the existing group')
+    parser.add_argument('--canary-probe-url',
+                        help='URL that is probed after each canary step, the step fails if ' \
+                             'too many requests fail')
+    parser.add_argument('--canary-max-error-rate', type=float, default=0.05,
+                        help='Share of failed probe requests (0-1) a canary step tolerates')
+    parser.add_argument('--in-place',
+                        help='Update the deployed group instead of deploying a new one, ' \
+                             'only the services that changed are restarted',
+                        action='store_true')
+    parser.add_argument('--check-capacity',
+                        help='Check that the deployment fits the free cpus and memory of the ' \
+                             'agents before it starts and use smaller steps if needed',
+                        action='store_true')
+    parser.add_argument('--plan',
+                        help='Only show what the deployment would do, without changing anything',
+                        action='store_true')
+    parser.add_argument('--profile-startup',
+                        help='Log how long it takes to import each module',
+                        action='store_true')
     return parser
 
 def process_arguments():
@@ -83,6 +126,12 @@ def process_arguments():
         arg_parser.error('argument --group-version is required')
     if args.minimum_health_capacity is None:
         arg_parser.error('argument --minimum-health-capacity is required')
+    if args.resume and args.state_file is None:
+        arg_parser.error('argument --resume requires --state-file')
+    if args.canary_probe_url and not args.canary_steps:
+        arg_parser.error('argument --canary-probe-url requires --canary-steps')
+    if args.in_place and args.canary_steps:
+        arg_parser.error('argument --in-place not allowed with --canary-steps')
     return args
 
 def init_logger(verbose):
@@ -103,16 +152,61 @@ def init_logger(verbose):
 if __name__ == '__main__':
     arguments = process_arguments()
     init_logger(arguments.verbose)
+
+    if arguments.daemon_socket and not arguments.record_file and not arguments.plan:
+        try:
+            sys.exit(deployclient.submit_job(arguments.daemon_socket, arguments))
+        except socket.error as socket_exc:
+            logging.warning('Deploy daemon is not available (%s), deploying without it',
+                            socket_exc)
+
+    # Deployment modules (and the libraries they use) are only imported
+    # once the arguments are valid and the deployment runs in this process
+    with startupprofile.ImportProfiler() as import_profiler:
+        import canary
+        import clusterrecording
+        import dockercomposeparser
+        from requestobserver import RequestStats, SlowRequestLogger
+    if arguments.profile_startup:
+        import_profiler.log_report()
+
+    request_stats = RequestStats()
+    request_observers = [request_stats, SlowRequestLogger(arguments.slow_request_threshold)]
+    recorder = None
+    if arguments.record_file:
+        recorder = clusterrecording.ClusterRecorder()
+        request_observers.append(recorder)
+
+    timing_store = deploymenttimings.TimingStore(arguments.timings_file)
     try:
+        canary_steps, canary_probe = None, None
+        if arguments.canary_steps:
+            canary_steps = canary.parse_steps(arguments.canary_steps)
+            if arguments.canary_probe_url:
+                canary_probe = canary.ErrorRateProbe(
+                    arguments.canary_probe_url, arguments.canary_max_error_rate)
         with dockercomposeparser.DockerComposeParser(
             arguments.compose_file, arguments.dcos_master_url, arguments.acs_host,
             arguments.acs_port, arguments.acs_username, arguments.acs_password,
             arguments.acs_private_key, arguments.group_name, arguments.group_qualifier,
             arguments.group_version, arguments.registry_host, arguments.registry_username,
             arguments.registry_password, arguments.minimum_health_capacity,
-            check_dcos_version=True) as compose_parser:
+            check_dcos_version=True, request_observers=request_observers,
+            timing_store=timing_store, state_file=arguments.state_file,
+            resume=arguments.resume, canary_steps=canary_steps,
+            canary_probe=canary_probe,
+            check_capacity=arguments.check_capacity,
+            in_place=arguments.in_place) as compose_parser:
+            if arguments.plan:
+                compose_parser.plan().log()
+                sys.exit(0)
             compose_parser.deploy()
+            request_stats.log_summary()
+            logging.debug('Retry counters: %s', compose_parser.acs_client.retry_policy.counters)
             sys.exit(0)
     except Exception as deployment_exc:
         logging.error('Error occurred during deployment: %s', deployment_exc)
         sys.exit(1)
+    finally:
+        if recorder:
+            recorder.save(arguments.record_file)
@@ -0,0 +1,110 @@
+import difflib
+import json
+import logging
+
+# Rough durations (in seconds) used to estimate how long a deployment takes:
+# every group update/scale waits for a Marathon deployment, and steps that
+# start new tasks also wait for the tasks to become healthy
+STEP_SECONDS = 5.0
+TASK_START_SECONDS = 30.0
+
+
+def filter_like(existing, target):
+    """
+    Returns the parts of existing that are also in target, so
+    fields added by the cluster (e.g. versions, status) don't
+    show up in the diff
+    """
+    if isinstance(existing, dict) and isinstance(target, dict):
+        return dict((key, filter_like(existing[key], target[key]))
+                    for key in target if key in existing)
+    if isinstance(existing, list) and isinstance(target, list) and \
+       len(existing) == len(target):
+        return [filter_like(e, t) for e, t in zip(existing, target)]
+    return existing
+
+
+class DeploymentPlan(object):
+    """
+    What a deployment would do, without doing it: the steps with their
+    estimated duration, the target objects, the instance counts and
+    the diff to what is currently deployed
+    """
+    def __init__(self, group_id, existing_group_id=None):
+        self.group_id = group_id
+        self.existing_group_id = existing_group_id
+        self.steps = []
+        self.instances = {}
+        self.diffs = []
+        self.target = None
+
+    def add_step(self, description, estimated_duration=STEP_SECONDS):
+        """
+        Adds a deployment step
+        """
+        self.steps.append({'description': description,
+                           'estimated_duration': estimated_duration})
+
+    def add_diff(self, name, existing, target):
+        """
+        Adds the unified diff between the existing and target JSON
+        of an object (None if it doesn't exist)
+        """
+        diff = list(difflib.unified_diff(
+            self._to_lines(existing), self._to_lines(target),
+            fromfile='deployed/{}'.format(name), tofile='planned/{}'.format(name),
+            lineterm=''))
+        if diff:
+            self.diffs.append({'name': name, 'diff': diff})
+
+    def _to_lines(self, json_object):
+        if json_object is None:
+            return []
+        return json.dumps(json_object, indent=2, sort_keys=True,
+                          separators=(',', ': ')).splitlines()
+
+    def get_estimated_duration(self):
+        """
+        Gets the estimated duration of all steps (in seconds)
+        """
+        return sum([step['estimated_duration'] for step in self.steps])
+
+    def to_dict(self):
+        """
+        Gets the plan as a dictionary (e.g. for writing it to a JSON file)
+        """
+        return {
+            'group_id': self.group_id,
+            'existing_group_id': self.existing_group_id,
+            'steps': self.steps,
+            'instances': self.instances,
+            'diffs': self.diffs,
+            'target': self.target,
+            'estimated_duration': self.get_estimated_duration()
+        }
+
+    def log(self):
+        """
+        Logs the steps, instance counts and diffs
+        """
+        if self.existing_group_id:
+            logging.info('Plan for updating "%s" to "%s":',
+                         self.existing_group_id, self.group_id)
+        else:
+            logging.info('Plan for deploying "%s":', self.group_id)
+
+        for index, step in enumerate(self.steps):
+            logging.info('  %s. %s (~%ss)', index + 1, step['description'],
+                         step['estimated_duration'])
+
+        logging.info('Instances (deployed -> initial -> target):')
+        for name in sorted(self.instances):
+            counts = self.instances[name]
+            logging.info('  %s: %s -> %s -> %s', name, counts['deployed'],
+                         counts['initial'], counts['target'])
+
+        for diff in self.diffs:
+            logging.info('\n'.join(diff['diff']))
+        if not self.diffs:
+            logging.info('No changes to the deployed services')
+        logging.info('Estimated duration: %ss', self.get_estimated_duration())
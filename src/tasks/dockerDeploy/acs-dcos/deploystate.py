@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import tempfile
+
+# Phases of a deployment, in the order they run
+INITIAL_DEPLOY = 'initial-deploy'
+VIP_UPDATE = 'vip-update'
+SCALE_OLD = 'scale-old'
+UPDATE_NEW = 'update-new'
+SCALE_TO_ZERO = 'scale-to-zero'
+FINAL_SCALE = 'final-scale'
+# Replaces the scale and update phases of updates with a canary rollout
+CANARY_ROLLOUT = 'canary-rollout'
+DELETE_OLD = 'delete-old'
+PHASES = [INITIAL_DEPLOY, VIP_UPDATE, SCALE_OLD, UPDATE_NEW, SCALE_TO_ZERO,
+          FINAL_SCALE, CANARY_ROLLOUT, DELETE_OLD]
+
+
+class DeployState(object):
+    """
+    The last phase of a deployment that completed and the data needed to
+    continue it (e.g. the ID of the existing group and its instance counts
+    before it was scaled), kept in a JSON file so a failed deployment can
+    be resumed. The state of another group is ignored.
+    """
+    def __init__(self, file_path, group_id):
+        self.file_path = file_path
+        self.group_id = group_id
+        self.phase = None
+        self.data = {}
+        self._load()
+
+    def _load(self):
+        """
+        Loads the state from the file, if it's for the group
+        """
+        if not os.path.isfile(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r') as state_file:
+                state = json.load(state_file)
+        except (IOError, ValueError) as load_exc:
+            logging.warning('Ignoring deployment state "%s": %s', self.file_path, load_exc)
+            return
+        if state.get('group_id') != self.group_id:
+            logging.info('Ignoring deployment state "%s" of group "%s"',
+                         self.file_path, state.get('group_id'))
+            return
+        if state.get('phase') not in PHASES:
+            logging.warning('Ignoring deployment state "%s" with unknown phase "%s"',
+                            self.file_path, state.get('phase'))
+            return
+        self.phase = state['phase']
+        self.data = state.get('data') or {}
+
+    def is_completed(self, phase):
+        """
+        Checks if the phase (or a later one) completed
+        """
+        return self.phase is not None and PHASES.index(self.phase) >= PHASES.index(phase)
+
+    def complete(self, phase, **data):
+        """
+        Records that the phase completed, together with the data, and saves the state
+        """
+        self.phase = phase
+        self.save(**data)
+        logging.debug('Deployment phase "%s" completed', phase)
+
+    def save(self, **data):
+        """
+        Records the data (e.g. the progress of the running phase) and saves the state
+        """
+        self.data.update(data)
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(temp_fd, 'w') as state_file:
+            json.dump({'group_id': self.group_id, 'phase': self.phase, 'data': self.data},
+                      state_file)
+        os.rename(temp_path, self.file_path)
+
+    def reset(self):
+        """
+        Forgets the loaded state, the deployment starts from the first phase
+        """
+        self.phase = None
+        self.data = {}
+
+    def remove(self):
+        """
+        Removes the state, once the deployment completed
+        """
+        self.reset()
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
@@ -1,27 +1,45 @@
 import hashlib
+import json
 import logging
-import math
 import os
+import re
 
 import yaml
 
 import acsclient
 import acsinfo
+import canary
+import capacityplanner
+import deploymentplan
+import deploystate
 import dockerregistry
+import groupreconciler
 import marathon
 import portmappings
 import serviceparser
 from exhibitor import Exhibitor
 from nginx import LoadBalancerApp
 
+# Private IPs are only known once Marathon assigns the service ports,
+# so plans use this instead
+PRIVATE_IP_PLACEHOLDER = '<private-ip>'
+
 
 class DockerComposeParser(object):
     def __init__(self, compose_file, master_url, acs_host, acs_port, acs_username,
                  acs_password, acs_private_key, group_name, group_qualifier, group_version,
                  registry_host, registry_username, registry_password,
-                 minimum_health_capacity, check_dcos_version=False):
+                 minimum_health_capacity, check_dcos_version=False, request_observers=None,
+                 acs_client=None, timing_store=None, state_file=None, resume=False,
+                 canary_steps=None, canary_probe=None, check_capacity=False,
+                 in_place=False):
 
         self.cleanup_needed = False
+        # With a state_file, the completed phases of the deployment are recorded
+        # (see deploystate) and with resume, a failed deployment is continued
+        self.state_file = state_file
+        self.resume = resume
+        self.deploy_state = None
         self._ensure_docker_compose(compose_file)
         with open(compose_file, 'r') as compose_stream:
             self.compose_data = yaml.load(compose_stream)
@@ -38,16 +56,37 @@ class DockerComposeParser(object):
         self.registry_password = registry_password
 
         self.minimum_health_capacity = minimum_health_capacity
-
-        self.acs_client = acsclient.ACSClient(self.acs_info)
+        # With check_capacity, the steps of the deployment are checked against
+        # the free resources of the agents (and made smaller if they don't fit)
+        self.check_capacity = check_capacity
+        # With in_place, updates change the deployed group instead of deploying
+        # a new one, only the apps that changed are restarted
+        self.in_place = in_place
+
+        # A client passed in (e.g. shared by a batch deployment) is not shut down by the parser
+        self._owns_acs_client = acs_client is None
+        self.acs_client = acs_client or acsclient.ACSClient(self.acs_info)
+        for observer in request_observers or []:
+            self.acs_client.add_request_observer(observer)
         if check_dcos_version:
             self.acs_client.ensure_dcos_version()
         self.marathon_helper = marathon.Marathon(self.acs_client)
+        # Timings of the services are kept per group, not per group version
+        self.marathon_helper.timing_store = timing_store
+        self.marathon_helper.timing_groups[self._get_group_id()] = \
+            self._get_group_id(include_version=False).rstrip('.')
         self.exhibitor_helper = Exhibitor(self.marathon_helper)
         self.nginx_helper = LoadBalancerApp(self.marathon_helper)
 
         self.portmappings_helper = portmappings.PortMappings()
 
+        # Updates move the instances to the new group in canary_steps
+        # (percentages), if provided
+        self.canary_rollout = None
+        if canary_steps:
+            self.canary_rollout = canary.CanaryRollout(
+                self.marathon_helper, canary_steps, canary_probe)
+
     def __enter__(self):
         """
         Used when entering the 'with'
@@ -67,7 +106,7 @@ class DockerComposeParser(object):
         """
         Shuts down the acs client if needed
         """
-        if self.acs_client:
+        if self.acs_client and self._owns_acs_client:
             self.acs_client.shutdown()
 
     def _ensure_docker_compose(self, docker_compose_file):
@@ -126,14 +165,16 @@ class DockerComposeParser(object):
         return '{}.{}'.format(self._get_hash(self.group_name + qualifier_hash)[:8],
                               service_name)
 
-    def _parse_compose(self):
+    def _parse_compose(self, dry_run=False):
         """
-        Parses the docker-compose file and returns the initial marathon.json file
+        Parses the docker-compose file and returns the initial marathon.json file.
+        With dry_run, NGINX and the registry credentials are not deployed.
         """
         group_name = self._get_group_id()
         all_apps = {'id': group_name, 'apps': []}
 
-        self.nginx_helper.ensure_exists(self.compose_data)
+        if not dry_run:
+            self.nginx_helper.ensure_exists(self.compose_data)
         docker_registry = dockerregistry.DockerRegistry(
             self.registry_host, self.registry_username, self.registry_password,
             self.marathon_helper)
@@ -144,22 +185,23 @@ class DockerComposeParser(object):
             app_json = service_parser.get_app_json()
 
             # Add the registry auth URL if needed
-            registry_auth_url = docker_registry.get_registry_auth_url()
+            registry_auth_url = docker_registry.get_registry_auth_url(upload=not dry_run)
             if registry_auth_url:
                 app_json['uris'] = [registry_auth_url]
             all_apps['apps'].append(app_json)
 
         return all_apps
 
-    def _predeployment_check(self):
+    def _predeployment_check(self, get_group_ids=None):
         """
         Checks if services can be deployed and
         returns True if services are being updated or
         False if this is the first deployment
         """
+        get_group_ids = get_group_ids or self.marathon_helper.get_group_ids
         group_id = self._get_group_id(include_version=False)
         group_version_id = self._get_group_id()
-        group_ids = self.marathon_helper.get_group_ids(group_id)
+        group_ids = get_group_ids(group_id)
         group_count = len(group_ids)
         is_update = False
         existing_group_id = None
@@ -170,7 +212,7 @@ class DockerComposeParser(object):
 
         if group_count == 1:
             # Do an additional check that includes the group version
-            groups_with_version = self.marathon_helper.get_group_ids(group_version_id)
+            groups_with_version = get_group_ids(group_version_id)
 
             # Check if there's an existing group with the same version_id
             if len(groups_with_version) > 0:
@@ -229,14 +271,19 @@ class DockerComposeParser(object):
 
             # Always get the first portMapping and use it to create the private IP
             port_mapping = port_mappings[0]
-            port = int(port_mapping['servicePort'])
-            x, y = divmod(port - 10000, 1<<8)
-            ip = '10.64.' + str(x) + '.' + str(y)
+            ip = self._get_private_ip(port_mapping['servicePort'])
             private_ips[str(new_id)] = ip
             logging.info('Creating new private IP "%s" for service "%s"', ip, new_id)
 
         return private_ips
 
+    def _get_private_ip(self, service_port):
+        """
+        Gets the private IP for the service port
+        """
+        x, y = divmod(int(service_port) - 10000, 1<<8)
+        return '10.64.' + str(x) + '.' + str(y)
+
     def _update_port_mappings(self, marathon_app, private_ips, service_info, vip_name):
         """
         Updates portMappings in marathon_app for the service defined with service_info
@@ -325,49 +372,11 @@ class DockerComposeParser(object):
                 return True
         return False
 
-    def _cleanup(self):
+    def _update_apps(self, marathon_json, private_ips):
         """
-        Removes the group we were trying to deploy in case exception occurs
+        Updates the apps in marathon_json with port mappings, VIPs,
+        dependencies and links to other services
         """
-        if not self.cleanup_needed:
-            self._shutdown()
-            return
-
-        try:
-            group_id = self._get_group_id()
-            logging.info('Removing "%s".', group_id)
-            self.marathon_helper.delete_group(group_id)
-        except Exception as remove_exception:
-            raise remove_exception
-        finally:
-            self._shutdown()
-
-    def deploy(self):
-        """
-        Deploys the services defined in docker-compose.yml file
-        """
-        is_update, existing_group_id = self._predeployment_check()
-
-        # marathon_json is the instance we are working with and deploying
-        marathon_json = self._parse_compose()
-
-        # 1. Deploy the initial marathon_json file (instances = 0, no VIPs)
-        self.marathon_helper.deploy_group(marathon_json)
-
-        # At this point we need to clean up if anything
-        # goes wrong
-        self.cleanup_needed = True
-
-        group_id = self._get_group_id()
-        if not self.marathon_helper.is_group_id_unique(group_id):
-            raise Exception(
-                'App with ID "{}" is not unique anymore'.format(group_id))
-
-        new_deployment_json = self.marathon_helper.get_group(group_id)
-
-        # Create the VIPs from servicePorts for apps we dont have the VIPs for yet
-        private_ips = self._create_or_update_private_ips(new_deployment_json, group_id)
-
         # Go through the docker-compose file and update the corresponding marathon_app with
         # portMappings, VIP, color and links
         for service_name, service_info in self.compose_data['services'].items():
@@ -417,66 +426,493 @@ class DockerComposeParser(object):
                     logging.info('Adding dependency "%s" to "%s"', link_id, service_name)
                     marathon_app['dependencies'].append(link_id)
 
-        # Update the group with VIPs
-        self.marathon_helper.update_group(marathon_json)
+    def _get_target_instances(self, existing_deployment_json, new_deployment_json):
+        """
+        Gets the number of instances for each app in the new deployment: the
+        instances of the app with the same name in the existing deployment or
+        1 for new apps. Apps that were removed from the compose file are ignored.
+        """
+        target_service_instances = {}
+        for app in existing_deployment_json['apps']:
+            full_app_id = app['id']
+            # Just get the service name (e.g. service-a)
+            app_id = full_app_id.split('/')[-1]
+            new_apps = [a for a in new_deployment_json['apps'] \
+                                if a['id'].split('/')[-1] == app_id]
+            if not new_apps:
+                continue
+            new_app = new_apps[0]
+
+            # Store the new app ID and the instances of existing app
+            # so we can easily look it up when scaling
+            target_service_instances[new_app['id']] = app['instances']
 
-        # 3. Update the instances and do the final deployment
-        if is_update:
-            existing_deployment_json = self.marathon_helper.get_group(existing_group_id)
+        for app in new_deployment_json['apps']:
+            if not app['id'] in target_service_instances:
+                target_service_instances[app['id']] = 1
+        return target_service_instances
+
+    def _get_initial_instances(self, target_instances):
+        """
+        Gets the number of instances the new deployment starts with,
+        while the existing deployment is still running. With check_capacity
+        they are rounded up, like the capacity planner counts them.
+        """
+        if self.check_capacity:
+            return marathon.get_scaled_instances(target_instances, self.minimum_health_capacity)
+        return int(target_instances * self.minimum_health_capacity) // 100
+
+    def _cleanup(self):
+        """
+        Removes the group we were trying to deploy in case exception occurs
+        """
+        if not self.cleanup_needed:
+            self._shutdown()
+            return
+
+        try:
+            group_id = self._get_group_id()
+            logging.info('Removing "%s".', group_id)
+            self.marathon_helper.delete_group(group_id)
+        except Exception as remove_exception:
+            raise remove_exception
+        finally:
+            self._shutdown()
+
+    def _get_all_groups(self, group):
+        """
+        Recursively gets the group and all its subgroups
+        """
+        yield group
+        for subgroup in group.get('groups', []):
+            for nested_group in self._get_all_groups(subgroup):
+                yield nested_group
+
+    def _get_vip_addresses(self, deployment_json):
+        """
+        Gets the private IPs used in the VIP_0 labels of the deployed apps
+        """
+        private_ips = set()
+        for app in deployment_json['apps']:
+            port_mappings = app.get('container', {}).get('docker', {}).get('portMappings')
+            for port_mapping in port_mappings or []:
+                vip = port_mapping.get('labels', {}).get('VIP_0')
+                if vip:
+                    private_ips.add(vip.split(':')[0])
+        return private_ips
 
-            # Get the number of instances for deployed services
-            target_service_instances = {}
+    def _get_deployed_private_ips(self, deployment_json):
+        """
+        Gets the private IPs (by app ID) from the VIP_0 label of the first
+        port mapping of the deployed apps
+        """
+        private_ips = {}
+        for app in deployment_json['apps']:
+            port_mappings = app.get('container', {}).get('docker', {}).get('portMappings')
+            vip = (port_mappings or [{}])[0].get('labels', {}).get('VIP_0')
+            if vip:
+                private_ips[app['id']] = vip.split(':')[0]
+        return private_ips
+
+    def _normalize_app(self, app, group_id, private_ips):
+        """
+        Changes the existing app JSON so it can be compared to the planned
+        one: uses the new group ID and replaces the private IPs
+        """
+        app_json = json.dumps(app).replace(group_id, self._get_group_id())
+        for private_ip in private_ips:
+            app_json = re.sub(re.escape(private_ip) + r'(?![0-9])',
+                              PRIVATE_IP_PLACEHOLDER, app_json)
+        return json.loads(app_json)
+
+    def plan(self):
+        """
+        Computes what deploy() would do, without making any changes: the
+        steps, the target group JSON and instance counts and the diff to
+        the deployed group. Cluster state is read with a single request.
+        """
+        root_group = self.marathon_helper.get_groups_with_apps()
+        all_groups = dict((group['id'], group) for group in self._get_all_groups(root_group))
+        is_update, existing_group_id = self._predeployment_check(
+            lambda prefix: [group_id for group_id in all_groups if group_id.startswith(prefix)])
+
+        group_id = self._get_group_id()
+        plan = deploymentplan.DeploymentPlan(group_id, existing_group_id)
+        root_app_ids = [app['id'] for app in root_group.get('apps', [])]
+        if self.nginx_helper.is_required(self.compose_data) and \
+           LoadBalancerApp.APP_ID not in root_app_ids:
+            plan.add_step('Deploy app "{}"'.format(LoadBalancerApp.APP_ID),
+                          deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+        if self.registry_host and Exhibitor.APP_ID not in root_app_ids:
+            plan.add_step('Deploy app "{}"'.format(Exhibitor.APP_ID),
+                          deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+
+        marathon_json = self._parse_compose(dry_run=True)
+        in_place = is_update and self.in_place
+        if not in_place:
+            plan.add_step('Deploy group "{}" with 0 instances'.format(group_id))
+
+        private_ips = {}
+        for app in marathon_json['apps']:
+            if app['container']['docker'].get('portMappings'):
+                private_ips[app['id']] = PRIVATE_IP_PLACEHOLDER
+        self._update_apps(marathon_json, private_ips)
+        if not in_place:
+            plan.add_step('Update group "{}" with VIPs and links'.format(group_id))
+
+        existing_apps = {}
+        if is_update:
+            existing_deployment_json = all_groups[existing_group_id]
+            existing_private_ips = self._get_vip_addresses(existing_deployment_json)
             for app in existing_deployment_json['apps']:
-                full_app_id = app['id']
-                # Just get the service name (e.g. service-a)
-                app_id = full_app_id.split('/')[-1]
-                new_apps = [a for a in new_deployment_json['apps'] \
-                                    if a['id'].split('/')[-1] == app_id]
-                new_app = new_apps[0]
-
-                # Store the new app ID and the instances of existing app
-                # so we can easily look it up when scaling
-                target_service_instances[new_app['id']] = app['instances']
-
-            for app in new_deployment_json['apps']:
-                app_id = app['id']
-                # Calculate the new instances for each service
-                marathon_app = [app for app in marathon_json['apps'] \
-                                 if app['id'] == app_id][0]
-                if not app_id in target_service_instances:
-                    target_service_instances[app_id] = 1
-                instance_count = math.ceil(
-                    (target_service_instances[app_id] * self.minimum_health_capacity) / 100)
-                logging.info('Setting instances for app "%s" to %s',
-                             marathon_app['id'], instance_count)
-                marathon_app['instances'] = instance_count
+                existing_apps[app['id'].split('/')[-1]] = self._normalize_app(
+                    app, existing_group_id, existing_private_ips)
+
+            target_service_instances = self._get_target_instances(
+                existing_deployment_json, marathon_json)
+            if self.check_capacity:
+                self._plan_capacity(marathon_json, target_service_instances,
+                                    existing_deployment_json)
+            if in_place:
+                plan.add_step(
+                    'Update the changed apps of group "{}" in place'.format(existing_group_id),
+                    deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+            elif self.canary_rollout is not None:
+                for step in self.canary_rollout.steps:
+                    plan.add_step(
+                        'Update group "{}" with {}% of target instance counts'.format(
+                            group_id, step),
+                        deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+                    plan.add_step('Update group "{}" with {}% of instance counts'.format(
+                        existing_group_id, 100 - step))
+            else:
+                scale_factor = float(self.minimum_health_capacity)/100
+                plan.add_step('Scale group "{}" by factor {}'.format(
+                    existing_group_id, scale_factor))
+                plan.add_step('Update group "{}" with initial instance counts'.format(group_id),
+                              deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+                plan.add_step('Scale group "{}" by factor 0'.format(existing_group_id))
+                plan.add_step('Update group "{}" with target instance counts'.format(group_id),
+                              deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+            if not in_place:
+                plan.add_step('Delete group "{}"'.format(existing_group_id))
+        else:
+            target_service_instances = dict((app['id'], 1) for app in marathon_json['apps'])
+            if self.check_capacity:
+                self._plan_capacity(marathon_json, target_service_instances, None)
+            plan.add_step('Update group "{}" with 1 instance per app'.format(group_id),
+                          deploymentplan.STEP_SECONDS + deploymentplan.TASK_START_SECONDS)
+
+        for app in marathon_json['apps']:
+            app_name = app['id'].split('/')[-1]
+            app['instances'] = target_service_instances[app['id']]
+            existing_app = existing_apps.pop(app_name, None)
+            plan.instances[app_name] = {
+                'deployed': existing_app['instances'] if existing_app else 0,
+                'initial': self._get_initial_instances(app['instances']) if is_update else 1,
+                'target': app['instances']
+            }
+            plan.add_diff(app_name, deploymentplan.filter_like(existing_app, app)
+                          if existing_app else None, app)
+
+        # Apps that are not in the compose file anymore
+        for app_name, existing_app in sorted(existing_apps.items()):
+            plan.add_diff(app_name, existing_app, None)
+
+        plan.target = marathon_json
+        return plan
+
+    def _plan_capacity(self, marathon_json, target_instances, existing_deployment_json):
+        """
+        Checks that the deployment fits the free resources of the cluster
+        and uses the largest step sizes that fit for updates
+        """
+        planner = capacityplanner.CapacityPlanner.from_mesos(self.marathon_helper.mesos)
+        if existing_deployment_json is not None and self.canary_rollout is not None:
+            self.canary_rollout.steps = planner.plan_canary(
+                marathon_json, target_instances, existing_deployment_json,
+                self.canary_rollout.steps)
+        else:
+            self.minimum_health_capacity = planner.plan_blue_green(
+                marathon_json, target_instances, existing_deployment_json,
+                self.minimum_health_capacity)
+
+    def _move_to_group(self, marathon_json, group_id):
+        """
+        Moves the apps of marathon_json into the group: only the IDs of the
+        group, of its apps and of their dependencies on each other change
+        """
+        def move(app_id):
+            if not app_id.startswith(marathon_json['id'] + '/'):
+                return app_id
+            return group_id + app_id[len(marathon_json['id']):]
+
+        for app in marathon_json['apps']:
+            app['id'] = move(app['id'])
+            if 'dependencies' in app:
+                app['dependencies'] = [move(dependency) for dependency in app['dependencies']]
+        marathon_json['id'] = group_id
+
+    def _deploy_in_place(self, existing_group_id):
+        """
+        Updates the existing group to the services in the docker-compose
+        file, restarting only the apps that changed. The group keeps its ID
+        and is rolled back to its previous version if the update fails.
+        """
+        reconciler = groupreconciler.GroupReconciler(
+            self.marathon_helper, self.minimum_health_capacity)
+        self.marathon_helper.timing_groups[existing_group_id] = \
+            self._get_group_id(include_version=False).rstrip('.')
+        existing_json = self.marathon_helper.get_group(existing_group_id)
+        rollback_version = reconciler.get_current_version(existing_group_id)
+
+        # The apps are parsed into the existing group
+        marathon_json = self._parse_compose()
+        self._move_to_group(marathon_json, existing_group_id)
+        self._set_instances(marathon_json, self._get_target_instances(
+            existing_json, marathon_json))
+
+        try:
+            added_app_ids = reconciler.get_changes(existing_json, marathon_json)[0]
+            if added_app_ids:
+                # New apps are added without instances first, to get their service
+                # ports (and private IPs) before the VIPs and links are set
+                initial_json = json.loads(json.dumps(marathon_json))
+                for app in initial_json['apps']:
+                    if app['id'] in added_app_ids:
+                        app['instances'] = 0
+                reconciler.update(initial_json, existing_json, added_app_ids)
+                existing_json = self.marathon_helper.get_group(existing_group_id)
+
+            # Deployed apps keep the private IPs of their VIPs
+            private_ips = self._create_or_update_private_ips(existing_json, existing_group_id)
+            private_ips.update(self._get_deployed_private_ips(existing_json))
+            self._update_apps(marathon_json, private_ips)
+            reconciler.reconcile(marathon_json, existing_json)
+        except Exception:
+            if rollback_version:
+                reconciler.rollback(existing_group_id, rollback_version)
+            raise
+
+    def _run_phase(self, phase, run, **data):
+        """
+        Runs the deployment phase, unless it completed in a previous run
+        of the deployment that is resumed, and records the data with it
+        """
+        state = self.deploy_state
+        if state is not None and state.is_completed(phase):
+            logging.info('Skipping phase "%s", completed by a previous run', phase)
+            return
+        run()
+        if state is not None:
+            state.complete(phase, **data)
+
+    def _record_canary_step(self, completed_steps):
+        """
+        Records the number of completed canary steps, so a resumed
+        deployment continues after them
+        """
+        if self.deploy_state is not None:
+            self.deploy_state.save(canary_completed_steps=completed_steps)
+
+    def _verify_resumable(self, group_id, existing_group_id):
+        """
+        Checks that the groups of the deployment that is resumed are
+        still in the state the recorded phases left them in
+        """
+        if not self.marathon_helper.group_exists(group_id):
+            raise Exception(
+                'Cannot resume deployment, group "{}" does not exist'.format(group_id))
+        if existing_group_id and not self.deploy_state.is_completed(deploystate.DELETE_OLD) \
+            and not self.marathon_helper.group_exists(existing_group_id):
+            raise Exception('Cannot resume deployment, existing group "{}" does not exist'.format(
+                existing_group_id))
+
+    def _get_resumable_instances(self, existing_instances):
+        """
+        Gets the instances (by app ID) the existing group can have when the
+        blue/green deployment is resumed: the ones the completed phases scaled
+        it to, or the ones the next phase scales it to, if that phase failed
+        after scaling the group
+        """
+        scaled = dict((app_id, marathon.get_scaled_instances(
+            instances, self.minimum_health_capacity))
+                      for app_id, instances in existing_instances.items())
+        stopped = dict((app_id, 0) for app_id in existing_instances)
+        state = self.deploy_state
+        if state.is_completed(deploystate.SCALE_TO_ZERO):
+            return [stopped]
+        if state.is_completed(deploystate.UPDATE_NEW):
+            return [scaled, stopped]
+        if state.is_completed(deploystate.SCALE_OLD):
+            return [scaled]
+        return [existing_instances, scaled]
+
+    def _verify_existing_instances(self, existing_group_id, existing_instances):
+        """
+        Checks that the existing group of the blue/green deployment that is
+        resumed has the instances the recorded phases scaled it to
+        """
+        if not existing_instances or self.deploy_state.is_completed(deploystate.DELETE_OLD):
+            return
+        existing_json = self.marathon_helper.get_group(
+            existing_group_id, marathon.Marathon.GROUP_APPS)
+        instances = dict((app['id'], app['instances']) for app in existing_json['apps'])
+        expected = self._get_resumable_instances(existing_instances)
+        if not instances in expected:
+            raise Exception(
+                'Cannot resume deployment, existing group "{}" has instances {} '
+                'instead of {}'.format(existing_group_id, instances, expected[0]))
+
+    def _set_instances(self, marathon_json, instances):
+        """
+        Sets the instances of the apps (by app ID)
+        """
+        for marathon_app in marathon_json['apps']:
+            logging.info('Setting instances for app "%s" to %s',
+                         marathon_app['id'], instances[marathon_app['id']])
+            marathon_app['instances'] = instances[marathon_app['id']]
+
+    def deploy(self):
+        """
+        Deploys the services defined in docker-compose.yml file. With a
+        state_file, the completed phases are recorded and a failed deployment
+        is kept; with resume, it continues after the last completed phase.
+        """
+        group_id = self._get_group_id()
+        if self.state_file:
+            self.deploy_state = deploystate.DeployState(self.state_file, group_id)
+            if not self.resume:
+                self.deploy_state.reset()
+            elif self.deploy_state.phase is None:
+                logging.info('No deployment of "%s" to resume, deploying it', group_id)
+        state = self.deploy_state
+
+        resumed = state is not None and state.phase is not None
+        if resumed:
+            is_update = state.data['is_update']
+            existing_group_id = state.data['existing_group_id']
+            logging.info('Resuming deployment of "%s" after phase "%s"', group_id, state.phase)
+            self._verify_resumable(group_id, existing_group_id)
+        else:
+            is_update, existing_group_id = self._predeployment_check()
+            if is_update and self.in_place:
+                self._deploy_in_place(existing_group_id)
+                if state is not None:
+                    state.remove()
+                return
+
+        # marathon_json is the instance we are working with and deploying
+        marathon_json = self._parse_compose()
+
+        if resumed:
+            target_service_instances = state.data['target_instances']
+            existing_instances = state.data.get('existing_instances')
+            # Use the step sizes the deployment started with
+            self.minimum_health_capacity = state.data.get(
+                'minimum_health_capacity', self.minimum_health_capacity)
+            if self.canary_rollout is not None and state.data.get('canary_steps'):
+                self.canary_rollout.steps = state.data['canary_steps']
+            elif is_update:
+                self._verify_existing_instances(existing_group_id, existing_instances)
+        else:
+            # Instances are taken from the existing deployment before it's scaled down
+            target_service_instances = dict((app['id'], 1) for app in marathon_json['apps'])
+            existing_instances = None
+            existing_deployment_json = None
+            if is_update:
+                existing_deployment_json = self.marathon_helper.get_group(
+                    existing_group_id, marathon.Marathon.GROUP_APP_RESOURCES
+                    if self.check_capacity else marathon.Marathon.GROUP_APPS)
+                target_service_instances = self._get_target_instances(
+                    existing_deployment_json, marathon_json)
+                existing_instances = dict((app['id'], app['instances'])
+                                          for app in existing_deployment_json['apps'])
+            # Report a deployment that doesn't fit before anything is changed
+            if self.check_capacity:
+                self._plan_capacity(marathon_json, target_service_instances,
+                                    existing_deployment_json)
+
+        # 1. Deploy the initial marathon_json file (instances = 0, no VIPs)
+        self._run_phase(deploystate.INITIAL_DEPLOY,
+                        lambda: self.marathon_helper.deploy_group(marathon_json),
+                        is_update=is_update, existing_group_id=existing_group_id,
+                        target_instances=target_service_instances,
+                        existing_instances=existing_instances,
+                        minimum_health_capacity=self.minimum_health_capacity,
+                        canary_steps=self.canary_rollout.steps if self.canary_rollout else None)
+
+        # At this point we need to clean up if anything goes
+        # wrong, unless the deployment can be resumed
+        self.cleanup_needed = state is None
+
+        if not self.marathon_helper.is_group_id_unique(group_id):
+            raise Exception(
+                'App with ID "{}" is not unique anymore'.format(group_id))
+
+        new_deployment_json = self.marathon_helper.get_group(
+            group_id, marathon.Marathon.GROUP_APPS)
+
+        # Create the VIPs from servicePorts for apps we dont have the VIPs for yet
+        private_ips = self._create_or_update_private_ips(new_deployment_json, group_id)
+
+        self._update_apps(marathon_json, private_ips)
+
+        # 2. Update the group with VIPs
+        self._run_phase(deploystate.VIP_UPDATE,
+                        lambda: self.marathon_helper.update_group(marathon_json))
+
+        # 3. Update the instances and do the final deployment
+        if is_update and self.canary_rollout is not None:
+            # An interrupted rollout continues after its recorded steps
+            completed_steps = state.data.get('canary_completed_steps', 0) if resumed else 0
+            try:
+                self._run_phase(deploystate.CANARY_ROLLOUT, lambda: self.canary_rollout.run(
+                    marathon_json, target_service_instances, existing_group_id,
+                    existing_instances, completed_steps, self._record_canary_step))
+            except canary.CanaryFailed:
+                # The existing deployment was restored, the new one is removed
+                self.cleanup_needed = True
+                if state is not None:
+                    state.remove()
+                raise
+
+            logging.info('Delete deployment "%s"', existing_group_id)
+            self._run_phase(deploystate.DELETE_OLD,
+                            lambda: self.marathon_helper.delete_group(existing_group_id))
+        elif is_update:
+            # Calculate the new instances for each service
+            self._set_instances(marathon_json, dict(
+                (app_id, self._get_initial_instances(instances))
+                for app_id, instances in target_service_instances.items()))
 
             scale_factor = float(self.minimum_health_capacity)/100
             logging.info('Scale deployment "%s" by factor %s', existing_group_id, scale_factor)
-            self.marathon_helper.scale_group(existing_group_id, scale_factor, log_failures=False)
+            self._run_phase(deploystate.SCALE_OLD, lambda: self.marathon_helper.scale_group(
+                existing_group_id, scale_factor, log_failures=False, instances=existing_instances))
 
             logging.info('Update deployment "%s" with new instance counts', marathon_json['id'])
-            self.marathon_helper.update_group(marathon_json)
+            self._run_phase(deploystate.UPDATE_NEW,
+                            lambda: self.marathon_helper.update_group(marathon_json))
 
             # Scale the existing deployment instances to 0
             logging.info('Scale deployment "%s" by factor %s', existing_group_id, 0)
-            self.marathon_helper.scale_group(existing_group_id, 0, log_failures=False)
+            self._run_phase(deploystate.SCALE_TO_ZERO, lambda: self.marathon_helper.scale_group(
+                existing_group_id, 0, log_failures=False, instances=existing_instances))
 
             # Scale up new deployment instances to target instance count
-            for app in new_deployment_json['apps']:
-                app_id = app['id']
-                marathon_app = [app for app in marathon_json['apps'] \
-                                 if app['id'] == app_id][0]
-                logging.info('Setting instances for app "%s" to %s',
-                             marathon_app['id'], target_service_instances[app_id])
-                marathon_app['instances'] = target_service_instances[app_id]
-
+            self._set_instances(marathon_json, target_service_instances)
             logging.info('Scale instances in deployment "%s" to target count', marathon_json['id'])
-            self.marathon_helper.update_group(marathon_json)
+            self._run_phase(deploystate.FINAL_SCALE,
+                            lambda: self.marathon_helper.update_group(marathon_json))
 
             logging.info('Delete deployment "%s"', existing_group_id)
-            self.marathon_helper.delete_group(existing_group_id)
+            self._run_phase(deploystate.DELETE_OLD,
+                            lambda: self.marathon_helper.delete_group(existing_group_id))
         else:
-            for app in marathon_json['apps']:
-                app['instances'] = 1
-            self.marathon_helper.update_group(marathon_json)
+            self._set_instances(marathon_json, target_service_instances)
+            self._run_phase(deploystate.FINAL_SCALE,
+                            lambda: self.marathon_helper.update_group(marathon_json))
+
+        if state is not None:
+            state.remove()
@@ -20,5 +20,11 @@ class Exhibitor(object):
             put_data=hex_string,
             endpoint='/exhibitor/exhibitor/v1/explorer/znode')
 
+        return self.get_url(endpoint)
+
+    def get_url(self, endpoint):
+        """
+        Gets the full URL to the exhibitor endpoint
+        """
         return 'http://{}/{}'.format(
             Exhibitor.HOST_NAME, endpoint)
@@ -0,0 +1,118 @@
+import copy
+import logging
+
+import deploymentplan
+from marathon import get_app_definition
+
+# Tasks of changed apps are replaced without starting extra tasks first, so
+# the update doesn't need more resources than the deployed group
+MAXIMUM_OVER_CAPACITY = 0.0
+
+
+def get_port_mappings(app):
+    """
+    Gets the port mappings of the app (or an empty list)
+    """
+    try:
+        return app['container']['docker']['portMappings'] or []
+    except (KeyError, TypeError):
+        return []
+
+
+class GroupReconciler(object):
+    """
+    Updates a deployed group in place: only the apps whose definition
+    changed (e.g. image, environment, labels or resources) get the new
+    definition and Marathon replaces their tasks with a rolling
+    upgradeStrategy; the other apps are PUT as they are deployed, so their
+    tasks keep running. The version of the group before the update is read
+    from the group versions, so the update can be rolled back to it.
+    """
+    def __init__(self, marathon_helper, minimum_health_capacity):
+        self.marathon_helper = marathon_helper
+        self.minimum_health_capacity = minimum_health_capacity
+
+    def get_current_version(self, group_id):
+        """
+        Gets the current version of the group (or None if it has no versions)
+        """
+        versions = self.marathon_helper.get_group_versions(group_id)
+        return versions[0] if versions else None
+
+    def keep_service_ports(self, existing_json, marathon_json):
+        """
+        Sets the service ports of the deployed apps on the port mappings of
+        the apps in marathon_json, so the private IPs of the VIPs don't change
+        """
+        existing_apps = dict((app['id'], app) for app in existing_json['apps'])
+        for app in marathon_json['apps']:
+            existing_app = existing_apps.get(app['id'])
+            if existing_app is None:
+                continue
+            for port_mapping, existing_mapping in zip(get_port_mappings(app),
+                                                      get_port_mappings(existing_app)):
+                if port_mapping.get('containerPort') == existing_mapping.get('containerPort') \
+                    and existing_mapping.get('servicePort'):
+                    port_mapping['servicePort'] = existing_mapping['servicePort']
+
+    def get_changes(self, existing_json, marathon_json):
+        """
+        Gets the IDs of the apps in marathon_json that are not deployed yet,
+        the ones with a changed definition and the deployed apps that are
+        not in marathon_json anymore
+        """
+        existing_apps = dict((app['id'], app) for app in existing_json['apps'])
+        added = []
+        changed = []
+        for app in marathon_json['apps']:
+            existing_app = existing_apps.pop(app['id'], None)
+            if existing_app is None:
+                added.append(app['id'])
+            elif deploymentplan.filter_like(existing_app, app) != app:
+                changed.append(app['id'])
+        return added, changed, sorted(existing_apps)
+
+    def update(self, marathon_json, existing_json, app_ids):
+        """
+        Updates the group with the apps in app_ids from marathon_json and the
+        other apps of marathon_json as they are deployed. Deployed apps that
+        are not in marathon_json are removed.
+        """
+        existing_apps = dict((app['id'], app) for app in existing_json['apps'])
+        group_json = {'id': marathon_json['id'], 'apps': []}
+        for app in marathon_json['apps']:
+            if app['id'] in app_ids:
+                app = copy.deepcopy(app)
+                if app['id'] in existing_apps:
+                    app['upgradeStrategy'] = {
+                        'minimumHealthCapacity': self.minimum_health_capacity / 100.0,
+                        'maximumOverCapacity': MAXIMUM_OVER_CAPACITY
+                    }
+                group_json['apps'].append(app)
+            elif app['id'] in existing_apps:
+                group_json['apps'].append(get_app_definition(existing_apps[app['id']]))
+        self.marathon_helper.update_group(group_json, started_app_ids=[
+            app['id'] for app in group_json['apps']
+            if app['id'] in app_ids and app.get('instances', 1) > 0])
+
+    def reconcile(self, marathon_json, existing_json):
+        """
+        Updates the apps of the group that changed and returns their IDs
+        """
+        self.keep_service_ports(existing_json, marathon_json)
+        added, changed, removed = self.get_changes(existing_json, marathon_json)
+        if not added and not changed and not removed:
+            logging.info('Group "%s" is up to date', marathon_json['id'])
+            return []
+
+        logging.info('Updating group "%s" in place: adding %s, updating %s, removing %s',
+                     marathon_json['id'], added, changed, removed)
+        self.update(marathon_json, existing_json, added + changed)
+        return added + changed
+
+    def rollback(self, group_id, version):
+        """
+        Rolls the group back to the version
+        """
+        logging.info('Rolling group "%s" back to version "%s"', group_id, version)
+        self.marathon_helper.rollback_group(group_id, version)
@@ -1,6 +1,9 @@
 
 import json
 
+import servicelabels
+
+
 class HealthCheck(object):
     PATH_LABEL = 'com.microsoft.acs.dcos.marathon.healthcheck.path'
     PORT_INDEX_LABEL = 'com.microsoft.acs.dcos.marathon.healthcheck.portindex'
@@ -12,6 +15,7 @@ class HealthCheck(object):
         if labels is None:
             raise ValueError('Labels cannot be empty')
         self.labels = labels
+        self._labels = servicelabels.parse_labels(labels)
 
     @staticmethod
     def get_default_health_check_config():
@@ -31,36 +35,13 @@ class HealthCheck(object):
         """
         Checks if label exists and returns True/False
         """
-        label_exists = False
-        for label in self.labels:
-            if '=' in label:
-                label_split = label.split('=')
-                if label_split[0].lower() == name:
-                    label_exists = True
-                    break
-            else:
-                if label.lower() == name:
-                    label_exists = True
-                    break
-
-        return label_exists
+        return name in self._labels
 
     def _get_label_value(self, name):
         """
         Gets the label value or None if label doesn't exist
         """
-        label_value = None
-        for label in self.labels:
-            if '=' in label:
-                label_split = label.split('=')
-                if label_split[0].lower() == name:
-                    label_value = label_split[1]
-                    break
-            else:
-                if label.lower() == name:
-                    label_value = self.labels[label]
-                    break
-        return label_value
+        return self._labels.get(name)
 
     def _set_path_if_exists(self, healthcheck_json):
         """
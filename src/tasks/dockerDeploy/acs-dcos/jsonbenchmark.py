@@ -0,0 +1,154 @@
+import argparse
+import json
+import sys
+import time
+
+import clusterrecording
+import jsoncodec
+from marathon import Marathon
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Measures how long it takes to decode the Marathon and Mesos responses ' \
+                    'with each available JSON codec, with and without selecting keys')
+    parser.add_argument('--recording',
+                        help='Recording created with --record-file (default: generated payloads)')
+    parser.add_argument('--groups', type=int, default=200,
+                        help='Number of groups in the generated group tree')
+    parser.add_argument('--apps', type=int, default=10,
+                        help='Number of apps per generated group')
+    parser.add_argument('--tasks', type=int, default=2000,
+                        help='Number of tasks in the generated agent state.json')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of runs')
+    return parser
+
+
+def get_selection(path):
+    """
+    Gets the name and key selection for the large responses (the Mesos
+    state.json and Marathon deployments responses are decoded without a selection)
+    """
+    if path.startswith('service/marathon/v2/groups?embed=group.groups') and \
+        'embed=group.apps' not in path:
+        return 'groups', Marathon.GROUP_IDS
+    if path == 'service/marathon/v2/apps':
+        return 'apps', Marathon.APP_IDS
+    if path == 'service/marathon/v2/deployments':
+        return 'deployments', None
+    if path == 'mesos/slaves/state.json':
+        return 'slaves', None
+    if path.startswith('slave/') and path.endswith('/state.json'):
+        return 'agent_state', None
+    return None, None
+
+
+def load_payloads(recording_file):
+    """
+    Loads the recorded bodies of the large responses
+    """
+    payloads = []
+    recording = clusterrecording.Recording.load(recording_file)
+    for (method, path), entries in sorted(recording.responses.items()):
+        name, selection = get_selection(path)
+        if method != 'GET' or name is None:
+            continue
+        for entry in entries:
+            if entry['status'] == 200 and entry['body']:
+                payloads.append((name, entry['body'].encode('utf-8'), selection))
+    return payloads
+
+
+def create_payloads(arguments):
+    """
+    Creates a group tree and an agent state.json like the ones returned by the cluster
+    """
+    groups = []
+    for i in range(arguments.groups):
+        group_id = '/group-{}'.format(i)
+        groups.append({
+            'id': group_id, 'version': '2017-01-01T00:00:00.000Z', 'dependencies': [],
+            'groups': [],
+            'apps': [{'id': '{}/app-{}'.format(group_id, j), 'cmd': None, 'cpus': 0.1,
+                      'mem': 128, 'instances': 2, 'labels': {'HAPROXY_GROUP': 'external'},
+                      'container': {'type': 'DOCKER', 'docker': {
+                          'image': 'nginx', 'network': 'BRIDGE', 'portMappings': [
+                              {'containerPort': 80, 'hostPort': 0, 'protocol': 'tcp'}]}},
+                      'healthChecks': [{'protocol': 'HTTP', 'path': '/'}]}
+                     for j in range(arguments.apps)]
+        })
+    group_tree = {'id': '/', 'apps': [], 'groups': groups}
+
+    tasks = [{'id': 'app-{}.task'.format(i), 'framework_id': 'marathon-framework',
+              'slave_id': 'agent-1', 'state': 'TASK_RUNNING', 'resources': {
+                  'cpus': 0.1, 'mem': 128, 'ports': '[31000-31000]'},
+              'statuses': [{'state': 'TASK_RUNNING', 'timestamp': 1483228800.0 + i}]}
+             for i in range(arguments.tasks)]
+    agent_state = {
+        'id': 'agent-1', 'hostname': '10.0.0.1', 'flags': {'work_dir': '/var/lib/mesos'},
+        'frameworks': [{
+            'id': 'marathon-framework', 'name': 'marathon', 'user': 'root',
+            'executors': [{'id': task['id'], 'directory': '/var/lib/mesos/{}'.format(task['id']),
+                           'resources': task['resources'], 'tasks': [task],
+                           'queued_tasks': [], 'completed_tasks': []} for task in tasks],
+            'completed_executors': []}],
+        'completed_frameworks': []
+    }
+    return [('groups', json.dumps(group_tree), Marathon.GROUP_IDS),
+            ('agent_state', json.dumps(agent_state), None)]
+
+
+def time_runs(runs, function):
+    """
+    Runs the function and returns the median run time
+    """
+    run_times = []
+    for _ in range(runs):
+        start_time = time.time()
+        function()
+        run_times.append(time.time() - start_time)
+    run_times.sort()
+    return round(run_times[len(run_times) // 2], 4)
+
+
+def run_benchmark(arguments, payloads):
+    """
+    Decodes all payloads with each codec and returns the results
+    """
+    results = {}
+    for name, content, selection in payloads:
+        result = results.setdefault(name, {'count': 0, 'bytes': 0, 'selected_bytes': 0})
+        result['count'] += 1
+        result['bytes'] += len(content)
+        result['selected_bytes'] += len(json.dumps(jsoncodec.select_keys(
+            json.loads(content), selection)))
+
+    for codec in jsoncodec.get_available_codecs():
+        for name in results:
+            contents = [(content, selection) for payload_name, content, selection in payloads
+                        if payload_name == name]
+
+            def decode():
+                for content, _ in contents:
+                    codec.loads(content)
+
+            def decode_selected():
+                for content, selection in contents:
+                    jsoncodec.select_keys(codec.loads(content), selection)
+
+            results[name][codec.name] = time_runs(arguments.runs, decode)
+            results[name][codec.name + '_selected'] = time_runs(arguments.runs, decode_selected)
+    return results
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    if arguments.recording:
+        payloads = load_payloads(arguments.recording)
+    else:
+        payloads = create_payloads(arguments)
+    sys.stdout.write(json.dumps(run_benchmark(arguments, payloads), indent=2, sort_keys=True) + '\n')
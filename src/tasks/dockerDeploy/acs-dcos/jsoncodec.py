@@ -0,0 +1,105 @@
+import json
+import logging
+
+try:
+    # Optional, a lot faster at decoding large responses (e.g. state.json)
+    import ujson
+except ImportError:
+    ujson = None
+
+_codec = None
+
+
+class JsonCodec(object):
+    """
+    Decodes and encodes JSON with the json module from the standard library
+    """
+    name = 'json'
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def dumps(self, data):
+        return json.dumps(data)
+
+
+class UJsonCodec(JsonCodec):
+    """
+    Decodes and encodes JSON with ujson
+    """
+    name = 'ujson'
+
+    def loads(self, text):
+        return ujson.loads(text)
+
+    def dumps(self, data):
+        return ujson.dumps(data)
+
+
+def get_available_codecs():
+    """
+    Gets all codecs that can be used, the fastest one first
+    """
+    codecs = []
+    if ujson is not None:
+        codecs.append(UJsonCodec())
+    codecs.append(JsonCodec())
+    return codecs
+
+
+def get_codec():
+    """
+    Gets the codec used to decode responses, which is the fastest
+    available one unless a different codec was set with set_codec
+    """
+    global _codec
+    if _codec is None:
+        _codec = get_available_codecs()[0]
+        logging.debug('Using "%s" to decode JSON responses', _codec.name)
+    return _codec
+
+
+def set_codec(codec):
+    """
+    Sets the codec used to decode responses (None selects the
+    fastest available one again)
+    """
+    global _codec
+    _codec = codec
+
+
+def select_keys(data, selection):
+    """
+    Keeps only the selected keys of the decoded JSON. selection is a dict
+    with the keys to keep, where the value is either None (keep the value
+    as is) or the selection for the value. Selections are applied to every
+    item in a list and can refer to themselves for recursive structures
+    (e.g. Marathon groups).
+
+    The data is already fully decoded, so this adds to the decode time
+    instead of saving any. It only pays off when the result is kept
+    around and most of the document is dropped (e.g. the group tree).
+    """
+    if selection is None:
+        return data
+    if isinstance(data, list):
+        return [select_keys(item, selection) for item in data]
+    if isinstance(data, dict):
+        return dict([(key, select_keys(data[key], selection[key]))
+                     for key in selection if key in data])
+    return data
+
+
+def decode_response(response, selection=None, codec=None):
+    """
+    Decodes the JSON response with the codec (or the one from get_codec)
+    and keeps only the selected keys. The whole response is decoded
+    either way (see select_keys).
+    """
+    content = getattr(response, 'content', None)
+    if isinstance(content, basestring):
+        data = (codec or get_codec()).loads(content)
+    else:
+        # Content was not read (e.g. a streamed response)
+        data = response.json()
+    return select_keys(data, selection)
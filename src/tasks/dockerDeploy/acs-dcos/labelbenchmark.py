@@ -0,0 +1,100 @@
+import argparse
+import json
+import sys
+import time
+
+import nginx
+import portmappings
+import servicelabels
+from serviceparser import Parser
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Measures how long it takes to parse services with many labels ' \
+                    '(app JSON, health checks, port mappings and NGINX check)')
+    parser.add_argument('--services', type=int, default=100,
+                        help='Number of services to parse')
+    parser.add_argument('--labels', type=int, default=500,
+                        help='Number of labels per service')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of runs')
+    return parser
+
+
+def create_service(labels, use_dict):
+    """
+    Creates a service with the provided number of labels (plus health
+    check and vhost labels), in the list or dict form
+    """
+    label_items = [('label-{}'.format(i), 'value-{}'.format(i)) for i in range(labels)]
+    label_items.extend([
+        ('com.microsoft.acs.dcos.marathon.healthcheck.path', '/health'),
+        ('com.microsoft.acs.dcos.marathon.vhost', 'www.contoso.com:8080')])
+    if use_dict:
+        service_labels = dict(label_items)
+    else:
+        service_labels = ['{}={}'.format(name, value) for name, value in label_items]
+    return {'image': 'nginx', 'expose': [8080], 'labels': service_labels}
+
+
+class _ParseCounter(object):
+    """
+    Counts how many times labels are parsed
+    """
+    def __init__(self):
+        self.count = 0
+        self._init = servicelabels.ServiceLabels.__init__
+
+    def __enter__(self):
+        counter = self
+        def counted_init(service_labels, *args, **kwargs):
+            counter.count += 1
+            counter._init(service_labels, *args, **kwargs)
+        servicelabels.ServiceLabels.__init__ = counted_init
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        servicelabels.ServiceLabels.__init__ = self._init
+
+
+def run_benchmark(arguments):
+    """
+    Parses the services and returns the results
+    """
+    run_times = []
+    portmappings_helper = portmappings.PortMappings()
+    load_balancer = nginx.LoadBalancerApp(None)
+    with _ParseCounter() as parse_counter:
+        for _ in range(arguments.runs):
+            # New services every run, so the labels are not cached yet
+            services = [create_service(arguments.labels, i % 2 == 0)
+                        for i in range(arguments.services)]
+            start_time = time.time()
+            for i, service_info in enumerate(services):
+                service_name = 'service-{}'.format(i)
+                Parser('/benchmark', service_name, service_info).get_app_json()
+                portmappings_helper.get_port_mappings(
+                    '10.0.0.1', service_info, service_name)
+                load_balancer.is_required({'services': {service_name: service_info}})
+            run_times.append(time.time() - start_time)
+
+    run_times.sort()
+    median = run_times[len(run_times) // 2]
+    return {
+        'services': arguments.services,
+        'labels': arguments.labels,
+        'median': round(median, 3),
+        'min': round(run_times[0], 3),
+        'max': round(run_times[-1], 3),
+        'per_service_ms': round(median / arguments.services * 1000, 3),
+        'parses_per_service': float(parse_counter.count) / (arguments.services * arguments.runs)
+    }
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    sys.stdout.write(json.dumps(run_benchmark(arguments), indent=2, sort_keys=True) + '\n')
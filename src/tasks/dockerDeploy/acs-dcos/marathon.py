@@ -1,12 +1,38 @@
 import json
 import logging
+import math
 import os
 import re
 import threading
 import time
 
+import jsoncodec
 from marathon_deployments import DeploymentMonitor
 from mesos import Mesos
+from requestbody import JsonBody
+
+# Fields of apps returned by Marathon that are not part of the app definition,
+# they are removed before the apps are PUT again
+READ_ONLY_APP_FIELDS = ['version', 'versionInfo', 'deployments', 'tasks', 'tasksStaged',
+                        'tasksRunning', 'tasksHealthy', 'tasksUnhealthy', 'taskStats',
+                        'lastTaskFailure', 'readinessCheckResults']
+
+
+def get_scaled_instances(instances, percentage):
+    """
+    Gets the instances scaled to the percentage, rounded up like
+    Marathon does when scaling
+    """
+    # Rounded first, so e.g. 10 * 0.3 * 100 isn't rounded up to 4
+    return int(math.ceil(round(instances * percentage / 100.0, 6)))
+
+
+def get_app_definition(app):
+    """
+    Gets the definition of a deployed app, without the read-only fields
+    """
+    return dict((key, value) for key, value in app.items()
+                if not key in READ_ONLY_APP_FIELDS)
 
 
 class Marathon(object):
@@ -15,10 +41,37 @@ class Marathon(object):
     """
     # Max time to wait (in seconds) for deployments to complete
     deployment_max_wait_time = 5 * 60
+    # How often (in seconds) to log the progress while waiting for deployments
+    progress_interval = 15
+    # Number of times the instance counts are checked after a deployment,
+    # tasks can still become healthy right after the deployment ended
+    verify_attempts = 3
+    # Group JSON is encoded while it is sent (instead of as one string up front);
+    # set compress_requests if Marathon is set up to accept gzipped requests
+    stream_requests = True
+    compress_requests = False
+    # Makes sure apps shared by concurrent deployments (e.g. NGINX) are only deployed once
+    _ensure_exists_lock = threading.Lock()
+    # Keys kept from the responses (see jsoncodec.select_keys)
+    APP_IDS = {'apps': {'id': None}}
+    GROUP_IDS = {'id': None}
+    GROUP_IDS['groups'] = GROUP_IDS
+    # Only what the deployment reads from the deployed group
+    GROUP_APPS = {'id': None, 'apps': {
+        'id': None, 'instances': None, 'container': {'docker': {'portMappings': None}}}}
+    # With the resources of the apps, for checking the cluster capacity
+    GROUP_APP_RESOURCES = {'id': None, 'apps': dict(GROUP_APPS['apps'], cpus=None, mem=None)}
+    APP_COUNTS = {'apps': {'id': None, 'instances': None, 'healthChecks': None,
+                           'tasksRunning': None, 'tasksHealthy': None}}
 
     def __init__(self, acs_client):
         self.acs_client = acs_client
         self.mesos = Mesos(self.acs_client)
+        # Optional deploymenttimings.TimingStore used for adaptive timeouts. Timings
+        # of apps in the groups from timing_groups are recorded under the mapped
+        # name (e.g. the group ID without version), so they apply to later versions
+        self.timing_store = None
+        self.timing_groups = {}
 
     def get_url(self, path):
         """
@@ -32,18 +85,24 @@ class Marathon(object):
         """
         return self.acs_client.get_request('{}/{}'.format(endpoint, path))
 
+    def get_json(self, path, selection=None, endpoint='service/marathon/v2'):
+        """
+        Makes an HTTP GET request and decodes the (selected keys of the) response
+        """
+        return jsoncodec.decode_response(self.get_request(path, endpoint), selection)
+
     def delete_request(self, path, endpoint='service/marathon/v2'):
         """
         Makes an HTTP DELETE request
         """
         return self.acs_client.delete_request('{}/{}'.format(endpoint, path))
 
-    def post_request(self, path, post_data, endpoint='service/marathon/v2'):
+    def post_request(self, path, post_data, endpoint='service/marathon/v2', **kwargs):
         """
         Makes an HTTP POST request
         """
         return self.acs_client.post_request('{}/{}'.format(endpoint, path),
-                                            post_data=post_data)
+                                            post_data=post_data, **kwargs)
 
     def put_request(self, path, put_data=None, endpoint='service/marathon/v2', **kwargs):
         """
@@ -71,11 +130,34 @@ class Marathon(object):
         """
         return self.get_request('deployments')
 
+    def get_deployment(self, deployment_id):
+        """
+        Gets the deployment with the provided ID or None if it's not
+        in progress anymore
+        """
+        deployments = jsoncodec.decode_response(self.get_deployments())
+        for deployment in deployments:
+            if deployment['id'] == deployment_id:
+                return deployment
+        return None
+
+    def find_deployment(self, app_ids):
+        """
+        Gets the first deployment in progress that affects any of
+        the apps or None if there is none
+        """
+        app_ids = set(app_ids or [])
+        for deployment in jsoncodec.decode_response(self.get_deployments()):
+            if app_ids.intersection(deployment['affectedApps']):
+                return deployment
+        return None
+
     def app_exists(self, app_id):
         """
         Checks if app with the provided ID exists
         """
-        all_apps = self.get_request('apps').json()
+        # Marathon only returns apps with IDs that contain app_id
+        all_apps = self.get_json('apps?id={}'.format(app_id), Marathon.APP_IDS)
 
         if not 'apps' in all_apps:
             return False
@@ -90,12 +172,13 @@ class Marathon(object):
         Checks if app with provided ID is deployed on Marathon and
         deploys it if it is not
         """
-        logging.info('Check if app "%s" is deployed', app_id)
-        app_exists = self.app_exists(app_id)
-        if not app_exists:
-            logging.info('Deploying app "%s"', app_id)
-            json_contents = self._load_json(json_file)
-            self.deploy_app(json.dumps(json_contents))
+        with Marathon._ensure_exists_lock:
+            logging.info('Check if app "%s" is deployed', app_id)
+            app_exists = self.app_exists(app_id)
+            if not app_exists:
+                logging.info('Deploying app "%s"', app_id)
+                json_contents = self._load_json(json_file)
+                self.deploy_app(json.dumps(json_contents), app_id=app_id)
 
     def _load_json(self, file_path):
         """
@@ -106,22 +189,30 @@ class Marathon(object):
             data = json.load(json_file)
         return data
 
-    def deploy_app(self, app_json):
+    def deploy_app(self, app_json, app_id=None):
         """
-        Deploys an app to marathon
+        Deploys an app to marathon. If app_id is provided, the
+        request is safe to retry as long as the app does not exist
         """
         if not app_json:
             raise ValueError('app_json not provided')
 
+        exists_check = None
+        if app_id:
+            exists_check = lambda: self.app_exists(app_id)
+
         start_timestamp = time.time()
-        response = self.post_request('apps', post_data=app_json)
-        self._wait_for_deployment_complete(response, start_timestamp)
+        response = self.post_request('apps', post_data=app_json, exists_check=exists_check)
+        self._wait_for_deployment_complete(
+            response, start_timestamp, started_app_ids=self._get_started_app_ids(
+                {'apps': [json.loads(app_json)]}))
 
-    def update_group(self, marathon_json):
+    def update_group(self, marathon_json, started_app_ids=None):
         """
-        Updates an existing marathon group
+        Updates an existing marathon group. Only started_app_ids are timed
+        and verified, if provided (by default all apps with instances).
         """
-        return self._deploy_group(marathon_json, 'PUT')
+        return self._deploy_group(marathon_json, 'PUT', started_app_ids)
 
     def deploy_group(self, marathon_json):
         """
@@ -129,7 +220,16 @@ class Marathon(object):
         """
         return self._deploy_group(marathon_json, 'POST')
 
-    def _deploy_group(self, marathon_json, method):
+    def _get_request_body(self, data):
+        """
+        Gets the request body for the JSON data, either streamed
+        or encoded into a string
+        """
+        if self.stream_requests:
+            return JsonBody(data, compress=self.compress_requests)
+        return json.dumps(data)
+
+    def _deploy_group(self, marathon_json, method, started_app_ids=None):
         """
         Creates and starts a new application group defined in marathon_json
         """
@@ -138,15 +238,29 @@ class Marathon(object):
 
         start_timestamp = time.time()
         if method == 'POST':
-            response = self.post_request('groups', json.dumps(marathon_json))
+            response = self.post_request(
+                'groups', self._get_request_body(marathon_json),
+                exists_check=lambda: self.group_exists(marathon_json['id']))
         elif method == 'PUT':
-            response = self.put_request('groups', put_data=json.dumps(marathon_json))
+            response = self.put_request('groups', put_data=self._get_request_body(marathon_json))
         else:
             raise ValueError('Invalid method "{}"'.format(method))
 
-        self._wait_for_deployment_complete(response, start_timestamp)
+        if started_app_ids is None:
+            started_app_ids = self._get_started_app_ids(marathon_json)
+        self._wait_for_deployment_complete(
+            response, start_timestamp, started_app_ids=started_app_ids)
         return response
 
+    def _get_started_app_ids(self, marathon_json):
+        """
+        Gets the IDs of apps that have instances in marathon_json, only
+        deployments of those are timed (scaling down is a lot faster)
+        and verified
+        """
+        return [app['id'] for app in marathon_json.get('apps', [])
+                if 'id' in app and app.get('instances', 1) > 0]
+
     def _get_all_group_ids(self, data):
         """
         Recursively gets all group Ids
@@ -165,27 +279,68 @@ class Marathon(object):
         that start with the provided prefix
         """
         # We only get group IDs
-        response = self.get_request('groups?embed=group.groups').json()
+        response = self.get_json('groups?embed=group.groups', Marathon.GROUP_IDS)
         all_groups = self._get_all_group_ids([response])
         return [group for group in all_groups if group.startswith(prefix)]
 
-    def get_group(self, group_id):
+    def get_groups_with_apps(self):
         """
-        Gets the group with the provided group_id
+        Gets the root group with all groups and apps in a single request
         """
-        group_id = self.get_group_ids(group_id)[0]
+        return self.get_json('groups?embed=group.groups&embed=group.apps')
 
-        response = self.get_request('groups/{}'.format(group_id)).json()
-        return response
+    def get_group(self, group_id, selection=None):
+        """
+        Gets the group with the provided group_id and its apps (or only
+        the selected keys, see jsoncodec.select_keys)
+        """
+        return self.get_json('groups/{}?embed=group.apps'.format(group_id.strip('/')), selection)
 
-    def scale_group(self, group_id, scale_factor, log_failures=True):
+    def scale_apps(self, instances, log_failures=True):
         """
-        Scales the group for provided scale_factor
+        Scales the apps to the instances (by app ID). Only the instances of
+        the apps are updated, so their definitions (and tasks) don't change
+        and a retried or repeated request doesn't scale them again.
         """
         start_timestamp = time.time()
-        response = self.put_request('groups/{}'.format(group_id), json={'scaleBy': scale_factor})
+        response = self.put_request('apps', json=[
+            {'id': app_id, 'instances': count} for app_id, count in sorted(instances.items())])
         self._wait_for_deployment_complete(response, start_timestamp, log_failures)
-        return response.json()
+        return jsoncodec.decode_response(response)
+
+    def scale_group(self, group_id, scale_factor, log_failures=True, instances=None):
+        """
+        Scales the apps of the group to scale_factor of their instances (by
+        app ID, by default the current instances of the group's apps)
+        """
+        if instances is None:
+            group = self.get_group(group_id, Marathon.GROUP_APPS)
+            instances = dict((app['id'], app.get('instances', 0)) for app in group['apps'])
+        return self.scale_apps(dict(
+            (app_id, get_scaled_instances(count, scale_factor * 100))
+            for app_id, count in instances.items()), log_failures)
+
+    def get_group_versions(self, group_id):
+        """
+        Gets the versions of the group, newest first
+        """
+        return self.get_json('groups/{}/versions'.format(group_id.strip('/')))
+
+    def rollback_group(self, group_id, version):
+        """
+        Changes the group back to the version (see get_group_versions)
+        """
+        start_timestamp = time.time()
+        response = self.put_request('groups/{}'.format(group_id.strip('/')),
+                                    json={'version': version})
+        self._wait_for_deployment_complete(response, start_timestamp)
+        return jsoncodec.decode_response(response)
+
+    def group_exists(self, group_id):
+        """
+        Checks if group with the provided group_id exists
+        """
+        return group_id in self.get_group_ids(group_id)
 
     def is_group_id_unique(self, group_id):
         """
@@ -199,52 +354,76 @@ class Marathon(object):
 
         return False
 
-    def _wait_for_deployment_complete(self, deployment_response, start_timestamp, log_failures=True):
+    def _wait_for_deployment_complete(self, deployment_response, start_timestamp, log_failures=True,
+                                      started_app_ids=None):
         """
-        Waits for deployment to Marathon to complete. We start an instance of
+        Waits for deployment to Marathon to complete (deployment_response is None
+        if the request created the resource but failed). We start an instance of
         DeploymentMonitor that streams events from Marathon endpoint and monitors when
         apps fail or succeed to deploy. Monitor also logs any app status changes.
-        """
-        # Get the deploymentId, so we can uniquely identify deployment
-        # we want to monitor
-        deployment_json = deployment_response.json()
-        if 'deploymentId' in deployment_json:
-            deployment_id = deployment_json['deploymentId']
-        elif 'deployments' in deployment_json:
-            deployment_id = deployment_json['deployments'][0]['id']
+        Once the deployment ended, started_app_ids are checked to have their target
+        instance count running and healthy. With a timing store, the time it took is
+        recorded for started_app_ids and their previous timings are used for the
+        timeout and the progress estimate.
+        """
+        if deployment_response is None:
+            # The request failed after it created the resource (see
+            # ACSClient.make_request), so look the deployment up by its apps
+            a_deployment = self.find_deployment(started_app_ids)
         else:
-            raise Exception(
-                'Could not find "deploymentId" in {}'.format(deployment_json))
+            # Get the deploymentId, so we can uniquely identify deployment
+            # we want to monitor
+            deployment_json = jsoncodec.decode_response(deployment_response)
+            if 'deploymentId' in deployment_json:
+                deployment_id = deployment_json['deploymentId']
+            elif 'deployments' in deployment_json:
+                deployment_id = deployment_json['deployments'][0]['id']
+            else:
+                raise Exception(
+                    'Could not find "deploymentId" in {}'.format(deployment_json))
+            a_deployment = self.get_deployment(deployment_id)
 
         # Get the affected apps for the deployment that was started
-        # or just return if deployment already completed.
-        get_deployments_response = self.get_deployments().json()
-        a_deployment = [dep for dep in get_deployments_response if dep['id'] == deployment_id]
-        if len(a_deployment) > 0:
-            app_ids = a_deployment[0]['affectedApps']
+        # or just verify the started apps if deployment already completed.
+        if a_deployment is not None:
+            deployment_id = a_deployment['id']
+            app_ids = a_deployment['affectedApps']
         else:
-            # Nothing to do
+            self._verify_deployment(started_app_ids, None)
+            logging.info('Deployment ended')
             return
 
+        started_app_ids = [app_id for app_id in started_app_ids or [] if app_id in app_ids]
+        max_wait = self._get_max_wait(started_app_ids)
+        estimate = self._get_estimate(started_app_ids)
+        last_progress_timestamp = time.time()
+
         deployment_completed = False
+        deployment_failed = False
         timeout_exceeded = False
         processor_catchup = False # Did we already give processor an extra second to finish up or not?
         processor = DeploymentMonitor(self, app_ids, deployment_id, log_failures)
         processor.start()
 
         while not deployment_completed:
-            if self._wait_time_exceeded(self.deployment_max_wait_time, start_timestamp):
+            if self._wait_time_exceeded(max_wait, start_timestamp):
                 timeout_exceeded = True
                 break
-            get_deployments_response = self.get_deployments().json()
-            a_deployment = [dep for dep in get_deployments_response if dep['id'] == deployment_id]
-            if len(a_deployment) == 0:
+            if self._wait_time_exceeded(self.progress_interval, last_progress_timestamp):
+                self._log_progress(deployment_id, start_timestamp, max_wait, estimate)
+                last_progress_timestamp = time.time()
+            if processor.deployment_failed():
+                deployment_failed = True
+                break
+            if processor.deployment_succeeded():
+                deployment_completed = True
+                break
+            if self.get_deployment(deployment_id) is None:
                 if not processor_catchup:
                     logging.debug('Giving deployment monitor more time to catch-up on events')
                     for _ in range(0, 5):
                         if not processor.deployment_succeeded():
                             time.sleep(1)
-                    # TODO:Check that the group was deployed correctly (instance count, healthcheck)
                     processor_catchup = True
                     continue
                 else:
@@ -254,10 +433,123 @@ class Marathon(object):
 
         processor.stopped = True
         if timeout_exceeded:
-            raise Exception('Timeout exceeded waiting for deployment to complete')
+            raise Exception(
+                'Timeout exceeded waiting for deployment to complete ({}s)'.format(int(max_wait)))
+        if deployment_failed:
+            raise Exception('Deployment "{}" failed'.format(deployment_id))
 
         if deployment_completed:
+            self._verify_deployment(started_app_ids, processor)
             logging.info('Deployment ended')
+            self._record_timings(started_app_ids, time.time() - start_timestamp)
+
+    def _verify_deployment(self, app_ids, monitor):
+        """
+        Checks that the apps have their target instance count running (or
+        healthy, for apps with health checks) and raises an exception if not
+        """
+        if not app_ids:
+            return
+        for attempt in range(self.verify_attempts):
+            if attempt > 0:
+                time.sleep(1)
+            failures = self._get_instance_count_failures(app_ids, monitor)
+            if not failures:
+                return
+        raise Exception('Deployment did not reach the target instance count: {}'.format(
+            '; '.join(failures)))
+
+    def _get_instance_count_failures(self, app_ids, monitor):
+        """
+        Gets a message for each app that doesn't have its target instance count
+        running or healthy. Counts are read with one request per group.
+        """
+        apps = {}
+        for group_id in sorted(set([app_id.rpartition('/')[0] for app_id in app_ids])):
+            group = self.get_json('groups{}?embed=group.apps&embed=group.apps.counts'.format(
+                group_id or '/'), Marathon.APP_COUNTS)
+            for app in group.get('apps', []):
+                apps[app['id']] = app
+
+        failures = []
+        for app_id in app_ids:
+            app = apps.get(app_id)
+            if app is None:
+                failures.append('"{}" was not found'.format(app_id))
+                continue
+            if app.get('healthChecks'):
+                count, state = app.get('tasksHealthy', 0), 'healthy'
+            else:
+                count, state = app.get('tasksRunning', 0), 'running'
+            if count < app.get('instances', 0):
+                failure = '"{}" has {} of {} tasks {}'.format(
+                    app_id, count, app['instances'], state)
+                unhealthy_tasks = monitor.get_unhealthy_tasks(app_id) if monitor else []
+                if unhealthy_tasks:
+                    failure += ' (unhealthy: {})'.format(', '.join(unhealthy_tasks))
+                failures.append(failure)
+        return failures
+
+    def _get_timing_key(self, app_id):
+        """
+        Gets the (group, service) the timings of the app are stored under
+        """
+        group_id, _, service = app_id.rpartition('/')
+        group_id = group_id or '/'
+        return self.timing_groups.get(group_id, group_id), service
+
+    def _get_max_wait(self, app_ids):
+        """
+        Gets the max time (in seconds) to wait for the apps to deploy
+        """
+        if not self.timing_store or not app_ids:
+            return self.deployment_max_wait_time
+        timeouts = []
+        for app_id in app_ids:
+            group, service = self._get_timing_key(app_id)
+            timeouts.append(self.timing_store.get_timeout(
+                group, service, self.deployment_max_wait_time))
+        return max(timeouts)
+
+    def _get_estimate(self, app_ids):
+        """
+        Gets how long (in seconds) the apps usually take to deploy
+        or None if not known
+        """
+        if not self.timing_store:
+            return None
+        estimates = [self.timing_store.get_estimate(*self._get_timing_key(app_id))
+                     for app_id in app_ids]
+        if not estimates or None in estimates:
+            return None
+        return max(estimates)
+
+    def _record_timings(self, app_ids, duration):
+        """
+        Records the deployment duration for the apps
+        """
+        if not self.timing_store:
+            return
+        for app_id in app_ids:
+            group, service = self._get_timing_key(app_id)
+            self.timing_store.record(group, service, duration)
+
+    def _log_progress(self, deployment_id, start_timestamp, max_wait, estimate):
+        """
+        Logs how long the deployment is running and how long it will
+        probably take (if known)
+        """
+        elapsed = time.time() - start_timestamp
+        if estimate is None:
+            logging.info('Waiting for deployment "%s": %ds elapsed, timeout in %ds',
+                         deployment_id, elapsed, max_wait - elapsed)
+        elif elapsed < estimate:
+            logging.info('Waiting for deployment "%s": %ds elapsed, about %ds remaining',
+                         deployment_id, elapsed, estimate - elapsed)
+        else:
+            logging.info('Waiting for deployment "%s": %ds elapsed, taking longer than ' \
+                         'usual (%ds), timeout in %ds', deployment_id, elapsed, estimate,
+                         max_wait - elapsed)
 
     def _wait_time_exceeded(self, max_wait, timestamp):
         """
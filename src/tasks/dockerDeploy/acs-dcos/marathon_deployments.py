@@ -63,6 +63,18 @@ class MarathonEvent(object):
         """
         return self._get_event_type() == 'app_terminated_event'
 
+    def is_health_status_changed(self):
+        """
+        True if event represents a health status change of a task
+        """
+        return self._get_event_type() == 'health_status_changed_event'
+
+    def is_alive(self):
+        """
+        True if the health checks of the task passed
+        """
+        return self.data.get('alive') is True
+
     def is_task_failed(self):
         """
         True if task is failed, false otherwise
@@ -152,6 +164,9 @@ class DeploymentMonitor(object):
         self._log_failures = log_failures
         self._marathon = marathon
         self._deployment_succeeded = False
+        self._deployment_failed = False
+        # Tasks (by app ID) whose health checks failed and didn't pass since
+        self._unhealthy_tasks = {}
         self._app_ids = app_ids
         self._deployment_id = deployment_id
         self.stopped = False
@@ -171,6 +186,18 @@ class DeploymentMonitor(object):
         """
         return self._deployment_succeeded
 
+    def deployment_failed(self):
+        """
+        True if Marathon reported the deployment as failed
+        """
+        return self._deployment_failed
+
+    def get_unhealthy_tasks(self, app_id):
+        """
+        Gets the IDs of the app tasks that are reported unhealthy
+        """
+        return sorted(self._unhealthy_tasks.get(app_id, []))
+
     def _process_events(self):
         """
         Reads the event stream from Marathon and handles events
@@ -192,9 +219,21 @@ class DeploymentMonitor(object):
                 logging.info(event.status())
                 if (event.is_task_failed() or event.is_task_killed()) and self._log_failures:
                     self._log_stderr(event)
+        elif event.is_health_status_changed():
+            if event.app_id() in self._app_ids:
+                unhealthy_tasks = self._unhealthy_tasks.setdefault(event.app_id(), set())
+                if event.is_alive():
+                    logging.info('Service "%s" task is healthy', event.app_id())
+                    unhealthy_tasks.discard(event.data['taskId'])
+                else:
+                    logging.info('Service "%s" task is unhealthy', event.app_id())
+                    unhealthy_tasks.add(event.data['taskId'])
         elif event.is_deployment_succeeded():
             if self._deployment_id == event.data['id']:
                 self._deployment_succeeded = True
+        elif event.is_deployment_failed():
+            if self._deployment_id == event.data['id']:
+                self._deployment_failed = True
 
     def _log_stderr(self, event):
         """
@@ -210,11 +249,15 @@ class DeploymentMonitor(object):
         Gets the event stream by making a GET request to
         Marathon /events endpoint
         """
-        events_url = self._marathon.get_url('service/marathon/v2/events')
+        events_path = 'service/marathon/v2/events'
+        events_url = self._marathon.get_url(events_path)
         messages = sseclient.SSEClient(events_url)
+        acs_client = self._marathon.acs_client
+        acs_client.notify_event_stream_opened(id(self), events_path)
         for msg in messages:
             if self.stopped:
                 break
+            acs_client.notify_event_received(id(self), msg.data)
             try:
                 json_data = json.loads(msg.data)
             except ValueError:
@@ -0,0 +1,714 @@
+import BaseHTTPServer
+import copy
+import functools
+import json
+import logging
+import Queue
+import random
+import SocketServer
+import threading
+import time
+import urlparse
+import uuid
+
+from requestbody import read_request_body
+
+
+def _locked(method):
+    """
+    Runs the method holding the simulator lock: the HTTP handler threads,
+    the engine thread and tests change the state (and the ID counters)
+    concurrently
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Event stream clients disconnect without reading the whole stream
+        logging.debug('Simulator: connection from %s closed', client_address)
+
+
+class SimulatedTask(object):
+    """
+    Task of a simulated Marathon app
+    """
+    def __init__(self, app_id, agent_id, framework_id):
+        self.task_id = '{}.{}'.format(app_id.strip('/').replace('/', '_'), uuid.uuid4())
+        self.app_id = app_id
+        self.agent_id = agent_id
+        self.framework_id = framework_id
+        self.state = 'TASK_STAGING'
+        self.statuses = [{'state': self.state, 'timestamp': time.time()}]
+        self.ready_at = None
+        self.deployment_id = None
+        # None until the health checks of a running task reported
+        self.healthy = None
+
+    def set_state(self, state):
+        """
+        Updates the task state and adds it to statuses
+        """
+        self.state = state
+        self.statuses.append({'state': state, 'timestamp': time.time()})
+
+    def is_active(self):
+        """
+        True if task is staging or running
+        """
+        return self.state in ('TASK_STAGING', 'TASK_RUNNING')
+
+    def to_mesos_json(self):
+        """
+        Gets the task as it appears in agent state.json
+        """
+        return {
+            'id': self.task_id,
+            'slave_id': self.agent_id,
+            'framework_id': self.framework_id,
+            'state': self.state,
+            'statuses': self.statuses
+        }
+
+
+class MarathonSimulator(object):
+    """
+    In-process fake Marathon and Mesos server.
+
+    Implements the Marathon endpoints used by the DC/OS deployment
+    (/v2/groups, /v2/apps, /v2/deployments, /v2/events), Mesos agent
+    state.json and sandbox file downloads. Tasks start after a random
+    latency from task_start_latency (min, max) and fail with the
+    probability of failure_rate (failed tasks are relaunched, as Marathon does).
+    Health checks of tasks of apps in unhealthy_apps fail once the tasks are running
+    (the deployment still completes, as if the checks failed after the grace period).
+    """
+    MARATHON_PREFIX = 'service/marathon/v2/'
+    FRAMEWORK_ID = 'marathon-framework'
+
+    def __init__(self, agents=3, task_start_latency=(0.0, 0.0), failure_rate=0.0,
+                 agent_cpus=4.0, agent_mem=14336.0, seed=None, tick_interval=0.05, port=0,
+                 unhealthy_apps=None):
+        self.task_start_latency = task_start_latency
+        self.unhealthy_apps = set(unhealthy_apps or [])
+        self.failure_rate = failure_rate
+        self.tick_interval = tick_interval
+        self.agent_ids = ['agent-{}'.format(i) for i in range(agents)]
+        self.agent_cpus = agent_cpus
+        self.agent_mem = agent_mem
+        self.stopped = False
+
+        self.groups = {}
+        # Group ID -> [(version, group JSON)], newest first
+        self.group_versions = {}
+        self.root_apps = {}
+        self.tasks = {}
+        self.deployments = {}
+        self.deployment_durations = []
+        self.counters = {
+            'requests': 0,
+            'events': 0,
+            'tasks_started': 0,
+            'tasks_failed': 0,
+            'tasks_killed': 0,
+            'deployments': 0
+        }
+
+        self._random = random.Random(seed)
+        self._next_agent = 0
+        self._next_service_port = 10000
+        self._deployment_start = {}
+        # Indexes, so large simulations don't scan all tasks on every tick
+        self._tasks_by_app = {}
+        self._staging_tasks = {}
+        self._pending_tasks = {}
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', port), _SimulatorHandler)
+        self._server.simulator = self
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever, args=(0.1,))
+        self._server_thread.daemon = True
+        self._engine_thread = threading.Thread(target=self._run_engine)
+        self._engine_thread.daemon = True
+
+    def get_url(self):
+        """
+        Gets the URL the simulator is listening on (use as DC/OS master URL)
+        """
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def start(self):
+        """
+        Starts the simulator
+        """
+        self._server_thread.start()
+        self._engine_thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the simulator
+        """
+        self.stopped = True
+        self._stop_event.set()
+        self._server.shutdown()
+        self._server.server_close()
+        # Give open streams a moment to close, so their threads don't
+        # outlive the simulator
+        timeout = time.time() + 1
+        while self._subscribers and time.time() < timeout:
+            time.sleep(0.01)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Events
+
+    def subscribe(self):
+        """
+        Subscribes to the event stream and returns the queue events are put on
+        """
+        event_queue = Queue.Queue()
+        with self._lock:
+            self._subscribers.append(event_queue)
+        return event_queue
+
+    def unsubscribe(self, event_queue):
+        """
+        Removes the event stream subscription
+        """
+        with self._lock:
+            if event_queue in self._subscribers:
+                self._subscribers.remove(event_queue)
+
+    @_locked
+    def _publish(self, event_type, **data):
+        """
+        Publishes an event to all event stream subscribers
+        """
+        data['eventType'] = event_type
+        data['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        self.counters['events'] += 1
+        for subscriber in self._subscribers:
+            subscriber.put(data)
+
+    def _publish_task_status(self, task, message=''):
+        self._publish('status_update_event', appId=task.app_id, taskId=task.task_id,
+                      slaveId=task.agent_id, taskStatus=task.state, message=message)
+
+    # State
+
+    def add_group(self, group_json):
+        """
+        Adds a group with running tasks without going through a
+        deployment (used to seed the simulator with existing state)
+        """
+        with self._lock:
+            group = self._store_group(group_json)
+            for app in group['apps']:
+                for _ in range(int(app.get('instances', 0))):
+                    task = self._create_task(app['id'])
+                    task.set_state('TASK_RUNNING')
+                    if app.get('healthChecks'):
+                        task.healthy = not app['id'] in self.unhealthy_apps
+            return group
+
+    def _store_group(self, group_json):
+        group = copy.deepcopy(group_json)
+        group['id'] = '/' + group['id'].strip('/')
+        group.setdefault('apps', [])
+        group.setdefault('groups', [])
+        for app in group['apps']:
+            app['id'] = '/' + app['id'].strip('/')
+            app.setdefault('instances', 1)
+            self._assign_service_ports(app)
+        self.groups[group['id']] = group
+        return group
+
+    @_locked
+    def _assign_service_ports(self, app):
+        """
+        Assigns service ports to port mappings without one (as Marathon does)
+        """
+        try:
+            port_mappings = app['container']['docker']['portMappings'] or []
+        except KeyError:
+            return
+        for port_mapping in port_mappings:
+            if not port_mapping.get('servicePort'):
+                port_mapping['servicePort'] = self._next_service_port
+                self._next_service_port += 1
+
+    def _all_apps(self):
+        apps = list(self.root_apps.values())
+        for group in self.groups.values():
+            apps.extend(group['apps'])
+        return apps
+
+    def _find_app(self, app_id):
+        if app_id in self.root_apps:
+            return self.root_apps[app_id]
+        group = self.groups.get(app_id.rsplit('/', 1)[0])
+        if group:
+            for app in group['apps']:
+                if app['id'] == app_id:
+                    return app
+        return None
+
+    @_locked
+    def _next_agent_id(self):
+        agent_id = self.agent_ids[self._next_agent % len(self.agent_ids)]
+        self._next_agent += 1
+        return agent_id
+
+    @_locked
+    def _create_task(self, app_id):
+        task = SimulatedTask(app_id, self._next_agent_id(), self.FRAMEWORK_ID)
+        self.tasks[task.task_id] = task
+        self._tasks_by_app.setdefault(app_id, []).append(task)
+        return task
+
+    def _active_tasks(self, app_id):
+        return [t for t in self._tasks_by_app.get(app_id, []) if t.is_active()]
+
+    def _app_with_counts(self, app):
+        app_json = copy.deepcopy(app)
+        active = self._active_tasks(app['id'])
+        running = len([t for t in active if t.state == 'TASK_RUNNING'])
+        app_json['tasksRunning'] = running
+        app_json['tasksStaged'] = len(active) - running
+        app_json['tasksHealthy'] = len([t for t in active if t.healthy is True])
+        app_json['tasksUnhealthy'] = len([t for t in active if t.healthy is False])
+        return app_json
+
+    def _group_json(self, group):
+        group_json = copy.deepcopy(group)
+        group_json['apps'] = [self._app_with_counts(app) for app in group['apps']]
+        return group_json
+
+    # Deployments
+
+    @_locked
+    def _start_deployment(self, apps):
+        """
+        Starts a deployment that brings all provided apps to their target
+        instance count. Returns the deployment id
+        """
+        deployment_id = str(uuid.uuid4())
+        self.counters['deployments'] += 1
+        pending = False
+        for app in apps:
+            active = self._active_tasks(app['id'])
+            target = int(app.get('instances', 0))
+            for task in active[target:]:
+                self._kill_task(task)
+            for _ in range(target - len(active)):
+                self._launch_task(app['id'], deployment_id)
+                pending = True
+
+        if pending:
+            self.deployments[deployment_id] = {
+                'id': deployment_id,
+                'version': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+                'affectedApps': [app['id'] for app in apps],
+                'steps': [],
+                'currentStep': 1,
+                'totalSteps': 1
+            }
+            self._deployment_start[deployment_id] = time.time()
+        else:
+            self._publish('deployment_success', id=deployment_id)
+        return deployment_id
+
+    def _launch_task(self, app_id, deployment_id):
+        task = self._create_task(app_id)
+        task.deployment_id = deployment_id
+        low, high = self.task_start_latency
+        task.ready_at = time.time() + self._random.uniform(low, high)
+        self._staging_tasks[task.task_id] = task
+        self._pending_tasks[deployment_id] = self._pending_tasks.get(deployment_id, 0) + 1
+        self._publish_task_status(task)
+        return task
+
+    def _task_started(self, task):
+        """
+        Removes the task from staging and returns True if it was staging
+        """
+        if self._staging_tasks.pop(task.task_id, None) is None:
+            return False
+        self._pending_tasks[task.deployment_id] -= 1
+        return True
+
+    @_locked
+    def _kill_task(self, task):
+        self._task_started(task)
+        task.set_state('TASK_KILLED')
+        self.counters['tasks_killed'] += 1
+        self._publish_task_status(task, message='Killed by deployment')
+
+    def _run_engine(self):
+        """
+        Starts pending tasks and completes deployments
+        """
+        while not self._stop_event.wait(self.tick_interval):
+            with self._lock:
+                self._tick()
+
+    def _tick(self):
+        now = time.time()
+        for task in list(self._staging_tasks.values()):
+            if task.ready_at > now:
+                continue
+            self._task_started(task)
+            if self._random.random() < self.failure_rate:
+                task.set_state('TASK_FAILED')
+                self.counters['tasks_failed'] += 1
+                self._publish_task_status(task, message='Simulated task failure')
+                if task.deployment_id in self.deployments and self._find_app(task.app_id):
+                    self._launch_task(task.app_id, task.deployment_id)
+                continue
+
+            task.set_state('TASK_RUNNING')
+            self.counters['tasks_started'] += 1
+            self._publish_task_status(task)
+            app = self._find_app(task.app_id)
+            if app and app.get('healthChecks'):
+                task.healthy = not task.app_id in self.unhealthy_apps
+                self._publish('health_status_changed_event', appId=task.app_id,
+                              taskId=task.task_id, alive=task.healthy)
+
+        for deployment_id in list(self.deployments.keys()):
+            if not self._pending_tasks.get(deployment_id):
+                del self.deployments[deployment_id]
+                self._pending_tasks.pop(deployment_id, None)
+                self.deployment_durations.append(
+                    time.time() - self._deployment_start.pop(deployment_id))
+                self._publish('deployment_success', id=deployment_id)
+
+    # Marathon API
+
+    @_locked
+    def create_group(self, group_json):
+        if group_json['id'].rstrip('/') in self.groups:
+            return 409, {'message': 'Group {} already exists'.format(group_json['id'])}
+        group = self._store_group(group_json)
+        deployment_id = self._start_deployment(group['apps'])
+        self._add_version(group['id'], deployment_id)
+        return 201, {'deploymentId': deployment_id, 'version': deployment_id}
+
+    @_locked
+    def update_group(self, group_id, group_json):
+        group_id = '/' + (group_id or group_json.get('id', '')).strip('/')
+        group = self.groups.get(group_id)
+        if group is None:
+            return self.create_group(group_json)
+
+        if 'version' in group_json:
+            # Rollback to a previous version of the group
+            versions = dict(self.group_versions.get(group_id, []))
+            if not group_json['version'] in versions:
+                return 404, {'message': 'Version {} of group {} does not exist'.format(
+                    group_json['version'], group_id)}
+            group_json = versions[group_json['version']]
+
+        if 'scaleBy' in group_json:
+            for app in group['apps']:
+                app['instances'] = int(round(app['instances'] * float(group_json['scaleBy'])))
+            changed_apps = group['apps']
+        else:
+            existing_apps = dict((app['id'], app) for app in group['apps'])
+            group_json = dict(group_json, id=group_id)
+            new_group = self._store_group(group_json)
+            changed_apps = []
+            for app in new_group['apps']:
+                existing = existing_apps.get(app['id'])
+                if existing and self._definition_changed(existing, app):
+                    # Marathon restarts all tasks of apps with changed definition
+                    for task in self._active_tasks(app['id']):
+                        self._kill_task(task)
+                changed_apps.append(app)
+            new_app_ids = set(app['id'] for app in new_group['apps'])
+            for app_id in existing_apps:
+                if not app_id in new_app_ids:
+                    for task in self._active_tasks(app_id):
+                        self._kill_task(task)
+
+        deployment_id = self._start_deployment(changed_apps)
+        self._add_version(group_id, deployment_id)
+        return 200, {'deploymentId': deployment_id, 'version': deployment_id}
+
+    def _add_version(self, group_id, version):
+        """
+        Records the current definition of the group as version
+        """
+        self.group_versions.setdefault(group_id, []).insert(
+            0, (version, copy.deepcopy(self.groups[group_id])))
+
+    def get_group_versions(self, group_id):
+        group_id = '/' + group_id.strip('/')
+        if not group_id in self.groups:
+            return 404, {'message': 'Group {} does not exist'.format(group_id)}
+        return 200, [version for version, _ in self.group_versions.get(group_id, [])]
+
+    def _definition_changed(self, existing_app, new_app):
+        existing = dict((k, v) for k, v in existing_app.items() if k != 'instances')
+        new = dict((k, v) for k, v in new_app.items() if k != 'instances')
+        return existing != new
+
+    @_locked
+    def delete_group(self, group_id):
+        group_id = '/' + group_id.strip('/')
+        group = self.groups.pop(group_id, None)
+        if group is None:
+            return 404, {'message': 'Group {} does not exist'.format(group_id)}
+        self.group_versions.pop(group_id, None)
+        for app in group['apps']:
+            for task in self._active_tasks(app['id']):
+                self._kill_task(task)
+        deployment_id = str(uuid.uuid4())
+        self._publish('deployment_success', id=deployment_id)
+        return 200, {'deploymentId': deployment_id, 'version': deployment_id}
+
+    def get_group(self, group_id, embed):
+        group_id = '/' + (group_id or '').strip('/')
+        if group_id == '/':
+            return 200, {
+                'id': '/',
+                'apps': [self._app_with_counts(app) for app in self.root_apps.values()],
+                'groups': [self._group_json(g) if 'group.apps' in embed
+                           else {'id': g['id'], 'apps': [], 'groups': []}
+                           for g in self.groups.values()]
+            }
+        group = self.groups.get(group_id)
+        if group is None:
+            return 404, {'message': 'Group {} does not exist'.format(group_id)}
+        return 200, self._group_json(group)
+
+    def get_apps(self, app_id=None):
+        # Like Marathon, the id filter matches all apps with IDs that contain it
+        return 200, {'apps': [self._app_with_counts(app) for app in self._all_apps()
+                              if not app_id or app_id in app['id']]}
+
+    @_locked
+    def create_app(self, app_json):
+        app = copy.deepcopy(app_json)
+        app['id'] = '/' + app['id'].strip('/')
+        if self._find_app(app['id']):
+            return 409, {'message': 'An app with id [{}] already exists.'.format(app['id'])}
+        app.setdefault('instances', 1)
+        self._assign_service_ports(app)
+        self.root_apps[app['id']] = app
+        deployment_id = self._start_deployment([app])
+        result = dict(app)
+        result['deployments'] = [{'id': deployment_id}]
+        return 201, result
+
+    @_locked
+    def update_apps(self, apps_json):
+        # Partial updates: only the provided fields of the apps change
+        changed_apps = []
+        for app_json in apps_json:
+            app = self._find_app('/' + app_json['id'].strip('/'))
+            if app is None:
+                return 404, {'message': 'App {} does not exist'.format(app_json['id'])}
+            updated = dict(app, **dict((k, v) for k, v in app_json.items() if k != 'id'))
+            if self._definition_changed(app, updated):
+                for task in self._active_tasks(app['id']):
+                    self._kill_task(task)
+            app.update(updated)
+            changed_apps.append(app)
+        deployment_id = self._start_deployment(changed_apps)
+        for group_id in set(app['id'].rpartition('/')[0] for app in changed_apps):
+            if group_id in self.groups:
+                self._add_version(group_id, deployment_id)
+        return 200, {'deploymentId': deployment_id, 'version': deployment_id}
+
+    def get_deployments(self):
+        return 200, list(self.deployments.values())
+
+    # Mesos API
+
+    def get_agents(self):
+        slaves = []
+        used_resources = dict((agent_id, [0.0, 0.0]) for agent_id in self.agent_ids)
+        for task in self.tasks.values():
+            if task.is_active():
+                app = self._find_app(task.app_id) or {}
+                used_resources[task.agent_id][0] += float(app.get('cpus', 0.1))
+                used_resources[task.agent_id][1] += float(app.get('mem', 256))
+        for agent_id in self.agent_ids:
+            used_cpus, used_mem = used_resources[agent_id]
+            slaves.append({
+                'id': agent_id,
+                'hostname': '10.0.0.{}'.format(self.agent_ids.index(agent_id) + 4),
+                'active': True,
+                'resources': {'cpus': self.agent_cpus, 'mem': self.agent_mem},
+                'used_resources': {'cpus': used_cpus, 'mem': used_mem}
+            })
+        return 200, {'slaves': slaves}
+
+    def get_agent_state(self, agent_id):
+        if not agent_id in self.agent_ids:
+            return 404, {'message': 'Agent not found'}
+        executors = []
+        completed_executors = []
+        for task in self.tasks.values():
+            if task.agent_id != agent_id:
+                continue
+            executor = {
+                'id': task.task_id,
+                'directory': '/var/lib/mesos/slave/sandbox/{}'.format(task.task_id),
+                'tasks': [],
+                'queued_tasks': [],
+                'completed_tasks': []
+            }
+            if task.is_active():
+                executor['tasks'].append(task.to_mesos_json())
+                executors.append(executor)
+            else:
+                executor['completed_tasks'].append(task.to_mesos_json())
+                completed_executors.append(executor)
+        return 200, {
+            'id': agent_id,
+            'frameworks': [{
+                'id': self.FRAMEWORK_ID,
+                'name': 'marathon',
+                'executors': executors,
+                'completed_executors': completed_executors
+            }],
+            'completed_frameworks': []
+        }
+
+    def handle_request(self, method, path, query, body):
+        """
+        Routes the request to the simulated API and returns (status, json)
+        """
+        with self._lock:
+            self.counters['requests'] += 1
+            if path == 'dcos-metadata/dcos-version.json':
+                return 200, {'version': '1.8.8'}
+
+            if path.startswith('exhibitor/'):
+                return 200, {}
+
+            if path == 'mesos/slaves/state.json':
+                return self.get_agents()
+
+            if path.startswith('slave/') and path.endswith('/state.json'):
+                return self.get_agent_state(path.split('/')[1])
+
+            if not path.startswith(self.MARATHON_PREFIX):
+                return 404, {'message': 'Not found'}
+
+            resource = path[len(self.MARATHON_PREFIX):]
+            if resource == 'deployments' and method == 'GET':
+                return self.get_deployments()
+
+            if resource == 'apps':
+                if method == 'GET':
+                    return self.get_apps(query.get('id', [None])[0])
+                if method == 'POST':
+                    return self.create_app(body)
+                if method == 'PUT':
+                    return self.update_apps(body)
+
+            if resource == 'groups' or resource.startswith('groups/'):
+                group_id = resource[len('groups'):]
+                embed = query.get('embed', [])
+                if method == 'GET' and group_id.endswith('/versions'):
+                    return self.get_group_versions(group_id[:-len('/versions')])
+                if method == 'GET':
+                    return self.get_group(group_id, embed)
+                if method == 'POST':
+                    return self.create_group(body)
+                if method == 'PUT':
+                    return self.update_group(group_id, body)
+                if method == 'DELETE':
+                    return self.delete_group(group_id)
+
+        return 404, {'message': 'Not found'}
+
+
+class _SimulatorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    HTTP front-end for the MarathonSimulator
+    """
+    def _handle(self):
+        simulator = self.server.simulator
+        # Not using urlparse on the full path, as '//path' would be parsed as netloc
+        path, _, query_string = self.path.partition('?')
+        path = path.lstrip('/')
+        query = urlparse.parse_qs(query_string)
+
+        body = None
+        raw_body = read_request_body(self)
+        if raw_body:
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                body = raw_body
+
+        if path == simulator.MARATHON_PREFIX + 'events':
+            self._stream_events(simulator)
+            return
+
+        if path.startswith('slave/') and '/files/download' in path:
+            file_path = query.get('path', [''])[0]
+            self._send(200, 'text/plain', 'Simulated sandbox file {}'.format(file_path))
+            return
+
+        status, response_json = simulator.handle_request(self.command, path, query, body)
+        self._send(status, 'application/json', json.dumps(response_json))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, simulator):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        event_queue = simulator.subscribe()
+        try:
+            while not simulator.stopped:
+                try:
+                    event = event_queue.get(timeout=0.1)
+                except Queue.Empty:
+                    continue
+                self.wfile.write('event: {}\ndata: {}\n\n'.format(
+                    event['eventType'], json.dumps(event)))
+                self.wfile.flush()
+        except IOError:
+            # Client disconnected
+            pass
+        finally:
+            simulator.unsubscribe(event_queue)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        logging.debug('Simulator: ' + format, *args)
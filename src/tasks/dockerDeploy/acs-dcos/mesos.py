@@ -1,3 +1,4 @@
+import jsoncodec
 from mesos_task import MesosTask
 
 class Mesos(object):
@@ -30,9 +31,20 @@ class Mesos(object):
         response = self._get_request('mesos/slaves', 'state.json')
         response.raise_for_status()
 
-        all_slaves = response.json()
+        all_slaves = jsoncodec.decode_response(response)
         return [slave['id'] for slave in all_slaves['slaves']]
 
+    def get_agent_resources(self):
+        """
+        Gets the total and used resources (cpus and mem) of all agents
+        in the cluster, with a single request
+        """
+        # GET /mesos/slaves/state.json
+        response = self._get_request('mesos/slaves', 'state.json')
+        response.raise_for_status()
+
+        return jsoncodec.decode_response(response)['slaves']
+
     def _get_slave_state(self, slave_id):
         """
         Gets the state.json for specified slave
@@ -41,7 +53,7 @@ class Mesos(object):
             'slave', '{}/state.json'.format(slave_id))
         slave_state_response.raise_for_status()
 
-        slave_state_json = slave_state_response.json()
+        slave_state_json = jsoncodec.decode_response(slave_state_response)
         return slave_state_json
 
     def get_task(self, task_id, slave_id=None):
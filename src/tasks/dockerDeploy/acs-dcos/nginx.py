@@ -1,5 +1,6 @@
 import os
 
+import servicelabels
 from hexifier import DockerAuthConfigHexifier
 from exhibitor import Exhibitor
 
@@ -19,20 +20,25 @@ class LoadBalancerApp(object):
         Checks if compose file has label that requires NGINX
         to be install and ensures it is installed
         """
+        if self.is_required(compose_data):
+            self._install()
+
+    def is_required(self, compose_data):
+        """
+        Checks if any service in the compose file has a label
+        that requires NGINX
+        """
         for _, service_info in compose_data['services'].items():
             if self._has_external_label(service_info):
-                self._install()
-                break
+                return True
+        return False
 
     def _has_external_label(self, service_info):
         """
         Checks if the service has a vhost label set
         """
-        if 'labels' in service_info:
-            for label in service_info['labels']:
-                if label.startswith('com.microsoft.acs.dcos.marathon.vhost'):
-                    return True
-        return False
+        return servicelabels.get_service_labels(service_info).has_prefix(
+            'com.microsoft.acs.dcos.marathon.vhost')
 
     def _install(self):
         """
@@ -0,0 +1,95 @@
+import argparse
+import json
+import sys
+import time
+
+import portmappings
+import portspec
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Measures how long it takes to parse the ports of services ' \
+                    'with many (and wide) port ranges and to create their port mappings')
+    parser.add_argument('--services', type=int, default=50,
+                        help='Number of services')
+    parser.add_argument('--ranges', type=int, default=20,
+                        help='Number of port ranges per service')
+    parser.add_argument('--range-size', type=int, default=100,
+                        help='Number of ports in each range')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of runs')
+    return parser
+
+
+def create_services(arguments):
+    """
+    Creates services with port ranges in all supported forms
+    """
+    services = []
+    for _ in range(arguments.services):
+        ports = []
+        for i in range(arguments.ranges):
+            start = 10000 + i * arguments.range_size
+            port_range = '{}-{}'.format(start, start + arguments.range_size - 1)
+            if i % 3 == 0:
+                ports.append(port_range)
+            elif i % 3 == 1:
+                ports.append('{}:{}'.format(port_range, port_range))
+            else:
+                ports.append('127.0.0.1:{}:{}/udp'.format(port_range, port_range))
+        services.append({'expose': [80], 'ports': ports})
+    return services
+
+
+def time_runs(runs, function):
+    """
+    Runs the function and returns the median run time
+    """
+    run_times = []
+    for _ in range(runs):
+        start_time = time.time()
+        function()
+        run_times.append(time.time() - start_time)
+    run_times.sort()
+    return round(run_times[len(run_times) // 2], 4)
+
+
+def run_benchmark(arguments):
+    """
+    Parses the ports of all services and returns the results
+    """
+    services = create_services(arguments)
+    portmappings_helper = portmappings.PortMappings()
+    # Measure all ports, even above the deployable limit
+    portmappings_helper.max_port_mappings = sys.maxsize
+    portmappings_helper.warn_port_mappings = sys.maxsize
+
+    def parse_specs():
+        for service_info in services:
+            portspec.parse_port_specs(service_info['ports'])
+
+    def parse_tuples():
+        for service_info in services:
+            portmappings_helper._parse_internal_ports(service_info)
+
+    def get_port_mappings():
+        for service_info in services:
+            portmappings_helper.get_port_mappings('10.0.0.1', service_info, 'benchmark')
+
+    return {
+        'services': arguments.services,
+        'ports': sum([len(spec) for service_info in services
+                      for spec in portspec.parse_port_specs(service_info['ports'])]),
+        'parse_specs': time_runs(arguments.runs, parse_specs),
+        'parse_tuples': time_runs(arguments.runs, parse_tuples),
+        'port_mappings': time_runs(arguments.runs, get_port_mappings)
+    }
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    sys.stdout.write(json.dumps(run_benchmark(arguments), indent=2, sort_keys=True) + '\n')
@@ -1,8 +1,42 @@
 import json
+import logging
 import types
 
+import portspec
+import servicelabels
+
+
+class _PortMappingList(object):
+    """
+    Port mappings in the order they were added, indexed by container port
+    """
+    def __init__(self):
+        self.port_mappings = []
+        self._by_container_port = {}
+
+    def append(self, port_mapping):
+        """
+        Adds the port mapping
+        """
+        self.port_mappings.append(port_mapping)
+        self._by_container_port.setdefault(
+            int(port_mapping['containerPort']), []).append(port_mapping)
+
+    def get(self, container_port):
+        """
+        Gets the port mappings for the container port
+        """
+        return self._by_container_port.get(int(container_port), [])
+
 
 class PortMappings(object):
+    # Each port mapping takes a host port on the agent (agents offer the ports
+    # 31000-32000 by default), so Marathon can't place apps with a lot more
+    # mappings. Services above warn_port_mappings are logged, services above
+    # max_port_mappings are rejected before anything is deployed.
+    warn_port_mappings = 100
+    max_port_mappings = 1000
+
     def _is_number(self, input_str):
         """
         Checks if the string is a number or not
@@ -17,37 +51,35 @@ class PortMappings(object):
         """
         Checks if the provided string is a port entry or not
         """
-        if not port_entry:
-            return False
-
-        if '-' in str(port_entry) and str(port_entry).count('-') == 1:
-            split = port_entry.split('-')
-            first_part = split[0]
-            second_part = split[1]
-            return self._is_number(first_part) and self._is_number(second_part)
-        return False
+        return portspec.is_port_range(port_entry)
 
     def _split_port_range(self, port_range):
         """
         Splits a port range and returns a tuple with start and end port
         """
         if not self._is_port_range(port_range):
-            raise ValueError('Provided value "%s" is not a port range', port_range)
-        split = port_range.split('-')
-        return (int(split[0]), int(split[1]))
+            raise ValueError('Provided value "{}" is not a port range'.format(port_range))
+        parsed = portspec.parse_port_range(port_range)
+        return (parsed.start, parsed.end)
 
     def _are_port_ranges_same_length(self, first_range, second_range):
         """
         Checks if two port ranges are the same length
         """
-
         if not self._is_port_range(first_range) or not self._is_port_range(second_range):
             raise ValueError('At least one of the provided values is not a port range')
+        return len(portspec.parse_port_range(first_range)) == \
+            len(portspec.parse_port_range(second_range))
 
-        first_split_start, first_split_end = self._split_port_range(first_range)
-        second_split_start, second_split_end = self._split_port_range(second_range)
-
-        return len(range(first_split_start, first_split_end)) == len(range(second_split_start, second_split_end))
+    def _parse_private_port_specs(self, service_data):
+        """
+        Parses the 'expose' key in the docker-compose file and
+        returns a list of port specs
+        """
+        if not service_data:
+            raise ValueError('service_data not provided')
+        return [portspec.parse_exposed_port(port_entry)
+                for port_entry in service_data.get('expose', [])]
 
     def _parse_private_ports(self, service_data):
         """
@@ -55,20 +87,16 @@ class PortMappings(object):
         list of tuples with port numbers. These tuples are used
         to create portMappings (blue/green only) in the marathon.json file
         """
-        port_tuple_list = []
+        return list(portspec.get_port_tuples(self._parse_private_port_specs(service_data)))
 
+    def _parse_internal_port_specs(self, service_data):
+        """
+        Parses the 'ports' key in the docker-compose file and returns a list
+        of port specs (ranges are not expanded)
+        """
         if not service_data:
             raise ValueError('service_data not provided')
-
-        if 'expose' not in service_data:
-            return port_tuple_list
-
-        for port_entry in service_data['expose']:
-            if self._is_number(port_entry):
-                port_tuple_list.append((int(port_entry), int(port_entry)))
-            else:
-                raise ValueError('Port number "%s" is not a valid number', port_entry)
-        return port_tuple_list
+        return portspec.parse_port_specs(service_data.get('ports', []))
 
     def _parse_internal_ports(self, service_data):
         """
@@ -76,51 +104,7 @@ class PortMappings(object):
         tuples with port numbers. These tuples are used to create
         portMappings (blue/green and cyan) in the marathon.json file
         """
-        port_tuple_list = []
-
-        if not service_data:
-            raise ValueError('service_data not provided')
-
-        if 'ports' not in service_data:
-            return port_tuple_list
-
-        for port_entry in service_data['ports']:
-            if ':' in str(port_entry):
-                split = port_entry.split(':')
-                vip_port = split[0]
-                container_port = split[1]
-                if self._is_port_range(vip_port) and self._is_port_range(container_port):
-                    # "8080-8090:9080-9090"
-                    if self._are_port_ranges_same_length(vip_port, container_port):
-                        vip_start, vip_end = self._split_port_range(vip_port)
-                        container_start, container_end = self._split_port_range(container_port)
-                        # vp = vip_port, cp = container_port; we do +1 on the end range to 
-                        # include the last port as well
-                        for vp, cp in zip(range(vip_start, vip_end + 1), range(container_start, container_end + 1)):
-                            port_tuple_list.append((int(vp), int(cp)))
-                    else:
-                        raise ValueError('Port ranges "{}" and "{}" are not equal in length',
-                                         vip_port, container_port)
-                else:
-                    # "8080:8080"
-                    if self._is_number(vip_port) and self._is_number(container_port):
-                        port_tuple_list.append((int(vip_port), int(container_port)))
-                    else:
-                        # e.g. invalid entry: 8080-8082:9000
-                        raise ValueError('One of the ports is not a valid number or a valid range')
-            else:
-                if self._is_port_range(port_entry):
-                    # "3000-3005"
-                    range_start, range_end = self._split_port_range(port_entry)
-                    for i in range(range_start, range_end + 1):
-                        port_tuple_list.append((i, i))
-                else:
-                    # "3000"
-                    if self._is_number(port_entry):
-                        port_tuple_list.append((int(port_entry), int(port_entry)))
-                    else:
-                        raise ValueError('One of the ports is not a valid number')
-        return port_tuple_list
+        return list(portspec.get_port_tuples(self._parse_internal_port_specs(service_data)))
 
     def _get_port_mapping_json(self):
         return {
@@ -178,28 +162,15 @@ class PortMappings(object):
         vhosts_label = 'com.microsoft.acs.dcos.marathon.vhosts'
         all_vhosts = {}
 
-        if not 'labels' in service_data:
-            return {}
-
-        for label in service_data['labels']:
-            if label.lower() == vhosts_label:
-                parsed = self._parse_vhost_json(service_data['labels'][label])
-                all_vhosts = self._merge_dicts(all_vhosts, parsed)
-            elif label.lower() == vhost_label:
-                vhost_item = service_data['labels'][label]
-                vhost, port = self._parse_vhost_label(vhost_item)
-                all_vhosts[vhost] = port
-            else:
-                if '=' in label:
-                    split = label.split('=')
-                    if split[0].lower() == vhost_label:
-                        # "vhost='www.contoto.com:80'"
-                        vhost, port = self._parse_vhost_label(split[1])
-                        all_vhosts[vhost] = port
-                    elif split[0].lower() == vhosts_label:
-                        # "vhosts=['www.blah.com:80','api.blah.com:81']"
-                        parsed = self._parse_vhost_json(split[1].replace("'", '"'))
-                        all_vhosts = self._merge_dicts(all_vhosts, parsed)
+        labels = servicelabels.get_service_labels(service_data)
+        for vhosts_item in labels.get_all(vhosts_label):
+            # "vhosts=['www.blah.com:80','api.blah.com:81']"
+            parsed = self._parse_vhost_json(vhosts_item.replace("'", '"'))
+            all_vhosts = self._merge_dicts(all_vhosts, parsed)
+        for vhost_item in labels.get_all(vhost_label):
+            # "vhost='www.contoto.com:80'"
+            vhost, port = self._parse_vhost_label(vhost_item)
+            all_vhosts[vhost] = port
         return all_vhosts
 
     def _set_external_port_mappings(self, service_data, ip_address, existing_port_mappings):
@@ -209,10 +180,9 @@ class PortMappings(object):
             port = all_vhosts[vhost]
             port = str(port).strip()
             external_vip = vhost + '.external' + ':80'
-            for port_mapping in existing_port_mappings:
-                if str(port_mapping['containerPort']).strip() == str(port):
-                    port_mapping['labels']['VIP_2'] = external_vip
-                    vhost_added = True
+            for port_mapping in existing_port_mappings.get(port):
+                port_mapping['labels']['VIP_2'] = external_vip
+                vhost_added = True
             if not vhost_added:
                 # Create a new port mapping
                 port_mapping = self._get_port_mapping_json()
@@ -221,49 +191,63 @@ class PortMappings(object):
                 port_mapping['labels']['VIP_2'] = external_vip
                 existing_port_mappings.append(port_mapping)
 
-    def _get_internal_port_mappings(self, service_data, ip_address,
+    def _get_internal_port_mappings(self, port_specs, ip_address,
                                     vip_name, existing_port_mappings):
         """
-        Gets the internal ports from the service data and updates the
-        existing_port_mappings array
-        """
-        internal_ports = self._parse_internal_ports(service_data)
-
-        for internal_port in internal_ports:
-            port_mapping = self._get_port_mapping_json()
-            vip_port = internal_port[0]
-            container_port = internal_port[1]
-
-            existing_mapping = False
-            for existing_port_mapping in existing_port_mappings:
-                if str(existing_port_mapping['containerPort']).strip() == str(container_port):
-                    # No need to add VIP_0 as it already exists
-                    existing_port_mapping['labels']['VIP_1'] = \
-                        vip_name + '.internal' + ':' + str(vip_port)
-                    existing_mapping = True
-                    break
-            # If we have a completely new mapping
-            if not existing_mapping:
+        Gets the internal ports from the port specs and updates the
+        existing port mappings
+        """
+        for port_spec in port_specs:
+            for vip_port, container_port in port_spec.get_port_tuples():
+                self._add_internal_port_mapping(
+                    ip_address, vip_name, vip_port, container_port,
+                    port_spec.protocol, existing_port_mappings)
+
+    def _add_internal_port_mapping(self, ip_address, vip_name, vip_port, container_port,
+                                   protocol, existing_port_mappings):
+        """
+        Adds the internal VIP to the mapping of the container port or
+        adds a new port mapping
+        """
+        for existing_port_mapping in existing_port_mappings.get(container_port):
+            # No need to add VIP_0 as it already exists
+            existing_port_mapping['labels']['VIP_1'] = \
+                vip_name + '.internal' + ':' + str(vip_port)
+            return
+
+        # If we have a completely new mapping
+        port_mapping = self._get_port_mapping_json()
+        port_mapping['containerPort'] = int(container_port)
+        port_mapping['protocol'] = protocol
+        port_mapping['labels']['VIP_0'] = ip_address + ':' + str(container_port)
+        port_mapping['labels']['VIP_1'] = vip_name + '.internal' + ':' + str(vip_port)
+        existing_port_mappings.append(port_mapping)
+
+    def _get_private_port_mappings(self, port_specs, ip_address):
+        """
+        Generates the port mappings with private ports
+        """
+        for port_spec in port_specs:
+            for container_port, _ in port_spec.get_port_tuples():
+                port_mapping = self._get_port_mapping_json()
                 port_mapping['containerPort'] = int(container_port)
+                port_mapping['protocol'] = port_spec.protocol
                 port_mapping['labels']['VIP_0'] = ip_address + ':' + str(container_port)
-                port_mapping['labels']['VIP_1'] = vip_name + '.internal' + ':' + str(vip_port)
-                existing_port_mappings.append(port_mapping)
+                yield port_mapping
 
-    def _get_private_port_mappings(self, service_data, ip_address):
+    def _check_port_count(self, port_specs, vip_name):
         """
-        Creates a list of port mappings with private ports
+        Checks the number of container ports (without expanding the
+        ranges) against the limits
         """
-        port_mappings = []
-        private_ports = self._parse_private_ports(service_data)
-
-        for private_port in private_ports:
-            port_mapping = self._get_port_mapping_json()
-            container_port = private_port[0]
-            port_mapping['containerPort'] = int(container_port)
-            port_mapping['labels']['VIP_0'] = ip_address + ':' + str(container_port)
-            port_mappings.append(port_mapping)
-
-        return port_mappings
+        port_count = portspec.count_ports([port_spec.container for port_spec in port_specs])
+        if port_count > self.max_port_mappings:
+            raise ValueError(
+                'Service "{}" has {} ports, more than the {} port mappings that can be '
+                'deployed'.format(vip_name, port_count, self.max_port_mappings))
+        if port_count > self.warn_port_mappings:
+            logging.warning('Service "%s" has %s ports, agents might not have enough free '
+                            'ports to run it', vip_name, port_count)
 
     def get_port_mappings(self, ip_address, service_data, vip_name):
         """
@@ -273,8 +257,14 @@ class PortMappings(object):
             split = ip_address.split(':')
             ip_address = split[0]
 
-        all_port_mappings = self._get_private_port_mappings(service_data, ip_address)
+        private_port_specs = self._parse_private_port_specs(service_data)
+        internal_port_specs = self._parse_internal_port_specs(service_data)
+        self._check_port_count(private_port_specs + internal_port_specs, vip_name)
+
+        all_port_mappings = _PortMappingList()
+        for port_mapping in self._get_private_port_mappings(private_port_specs, ip_address):
+            all_port_mappings.append(port_mapping)
         self._get_internal_port_mappings(
-            service_data, ip_address, vip_name, all_port_mappings)
+            internal_port_specs, ip_address, vip_name, all_port_mappings)
         self._set_external_port_mappings(service_data, ip_address, all_port_mappings)
-        return all_port_mappings
+        return all_port_mappings.port_mappings
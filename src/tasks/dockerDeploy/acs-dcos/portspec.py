@@ -0,0 +1,175 @@
+import re
+
+try:
+    _xrange = xrange
+except NameError:
+    _xrange = range
+
+# Port entry from docker-compose: [ip:][host:]container[/protocol], where
+# host and container are single ports or ranges (e.g. 127.0.0.1:8080-8081:80-81/udp)
+PORT_SPEC_PATTERN = re.compile(
+    r'^(?:(?P<ip>\d{1,3}(?:\.\d{1,3}){3}|\[[0-9a-fA-F:.]+\]):)?'
+    r'(?:(?P<host>\d+(?:-\d+)?)?:)?'
+    r'(?P<container>\d+(?:-\d+)?)'
+    r'(?:/(?P<protocol>tcp|udp))?$', re.IGNORECASE)
+PORT_RANGE_PATTERN = re.compile(r'^(\d+)-(\d+)$')
+PORT_PATTERN = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+
+class PortRange(object):
+    """
+    Inclusive range of ports (a single port is a range with the same start
+    and end). Ports are only generated when the range is iterated.
+    """
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = start if end is None else end
+        if self.end < self.start:
+            raise ValueError('Port range "{}-{}" ends before it starts'.format(start, end))
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    def __iter__(self):
+        return iter(_xrange(self.start, self.end + 1))
+
+    def __eq__(self, other):
+        return isinstance(other, PortRange) and \
+            (self.start, self.end) == (other.start, other.end)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __str__(self):
+        if self.start == self.end:
+            return str(self.start)
+        return '{}-{}'.format(self.start, self.end)
+
+    def __repr__(self):
+        return 'PortRange({}, {})'.format(self.start, self.end)
+
+    def is_range(self):
+        """
+        True if the range has more than one port
+        """
+        return self.start != self.end
+
+
+class PortSpec(object):
+    """
+    Parsed docker-compose port entry. host is None if only the container
+    port was provided, in which case the container port is used for both.
+    """
+    __slots__ = ('ip', 'host', 'container', 'protocol')
+
+    def __init__(self, container, host=None, ip=None, protocol='tcp'):
+        if host is not None and len(host) != len(container):
+            raise ValueError('Port ranges "{}" and "{}" are not equal in length'.format(
+                host, container))
+        self.ip = ip
+        self.host = host
+        self.container = container
+        self.protocol = protocol
+
+    def __len__(self):
+        return len(self.container)
+
+    def __repr__(self):
+        return 'PortSpec({!r}, {!r}, {!r}, {!r})'.format(
+            self.container, self.host, self.ip, self.protocol)
+
+    def get_port_tuples(self):
+        """
+        Generates the (host port, container port) tuples
+        """
+        host = self.host if self.host is not None else self.container
+        return zip_ports(host, self.container)
+
+
+def zip_ports(first_range, second_range):
+    """
+    Generates tuples with the ports of both ranges
+    """
+    offset = second_range.start - first_range.start
+    for port in first_range:
+        yield (port, port + offset)
+
+
+def parse_port_range(value):
+    """
+    Parses a single port ('3000') or port range ('3000-3005')
+    """
+    match = PORT_PATTERN.match(str(value).strip())
+    if not match:
+        raise ValueError('"{}" is not a valid port or port range'.format(value))
+    start, end = match.groups()
+    return PortRange(int(start), int(end) if end else None)
+
+
+def is_port_range(value):
+    """
+    Checks if the value is a port range ('3000-3005')
+    """
+    return value is not None and PORT_RANGE_PATTERN.match(str(value).strip()) is not None
+
+
+def parse_port_spec(entry):
+    """
+    Parses a port entry from the 'ports' key
+    """
+    match = PORT_SPEC_PATTERN.match(str(entry).strip())
+    if not match:
+        raise ValueError('Port entry "{}" is not a valid port, port range or mapping'.format(
+            entry))
+    host = match.group('host')
+    return PortSpec(parse_port_range(match.group('container')),
+                    host=parse_port_range(host) if host else None,
+                    ip=match.group('ip'),
+                    protocol=(match.group('protocol') or 'tcp').lower())
+
+
+def parse_port_specs(entries):
+    """
+    Parses all port entries from the 'ports' key
+    """
+    return [parse_port_spec(entry) for entry in entries]
+
+
+def parse_exposed_port(entry):
+    """
+    Parses a port entry from the 'expose' key (a single port, with an
+    optional protocol)
+    """
+    match = PORT_SPEC_PATTERN.match(str(entry).strip())
+    if not match or match.group('ip') or ':' in str(entry) or \
+        is_port_range(match.group('container')):
+        raise ValueError('Port number "{}" is not a valid number'.format(entry))
+    return PortSpec(parse_port_range(match.group('container')),
+                    protocol=(match.group('protocol') or 'tcp').lower())
+
+
+def count_ports(port_ranges):
+    """
+    Counts the distinct ports in the port ranges, without expanding them
+    """
+    count = 0
+    last_port = None
+    for port_range in sorted(port_ranges, key=lambda port_range: port_range.start):
+        if last_port is None or port_range.start > last_port:
+            count += len(port_range)
+            last_port = port_range.end
+        elif port_range.end > last_port:
+            count += port_range.end - last_port
+            last_port = port_range.end
+    return count
+
+
+def get_port_tuples(port_specs):
+    """
+    Generates the (host port, container port) tuples of all port specs
+    """
+    for port_spec in port_specs:
+        for port_tuple in port_spec.get_port_tuples():
+            yield port_tuple
@@ -0,0 +1,69 @@
+import json
+import sys
+import time
+
+import clusterrecording
+import createmarathon
+import dockercomposeparser
+from requestobserver import RequestStats
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser. Takes the same arguments as createmarathon.py
+    (they need to match the recorded deployment) and the recording options.
+    """
+    parser = createmarathon.get_arg_parser()
+    parser.description = 'Replays a recorded deployment and reports deploy latency, ' \
+                          'request count and bytes transferred'
+    parser.add_argument('--recording',
+                        help='[required] Recording created with --record-file')
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='Scale recorded timing (1 = realistic, 0 = no delays)')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='Number of times to replay the deployment')
+    return parser
+
+
+def run_benchmark(arguments, recording):
+    """
+    Replays the recording once and returns the results
+    """
+    request_stats = RequestStats()
+    with clusterrecording.ReplayServer(recording, arguments.time_scale) as server:
+        start_time = time.time()
+        with dockercomposeparser.DockerComposeParser(
+            arguments.compose_file, server.get_url(), None, None, None, None, None,
+            arguments.group_name, arguments.group_qualifier, arguments.group_version,
+            arguments.registry_host, arguments.registry_username, arguments.registry_password,
+            arguments.minimum_health_capacity, check_dcos_version=True,
+            request_observers=[request_stats]) as compose_parser:
+            compose_parser.deploy()
+            # Deployment succeeded, don't remove it when leaving the 'with' block
+            compose_parser.cleanup_needed = False
+        duration = time.time() - start_time
+        unmatched = len(server.unmatched)
+
+    totals = request_stats.get_totals()
+    return {
+        'duration': round(duration, 3),
+        'requests': totals['count'],
+        'request_bytes': totals['request_bytes'],
+        'response_bytes': totals['response_bytes'],
+        'unmatched_requests': unmatched
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = get_arg_parser()
+    arguments = arg_parser.parse_args()
+    if arguments.recording is None:
+        arg_parser.error('argument --recording is required')
+    createmarathon.init_logger(arguments.verbose)
+
+    loaded_recording = clusterrecording.Recording.load(arguments.recording)
+    results = []
+    for _ in range(arguments.runs):
+        results.append(run_benchmark(arguments, loaded_recording))
+    sys.stdout.write(json.dumps(results, indent=2) + '\n')
+    sys.exit(0)
@@ -0,0 +1,107 @@
+import json
+import zlib
+
+
+class JsonBody(object):
+    """
+    Request body that encodes the JSON incrementally (and optionally gzips
+    it), so large payloads are sent in chunks instead of being built as one
+    string first. The body can be iterated more than once, e.g. when the
+    request is retried.
+    """
+    # Encoded JSON is sent in chunks of (at least) chunk_size bytes
+    chunk_size = 64 * 1024
+    compress_level = 6
+
+    def __init__(self, data, compress=False):
+        self.data = data
+        self.compress = compress
+        # Number of bytes sent, set once the body was iterated
+        self.size = None
+
+    def get_headers(self):
+        """
+        Gets the headers to send with the body
+        """
+        headers = {'content-type': 'application/json'}
+        if self.compress:
+            headers['content-encoding'] = 'gzip'
+        return headers
+
+    def _encode(self):
+        """
+        Generates the encoded JSON in chunks of about chunk_size bytes
+        """
+        chunks = []
+        length = 0
+        for chunk in json.JSONEncoder().iterencode(self.data):
+            chunks.append(chunk)
+            length += len(chunk)
+            if length >= self.chunk_size:
+                yield ''.join(chunks).encode('utf-8')
+                chunks = []
+                length = 0
+        if chunks:
+            yield ''.join(chunks).encode('utf-8')
+
+    def _gzip(self, chunks):
+        """
+        Compresses the chunks into a gzip stream
+        """
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def __iter__(self):
+        size = 0
+        chunks = self._encode()
+        if self.compress:
+            chunks = self._gzip(chunks)
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        self.size = size
+
+    def get_preview(self, max_length):
+        """
+        Gets (at least) the first max_length characters of the JSON,
+        without encoding the rest
+        """
+        preview = []
+        length = 0
+        for chunk in json.JSONEncoder().iterencode(self.data):
+            preview.append(chunk)
+            length += len(chunk)
+            if length > max_length:
+                break
+        return ''.join(preview)
+
+
+def read_request_body(handler):
+    """
+    Reads the request body in a BaseHTTPRequestHandler, with either a
+    content-length or chunked transfer encoding, and decompresses it
+    if it's gzipped
+    """
+    if handler.headers.getheader('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            chunk_length = int(handler.rfile.readline().split(';')[0].strip(), 16)
+            if not chunk_length:
+                # Skip the trailer
+                while handler.rfile.readline().strip():
+                    pass
+                break
+            chunks.append(handler.rfile.read(chunk_length))
+            handler.rfile.readline()
+        body = ''.join(chunks)
+    else:
+        length = int(handler.headers.getheader('content-length', 0))
+        body = handler.rfile.read(length) if length else ''
+
+    if body and handler.headers.getheader('content-encoding', '').lower() == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    return body
@@ -0,0 +1,209 @@
+import logging
+import threading
+
+
+class RequestRecord(object):
+    """
+    Describes a single HTTP request made through the ACS client
+    """
+    def __init__(self, method, path, status_code, elapsed,
+                 request_bytes=0, response_bytes=0, retries=0, response=None):
+        self.method = method.upper()
+        self.path = path
+        self.path_template = get_path_template(path)
+        self.status_code = status_code
+        self.elapsed = elapsed
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.retries = retries
+        self.response = response
+
+    def failed(self):
+        """
+        True if request did not get a response or the response was an error
+        """
+        return self.status_code is None or self.status_code >= 400
+
+    def __str__(self):
+        return '{} {} -> {} in {:.3f}s (sent {}B, received {}B, retries {})'.format(
+            self.method, self.path, self.status_code, self.elapsed,
+            self.request_bytes, self.response_bytes, self.retries)
+
+
+# Marathon endpoints that can follow an app or group ID
+MARATHON_SUB_RESOURCES = ['restart', 'tasks', 'versions']
+
+
+def get_path_template(path):
+    """
+    Gets the path without the query string and with the IDs replaced by
+    placeholders (e.g. service/marathon/v2/groups/{id}), so requests that
+    only differ in their IDs or query parameters are grouped together
+    """
+    if not path:
+        return ''
+    segments = path.split('?')[0].strip('/').split('/')
+    if segments[:3] == ['service', 'marathon', 'v2'] and len(segments) > 4:
+        # Marathon IDs can have any number of segments
+        segments = segments[:4] + ['{id}'] + \
+            [segment for segment in segments[-1:] if segment in MARATHON_SUB_RESOURCES]
+    elif segments[0] == 'slave' and len(segments) > 1:
+        segments[1] = '{id}'
+    return '/'.join(segments)
+
+
+class RequestObserver(object):
+    """
+    Base class for observers that get notified about every
+    request made through the ACS client
+    """
+    def request_completed(self, record):
+        """
+        Called after each request with a RequestRecord instance
+        """
+        pass
+
+    def event_stream_opened(self, stream_id, path):
+        """
+        Called when an event stream is opened
+        """
+        pass
+
+    def event_received(self, stream_id, data):
+        """
+        Called for each event received on an event stream
+        """
+        pass
+
+
+class RequestStats(RequestObserver):
+    """
+    Aggregates request counts, latencies and transferred bytes
+    per method and path template
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def request_completed(self, record):
+        key = (record.method, record.path_template)
+        with self._lock:
+            if not key in self._stats:
+                self._stats[key] = {
+                    'method': record.method,
+                    'path': record.path_template,
+                    'count': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'total_time': 0.0,
+                    'max_time': 0.0,
+                    'request_bytes': 0,
+                    'response_bytes': 0
+                }
+            entry = self._stats[key]
+            entry['count'] += 1
+            entry['retries'] += record.retries
+            entry['total_time'] += record.elapsed
+            entry['max_time'] = max(entry['max_time'], record.elapsed)
+            entry['request_bytes'] += record.request_bytes
+            entry['response_bytes'] += record.response_bytes
+            if record.failed():
+                entry['errors'] += 1
+
+    def get_stats(self):
+        """
+        Gets the list of aggregated entries, slowest (by total time) first
+        """
+        with self._lock:
+            entries = [dict(entry) for entry in self._stats.values()]
+        entries.sort(key=lambda entry: entry['total_time'], reverse=True)
+        return entries
+
+    def get_totals(self):
+        """
+        Gets the totals across all requests
+        """
+        totals = {
+            'count': 0,
+            'errors': 0,
+            'retries': 0,
+            'total_time': 0.0,
+            'request_bytes': 0,
+            'response_bytes': 0
+        }
+        for entry in self.get_stats():
+            for key in totals:
+                totals[key] += entry[key]
+        return totals
+
+    def get_payload_report(self):
+        """
+        Gets the bytes received per method and path template,
+        largest first, to see which requests transfer the most data
+        """
+        report = []
+        for entry in self.get_stats():
+            report.append({
+                'method': entry['method'],
+                'path': entry['path'],
+                'count': entry['count'],
+                'response_bytes': entry['response_bytes'],
+                'average_bytes': entry['response_bytes'] // max(entry['count'], 1)
+            })
+        report.sort(key=lambda entry: entry['response_bytes'], reverse=True)
+        return report
+
+    def log_summary(self, level=logging.DEBUG):
+        """
+        Logs the aggregated request statistics
+        """
+        totals = self.get_totals()
+        logging.log(level, 'Made %s requests in %.3fs (sent %sB, received %sB, %s errors, %s retries)',
+                    totals['count'], totals['total_time'], totals['request_bytes'],
+                    totals['response_bytes'], totals['errors'], totals['retries'])
+        for entry in self.get_stats():
+            logging.log(level, '  %s %s: %s calls, %.3fs total, %.3fs max, %sB sent, %sB received',
+                        entry['method'], entry['path'], entry['count'], entry['total_time'],
+                        entry['max_time'], entry['request_bytes'], entry['response_bytes'])
+
+
+class SlowRequestLogger(RequestObserver):
+    """
+    Logs only requests that took longer than the threshold (in seconds)
+    """
+    def __init__(self, threshold=5.0):
+        self.threshold = threshold
+
+    def request_completed(self, record):
+        if record.elapsed >= self.threshold:
+            logging.info('Slow request: %s', record)
+
+
+class TruncatedPayload(object):
+    """
+    Wraps a request payload for logging, so it is only converted
+    to a (truncated) string if the log record is actually emitted
+    """
+    max_length = 1024
+
+    def __init__(self, payload, max_length=None):
+        self.payload = payload
+        if max_length is not None:
+            self.max_length = max_length
+
+    def __str__(self):
+        if self.payload is None:
+            return 'None'
+        if hasattr(self.payload, 'get_preview'):
+            # Streamed payload, only the start of it is encoded
+            text = self.payload.get_preview(self.max_length)
+            if len(text) <= self.max_length:
+                return text
+            return '{}... (streamed)'.format(text[:self.max_length])
+        if isinstance(self.payload, basestring):
+            text = self.payload
+        else:
+            text = repr(self.payload)
+        if len(text) <= self.max_length:
+            return text
+        return '{}... ({} bytes total)'.format(text[:self.max_length], len(text))
@@ -0,0 +1,162 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+
+
+class RetryBudget(object):
+    """
+    Total number of retries that can be used by all requests
+    made during a single deployment
+    """
+    def __init__(self, max_retries=30):
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes one retry from the budget. Returns False if
+        the budget is exhausted
+        """
+        with self._lock:
+            if self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+    def remaining(self):
+        """
+        Gets the number of retries left in the budget
+        """
+        return max(self.max_retries - self.used, 0)
+
+
+class ExistsCheck(object):
+    """
+    Wraps the exists_check of a POST request and remembers if it
+    confirmed that a failed attempt created the resource
+    """
+    def __init__(self, exists_check):
+        self.exists_check = exists_check
+        self.confirmed = False
+
+    def __call__(self):
+        self.confirmed = bool(self.exists_check())
+        return self.confirmed
+
+
+class RetryPolicy(object):
+    """
+    Decides if and when a failed request should be retried.
+
+    GET, HEAD, PUT and DELETE requests are idempotent and are retried on
+    connection errors and transient (502, 503, 504) responses. POST requests
+    are only retried if the caller provides an exists_check that confirms
+    the resource was not created by the failed attempt.
+    """
+    RETRYABLE_STATUS_CODES = (502, 503, 504)
+    IDEMPOTENT_METHODS = ('get', 'head', 'put', 'delete')
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=30.0, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget if budget is not None else RetryBudget()
+        self.counters = {
+            'retries': 0,
+            'connection_errors': 0,
+            'transient_errors': 0,
+            'deployment_locked': 0,
+            'budget_exhausted': 0,
+            'duplicate_prevented': 0
+        }
+        self._lock = threading.Lock()
+
+    def _increment(self, counter):
+        """
+        Increments one of the counters
+        """
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get_delay(self, attempt):
+        """
+        Gets the delay (in seconds) before the next attempt, using
+        exponential backoff with full jitter
+        """
+        max_delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, max_delay)
+
+    def is_deployment_locked(self, response):
+        """
+        True if Marathon rejected the request because the app or
+        group is locked by another deployment
+        """
+        if response.status_code != 409:
+            return False
+        return 'locked' in (getattr(response, 'text', None) or '').lower()
+
+    def is_transient_response(self, response):
+        """
+        True if the response indicates a transient error
+        """
+        return response.status_code in self.RETRYABLE_STATUS_CODES or \
+            self.is_deployment_locked(response)
+
+    def should_retry(self, method, attempt, response=None, error=None, exists_check=None):
+        """
+        Checks if request should be retried after a failed attempt (either
+        a transient response or a connection error)
+        """
+        if response is not None:
+            if not self.is_transient_response(response):
+                return False
+            if self.is_deployment_locked(response):
+                self._increment('deployment_locked')
+            else:
+                self._increment('transient_errors')
+        elif error is not None:
+            if not isinstance(error, (requests.exceptions.ConnectionError,
+                                      requests.exceptions.Timeout)):
+                return False
+            self._increment('connection_errors')
+        else:
+            return False
+
+        if attempt + 1 >= self.max_attempts:
+            return False
+
+        if not method.lower() in self.IDEMPOTENT_METHODS:
+            if exists_check is None:
+                return False
+            try:
+                resource_exists = exists_check()
+            except Exception as check_exc:
+                logging.debug('Could not check if resource exists: %s', check_exc)
+                return False
+            if resource_exists:
+                # Previous attempt created the resource, retrying
+                # would create a duplicate
+                logging.debug('Resource already exists, not retrying %s', method)
+                self._increment('duplicate_prevented')
+                return False
+
+        if not self.budget.acquire():
+            logging.debug('Retry budget exhausted')
+            self._increment('budget_exhausted')
+            return False
+
+        self._increment('retries')
+        return True
+
+    def wait(self, attempt):
+        """
+        Sleeps before the next attempt
+        """
+        delay = self.get_delay(attempt)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
@@ -4,6 +4,7 @@ import re
 
 import healthcheck
 import portmappings
+import servicelabels
 
 
 class Parser(object):
@@ -94,28 +95,19 @@ class Parser(object):
         Parses the 'labels' key
         """
         if key in self.service_info:
+            labels = servicelabels.parse_labels(self.service_info[key])
 
             # Add healthchecks (if any healthcheck labels are set)
-            healthcheck_helper = healthcheck.HealthCheck(self.service_info[key])
+            healthcheck_helper = healthcheck.HealthCheck(labels)
             healthcheck_json = healthcheck_helper.get_health_check_config()
             if not healthcheck_json is None:
                 self.app_json['healthChecks'] = healthcheck_json
 
-            for label in self.service_info[key]:
-                if not label.lower().startswith('com.microsoft.acs.dcos'):
+            for label_name, label_value in labels.items:
+                if not label_name.lower().startswith('com.microsoft.acs.dcos'):
                     if not 'labels' in self.app_json:
                         self.app_json['labels'] = {}
-                    if isinstance(self.service_info[key], dict):
-                        self.app_json['labels'][label] = str(self.service_info[key][label])
-                    else:
-                        if '=' in label:
-                            label_split = label.split('=')
-                            label_name = label_split[0]
-                            label_value = label_split[1]
-                            self.app_json['labels'][label_name] = str(label_value)
-                        else:
-                            # label without a value
-                            self.app_json['labels'][label] = ''
+                    self.app_json['labels'][label_name] = str(label_value)
 
     def _parse_mem_limit(self, key):
         """
@@ -0,0 +1,162 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+import createmarathon
+import dockercomposeparser
+import marathon
+from marathonsimulator import MarathonSimulator
+from requestobserver import RequestStats
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Runs a blue/green deployment against the Marathon/Mesos simulator ' \
+                    'and reports deploy latency, wait loop overhead, event throughput and memory')
+    parser.add_argument('--services', type=int, default=500,
+                        help='Number of services in the generated docker-compose file')
+    parser.add_argument('--instances', type=int, default=20,
+                        help='Number of instances per service in the existing deployment')
+    parser.add_argument('--agents', type=int, default=100,
+                        help='Number of simulated agents')
+    parser.add_argument('--min-task-start', type=float, default=0.0,
+                        help='Minimum time (in seconds) for a task to start')
+    parser.add_argument('--max-task-start', type=float, default=0.5,
+                        help='Maximum time (in seconds) for a task to start')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Probability of a task failing to start (0 - 1)')
+    parser.add_argument('--minimum-health-capacity', type=int, default=50,
+                        help='Minimum health capacity used for the deployment')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed, for repeatable runs')
+    parser.add_argument('--buffered-requests', action='store_true',
+                        help='Serialize request bodies to a single string instead of streaming them')
+    parser.add_argument('--compress-requests', action='store_true',
+                        help='Gzip streamed request bodies')
+    parser.add_argument('--payload-report', action='store_true',
+                        help='Include the bytes received per request path')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log deployment progress')
+    return parser
+
+
+def create_compose_file(directory, services):
+    """
+    Creates a docker-compose file with the provided number of services
+    """
+    compose_data = {'version': '2', 'services': {}}
+    for i in range(services):
+        compose_data['services']['service-{}'.format(i)] = {
+            'image': 'nginx',
+            'expose': [80]
+        }
+    compose_file = os.path.join(directory, 'docker-compose.yml')
+    with open(compose_file, 'w') as compose_stream:
+        yaml.safe_dump(compose_data, compose_stream)
+    return compose_file
+
+
+class _WaitTimer(object):
+    """
+    Measures the time spent in Marathon._wait_for_deployment_complete
+    """
+    def __init__(self):
+        self.total_time = 0.0
+        self._wait_for_deployment_complete = marathon.Marathon._wait_for_deployment_complete
+
+    def __enter__(self):
+        timer = self
+        def timed_wait(marathon_helper, *args, **kwargs):
+            start_time = time.time()
+            try:
+                return timer._wait_for_deployment_complete(marathon_helper, *args, **kwargs)
+            finally:
+                timer.total_time += time.time() - start_time
+        marathon.Marathon._wait_for_deployment_complete = timed_wait
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        marathon.Marathon._wait_for_deployment_complete = self._wait_for_deployment_complete
+
+
+def run_benchmark(arguments, compose_file):
+    """
+    Seeds the simulator with an existing deployment, updates it
+    and returns the results
+    """
+    request_stats = RequestStats()
+    simulator = MarathonSimulator(
+        agents=arguments.agents,
+        task_start_latency=(arguments.min_task_start, arguments.max_task_start),
+        failure_rate=arguments.failure_rate,
+        seed=arguments.seed)
+
+    with simulator:
+        with dockercomposeparser.DockerComposeParser(
+            compose_file, simulator.get_url(), None, None, None, None, None,
+            'benchmark', 'simulator', 'new', None, None, None,
+            arguments.minimum_health_capacity, check_dcos_version=True,
+            request_observers=[request_stats]) as compose_parser:
+
+            existing_group_id = compose_parser._get_group_id(include_version=False) + 'existing'
+            simulator.add_group({
+                'id': existing_group_id,
+                'apps': [{'id': '{}/{}'.format(existing_group_id, service_name),
+                          'instances': arguments.instances}
+                         for service_name in compose_parser.compose_data['services']]
+            })
+
+            start_time = time.time()
+            with _WaitTimer() as wait_timer:
+                compose_parser.deploy()
+            duration = time.time() - start_time
+            compose_parser.cleanup_needed = False
+
+    totals = request_stats.get_totals()
+    deployment_time = sum(simulator.deployment_durations)
+    results = {
+        'duration': round(duration, 3),
+        'wait_time': round(wait_timer.total_time, 3),
+        'deployment_time': round(deployment_time, 3),
+        'wait_overhead': round(wait_timer.total_time - deployment_time, 3),
+        'requests': totals['count'],
+        'request_bytes': totals['request_bytes'],
+        'response_bytes': totals['response_bytes'],
+        'events': simulator.counters['events'],
+        'events_per_second': round(simulator.counters['events'] / duration, 1),
+        'tasks_started': simulator.counters['tasks_started'],
+        'tasks_failed': simulator.counters['tasks_failed'],
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+    if arguments.payload_report:
+        results['payloads'] = request_stats.get_payload_report()
+    return results
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    createmarathon.init_logger(arguments.verbose)
+    if not arguments.verbose:
+        logging.root.setLevel(logging.WARNING)
+
+    marathon.Marathon.stream_requests = not arguments.buffered_requests
+    marathon.Marathon.compress_requests = arguments.compress_requests
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        results = run_benchmark(arguments, create_compose_file(temp_dir, arguments.services))
+    finally:
+        shutil.rmtree(temp_dir)
+    sys.stdout.write(json.dumps(results, indent=2) + '\n')
+    sys.exit(0)
@@ -0,0 +1,91 @@
+import __builtin__
+import logging
+import sys
+import time
+
+
+class ImportProfiler(object):
+    """
+    Measures how long it takes to import each module, by wrapping
+    the built-in __import__ while the profiler is running
+    """
+    def __init__(self):
+        self.timings = {}
+        self._child_times = []
+        self._original_import = None
+        self._start_time = None
+        self.total_time = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Starts measuring imports
+        """
+        self._start_time = time.time()
+        self._original_import = __builtin__.__import__
+        __builtin__.__import__ = self._import
+
+    def stop(self):
+        """
+        Stops measuring imports
+        """
+        if self._original_import:
+            __builtin__.__import__ = self._original_import
+            self._original_import = None
+            self.total_time += time.time() - self._start_time
+
+    def _import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        modules_before = len(sys.modules)
+        start_time = time.time()
+        self._child_times.append(0.0)
+        module = None
+        try:
+            module = self._original_import(name, globals, locals, fromlist, level)
+            return module
+        finally:
+            elapsed = time.time() - start_time
+            child_time = self._child_times.pop()
+            if self._child_times:
+                self._child_times[-1] += elapsed
+            if module is not None and name and len(sys.modules) > modules_before:
+                self._record(self._get_module_name(name, fromlist, module),
+                             elapsed, elapsed - child_time)
+
+    def _get_module_name(self, name, fromlist, module):
+        """
+        Gets the full name of the imported module, so implicit relative
+        imports (e.g. 'loader' in the yaml package) show up as 'yaml.loader'
+        """
+        if fromlist or '.' not in name:
+            return getattr(module, '__name__', name)
+        return name
+
+    def _record(self, module_name, cumulative, own):
+        if module_name not in self.timings:
+            self.timings[module_name] = (cumulative, own)
+
+    def get_report(self, count=None):
+        """
+        Gets the imported modules, slowest first, with the time including
+        (cumulative) and excluding (self) the modules they imported
+        """
+        report = [{'module': name, 'cumulative': round(cumulative, 4), 'self': round(own, 4)}
+                  for name, (cumulative, own) in self.timings.items()]
+        report.sort(key=lambda entry: entry['cumulative'], reverse=True)
+        return report[:count] if count else report
+
+    def log_report(self, count=20, level=logging.INFO):
+        """
+        Logs the slowest imports
+        """
+        logging.log(level, 'Imported %s modules in %.3fs', len(self.timings), self.total_time)
+        logging.log(level, '  %-40s %10s %10s', 'module', 'cumulative', 'self')
+        for entry in self.get_report(count):
+            logging.log(level, '  %-40s %9.3fs %9.3fs',
+                        entry['module'], entry['cumulative'], entry['self'])
@@ -87,10 +87,9 @@ class AcsClientTest(unittest.TestCase):
 
     @patch('acsclient.ACSClient.get_available_local_port')
     @patch('sshtunnel.SSHTunnelForwarder')
-    @patch('sshtunnel.SSHTunnelForwarder.start')
     @patch('acsclient.ACSClient._wait_for_tunnel')
     @patch('acsclient.ACSClient._get_private_key')
-    def test_setup_tunnel_ssh(self, mock_get_private_key, mock_wait_for_tunnel, mock_tunnel_forwarder, mock_tunnel, mock_available_port):
+    def test_setup_tunnel_ssh(self, mock_get_private_key, mock_wait_for_tunnel, mock_tunnel_forwarder, mock_available_port):
         mock_available_port.return_value = '1234'
         mock_get_private_key.return_value = Mock()
 
@@ -102,6 +101,7 @@ class AcsClientTest(unittest.TestCase):
         self.assertIsNotNone(acs_client.current_tunnel[0])
         self.assertEquals(acs_client.current_tunnel[1], 1234)
         self.assertTrue(mock_tunnel_forwarder.called)
+        self.assertTrue(mock_tunnel_forwarder.return_value.start.called)
         self.assertTrue(mock_wait_for_tunnel.called)
         self.assertEquals(return_value, 1234)
 
@@ -281,3 +281,102 @@ class AcsClientTest(unittest.TestCase):
 
         self.assertFalse(acs_client.is_running)
         self.assertTrue(mock_current_tunnel[0].stop.called)
+
+    @patch('acsclient.ACSClient.current_tunnel')
+    def test_create_deploy_client(self, mock_current_tunnel):
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', None)
+        acs_client = acsclient.ACSClient(acs_info)
+        acs_client.use_connection_pool()
+        acs_client.is_running = True
+        acs_client.add_request_observer(Mock())
+        acs_client.retry_policy.budget.used = acs_client.retry_policy.budget.max_retries
+
+        deploy_client = acs_client.create_deploy_client()
+        self.assertEquals(deploy_client.retry_policy.budget.remaining(),
+                          deploy_client.retry_policy.budget.max_retries)
+        self.assertIs(deploy_client.session, acs_client.session)
+        self.assertIs(deploy_client.create_deploy_client().parent, acs_client)
+        deploy_client.add_request_observer(Mock())
+        self.assertEquals(len(acs_client.request_observers), 1)
+        self.assertEquals(deploy_client._setup_tunnel_server(80), mock_current_tunnel[1])
+
+        # The tunnel and the connections are kept for the next deployment
+        deploy_client.shutdown()
+        self.assertTrue(acs_client.is_running)
+        self.assertIsNotNone(acs_client.session)
+        self.assertFalse(mock_current_tunnel[0].stop.called)
+
+    @patch('acsclient.ACSClient.create_request_url')
+    @patch('requests.get', side_effect=mocked_requests_get)
+    def test_make_request_notifies_observers(self, mock_get, mock_request_url):
+        mock_request_url.return_value = 'http://make_request_200'
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', 'http://leader.mesos')
+        acs_client = acsclient.ACSClient(acs_info)
+        observer = Mock()
+        acs_client.add_request_observer(observer)
+
+        acs_client.make_request('mypath?embed=a', 'get')
+        self.assertTrue(observer.request_completed.called)
+        record = observer.request_completed.call_args[0][0]
+        self.assertEquals(record.method, 'GET')
+        self.assertEquals(record.path_template, 'mypath')
+        self.assertEquals(record.status_code, 200)
+
+    @patch('acsclient.ACSClient.create_request_url')
+    @patch('requests.get')
+    def test_make_request_observers_do_not_read_body(self, mock_get, mock_request_url):
+        class StreamedResponse(object):
+            status_code = 200
+
+            def __init__(self, headers):
+                self.headers = headers
+
+            @property
+            def content(self):
+                raise AssertionError('Response body was read')
+
+        mock_request_url.return_value = 'http://make_request_200'
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', 'http://leader.mesos')
+        acs_client = acsclient.ACSClient(acs_info)
+        observer = Mock()
+        acs_client.add_request_observer(observer)
+
+        mock_get.return_value = StreamedResponse({'content-length': '42'})
+        acs_client.make_request('mypath', 'get', stream=True)
+        self.assertEquals(observer.request_completed.call_args[0][0].response_bytes, 42)
+        mock_get.return_value = StreamedResponse({})
+        acs_client.make_request('mypath', 'get', stream=True)
+        self.assertEquals(observer.request_completed.call_args[0][0].response_bytes, 0)
+
+    @patch('acsclient.ACSClient.create_request_url')
+    @patch('requests.get', side_effect=Exception('connection failed'))
+    def test_make_request_notifies_observers_on_error(self, mock_get, mock_request_url):
+        mock_request_url.return_value = 'http://make_request_200'
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', 'http://leader.mesos')
+        acs_client = acsclient.ACSClient(acs_info)
+        observer = Mock()
+        acs_client.add_request_observer(observer)
+
+        self.assertRaises(Exception, acs_client.make_request, 'mypath', 'get')
+        record = observer.request_completed.call_args[0][0]
+        self.assertIsNone(record.status_code)
+
+    @patch('acsclient.ACSClient.create_request_url')
+    @patch('requests.get', side_effect=mocked_requests_get)
+    def test_make_request_observer_exception_ignored(self, mock_get, mock_request_url):
+        mock_request_url.return_value = 'http://make_request_200'
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', 'http://leader.mesos')
+        acs_client = acsclient.ACSClient(acs_info)
+        observer = Mock()
+        observer.request_completed.side_effect = Exception('observer failed')
+        acs_client.add_request_observer(observer)
+
+        actual = acs_client.make_request('mypath', 'get')
+        self.assertEquals(actual.status_code, 200)
+
+    def test_get_request_url_direct_with_port(self):
+        acs_info = acsinfo.AcsInfo('myhost', 2200, 'user', 'password', 'pkey', 'http://localhost:8080/')
+        acs_client = acsclient.ACSClient(acs_info)
+
+        actual = acs_client.create_request_url('mypath', 80)
+        self.assertEquals(actual, 'http://localhost:8080/mypath')
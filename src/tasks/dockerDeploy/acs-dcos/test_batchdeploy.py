@@ -0,0 +1,124 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import yaml
+from mock import Mock, patch
+
+import acsclient
+import acsinfo
+import batchdeploy
+from marathonsimulator import MarathonSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class BatchDeployTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_yaml(self, file_name, data):
+        file_path = os.path.join(self.temp_dir, file_name)
+        with open(file_path, 'w') as yaml_stream:
+            yaml.safe_dump(data, yaml_stream)
+        return file_path
+
+    def _create_manifest(self, groups):
+        self._write_yaml('docker-compose.yml', {
+            'version': '2',
+            'services': {'web': {'image': 'nginx', 'expose': [80]}}
+        })
+        return self._write_yaml('manifest.yml', {
+            'defaults': {'compose_file': 'docker-compose.yml', 'minimum_health_capacity': 50},
+            'groups': [{'group_name': name, 'group_qualifier': 'qualifier', 'group_version': 1}
+                       for name in groups]
+        })
+
+    def _get_arguments(self, master_url, parallelism=2):
+        return Mock(dcos_master_url=master_url, acs_host=None, acs_port=None,
+                    acs_username=None, acs_password=None, acs_private_key=None,
+                    parallelism=parallelism, timings_file=None)
+
+    def test_load_manifest(self):
+        groups = batchdeploy.load_manifest(self._create_manifest(['app1', 'app2']))
+        self.assertEquals(len(groups), 2)
+        self.assertEquals(groups[0]['compose_file'],
+                          os.path.join(self.temp_dir, 'docker-compose.yml'))
+        self.assertEquals(groups[0]['group_version'], '1')
+        self.assertEquals(groups[0]['minimum_health_capacity'], 50)
+        self.assertIsNone(groups[0]['registry_host'])
+
+    def test_load_manifest_missing_key(self):
+        manifest_file = self._write_yaml('manifest.yml', {'groups': [{'group_name': 'app'}]})
+        self.assertRaises(ValueError, batchdeploy.load_manifest, manifest_file)
+
+    def test_load_manifest_no_groups(self):
+        manifest_file = self._write_yaml('manifest.yml', {'defaults': {}})
+        self.assertRaises(ValueError, batchdeploy.load_manifest, manifest_file)
+
+    def test_group_log_filter(self):
+        record = logging.LogRecord('test', logging.INFO, None, 0, 'Deploying', None, None)
+        batchdeploy._context.group_name = 'app.1'
+        try:
+            log_filter = batchdeploy.GroupLogFilter()
+            log_filter.filter(record)
+            log_filter.filter(record)
+        finally:
+            batchdeploy._context.group_name = None
+        self.assertEquals(record.getMessage(), '[app.1] Deploying')
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_all(self, mock_sleep):
+        groups = batchdeploy.load_manifest(self._create_manifest(['app1', 'app2', 'app3']))
+        with MarathonSimulator(task_start_latency=(0.01, 0.02), tick_interval=0.01) as simulator:
+            results = batchdeploy.deploy_all(self._get_arguments(simulator.get_url()), groups)
+            self.assertEquals(len(simulator.groups), 3)
+
+        self.assertEquals([r['group_name'] for r in results], ['app1', 'app2', 'app3'])
+        for result in results:
+            self.assertTrue(result['succeeded'])
+            self.assertTrue(result['requests'] > 0)
+            self.assertEquals(result['retry_counters']['retries'], 0)
+
+    @patch('batchdeploy.dockercomposeparser.DockerComposeParser')
+    def test_deploy_group_helper_thread_requests(self, mock_parser):
+        def deploy():
+            acs_client = mock_parser.call_args[1]['acs_client']
+            helper = threading.Thread(target=acs_client.get_request,
+                                      args=('service/marathon/v2/groups',))
+            helper.start()
+            helper.join()
+
+        mock_parser.return_value.__enter__.return_value.deploy.side_effect = deploy
+        group = batchdeploy.load_manifest(self._create_manifest(['app1']))[0]
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            acs_client = acsclient.ACSClient(
+                acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url()))
+            result = batchdeploy.deploy_group(
+                self._get_arguments(simulator.get_url()), acs_client, group)
+
+        self.assertTrue(result['succeeded'])
+        self.assertEquals(result['requests'], 1)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_all_failed_group(self, mock_sleep):
+        groups = batchdeploy.load_manifest(self._create_manifest(['app1', 'app2']))
+        groups[1]['compose_file'] = os.path.join(self.temp_dir, 'missing.yml')
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            results = batchdeploy.deploy_all(self._get_arguments(simulator.get_url()), groups)
+            self.assertEquals(len(simulator.groups), 1)
+
+        self.assertTrue(results[0]['succeeded'])
+        self.assertFalse(results[1]['succeeded'])
+        self.assertTrue('was not found' in results[1]['error'])
@@ -0,0 +1,87 @@
+import unittest
+
+from mock import Mock, patch
+
+import canary
+from canary import CanaryFailed, CanaryRollout, ErrorRateProbe
+
+
+class CanaryTest(unittest.TestCase):
+    def _get_marathon_helper(self, existing_instances=4):
+        marathon_helper = Mock()
+        marathon_helper.get_group.return_value = {
+            'id': '/group.1', 'apps': [{'id': '/group.1/web', 'instances': existing_instances}]}
+        return marathon_helper
+
+    def _get_new_json(self):
+        return {'id': '/group.2', 'apps': [{'id': '/group.2/web', 'instances': 0}]}
+
+    def _get_instances(self, marathon_helper):
+        # The new group is updated, the apps of the existing group are scaled
+        instances = []
+        for name, args, _ in marathon_helper.method_calls:
+            if name == 'update_group':
+                instances.append((args[0]['id'], args[0]['apps'][0]['instances']))
+            elif name == 'scale_apps':
+                instances.append(('/group.1', args[0]['/group.1/web']))
+        return instances
+
+    def test_parse_steps(self):
+        self.assertEquals(canary.parse_steps('10,25,50,100'), [10, 25, 50, 100])
+        self.assertEquals(canary.parse_steps('20, 50'), [20, 50, 100])
+        self.assertRaises(ValueError, canary.parse_steps, '50,25')
+        self.assertRaises(ValueError, canary.parse_steps, '0,100')
+        self.assertRaises(ValueError, canary.parse_steps, 'half')
+
+    def test_steps(self):
+        marathon_helper = self._get_marathon_helper()
+        new_json = self._get_new_json()
+        step_completed = Mock()
+        CanaryRollout(marathon_helper, [25, 50, 100]).run(
+            new_json, {'/group.2/web': 4}, '/group.1', step_completed=step_completed)
+        self.assertEquals(self._get_instances(marathon_helper), [
+            ('/group.2', 1), ('/group.1', 3), ('/group.2', 2), ('/group.1', 2),
+            ('/group.2', 4), ('/group.1', 0)])
+        self.assertEquals(new_json['apps'][0]['instances'], 4)
+        self.assertEquals([call[0][0] for call in step_completed.call_args_list], [1, 2, 3])
+
+    def test_resume(self):
+        # The first step completed in a previous run
+        marathon_helper = self._get_marathon_helper(existing_instances=3)
+        CanaryRollout(marathon_helper, [25, 50, 100]).run(
+            self._get_new_json(), {'/group.2/web': 4}, '/group.1',
+            existing_instances={'/group.1/web': 4}, completed_steps=1)
+        self.assertEquals(self._get_instances(marathon_helper), [
+            ('/group.2', 2), ('/group.1', 2), ('/group.2', 4), ('/group.1', 0)])
+
+    def test_rollback(self):
+        # The existing group was partly scaled down by a previous run
+        marathon_helper = self._get_marathon_helper(existing_instances=2)
+        probe = Mock()
+        probe.check.side_effect = [None, Exception('Error rate is 50%')]
+        with self.assertRaises(CanaryFailed):
+            CanaryRollout(marathon_helper, [25, 100], probe).run(
+                self._get_new_json(), {'/group.2/web': 4}, '/group.1',
+                existing_instances={'/group.1/web': 4})
+        self.assertEquals(self._get_instances(marathon_helper), [
+            ('/group.2', 1), ('/group.1', 3), ('/group.2', 4), ('/group.1', 4)])
+        self.assertFalse(marathon_helper.get_group.called)
+
+    def test_restore_failed(self):
+        marathon_helper = self._get_marathon_helper()
+        marathon_helper.scale_apps.side_effect = Exception('Connection reset')
+        with self.assertRaises(Exception) as context:
+            CanaryRollout(marathon_helper, [25, 100]).run(
+                self._get_new_json(), {'/group.2/web': 4}, '/group.1')
+        # Not restored, so the deployment is kept to be resumed
+        self.assertFalse(isinstance(context.exception, CanaryFailed))
+        self.assertTrue('failed at 25% (Connection reset)' in str(context.exception))
+
+    @patch('canary.time.sleep')
+    @patch('canary.requests.get')
+    def test_error_rate_probe(self, mock_get, mock_sleep):
+        mock_get.side_effect = [Mock(status_code=200), Mock(status_code=503),
+                                Mock(status_code=404), canary.requests.exceptions.Timeout()]
+        probe = ErrorRateProbe('http://web', max_error_rate=0.25, request_count=4)
+        self.assertRaises(Exception, probe.check)
+        self.assertEquals(mock_get.call_count, 4)
@@ -0,0 +1,61 @@
+import unittest
+
+import capacityplanner
+from capacityplanner import CapacityError, CapacityPlanner
+
+
+class CapacityPlannerTest(unittest.TestCase):
+    def _get_agent(self, cpus, used_cpus, mem=4096, used_mem=0, active=True):
+        return {'id': 'agent', 'active': active,
+                'resources': {'cpus': cpus, 'mem': mem},
+                'used_resources': {'cpus': used_cpus, 'mem': used_mem}}
+
+    def _get_group(self, group_id, instances, cpus=0.5):
+        return {'id': group_id, 'apps': [
+            {'id': group_id + '/web', 'instances': instances, 'cpus': cpus, 'mem': 128}]}
+
+    def _get_planner(self):
+        # 0.5 cpus are free on each agent, the existing group uses 2 cpus
+        return CapacityPlanner([self._get_agent(1.5, 1.0), self._get_agent(1.5, 1.0)])
+
+    def test_task_resources(self):
+        self.assertEquals(capacityplanner.get_task_resources({'cpus': 0.5}), (0.5, 128.0))
+        self.assertEquals(capacityplanner.get_task_resources({}), (1.0, 128.0))
+
+    def test_fits(self):
+        planner = CapacityPlanner([self._get_agent(1.6, 0.6), self._get_agent(1.6, 0.6),
+                                   self._get_agent(4.0, 0.0, active=False)])
+        app = {'id': '/web', 'cpus': 0.6, 'mem': 128}
+        self.assertTrue(planner.fits([(app, 2)]))
+        # 1.8 cpus are less than the free 2 cpus, but only one task fits on each agent
+        self.assertFalse(planner.fits([(app, 3)]))
+        # The stopped tasks free their resources on the agents that run them
+        self.assertTrue(planner.fits([(app, 3)], [(app, 2)]))
+
+    def test_plan_blue_green(self):
+        planner = self._get_planner()
+        existing_json = self._get_group('/app.1', 4)
+        marathon_json = self._get_group('/app.2', 0)
+        target_instances = {'/app.2/web': 4}
+        self.assertEquals(planner.plan_blue_green(
+            marathon_json, target_instances, existing_json, 75), 50)
+        self.assertEquals(planner.plan_blue_green(
+            marathon_json, target_instances, existing_json, 25), 25)
+
+    def test_plan_blue_green_infeasible(self):
+        planner = self._get_planner()
+        marathon_json = self._get_group('/app.2', 0, cpus=2.0)
+        self.assertRaises(CapacityError, planner.plan_blue_green,
+                          marathon_json, {'/app.2/web': 1}, None, 50)
+
+    def test_plan_canary(self):
+        planner = self._get_planner()
+        existing_json = self._get_group('/app.1', 4)
+        marathon_json = self._get_group('/app.2', 0)
+        target_instances = {'/app.2/web': 4}
+        self.assertEquals(planner.plan_canary(
+            marathon_json, target_instances, existing_json, [25, 50, 100]), [25, 50, 100])
+        self.assertEquals(planner.plan_canary(
+            marathon_json, target_instances, existing_json, [25, 100]), [25, 50, 100])
+        self.assertRaises(CapacityError, planner.plan_canary,
+                          marathon_json, {'/app.2/web': 8}, existing_json, [100])
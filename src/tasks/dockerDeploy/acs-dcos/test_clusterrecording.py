@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sseclient
+from mock import Mock
+
+import acsclient
+import acsinfo
+from clusterrecording import ClusterRecorder, Recording, ReplayServer
+from requestobserver import RequestRecord
+
+
+class ClusterRecordingTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.recording_file = os.path.join(self.temp_dir, 'recording.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_client(self, server):
+        acs_info = acsinfo.AcsInfo(None, None, None, None, None, server.get_url())
+        return acsclient.ACSClient(acs_info)
+
+    def _get_recording(self):
+        return Recording([
+            {'type': 'request', 'method': 'GET', 'path': 'v2/deployments', 'status': 200,
+             'elapsed': 0, 'content_type': 'application/json', 'body': '[{"id": "1"}]'},
+            {'type': 'request', 'method': 'GET', 'path': 'v2/deployments', 'status': 200,
+             'elapsed': 0, 'content_type': 'application/json', 'body': '[]'},
+            {'type': 'request', 'method': 'GET', 'path': 'v2/groups?embed=group.groups',
+             'status': 200, 'elapsed': 0, 'content_type': 'application/json', 'body': '{}'},
+            {'type': 'stream', 'stream': 0, 'path': 'v2/events'},
+            {'type': 'event', 'stream': 0, 'offset': 0, 'data': '{"eventType": "a"}'},
+            {'type': 'event', 'stream': 0, 'offset': 0.01, 'data': '{"eventType": "b"}'}
+        ])
+
+    def test_replay_in_order(self):
+        with ReplayServer(self._get_recording(), time_scale=0) as server:
+            client = self._get_client(server)
+            first = client.get_request('v2/deployments').json()
+            second = client.get_request('v2/deployments').json()
+            third = client.get_request('v2/deployments').json()
+
+        self.assertEquals(first, [{'id': '1'}])
+        self.assertEquals(second, [])
+        # Last response is repeated
+        self.assertEquals(third, [])
+
+    def test_replay_query_string(self):
+        with ReplayServer(self._get_recording(), time_scale=0) as server:
+            client = self._get_client(server)
+            response = client.get_request('v2/groups?embed=group.groups')
+        self.assertEquals(response.status_code, 200)
+
+    def test_replay_unmatched(self):
+        with ReplayServer(self._get_recording(), time_scale=0) as server:
+            client = self._get_client(server)
+            self.assertRaises(Exception, client.delete_request, 'v2/groups')
+            self.assertEquals(server.unmatched, [('DELETE', 'v2/groups')])
+
+    def test_replay_stream(self):
+        with ReplayServer(self._get_recording(), time_scale=0) as server:
+            messages = sseclient.SSEClient(server.get_url() + '/v2/events')
+            events = [next(messages).data, next(messages).data]
+        self.assertEquals(events, ['{"eventType": "a"}', '{"eventType": "b"}'])
+
+    def test_recorder_save_load(self):
+        recorder = ClusterRecorder()
+        response = Mock(content='{"id": "/group"}', headers={'content-type': 'application/json'})
+        recorder.request_completed(RequestRecord('get', '/v2/groups/group', 200, 0.5,
+                                                 response=response))
+        recorder.request_completed(RequestRecord('get', 'v2/failed', None, 0.5))
+        recorder.event_stream_opened('stream_id', 'v2/events')
+        recorder.event_received('stream_id', '{"eventType": "a"}')
+        recorder.event_received('unknown_stream', '{"eventType": "b"}')
+        recorder.save(self.recording_file)
+
+        recording = Recording.load(self.recording_file)
+        self.assertEquals(recording.responses.keys(), [('GET', 'v2/groups/group')])
+        entry = recording.responses[('GET', 'v2/groups/group')][0]
+        self.assertEquals(entry['status'], 200)
+        self.assertEquals(entry['body'], '{"id": "/group"}')
+        self.assertEquals(len(recording.streams), 1)
+        self.assertEquals(len(recording.streams[0]['events']), 1)
+
+    def test_record_and_replay(self):
+        recorder = ClusterRecorder()
+        with ReplayServer(self._get_recording(), time_scale=0) as server:
+            client = self._get_client(server)
+            client.add_request_observer(recorder)
+            client.get_request('v2/deployments')
+            client.get_request('v2/deployments')
+        recorder.save(self.recording_file)
+
+        with ReplayServer(Recording.load(self.recording_file), time_scale=0) as server:
+            client = self._get_client(server)
+            first = client.get_request('v2/deployments').json()
+            second = client.get_request('v2/deployments').json()
+
+        self.assertEquals(first, [{'id': '1'}])
+        self.assertEquals(second, [])
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import time
+import unittest
+
+from mock import Mock, patch
+
+import deployclient
+import deploydaemon
+from marathonsimulator import MarathonSimulator
+
+_sleep = time.sleep
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class DeployDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, 'deploy.sock')
+        self.log_handler = _ListHandler()
+        logging.root.addHandler(self.log_handler)
+
+    def tearDown(self):
+        logging.root.removeHandler(self.log_handler)
+        shutil.rmtree(self.temp_dir)
+
+    def _get_arguments(self, master_url, group_version, compose_file='test_compose_1.yml'):
+        return Mock(compose_file=os.path.join(test_root, compose_file),
+                    dcos_master_url=master_url, group_name='group',
+                    group_qualifier='qualifier', group_version=group_version,
+                    minimum_health_capacity=50, registry_host=None, registry_username=None,
+                    registry_password=None, acs_host=None, acs_port=None, acs_username=None,
+                    acs_password=None, acs_private_key=None, verbose=False,
+                    slow_request_threshold=5.0, timings_file=None, state_file=None,
+                    resume=False, canary_steps=None, canary_probe_url=None,
+                    canary_max_error_rate=0.05, check_capacity=False, in_place=False)
+
+    def _get_status(self):
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client_socket.connect(self.socket_path)
+        try:
+            client_socket.sendall(json.dumps({'command': 'status'}) + '\n')
+            return json.loads(client_socket.makefile('r').readline())
+        finally:
+            client_socket.close()
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_submit_jobs(self, mock_sleep):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with deploydaemon.DeployDaemon(self.socket_path):
+                for version in ['1', '2']:
+                    exit_code = deployclient.submit_job(
+                        self.socket_path, self._get_arguments(simulator.get_url(), version))
+                    self.assertEquals(exit_code, 0)
+                status = self._get_status()
+            self.assertTrue(simulator.counters['deployments'] > 0)
+
+        self.assertEquals(status['jobs'], 2)
+        self.assertEquals(status['failed_jobs'], 0)
+        # Both jobs used the same client
+        self.assertEquals(status['clients'], 1)
+        self.assertEquals(status['open_clients'], 1)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_retry_budget_per_job(self):
+        remaining = []
+
+        def deploy(compose_parser):
+            remaining.append(compose_parser.acs_client.retry_policy.budget.remaining())
+            compose_parser.acs_client.retry_policy.budget.used += 1
+
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with deploydaemon.DeployDaemon(self.socket_path) as daemon:
+                job_arguments = self._get_arguments(simulator.get_url(), '1')
+                arguments = dict((name, getattr(job_arguments, name))
+                                 for name in deployclient.JOB_ARGUMENTS)
+                with patch('dockercomposeparser.DockerComposeParser.deploy', autospec=True,
+                           side_effect=deploy):
+                    results = [daemon.run_job(arguments, Mock()) for _ in range(2)]
+        self.assertTrue(all(result['succeeded'] for result in results))
+        # Each job starts with the whole budget
+        self.assertEquals(remaining, [30, 30])
+        self.assertTrue('retries' in results[0]['retry_counters'])
+
+    def test_submit_failing_job(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with deploydaemon.DeployDaemon(self.socket_path) as daemon:
+                exit_code = deployclient.submit_job(
+                    self.socket_path,
+                    self._get_arguments(simulator.get_url(), '1', compose_file='missing.yml'))
+                self.assertEquals(exit_code, 1)
+                self.assertEquals(daemon.counters['failed_jobs'], 1)
+                # Client of the failed job is closed
+                self.assertEquals(daemon.get_status()['open_clients'], 0)
+
+        messages = [record.getMessage() for record in self.log_handler.records
+                    if record.levelno == logging.ERROR]
+        self.assertTrue(any('was not found' in message for message in messages))
+
+    @patch('deployclient.socket.socket')
+    def test_submit_job_paths(self, mock_socket):
+        mock_socket.return_value.makefile.return_value = [
+            json.dumps({'type': 'result', 'succeeded': True}) + '\n']
+        arguments = self._get_arguments('http://localhost', '1')
+        arguments.timings_file = 'timings.json'
+        arguments.state_file = 'state.json'
+        self.assertEquals(deployclient.submit_job(self.socket_path, arguments), 0)
+        job = json.loads(mock_socket.return_value.sendall.call_args[0][0])
+        self.assertEquals(job['arguments']['timings_file'], os.path.abspath('timings.json'))
+        self.assertEquals(job['arguments']['state_file'], os.path.abspath('state.json'))
+
+    def test_socket_permissions(self):
+        server_bind = deploydaemon._ThreadingUnixServer.server_bind
+        modes = []
+
+        def bind_and_stat(server):
+            server_bind(server)
+            modes.append(stat.S_IMODE(os.stat(self.socket_path).st_mode))
+
+        umask = os.umask(0o022)
+        try:
+            with patch.object(deploydaemon._ThreadingUnixServer, 'server_bind', bind_and_stat):
+                with deploydaemon.DeployDaemon(self.socket_path):
+                    self.assertEquals(os.umask(0o022), 0o022)
+        finally:
+            os.umask(umask)
+        self.assertEquals(modes, [0o600])
+
+    def test_submit_job_no_daemon(self):
+        self.assertRaises(socket.error, deployclient.submit_job, self.socket_path,
+                          self._get_arguments('http://localhost', '1'))
+
+    def test_invalid_job(self):
+        with deploydaemon.DeployDaemon(self.socket_path):
+            client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client_socket.connect(self.socket_path)
+            client_socket.sendall('not json\n')
+            result = json.loads(client_socket.makefile('r').readline())
+            client_socket.close()
+        self.assertFalse(result['succeeded'])
@@ -0,0 +1,94 @@
+import os
+import time
+import unittest
+
+from mock import patch
+
+import deploymentplan
+import dockercomposeparser
+from marathonsimulator import MarathonSimulator
+
+_sleep = time.sleep
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class DeploymentPlanTest(unittest.TestCase):
+    def test_filter_like(self):
+        existing = {'id': '/app', 'version': '2017', 'instances': 2,
+                    'container': {'docker': {'image': 'nginx', 'forcePullImage': False}},
+                    'ports': [{'port': 1, 'name': 'a'}]}
+        target = {'id': '/app', 'instances': 1, 'container': {'docker': {'image': 'nginx'}},
+                  'ports': [{'port': 2}], 'cmd': 'run'}
+        self.assertEquals(deploymentplan.filter_like(existing, target),
+                          {'id': '/app', 'instances': 2,
+                           'container': {'docker': {'image': 'nginx'}},
+                           'ports': [{'port': 1}]})
+
+    def test_add_diff(self):
+        plan = deploymentplan.DeploymentPlan('/group.1')
+        plan.add_diff('same', {'a': 1}, {'a': 1})
+        plan.add_diff('changed', {'a': 1}, {'a': 2})
+        plan.add_diff('new', None, {'a': 1})
+        self.assertEquals([diff['name'] for diff in plan.diffs], ['changed', 'new'])
+        self.assertTrue('-  "a": 1' in plan.diffs[0]['diff'])
+        self.assertTrue('+  "a": 2' in plan.diffs[0]['diff'])
+
+    def test_estimated_duration(self):
+        plan = deploymentplan.DeploymentPlan('/group.1')
+        plan.add_step('first')
+        plan.add_step('second', 10)
+        self.assertEquals(plan.get_estimated_duration(), deploymentplan.STEP_SECONDS + 10)
+        self.assertEquals(plan.to_dict()['estimated_duration'], deploymentplan.STEP_SECONDS + 10)
+
+
+class DockerComposeParserPlanTest(unittest.TestCase):
+    def _get_parser(self, simulator, group_version, minimum_health_capacity=50):
+        return dockercomposeparser.DockerComposeParser(
+            os.path.join(test_root, 'test_compose_1.yml'), simulator.get_url(), None, None,
+            None, None, None, 'group', 'qualifier', group_version, None, None, None,
+            minimum_health_capacity)
+
+    def test_plan_first_deployment(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with self._get_parser(simulator, '1') as compose_parser:
+                plan = compose_parser.plan()
+            self.assertEquals(simulator.counters['requests'], 1)
+            self.assertEquals(simulator.groups, {})
+
+        self.assertIsNone(plan.existing_group_id)
+        self.assertEquals(len(plan.steps), 3)
+        self.assertEquals(plan.instances['service-a'], {'deployed': 0, 'initial': 1, 'target': 1})
+        self.assertEquals(sorted([diff['name'] for diff in plan.diffs]), ['service-a', 'service-b'])
+        app_ids = sorted([app['id'] for app in plan.target['apps']])
+        self.assertEquals(app_ids, ['/group.16bce69b.1/service-a', '/group.16bce69b.1/service-b'])
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_plan_update(self, mock_sleep):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with self._get_parser(simulator, '1') as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+            for app in simulator.groups['/group.16bce69b.1']['apps']:
+                app['instances'] = 4
+
+            requests = simulator.counters['requests']
+            with self._get_parser(simulator, '2', minimum_health_capacity=75) as compose_parser:
+                plan = compose_parser.plan()
+            self.assertEquals(simulator.counters['requests'] - requests, 1)
+            self.assertEquals(simulator.groups.keys(), ['/group.16bce69b.1'])
+
+        self.assertEquals(plan.existing_group_id, '/group.16bce69b.1')
+        self.assertEquals(len(plan.steps), 7)
+        self.assertEquals(plan.instances['service-b'], {'deployed': 4, 'initial': 3, 'target': 4})
+        # Only the instance counts differ, private IPs and group IDs are ignored
+        self.assertEquals(plan.diffs, [])
+
+    def test_plan_same_version(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            simulator.add_group({'id': '/group.16bce69b.1', 'apps': []})
+            with self._get_parser(simulator, '1') as compose_parser:
+                self.assertRaises(Exception, compose_parser.plan)
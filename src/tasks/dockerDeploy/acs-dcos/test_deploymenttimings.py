@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+import acsclient
+import acsinfo
+import deploymenttimings
+import dockercomposeparser
+import marathon
+from marathonsimulator import MarathonSimulator
+
+_sleep = time.sleep
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class TimingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.timings_file = os.path.join(self.temp_dir, 'timings.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_percentile(self):
+        values = range(1, 101)
+        self.assertEquals(deploymenttimings.get_percentile(values, 50), 51)
+        self.assertEquals(deploymenttimings.get_percentile(values, 99), 99)
+        self.assertEquals(deploymenttimings.get_percentile([5], 99), 5)
+
+    def test_get_timeout(self):
+        store = deploymenttimings.TimingStore()
+        for _ in range(store.min_samples - 1):
+            store.record('/group', 'web', 100)
+        # Not enough timings yet
+        self.assertEquals(store.get_timeout('/group', 'web', 300), 300)
+        self.assertIsNone(store.get_estimate('/group', 'worker'))
+
+        store.record('/group', 'web', 100)
+        self.assertEquals(store.get_timeout('/group', 'web', 300), 100 * store.timeout_factor)
+        self.assertEquals(store.get_estimate('/group', 'web'), 100)
+
+    def test_get_timeout_limits(self):
+        store = deploymenttimings.TimingStore()
+        for _ in range(store.min_samples):
+            store.record('group', 'fast', 1)
+            store.record('group', 'slow', store.max_timeout)
+        self.assertEquals(store.get_timeout('group', 'fast', 300), store.min_timeout)
+        self.assertEquals(store.get_timeout('group', 'slow', 300), store.max_timeout)
+
+    def test_max_samples(self):
+        store = deploymenttimings.TimingStore()
+        for duration in range(store.max_samples + 10):
+            store.record('group', 'web', duration)
+        timings = store.get_timings('group', 'web')
+        self.assertEquals(len(timings), store.max_samples)
+        self.assertEquals(timings[0], 10)
+
+    def test_save_merges_timings(self):
+        first_store = deploymenttimings.TimingStore(self.timings_file)
+        second_store = deploymenttimings.TimingStore(self.timings_file)
+        first_store.record('group', 'web', 1)
+        second_store.record('group', 'web', 2)
+
+        self.assertEquals(deploymenttimings.TimingStore(self.timings_file).get_timings(
+            'group', 'web'), [1, 2])
+        self.assertEquals(os.listdir(self.temp_dir), ['timings.json'])
+
+    @patch('logging.warning')
+    def test_invalid_file(self, mock_warning):
+        with open(self.timings_file, 'w') as timings_file:
+            timings_file.write('not json')
+        store = deploymenttimings.TimingStore(self.timings_file)
+        self.assertEquals(store.timings, {})
+        store.record('group', 'web', 1)
+        with open(self.timings_file) as timings_file:
+            self.assertEquals(json.load(timings_file), {'group/web': [1]})
+        self.assertTrue(mock_warning.called)
+
+
+class MarathonTimingsTest(unittest.TestCase):
+    def _get_marathon(self, simulator, timing_store):
+        acs_info = acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url())
+        marathon_helper = marathon.Marathon(acsclient.ACSClient(acs_info))
+        marathon_helper.timing_store = timing_store
+        return marathon_helper
+
+    def _get_group(self, instances=1):
+        return {
+            'id': '/mygroup',
+            'apps': [{'id': '/mygroup/service-a', 'instances': instances, 'cpus': 0.5}]
+        }
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_records_timings(self, mock_sleep):
+        timing_store = deploymenttimings.TimingStore()
+        with MarathonSimulator(task_start_latency=(0.05, 0.05), tick_interval=0.01) as simulator:
+            with dockercomposeparser.DockerComposeParser(
+                os.path.join(test_root, 'test_compose_1.yml'), simulator.get_url(), None, None,
+                None, None, None, 'group', 'qualifier', '1', None, None, None, 50,
+                timing_store=timing_store) as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+
+        # Deployments with 0 instances are not timed
+        self.assertEquals(sorted(timing_store.timings.keys()),
+                          ['group.16bce69b/service-a', 'group.16bce69b/service-b'])
+        self.assertEquals(len(timing_store.get_timings('/group.16bce69b', 'service-a')), 1)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_adaptive_timeout(self, mock_sleep):
+        timing_store = deploymenttimings.TimingStore()
+        timing_store.min_timeout = 0.1
+        for _ in range(timing_store.min_samples):
+            timing_store.record('/mygroup', 'service-a', 0.01)
+
+        with MarathonSimulator(task_start_latency=(5.0, 5.0), tick_interval=0.01) as simulator:
+            marathon_helper = self._get_marathon(simulator, timing_store)
+            start_time = time.time()
+            self.assertRaises(Exception, marathon_helper.deploy_group, self._get_group())
+            self.assertTrue(time.time() - start_time < 2)
+
+    @patch('logging.info')
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_progress(self, mock_sleep, mock_info):
+        timing_store = deploymenttimings.TimingStore()
+        for _ in range(timing_store.min_samples):
+            timing_store.record('/mygroup', 'service-a', 10)
+
+        with MarathonSimulator(task_start_latency=(0.3, 0.3), tick_interval=0.01) as simulator:
+            marathon_helper = self._get_marathon(simulator, timing_store)
+            marathon_helper.progress_interval = 0.1
+            marathon_helper.deploy_group(self._get_group())
+
+        messages = [call[0][0] for call in mock_info.call_args_list]
+        self.assertTrue('Waiting for deployment "%s": %ds elapsed, about %ds remaining' in messages)
+        self.assertEquals(len(timing_store.get_timings('/mygroup', 'service-a')),
+                          timing_store.min_samples + 1)
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import deploystate
+from deploystate import DeployState
+
+
+class DeployStateTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_phases(self):
+        state = DeployState(self.file_path, '/group.1')
+        self.assertFalse(state.is_completed(deploystate.INITIAL_DEPLOY))
+        state.complete(deploystate.INITIAL_DEPLOY, existing_group_id='/group.0')
+        state.complete(deploystate.SCALE_OLD)
+        state.save(canary_completed_steps=2)
+
+        state = DeployState(self.file_path, '/group.1')
+        self.assertTrue(state.is_completed(deploystate.VIP_UPDATE))
+        self.assertTrue(state.is_completed(deploystate.SCALE_OLD))
+        self.assertFalse(state.is_completed(deploystate.UPDATE_NEW))
+        self.assertEquals(state.data, {'existing_group_id': '/group.0',
+                                       'canary_completed_steps': 2})
+
+        state.remove()
+        self.assertFalse(os.path.isfile(self.file_path))
+        self.assertIsNone(DeployState(self.file_path, '/group.1').phase)
+
+    def test_other_group_ignored(self):
+        DeployState(self.file_path, '/group.1').complete(deploystate.VIP_UPDATE)
+        state = DeployState(self.file_path, '/group.2')
+        self.assertIsNone(state.phase)
+        self.assertFalse(state.is_completed(deploystate.INITIAL_DEPLOY))
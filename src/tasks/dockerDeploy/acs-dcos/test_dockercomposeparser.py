@@ -415,4 +415,34 @@ class DockerComposeParserTests(unittest.TestCase):
                     }]
                 }
             }}]
-        self.assertFalse(p._has_private_ip(marathon_apps, '/mygroup/SERVICE-a'))
\ No newline at end of file
+        self.assertFalse(p._has_private_ip(marathon_apps, '/mygroup/SERVICE-a'))
+
+    def test_get_initial_instances(self):
+        p = dockercomposeparser.DockerComposeParser(
+            self.test_compose_file, 'masterurl', None, None, None, None, None,
+            'groupname', 'groupqualifier', '1',
+            'registryhost', 'registryuser', 'registrypassword', 50)
+        self.assertEquals(p._get_initial_instances(3), 1)
+        self.assertEquals(p._get_initial_instances(4), 2)
+        self.assertEquals(p._get_initial_instances(1), 0)
+
+        # Rounded up, like the capacity is planned
+        p.check_capacity = True
+        self.assertEquals(p._get_initial_instances(3), 2)
+        self.assertEquals(p._get_initial_instances(4), 2)
+        self.assertEquals(p._get_initial_instances(1), 1)
+
+    def test_move_to_group(self):
+        p = dockercomposeparser.DockerComposeParser(
+            self.test_compose_file, 'masterurl', None, None, None, None, None,
+            'groupname', 'groupqualifier', '1',
+            'registryhost', 'registryuser', 'registrypassword', 100)
+        marathon_json = {'id': '/mygroup.2', 'apps': [
+            {'id': '/mygroup.2/web', 'dependencies': ['/mygroup.2/db', '/other/db'],
+             'env': {'GROUP': '/mygroup.2/web'}},
+            {'id': '/mygroup.2/db'}]}
+        p._move_to_group(marathon_json, '/mygroup.1')
+        self.assertEquals(marathon_json, {'id': '/mygroup.1', 'apps': [
+            {'id': '/mygroup.1/web', 'dependencies': ['/mygroup.1/db', '/other/db'],
+             'env': {'GROUP': '/mygroup.2/web'}},
+            {'id': '/mygroup.1/db'}]})
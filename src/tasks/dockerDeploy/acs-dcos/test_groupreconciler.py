@@ -0,0 +1,66 @@
+import unittest
+
+from mock import Mock
+
+from groupreconciler import GroupReconciler
+
+
+class GroupReconcilerTest(unittest.TestCase):
+    def _get_app(self, name, image='web:1', service_port=None):
+        port_mapping = {'containerPort': 80, 'hostPort': 0}
+        if service_port:
+            port_mapping['servicePort'] = service_port
+        return {'id': '/group.1/' + name, 'instances': 2,
+                'container': {'docker': {'image': image, 'portMappings': [port_mapping]}}}
+
+    def _get_existing_json(self):
+        apps = [self._get_app('web', service_port=10000), self._get_app('worker')]
+        for app in apps:
+            app.update({'version': '2017-01-01', 'tasksRunning': 2})
+        return {'id': '/group.1', 'apps': apps}
+
+    def test_changes(self):
+        reconciler = GroupReconciler(Mock(), 50)
+        marathon_json = {'id': '/group.1', 'apps': [
+            self._get_app('web'), self._get_app('api', 'api:1')]}
+        existing_json = self._get_existing_json()
+        reconciler.keep_service_ports(existing_json, marathon_json)
+        self.assertEquals(reconciler.get_changes(existing_json, marathon_json),
+                          (['/group.1/api'], [], ['/group.1/worker']))
+
+        marathon_json['apps'][0]['container']['docker']['image'] = 'web:2'
+        self.assertEquals(reconciler.get_changes(existing_json, marathon_json),
+                          (['/group.1/api'], ['/group.1/web'], ['/group.1/worker']))
+
+    def test_reconcile(self):
+        marathon_helper = Mock()
+        reconciler = GroupReconciler(marathon_helper, 50)
+        marathon_json = {'id': '/group.1', 'apps': [
+            self._get_app('web', 'web:2'), self._get_app('worker')]}
+        self.assertEquals(reconciler.reconcile(marathon_json, self._get_existing_json()),
+                          ['/group.1/web'])
+
+        group_json = marathon_helper.update_group.call_args[0][0]
+        web, worker = group_json['apps']
+        self.assertEquals(web['container']['docker']['portMappings'][0]['servicePort'], 10000)
+        self.assertEquals(web['upgradeStrategy'],
+                          {'minimumHealthCapacity': 0.5, 'maximumOverCapacity': 0.0})
+        # Unchanged apps are PUT as deployed, without the read-only fields
+        self.assertEquals(worker, self._get_app('worker'))
+        self.assertEquals(marathon_helper.update_group.call_args[1],
+                          {'started_app_ids': ['/group.1/web']})
+
+    def test_up_to_date(self):
+        marathon_helper = Mock()
+        reconciler = GroupReconciler(marathon_helper, 50)
+        marathon_json = {'id': '/group.1', 'apps': [self._get_app('web'), self._get_app('worker')]}
+        self.assertEquals(reconciler.reconcile(marathon_json, self._get_existing_json()), [])
+        self.assertFalse(marathon_helper.update_group.called)
+
+    def test_current_version(self):
+        marathon_helper = Mock()
+        marathon_helper.get_group_versions.return_value = ['2017-01-02', '2017-01-01']
+        self.assertEquals(GroupReconciler(marathon_helper, 50).get_current_version('/group.1'),
+                          '2017-01-02')
+        marathon_helper.get_group_versions.return_value = []
+        self.assertIsNone(GroupReconciler(marathon_helper, 50).get_current_version('/group.1'))
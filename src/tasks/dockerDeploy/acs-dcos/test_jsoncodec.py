@@ -0,0 +1,56 @@
+import json
+import unittest
+
+from mock import Mock, patch
+
+import jsoncodec
+from marathon import Marathon
+
+
+class JsonCodecTest(unittest.TestCase):
+    def tearDown(self):
+        jsoncodec.set_codec(None)
+
+    def test_select_keys(self):
+        data = {'id': '/', 'apps': [], 'groups': [
+            {'id': '/a', 'apps': [{'id': '/a/b'}], 'groups': [{'id': '/a/c', 'groups': []}]}]}
+        self.assertEquals(jsoncodec.select_keys(data, Marathon.GROUP_IDS), {
+            'id': '/', 'groups': [{'id': '/a', 'groups': [{'id': '/a/c', 'groups': []}]}]})
+        self.assertEquals(jsoncodec.select_keys(data, None), data)
+        self.assertEquals(jsoncodec.select_keys([{'id': 'a', 'version': 1}, 2], {'id': None}),
+                          [{'id': 'a'}, 2])
+
+    def test_select_keys_state(self):
+        state = {'id': 'agent', 'frameworks': [{
+            'id': 'f', 'name': 'marathon', 'completed_executors': [],
+            'executors': [{'id': 'e', 'directory': '/d', 'resources': {}, 'tasks': [{'id': 't'}],
+                           'queued_tasks': [], 'completed_tasks': []}]}]}
+        executors = {'id': None, 'directory': None, 'tasks': None, 'completed_tasks': None}
+        selection = {'frameworks': {'name': None, 'executors': executors,
+                                    'completed_executors': executors}}
+        self.assertEquals(jsoncodec.select_keys(state, selection), {
+            'frameworks': [{'name': 'marathon', 'completed_executors': [], 'executors': [
+                {'id': 'e', 'directory': '/d', 'tasks': [{'id': 't'}], 'completed_tasks': []}]}]})
+
+    def test_get_codec_fallback(self):
+        with patch('jsoncodec.ujson', None):
+            jsoncodec.set_codec(None)
+            self.assertEquals(jsoncodec.get_codec().name, 'json')
+        with patch('jsoncodec.ujson', Mock()):
+            jsoncodec.set_codec(None)
+            self.assertEquals(jsoncodec.get_codec().name, 'ujson')
+
+    def test_decode_response(self):
+        response = Mock(content=json.dumps({'apps': [{'id': '/a', 'cpus': 1}]}))
+        self.assertEquals(jsoncodec.decode_response(response, Marathon.APP_IDS),
+                          {'apps': [{'id': '/a'}]})
+        codec = Mock()
+        codec.loads.return_value = {'id': '/'}
+        jsoncodec.set_codec(codec)
+        self.assertEquals(jsoncodec.decode_response(response), {'id': '/'})
+        codec.loads.assert_called_once_with(response.content)
+
+    def test_decode_response_without_content(self):
+        response = Mock(spec=['json'])
+        response.json.return_value = {'id': '/'}
+        self.assertEquals(jsoncodec.decode_response(response), {'id': '/'})
@@ -0,0 +1,207 @@
+import time
+import unittest
+
+import requests
+from mock import Mock, patch
+
+import acsclient
+import acsinfo
+import marathon
+from marathonsimulator import MarathonSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class MarathonVerifyDeploymentTest(unittest.TestCase):
+    def _get_marathon(self, simulator):
+        acs_info = acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url())
+        return marathon.Marathon(acsclient.ACSClient(acs_info))
+
+    def _get_group(self, health_checks=True):
+        app = {'id': '/mygroup/service-a', 'instances': 2, 'cpus': 0.5}
+        if health_checks:
+            app['healthChecks'] = [{'protocol': 'HTTP', 'path': '/'}]
+        return {'id': '/mygroup', 'apps': [app, {'id': '/mygroup/service-b', 'instances': 1}]}
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_healthy(self, mock_sleep):
+        with MarathonSimulator(task_start_latency=(0.05, 0.05), tick_interval=0.01) as simulator:
+            self._get_marathon(simulator).deploy_group(self._get_group())
+            group = simulator.get_group('/mygroup', [])[1]
+        self.assertEquals(group['apps'][0]['tasksHealthy'], 2)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_unhealthy(self, mock_sleep):
+        with MarathonSimulator(task_start_latency=(0.05, 0.05), tick_interval=0.01,
+                               unhealthy_apps=['/mygroup/service-a']) as simulator:
+            marathon_helper = self._get_marathon(simulator)
+            with self.assertRaises(Exception) as context:
+                marathon_helper.deploy_group(self._get_group())
+        self.assertTrue('"/mygroup/service-a" has 0 of 2 tasks healthy' in str(context.exception))
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_completed_unhealthy(self, mock_sleep):
+        with MarathonSimulator(task_start_latency=(0, 0), tick_interval=0.01,
+                               unhealthy_apps=['/mygroup/service-a']) as simulator:
+            marathon_helper = self._get_marathon(simulator)
+            get_deployment = marathon_helper.get_deployment
+
+            def get_completed_deployment(deployment_id):
+                # The deployment ends before it is looked up
+                while simulator.deployments:
+                    _sleep(0.01)
+                return get_deployment(deployment_id)
+
+            marathon_helper.get_deployment = get_completed_deployment
+            with self.assertRaises(Exception) as context:
+                marathon_helper.deploy_group(self._get_group())
+        self.assertTrue('"/mygroup/service-a" has 0 of 2 tasks healthy' in str(context.exception))
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_created_by_failed_request(self, mock_sleep):
+        post = requests.post
+
+        def post_and_fail(*args, **kwargs):
+            post(*args, **kwargs)
+            raise requests.exceptions.ConnectionError('connection dropped')
+
+        with MarathonSimulator(task_start_latency=(0.05, 0.05), tick_interval=0.01) as simulator:
+            marathon_helper = self._get_marathon(simulator)
+            with patch('acsclient.requests.post', side_effect=post_and_fail):
+                self.assertIsNone(marathon_helper.deploy_group(self._get_group()))
+            group = simulator.get_group('/mygroup', [])[1]
+        self.assertEquals(group['apps'][0]['tasksHealthy'], 2)
+        counters = marathon_helper.acs_client.retry_policy.counters
+        self.assertEquals(counters['duplicate_prevented'], 1)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_scale_down_not_verified(self, mock_sleep):
+        with MarathonSimulator(task_start_latency=(0.05, 0.05), tick_interval=0.01,
+                               unhealthy_apps=['/mygroup/service-a']) as simulator:
+            simulator.add_group(self._get_group())
+            self._get_marathon(simulator).scale_group('/mygroup', 0.5)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_scale_group_absolute(self, mock_sleep):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            group = self._get_group(health_checks=False)
+            group['apps'][0]['instances'] = 4
+            simulator.add_group(group)
+            marathon_helper = self._get_marathon(simulator)
+            task_ids = [task.task_id for task in simulator._active_tasks('/mygroup/service-a')]
+            # Repeating the request doesn't scale the group again
+            marathon_helper.scale_group('/mygroup', 0.5)
+            marathon_helper.scale_group('/mygroup', 0.5, instances={'/mygroup/service-a': 4})
+            apps = simulator.groups['/mygroup']['apps']
+            self.assertEquals([app['instances'] for app in apps], [2, 1])
+            # The definitions didn't change, so the remaining tasks kept running
+            for task in simulator._active_tasks('/mygroup/service-a'):
+                self.assertTrue(task.task_id in task_ids)
+
+    @patch('marathon.Marathon._wait_for_deployment_complete')
+    def test_scale_group_partial_update(self, mock_wait):
+        acs_client = Mock()
+        marathon.Marathon(acs_client).scale_group(
+            '/mygroup', 0.5, instances={'/mygroup/service-a': 4, '/mygroup/service-b': 1})
+        # Only the instances are sent, the definitions are not read or PUT again
+        self.assertFalse(acs_client.get_request.called)
+        acs_client.put_request.assert_called_once_with(
+            'service/marathon/v2/apps', put_data=None,
+            json=[{'id': '/mygroup/service-a', 'instances': 2},
+                  {'id': '/mygroup/service-b', 'instances': 1}])
+
+    def test_scaled_instances(self):
+        self.assertEquals(marathon.get_scaled_instances(4, 50), 2)
+        self.assertEquals(marathon.get_scaled_instances(3, 50), 2)
+        self.assertEquals(marathon.get_scaled_instances(10, 30), 3)
+        self.assertEquals(marathon.get_scaled_instances(10, 0.3 * 100), 3)
+        self.assertEquals(marathon.get_scaled_instances(5, 0), 0)
+
+    def test_app_definition(self):
+        app = {'id': '/mygroup/service-a', 'instances': 2, 'version': '2017-01-01',
+               'tasksRunning': 2, 'deployments': []}
+        self.assertEquals(marathon.get_app_definition(app),
+                          {'id': '/mygroup/service-a', 'instances': 2})
+
+    def test_instance_count_failures(self):
+        marathon_helper = marathon.Marathon(Mock())
+        marathon_helper.acs_client.get_request.return_value.json.return_value = {
+            'id': '/mygroup',
+            'apps': [{'id': '/mygroup/a', 'instances': 2, 'tasksRunning': 1},
+                     {'id': '/mygroup/b', 'instances': 1, 'tasksRunning': 1},
+                     {'id': '/mygroup/c', 'instances': 2, 'tasksRunning': 2, 'tasksHealthy': 1,
+                      'healthChecks': [{}]}]
+        }
+        monitor = Mock()
+        monitor.get_unhealthy_tasks.side_effect = \
+            lambda app_id: ['c.1'] if app_id == '/mygroup/c' else []
+
+        failures = marathon_helper._get_instance_count_failures(
+            ['/mygroup/a', '/mygroup/b', '/mygroup/c', '/mygroup/d'], monitor)
+        self.assertEquals(failures, ['"/mygroup/a" has 1 of 2 tasks running',
+                                     '"/mygroup/c" has 1 of 2 tasks healthy (unhealthy: c.1)',
+                                     '"/mygroup/d" was not found'])
+        # One request for all apps in the group
+        marathon_helper.acs_client.get_request.assert_called_once_with(
+            'service/marathon/v2/groups/mygroup?embed=group.apps&embed=group.apps.counts')
+
+    @patch('marathon_deployments.DeploymentMonitor.deployment_failed', return_value=True)
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deployment_failed_event(self, mock_sleep, mock_deployment_failed):
+        with MarathonSimulator(task_start_latency=(5.0, 5.0), tick_interval=0.01) as simulator:
+            marathon_helper = self._get_marathon(simulator)
+            start_time = time.time()
+            with self.assertRaises(Exception) as context:
+                marathon_helper.deploy_group(self._get_group())
+            self.assertTrue(time.time() - start_time < 2)
+        self.assertTrue('failed' in str(context.exception))
+
+
+class MarathonQueryTest(unittest.TestCase):
+    def _get_marathon(self, simulator):
+        acs_info = acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url())
+        return marathon.Marathon(acsclient.ACSClient(acs_info))
+
+    def test_app_exists_filtered(self):
+        with MarathonSimulator() as simulator:
+            simulator.add_group({'id': '/mygroup', 'apps': [
+                {'id': '/mygroup/service-a', 'instances': 0},
+                {'id': '/mygroup/service-a-2', 'instances': 0}]})
+            marathon_helper = self._get_marathon(simulator)
+            self.assertTrue(marathon_helper.app_exists('/mygroup/service-a'))
+            self.assertFalse(marathon_helper.app_exists('/mygroup/service'))
+
+    def test_get_group_selection(self):
+        with MarathonSimulator() as simulator:
+            simulator.add_group({'id': '/mygroup', 'apps': [
+                {'id': '/mygroup/service-a', 'instances': 0, 'cpus': 0.5, 'container': {
+                    'docker': {'image': 'nginx', 'portMappings': [{'containerPort': 80}]}}}]})
+            group = self._get_marathon(simulator).get_group(
+                '/mygroup', marathon.Marathon.GROUP_APPS)
+        self.assertEquals(sorted(group.keys()), ['apps', 'id'])
+        self.assertEquals(sorted(group['apps'][0].keys()), ['container', 'id', 'instances'])
+        self.assertEquals(group['apps'][0]['container']['docker']['portMappings'][0][
+            'containerPort'], 80)
+        self.assertFalse('image' in group['apps'][0]['container']['docker'])
+
+    def test_get_deployment(self):
+        marathon_helper = marathon.Marathon(Mock())
+        marathon_helper.acs_client.get_request.return_value.json.return_value = [
+            {'id': 'a', 'affectedApps': ['/a'], 'steps': []},
+            {'id': 'b', 'affectedApps': ['/b'], 'steps': []}]
+        self.assertEquals(marathon_helper.get_deployment('b'),
+                          {'id': 'b', 'affectedApps': ['/b'], 'steps': []})
+        self.assertIsNone(marathon_helper.get_deployment('c'))
+
+    def test_find_deployment(self):
+        marathon_helper = marathon.Marathon(Mock())
+        marathon_helper.acs_client.get_request.return_value.json.return_value = [
+            {'id': 'a', 'affectedApps': ['/a'], 'steps': []},
+            {'id': 'b', 'affectedApps': ['/b', '/c'], 'steps': []}]
+        self.assertEquals(marathon_helper.find_deployment(['/c', '/d'])['id'], 'b')
+        self.assertIsNone(marathon_helper.find_deployment(['/d']))
+        self.assertIsNone(marathon_helper.find_deployment(None))
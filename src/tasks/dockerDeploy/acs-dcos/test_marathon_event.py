@@ -95,3 +95,12 @@ class MarathonEventTest(unittest.TestCase):
     def test_is_task_running_false(self):
         m = MarathonEvent({'taskStatus': 'BLAH'})
         self.assertFalse(m.is_task_running())
+
+    def test_is_health_status_changed_true(self):
+        m = MarathonEvent({'eventType': 'health_status_changed_event', 'alive': False})
+        self.assertTrue(m.is_health_status_changed())
+        self.assertFalse(m.is_alive())
+
+    def test_is_alive_true(self):
+        m = MarathonEvent({'eventType': 'health_status_changed_event', 'alive': True})
+        self.assertTrue(m.is_alive())
@@ -0,0 +1,460 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import yaml
+from mock import Mock, patch
+
+import acsclient
+import acsinfo
+import capacityplanner
+import deploystate
+import dockercomposeparser
+import marathon
+from marathonsimulator import MarathonSimulator
+from mesos import Mesos
+
+_sleep = time.sleep
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class MarathonSimulatorTest(unittest.TestCase):
+    def _get_client(self, simulator):
+        acs_info = acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url())
+        return acsclient.ACSClient(acs_info)
+
+    def _get_group(self, instances=2):
+        return {
+            'id': '/mygroup',
+            'apps': [{'id': '/mygroup/service-a', 'instances': instances, 'cpus': 0.5,
+                      'container': {'docker': {'portMappings': [{'containerPort': 80}]}}}]
+        }
+
+    def _wait_for_deployments(self, client, timeout=5):
+        start_time = time.time()
+        while client.get_request('service/marathon/v2/deployments').json():
+            if time.time() - start_time > timeout:
+                self.fail('Deployment did not complete')
+            _sleep(0.01)
+
+    def test_create_group(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            client = self._get_client(simulator)
+            response = client.post_request('service/marathon/v2/groups',
+                                           json.dumps(self._get_group()))
+            self.assertEquals(response.status_code, 201)
+            self.assertTrue('deploymentId' in response.json())
+            self._wait_for_deployments(client)
+
+            group = client.get_request('service/marathon/v2/groups/mygroup').json()
+            self.assertEquals(group['apps'][0]['tasksRunning'], 2)
+            port_mapping = group['apps'][0]['container']['docker']['portMappings'][0]
+            self.assertEquals(port_mapping['servicePort'], 10000)
+
+    def test_concurrent_requests(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            client = self._get_client(simulator)
+
+            def create_group(index):
+                group = self._get_group()
+                group['id'] = '/mygroup{}'.format(index)
+                group['apps'][0]['id'] = group['id'] + '/service-a'
+                client.post_request('service/marathon/v2/groups', json.dumps(group))
+
+            threads = [threading.Thread(target=create_group, args=(index,))
+                       for index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEquals(simulator.counters['requests'], 8)
+            self.assertEquals(simulator.counters['deployments'], 8)
+            self._wait_for_deployments(client)
+
+            apps = client.get_request('service/marathon/v2/apps').json()['apps']
+            service_ports = [app['container']['docker']['portMappings'][0]['servicePort']
+                             for app in apps]
+            self.assertEquals(sorted(service_ports), range(10000, 10008))
+            self.assertEquals(len(simulator.tasks), 16)
+
+    def test_get_group_ids(self):
+        with MarathonSimulator() as simulator:
+            simulator.add_group(self._get_group())
+            marathon_helper = marathon.Marathon(self._get_client(simulator))
+            self.assertEquals(marathon_helper.get_group_ids('/my'), ['/mygroup'])
+            self.assertTrue(marathon_helper.group_exists('/mygroup'))
+
+    def test_scale_and_delete_group(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            simulator.add_group(self._get_group(instances=4))
+            client = self._get_client(simulator)
+            client.put_request('service/marathon/v2/groups/mygroup', json={'scaleBy': 0.5})
+            group = client.get_request('service/marathon/v2/groups/mygroup').json()
+            self.assertEquals(group['apps'][0]['instances'], 2)
+            self.assertEquals(group['apps'][0]['tasksRunning'], 2)
+
+            client.delete_request('service/marathon/v2/groups/mygroup?force=True')
+            self.assertEquals(simulator.counters['tasks_killed'], 4)
+            response = client.make_request('service/marathon/v2/groups', 'get')
+            self.assertEquals(response.json()['groups'], [])
+
+    def test_task_start_latency(self):
+        with MarathonSimulator(task_start_latency=(0.2, 0.2), tick_interval=0.01) as simulator:
+            client = self._get_client(simulator)
+            client.post_request('service/marathon/v2/groups', json.dumps(self._get_group()))
+            self.assertEquals(len(client.get_request('service/marathon/v2/deployments').json()), 1)
+            group = client.get_request('service/marathon/v2/groups/mygroup').json()
+            self.assertEquals(group['apps'][0]['tasksStaged'], 2)
+            self._wait_for_deployments(client)
+
+    def test_failed_tasks_are_relaunched(self):
+        with MarathonSimulator(failure_rate=0.5, seed=1, tick_interval=0.01) as simulator:
+            client = self._get_client(simulator)
+            client.post_request('service/marathon/v2/groups', json.dumps(self._get_group(10)))
+            self._wait_for_deployments(client)
+            group = client.get_request('service/marathon/v2/groups/mygroup').json()
+            self.assertEquals(group['apps'][0]['tasksRunning'], 10)
+            self.assertTrue(simulator.counters['tasks_failed'] > 0)
+
+    def test_events(self):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            events = simulator.subscribe()
+            client = self._get_client(simulator)
+            client.post_request('service/marathon/v2/groups', json.dumps(self._get_group(1)))
+            self._wait_for_deployments(client)
+            event_types = []
+            while not events.empty():
+                event = events.get()
+                event_types.append((event['eventType'], event.get('taskStatus')))
+        self.assertEquals(event_types, [
+            ('status_update_event', 'TASK_STAGING'),
+            ('status_update_event', 'TASK_RUNNING'),
+            ('deployment_success', None)])
+
+    def test_mesos_state_and_sandbox(self):
+        with MarathonSimulator(agents=2) as simulator:
+            simulator.add_group(self._get_group(instances=3))
+            mesos = Mesos(self._get_client(simulator))
+            task_id = simulator.tasks.keys()[0]
+            task = mesos.get_task(task_id, simulator.tasks[task_id].agent_id)
+            self.assertEquals(task.task_id, task_id)
+            self.assertEquals(task.state, 'TASK_RUNNING')
+            self.assertTrue('stderr' in mesos.get_task_log_file(task, 'stderr'))
+
+            agents = self._get_client(simulator).get_request('mesos/slaves/state.json').json()
+            self.assertEquals(len(agents['slaves']), 2)
+            used_cpus = sum([a['used_resources']['cpus'] for a in agents['slaves']])
+            self.assertAlmostEqual(used_cpus, 1.5)
+            resources = mesos.get_agent_resources()
+            self.assertEquals([a['resources']['cpus'] for a in resources], [4.0, 4.0])
+            self.assertAlmostEqual(sum([a['used_resources']['cpus'] for a in resources]), 1.5)
+
+    def test_not_found(self):
+        with MarathonSimulator() as simulator:
+            client = self._get_client(simulator)
+            self.assertRaises(Exception, client.get_request,
+                              'service/marathon/v2/groups/missing')
+            self.assertFalse(marathon.Marathon(client).group_exists('/missing'))
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_compose(self, mock_sleep):
+        with MarathonSimulator(task_start_latency=(0.01, 0.05), tick_interval=0.01) as simulator:
+            with dockercomposeparser.DockerComposeParser(
+                test_root + '/test_compose_1.yml', simulator.get_url(), None, None, None, None, None,
+                'mygroup', 'qualifier', '1', None, None, None, 50,
+                check_dcos_version=True) as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+                group_id = compose_parser._get_group_id()
+
+            self.assertEquals(simulator.groups.keys(), [group_id])
+            apps = simulator.groups[group_id]['apps']
+            self.assertEquals([app['instances'] for app in apps], [1, 1])
+            self.assertEquals(simulator.deployments, {})
+
+    def _create_parser(self, simulator, version, minimum_health_capacity=50,
+                       compose_file=test_root + '/test_compose_1.yml', **kwargs):
+        return dockercomposeparser.DockerComposeParser(
+            compose_file, simulator.get_url(), None, None, None, None, None,
+            'mygroup', 'qualifier', version, None, None, None, minimum_health_capacity, **kwargs)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_resume_deploy(self, mock_sleep):
+        temp_dir = tempfile.mkdtemp()
+        state_file = os.path.join(temp_dir, 'state.json')
+        scale_group = marathon.Marathon.scale_group
+
+        def failing_scale_group(helper, group_id, scale_factor, log_failures=True,
+                                instances=None):
+            if scale_factor == 0:
+                raise Exception('Connection reset')
+            return scale_group(helper, group_id, scale_factor, log_failures, instances)
+
+        try:
+            with MarathonSimulator(tick_interval=0.01) as simulator:
+                with self._create_parser(simulator, '1') as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                    existing_group_id = compose_parser._get_group_id()
+
+                with patch('marathon.Marathon.scale_group', failing_scale_group):
+                    with self.assertRaises(Exception):
+                        with self._create_parser(simulator, '2', state_file=state_file) as \
+                                compose_parser:
+                            compose_parser.deploy()
+                # The new group is kept and the last completed phase recorded
+                group_id = compose_parser._get_group_id()
+                self.assertEquals(sorted(simulator.groups.keys()),
+                                  sorted([existing_group_id, group_id]))
+                state = deploystate.DeployState(state_file, group_id)
+                self.assertEquals(state.phase, deploystate.UPDATE_NEW)
+                self.assertEquals(state.data['existing_group_id'], existing_group_id)
+
+                with patch('marathon.Marathon.deploy_group') as mock_deploy_group:
+                    with self._create_parser(simulator, '2', state_file=state_file,
+                                             resume=True) as compose_parser:
+                        compose_parser.deploy()
+                        compose_parser.cleanup_needed = False
+                self.assertFalse(mock_deploy_group.called)
+
+                self.assertEquals(simulator.groups.keys(), [group_id])
+                apps = simulator.groups[group_id]['apps']
+                self.assertEquals([app['instances'] for app in apps], [1, 1])
+                self.assertFalse(os.path.isfile(state_file))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_resume_changed_instances(self, mock_sleep):
+        temp_dir = tempfile.mkdtemp()
+        state_file = os.path.join(temp_dir, 'state.json')
+        scale_group = marathon.Marathon.scale_group
+        try:
+            with MarathonSimulator(tick_interval=0.01) as simulator:
+                with self._create_parser(simulator, '1') as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                    existing_group_id = compose_parser._get_group_id()
+                existing_json = simulator.groups[existing_group_id]
+                for app in existing_json['apps']:
+                    app['instances'] = 4
+                simulator.update_group(existing_group_id, existing_json)
+                get_instances = lambda: [app['instances'] for app in
+                                         simulator.groups[existing_group_id]['apps']]
+
+                # The existing group is scaled to 50%, but the deployment fails
+                # before the phase is recorded
+                def failing_scale_group(helper, *args, **kwargs):
+                    scale_group(helper, *args, **kwargs)
+                    raise Exception('Connection reset')
+
+                with patch('marathon.Marathon.scale_group', failing_scale_group):
+                    with self.assertRaises(Exception):
+                        with self._create_parser(simulator, '2', state_file=state_file) as \
+                                compose_parser:
+                            compose_parser.deploy()
+                group_id = compose_parser._get_group_id()
+                self.assertEquals(deploystate.DeployState(state_file, group_id).phase,
+                                  deploystate.VIP_UPDATE)
+                self.assertEquals(get_instances(), [2, 2])
+
+                # Resuming doesn't scale the existing group to 50% of 50%
+                with patch('marathon.Marathon.update_group', side_effect=Exception('Stop')):
+                    with self.assertRaises(Exception) as context:
+                        with self._create_parser(simulator, '2', state_file=state_file,
+                                                 resume=True) as compose_parser:
+                            compose_parser.deploy()
+                self.assertEquals(str(context.exception), 'Stop')
+                self.assertEquals(get_instances(), [2, 2])
+
+                # The existing group was scaled by someone else
+                simulator.groups[existing_group_id]['apps'][0]['instances'] = 3
+                with self.assertRaises(Exception) as context:
+                    with self._create_parser(simulator, '2', state_file=state_file,
+                                             resume=True) as compose_parser:
+                        compose_parser.deploy()
+                self.assertTrue('has instances' in str(context.exception))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_resume_missing_group(self):
+        temp_dir = tempfile.mkdtemp()
+        state_file = os.path.join(temp_dir, 'state.json')
+        try:
+            with MarathonSimulator() as simulator:
+                with self._create_parser(simulator, '1', state_file=state_file,
+                                         resume=True) as compose_parser:
+                    deploystate.DeployState(state_file, compose_parser._get_group_id()).complete(
+                        deploystate.INITIAL_DEPLOY, is_update=False, existing_group_id=None,
+                        target_instances={})
+                    self.assertRaises(Exception, compose_parser.deploy)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_canary_deploy(self, mock_sleep):
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            with self._create_parser(simulator, '1') as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+                existing_group_id = compose_parser._get_group_id()
+            for app in simulator.groups[existing_group_id]['apps']:
+                app['instances'] = 4
+            simulator.update_group(existing_group_id, simulator.groups[existing_group_id])
+
+            probe = Mock()
+            probe.check.side_effect = [None, Exception('Error rate is 50%')]
+            with self.assertRaises(Exception):
+                with self._create_parser(simulator, '2', canary_steps=[25, 50, 100],
+                                         canary_probe=probe) as compose_parser:
+                    compose_parser.deploy()
+            # Rolled back to the existing group, the new group is removed
+            self.assertEquals(simulator.groups.keys(), [existing_group_id])
+            apps = simulator.groups[existing_group_id]['apps']
+            self.assertEquals([app['instances'] for app in apps], [4, 4])
+
+            with self._create_parser(simulator, '3', canary_steps=[25, 50, 100]) as \
+                    compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+                group_id = compose_parser._get_group_id()
+            self.assertEquals(simulator.groups.keys(), [group_id])
+            apps = simulator.groups[group_id]['apps']
+            self.assertEquals([app['instances'] for app in apps], [4, 4])
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_resume_canary_deploy(self, mock_sleep):
+        temp_dir = tempfile.mkdtemp()
+        state_file = os.path.join(temp_dir, 'state.json')
+        try:
+            with MarathonSimulator(tick_interval=0.01) as simulator:
+                with self._create_parser(simulator, '1') as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                    existing_group_id = compose_parser._get_group_id()
+                for app in simulator.groups[existing_group_id]['apps']:
+                    app['instances'] = 4
+                simulator.update_group(existing_group_id, simulator.groups[existing_group_id])
+
+                # The deployment is interrupted during the second step
+                probe = Mock()
+                probe.check.side_effect = [None, KeyboardInterrupt()]
+                with self.assertRaises(KeyboardInterrupt):
+                    with self._create_parser(simulator, '2', canary_steps=[25, 50, 100],
+                                             canary_probe=probe, state_file=state_file) as \
+                            compose_parser:
+                        compose_parser.deploy()
+                group_id = compose_parser._get_group_id()
+                state = deploystate.DeployState(state_file, group_id)
+                self.assertEquals(state.data['canary_completed_steps'], 1)
+
+                probe = Mock()
+                with self._create_parser(simulator, '2', canary_steps=[25, 50, 100],
+                                         canary_probe=probe, state_file=state_file,
+                                         resume=True) as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                # The first step is not repeated
+                self.assertEquals(probe.check.call_count, 2)
+                self.assertEquals(simulator.groups.keys(), [group_id])
+                apps = simulator.groups[group_id]['apps']
+                self.assertEquals([app['instances'] for app in apps], [4, 4])
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_check_capacity(self, mock_sleep):
+        # The apps use 256 MB each, so the 2 tasks don't fit
+        with MarathonSimulator(agents=1, agent_mem=400.0, tick_interval=0.01) as simulator:
+            with self.assertRaises(capacityplanner.CapacityError):
+                with self._create_parser(simulator, '1', check_capacity=True) as compose_parser:
+                    compose_parser.deploy()
+            self.assertEquals(simulator.groups.keys(), [])
+
+        # 5 tasks fit, so only half of the new tasks can start next to the existing ones
+        with MarathonSimulator(agents=1, agent_mem=1300.0, tick_interval=0.01) as simulator:
+            with self._create_parser(simulator, '1') as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+                existing_group_id = compose_parser._get_group_id()
+            for app in simulator.groups[existing_group_id]['apps']:
+                app['instances'] = 2
+            simulator.update_group(existing_group_id, simulator.groups[existing_group_id])
+
+            with self._create_parser(simulator, '2', minimum_health_capacity=100,
+                                     check_capacity=True) as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+                group_id = compose_parser._get_group_id()
+            self.assertEquals(compose_parser.minimum_health_capacity, 50)
+            self.assertEquals(simulator.groups.keys(), [group_id])
+            apps = simulator.groups[group_id]['apps']
+            self.assertEquals([app['instances'] for app in apps], [2, 2])
+
+    def _get_task_ids(self, simulator, app_id):
+        return sorted(task.task_id for task in simulator._active_tasks(app_id))
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_in_place_deploy(self, mock_sleep):
+        temp_dir = tempfile.mkdtemp()
+        compose_file = os.path.join(temp_dir, 'docker-compose.yml')
+        with open(test_root + '/test_compose_1.yml', 'r') as compose_stream:
+            compose_data = yaml.load(compose_stream)
+        try:
+            with MarathonSimulator(tick_interval=0.01) as simulator:
+                with self._create_parser(simulator, '1') as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                    group_id = compose_parser._get_group_id()
+                service_a_tasks = self._get_task_ids(simulator, group_id + '/service-a')
+                service_b_tasks = self._get_task_ids(simulator, group_id + '/service-b')
+
+                # Only the service with the changed environment is restarted
+                compose_data['services']['service-b']['environment']['LOG_LEVEL'] = 'debug'
+                with open(compose_file, 'w') as compose_stream:
+                    yaml.dump(compose_data, compose_stream)
+                with self._create_parser(simulator, '2', compose_file=compose_file,
+                                         in_place=True) as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+                self.assertEquals(simulator.groups.keys(), [group_id])
+                self.assertEquals(self._get_task_ids(simulator, group_id + '/service-a'),
+                                  service_a_tasks)
+                self.assertNotEqual(self._get_task_ids(simulator, group_id + '/service-b'),
+                                    service_b_tasks)
+                version_count = len(simulator.group_versions[group_id])
+                service_b = [app for app in simulator.groups[group_id]['apps']
+                             if app['id'].endswith('/service-b')][0]
+                self.assertEquals(service_b['env']['LOG_LEVEL'], 'debug')
+                self.assertEquals(service_b['upgradeStrategy']['minimumHealthCapacity'], 0.5)
+
+                # A failed update is rolled back to the previous version
+                compose_data['services']['service-b']['environment']['LOG_LEVEL'] = 'info'
+                with open(compose_file, 'w') as compose_stream:
+                    yaml.dump(compose_data, compose_stream)
+                update_group = marathon.Marathon.update_group
+
+                def failing_update_group(helper, marathon_json, started_app_ids=None):
+                    update_group(helper, marathon_json, started_app_ids)
+                    raise Exception('Deployment failed')
+
+                with patch('marathon.Marathon.update_group', failing_update_group):
+                    with self.assertRaises(Exception):
+                        with self._create_parser(simulator, '3', compose_file=compose_file,
+                                                 in_place=True) as compose_parser:
+                            compose_parser.deploy()
+                self.assertEquals(simulator.groups.keys(), [group_id])
+                service_b = [app for app in simulator.groups[group_id]['apps']
+                             if app['id'].endswith('/service-b')][0]
+                self.assertEquals(service_b['env']['LOG_LEVEL'], 'debug')
+                self.assertEquals(len(simulator.group_versions[group_id]), version_count + 2)
+        finally:
+            shutil.rmtree(temp_dir)
@@ -2,6 +2,8 @@ import portmappings
 import unittest
 import json
 
+from mock import patch
+
 class PortMappingsTest(unittest.TestCase):
     def test_create_instance(self):
         p = portmappings.PortMappings()
@@ -343,4 +345,25 @@ class PortMappingsTest(unittest.TestCase):
         }}
         expected = {'example.com': 80}
         actual = p._get_all_vhosts(service_data)
-        self.assertEquals(actual, expected)
\ No newline at end of file
+        self.assertEquals(actual, expected)
+
+    def test_get_port_mappings_protocol(self):
+        p = portmappings.PortMappings()
+        service_data = {'expose': ['53/udp'], 'ports': ['5000:5000/udp']}
+        actual = p.get_port_mappings('1.1.1.1', service_data, 'myvipname')
+        self.assertEquals([port_mapping['protocol'] for port_mapping in actual], ['udp', 'udp'])
+
+    def test_get_port_mappings_large_range(self):
+        p = portmappings.PortMappings()
+        service_data = {'expose': ['10000'], 'ports': ['10000-10999:10000-10999']}
+        with patch('logging.warning') as mock_warning:
+            actual = p.get_port_mappings('1.1.1.1', service_data, 'myvipname')
+        self.assertTrue(mock_warning.called)
+        self.assertEquals(len(actual), 1000)
+        self.assertEquals(actual[0]['labels'], {'VIP_0': '1.1.1.1:10000',
+                                                'VIP_1': 'myvipname.internal:10000'})
+
+    def test_get_port_mappings_range_too_large(self):
+        p = portmappings.PortMappings()
+        service_data = {'ports': ['10000-10999', '20000']}
+        self.assertRaises(ValueError, p.get_port_mappings, '1.1.1.1', service_data, 'myvipname')
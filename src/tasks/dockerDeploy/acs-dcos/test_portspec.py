@@ -0,0 +1,67 @@
+import unittest
+
+import portspec
+
+
+class PortSpecTest(unittest.TestCase):
+    def test_parse_port_range(self):
+        self.assertEquals(portspec.parse_port_range('3000'), portspec.PortRange(3000))
+        self.assertEquals(portspec.parse_port_range(3000), portspec.PortRange(3000))
+        self.assertEquals(portspec.parse_port_range('3000-3005'), portspec.PortRange(3000, 3005))
+        self.assertRaises(ValueError, portspec.parse_port_range, '3000-')
+        self.assertRaises(ValueError, portspec.parse_port_range, '3005-3000')
+        self.assertRaises(ValueError, portspec.parse_port_range, 'blah')
+
+    def test_port_range_is_lazy(self):
+        port_range = portspec.parse_port_range('1-65535')
+        self.assertEquals(len(port_range), 65535)
+        self.assertTrue(port_range.is_range())
+        self.assertEquals(str(port_range), '1-65535')
+        self.assertEquals(list(portspec.parse_port_range('80-82')), [80, 81, 82])
+
+    def test_is_port_range(self):
+        self.assertTrue(portspec.is_port_range('3000-3005'))
+        self.assertFalse(portspec.is_port_range('3000'))
+        self.assertFalse(portspec.is_port_range('3000-3001-3030'))
+        self.assertFalse(portspec.is_port_range(None))
+
+    def test_parse_port_spec_forms(self):
+        spec = portspec.parse_port_spec('3000')
+        self.assertIsNone(spec.host)
+        self.assertEquals(list(spec.get_port_tuples()), [(3000, 3000)])
+
+        spec = portspec.parse_port_spec('8080:80/udp')
+        self.assertEquals(spec.host, portspec.PortRange(8080))
+        self.assertEquals(spec.container, portspec.PortRange(80))
+        self.assertEquals(spec.protocol, 'udp')
+
+        spec = portspec.parse_port_spec('127.0.0.1:8001-8002:9001-9002/TCP')
+        self.assertEquals(spec.ip, '127.0.0.1')
+        self.assertEquals(spec.protocol, 'tcp')
+        self.assertEquals(list(spec.get_port_tuples()), [(8001, 9001), (8002, 9002)])
+
+        spec = portspec.parse_port_spec('127.0.0.1::5000')
+        self.assertEquals(spec.ip, '127.0.0.1')
+        self.assertIsNone(spec.host)
+        self.assertEquals(list(spec.get_port_tuples()), [(5000, 5000)])
+
+    def test_parse_port_spec_invalid(self):
+        for entry in ['', 'blah', '8080-8082:9090', '8080:80/sctp', '1.2.3:80:80', '80:80:80']:
+            self.assertRaises(ValueError, portspec.parse_port_spec, entry)
+
+    def test_parse_exposed_port(self):
+        self.assertEquals(portspec.parse_exposed_port(80).container, portspec.PortRange(80))
+        self.assertEquals(portspec.parse_exposed_port('53/udp').protocol, 'udp')
+        for entry in ['3000:3001', '3000-3001', 'blah']:
+            self.assertRaises(ValueError, portspec.parse_exposed_port, entry)
+
+    def test_get_port_tuples(self):
+        specs = portspec.parse_port_specs(['80-81:90-91', '5000'])
+        self.assertEquals(list(portspec.get_port_tuples(specs)),
+                          [(80, 90), (81, 91), (5000, 5000)])
+
+    def test_count_ports(self):
+        port_ranges = [portspec.PortRange(80, 89), portspec.PortRange(85, 94),
+                       portspec.PortRange(90), portspec.PortRange(1000, 1001)]
+        self.assertEquals(portspec.count_ports(port_ranges), 17)
+        self.assertEquals(portspec.count_ports([]), 0)
@@ -0,0 +1,76 @@
+import json
+import time
+import unittest
+import zlib
+
+from mock import patch
+
+import acsclient
+import acsinfo
+import marathon
+import requestbody
+from marathonsimulator import MarathonSimulator
+from requestobserver import RequestStats, TruncatedPayload
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class JsonBodyTest(unittest.TestCase):
+    def _get_data(self):
+        return {'id': '/group', 'apps': [{'id': '/group/app-{}'.format(i), 'instances': i}
+                                         for i in range(1000)]}
+
+    def test_iterate(self):
+        body = requestbody.JsonBody(self._get_data())
+        body.chunk_size = 1024
+        chunks = list(body)
+        self.assertTrue(len(chunks) > 1)
+        self.assertEquals(b''.join(chunks), json.dumps(self._get_data()).encode('utf-8'))
+        self.assertEquals(body.size, len(b''.join(chunks)))
+        # Can be iterated again (e.g. when the request is retried)
+        self.assertEquals(b''.join(body), b''.join(chunks))
+
+    def test_compress(self):
+        body = requestbody.JsonBody(self._get_data(), compress=True)
+        compressed = b''.join(body)
+        self.assertEquals(json.loads(zlib.decompress(compressed, 16 + zlib.MAX_WBITS).decode(
+            'utf-8')), self._get_data())
+        self.assertTrue(body.size < len(json.dumps(self._get_data())))
+        self.assertEquals(body.get_headers()['content-encoding'], 'gzip')
+
+    def test_truncated_payload(self):
+        body = requestbody.JsonBody(self._get_data())
+        text = str(TruncatedPayload(body, max_length=20))
+        self.assertEquals(text, json.dumps(self._get_data())[:20] + '... (streamed)')
+        self.assertIsNone(body.size)
+
+
+class StreamedRequestTest(unittest.TestCase):
+    def _deploy(self, compress_requests):
+        request_stats = RequestStats()
+        with MarathonSimulator(tick_interval=0.01) as simulator:
+            client = acsclient.ACSClient(
+                acsinfo.AcsInfo(None, None, None, None, None, simulator.get_url()))
+            client.add_request_observer(request_stats)
+            marathon_helper = marathon.Marathon(client)
+            marathon_helper.compress_requests = compress_requests
+            marathon_helper.deploy_group({
+                'id': '/mygroup',
+                'apps': [{'id': '/mygroup/service-a', 'instances': 1, 'cpus': 0.5}]})
+            status, group = simulator.get_group('/mygroup', [])
+        self.assertEquals(status, 200)
+        self.assertEquals([app['id'] for app in group['apps']], ['/mygroup/service-a'])
+        return [entry['request_bytes'] for entry in request_stats.get_stats()
+                if entry['method'] == 'POST'][0]
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_group_streamed(self, mock_sleep):
+        self.assertTrue(self._deploy(compress_requests=False) > 0)
+
+    @patch('marathon.time.sleep', side_effect=_short_sleep)
+    def test_deploy_group_compressed(self, mock_sleep):
+        self.assertTrue(self._deploy(compress_requests=True) > 0)
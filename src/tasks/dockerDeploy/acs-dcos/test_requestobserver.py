@@ -0,0 +1,92 @@
+import unittest
+
+from mock import patch
+
+from requestobserver import (RequestRecord, RequestStats, SlowRequestLogger,
+                             TruncatedPayload, get_path_template)
+
+
+class RequestObserverTest(unittest.TestCase):
+    def test_get_path_template(self):
+        self.assertEquals(get_path_template('service/marathon/v2/groups?embed=group.groups'),
+                          'service/marathon/v2/groups')
+        self.assertEquals(get_path_template('service/marathon/v2/groups/mygroup.1?force=true'),
+                          'service/marathon/v2/groups/{id}')
+        self.assertEquals(get_path_template('service/marathon/v2/groups/a/b/versions'),
+                          'service/marathon/v2/groups/{id}/versions')
+        self.assertEquals(get_path_template('service/marathon/v2/apps//a/b'),
+                          'service/marathon/v2/apps/{id}')
+        self.assertEquals(get_path_template('slave/agent-1/state.json'), 'slave/{id}/state.json')
+        self.assertEquals(get_path_template('mesos/slaves/state.json'), 'mesos/slaves/state.json')
+
+    def test_get_path_template_empty(self):
+        self.assertEquals(get_path_template(None), '')
+
+    def test_record_failed(self):
+        self.assertTrue(RequestRecord('get', 'path', None, 0).failed())
+        self.assertTrue(RequestRecord('get', 'path', 500, 0).failed())
+        self.assertFalse(RequestRecord('get', 'path', 200, 0).failed())
+
+    def test_record_method_upper(self):
+        record = RequestRecord('get', 'path', 200, 0)
+        self.assertEquals(record.method, 'GET')
+
+    def test_stats_aggregated(self):
+        stats = RequestStats()
+        stats.request_completed(RequestRecord('get', 'apps?id=1', 200, 1.0, 0, 100))
+        stats.request_completed(RequestRecord('get', 'apps?id=2', 200, 3.0, 0, 50))
+        stats.request_completed(RequestRecord('put', 'apps', 503, 0.5, 10, 0, retries=2))
+
+        actual = stats.get_stats()
+        self.assertEquals(len(actual), 2)
+        self.assertEquals(actual[0]['method'], 'GET')
+        self.assertEquals(actual[0]['path'], 'apps')
+        self.assertEquals(actual[0]['count'], 2)
+        self.assertEquals(actual[0]['total_time'], 4.0)
+        self.assertEquals(actual[0]['max_time'], 3.0)
+        self.assertEquals(actual[0]['response_bytes'], 150)
+        self.assertEquals(actual[1]['errors'], 1)
+        self.assertEquals(actual[1]['retries'], 2)
+
+    def test_stats_totals(self):
+        stats = RequestStats()
+        stats.request_completed(RequestRecord('get', 'apps', 200, 1.0, 0, 100))
+        stats.request_completed(RequestRecord('put', 'apps', 200, 0.5, 10, 20))
+
+        actual = stats.get_totals()
+        self.assertEquals(actual['count'], 2)
+        self.assertEquals(actual['total_time'], 1.5)
+        self.assertEquals(actual['request_bytes'], 10)
+        self.assertEquals(actual['response_bytes'], 120)
+
+    def test_payload_report(self):
+        stats = RequestStats()
+        stats.request_completed(RequestRecord('get', 'apps', 200, 1.0, 0, 100))
+        stats.request_completed(RequestRecord('get', 'apps?id=/a', 200, 1.0, 0, 50))
+        stats.request_completed(RequestRecord('get', 'deployments', 200, 5.0, 0, 20))
+
+        actual = stats.get_payload_report()
+        self.assertEquals([(entry['path'], entry['response_bytes'], entry['average_bytes'])
+                           for entry in actual], [('apps', 150, 75), ('deployments', 20, 20)])
+
+    @patch('logging.info')
+    def test_slow_request_logged(self, mock_info):
+        slow_logger = SlowRequestLogger(threshold=2)
+        slow_logger.request_completed(RequestRecord('get', 'apps', 200, 3))
+        self.assertTrue(mock_info.called)
+
+    @patch('logging.info')
+    def test_fast_request_not_logged(self, mock_info):
+        slow_logger = SlowRequestLogger(threshold=2)
+        slow_logger.request_completed(RequestRecord('get', 'apps', 200, 1))
+        self.assertFalse(mock_info.called)
+
+    def test_truncated_payload_short(self):
+        self.assertEquals(str(TruncatedPayload('short')), 'short')
+
+    def test_truncated_payload_none(self):
+        self.assertEquals(str(TruncatedPayload(None)), 'None')
+
+    def test_truncated_payload_long(self):
+        actual = str(TruncatedPayload('x' * 100, max_length=10))
+        self.assertEquals(actual, 'xxxxxxxxxx... (100 bytes total)')
@@ -0,0 +1,220 @@
+import BaseHTTPServer
+import threading
+import unittest
+
+import requests
+from mock import Mock
+
+import acsclient
+import acsinfo
+from retrypolicy import RetryBudget, RetryPolicy
+
+
+class FaultInjectingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Replies with the next scripted fault from the server. A fault is
+    either a (status_code, body) tuple or 'drop' to close the connection
+    without sending a response
+    """
+    def _reply(self):
+        self.server.requests.append((self.command, self.path))
+        if self.server.faults:
+            fault = self.server.faults.pop(0)
+        else:
+            fault = (200, '{}')
+
+        if fault == 'drop':
+            self.close_connection = 1
+            self.wfile.close()
+            return
+
+        status_code, body = fault
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.getheader('content-length', 0))
+        if length:
+            self.rfile.read(length)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_DELETE(self):
+        self._reply()
+
+    def do_PUT(self):
+        self._read_body()
+        self._reply()
+
+    def do_POST(self):
+        self._read_body()
+        self._reply()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FaultInjectingServer(object):
+    """
+    Local stub server used to inject faults into requests made by ACSClient
+    """
+    def __init__(self, faults):
+        self._server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), FaultInjectingHandler)
+        self._server.faults = list(faults)
+        self._server.requests = []
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,))
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def _get_client(self, max_attempts=5, max_retries=30):
+        acs_info = acsinfo.AcsInfo('myhost', 2200, None, None, None, 'http://127.0.0.1')
+        client = acsclient.ACSClient(acs_info)
+        client.retry_policy = RetryPolicy(
+            max_attempts=max_attempts, base_delay=0,
+            budget=RetryBudget(max_retries=max_retries))
+        return client
+
+    def test_get_retried_on_503(self):
+        with FaultInjectingServer([(503, 'unavailable'), (502, 'bad gateway')]) as server:
+            client = self._get_client()
+            response = client.make_request('path', 'get', port=server.port)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(server.requests), 3)
+        self.assertEquals(client.retry_policy.counters['retries'], 2)
+        self.assertEquals(client.retry_policy.counters['transient_errors'], 2)
+
+    def test_get_retried_on_dropped_connection(self):
+        with FaultInjectingServer(['drop']) as server:
+            client = self._get_client()
+            response = client.make_request('path', 'get', port=server.port)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(client.retry_policy.counters['connection_errors'], 1)
+
+    def test_put_retried_on_deployment_locked(self):
+        locked = (409, '{"message": "App is locked by one or more deployments."}')
+        with FaultInjectingServer([locked]) as server:
+            client = self._get_client()
+            response = client.make_request('path', 'put', data='{}', port=server.port)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(client.retry_policy.counters['deployment_locked'], 1)
+
+    def test_put_conflict_not_retried(self):
+        with FaultInjectingServer([(409, '{"message": "Group already exists"}')]) as server:
+            client = self._get_client()
+            self.assertRaises(Exception, client.make_request, 'path', 'put',
+                              data='{}', port=server.port)
+
+        self.assertEquals(len(server.requests), 1)
+
+    def test_not_found_not_retried(self):
+        with FaultInjectingServer([(404, '{}')]) as server:
+            client = self._get_client()
+            self.assertRaises(Exception, client.make_request, 'path', 'delete', port=server.port)
+
+        self.assertEquals(len(server.requests), 1)
+
+    def test_post_not_retried_without_exists_check(self):
+        with FaultInjectingServer([(503, 'unavailable')]) as server:
+            client = self._get_client()
+            self.assertRaises(Exception, client.make_request, 'path', 'post',
+                              data='{}', port=server.port)
+
+        self.assertEquals(len(server.requests), 1)
+
+    def test_post_retried_if_resource_missing(self):
+        exists_check = Mock(return_value=False)
+        with FaultInjectingServer([(503, 'unavailable')]) as server:
+            client = self._get_client()
+            response = client.make_request('path', 'post', data='{}', port=server.port,
+                                           exists_check=exists_check)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(server.requests), 2)
+        self.assertTrue(exists_check.called)
+
+    def test_post_not_retried_if_resource_exists(self):
+        exists_check = Mock(return_value=True)
+        with FaultInjectingServer(['drop', (502, 'bad gateway')]) as server:
+            client = self._get_client()
+            # The failed attempt created the resource, so the request succeeded
+            self.assertIsNone(client.make_request('path', 'post', data='{}', port=server.port,
+                                                  exists_check=exists_check))
+            self.assertIsNone(client.make_request('path', 'post', data='{}', port=server.port,
+                                                  exists_check=exists_check))
+
+        self.assertEquals(len(server.requests), 2)
+        self.assertEquals(client.retry_policy.counters['duplicate_prevented'], 2)
+
+    def test_post_failed_if_resource_missing(self):
+        exists_check = Mock(return_value=False)
+        with FaultInjectingServer(['drop', 'drop']) as server:
+            client = self._get_client(max_attempts=2)
+            self.assertRaises(requests.exceptions.ConnectionError, client.make_request,
+                              'path', 'post', data='{}', port=server.port,
+                              exists_check=exists_check)
+
+    def test_max_attempts(self):
+        with FaultInjectingServer([(503, 'unavailable')] * 5) as server:
+            client = self._get_client(max_attempts=3)
+            self.assertRaises(Exception, client.make_request, 'path', 'get', port=server.port)
+
+        self.assertEquals(len(server.requests), 3)
+
+    def test_budget_shared_between_requests(self):
+        faults = [(503, 'unavailable'), (200, '{}'), (503, 'unavailable')]
+        with FaultInjectingServer(faults) as server:
+            client = self._get_client(max_retries=1)
+            client.make_request('path', 'get', port=server.port)
+            self.assertRaises(Exception, client.make_request, 'path', 'get', port=server.port)
+
+        self.assertEquals(client.retry_policy.counters['budget_exhausted'], 1)
+        self.assertEquals(client.retry_policy.budget.remaining(), 0)
+
+    def test_retries_reported_to_observers(self):
+        observer = Mock()
+        with FaultInjectingServer([(503, 'unavailable')]) as server:
+            client = self._get_client()
+            client.add_request_observer(observer)
+            client.make_request('path', 'get', port=server.port)
+
+        record = observer.request_completed.call_args[0][0]
+        self.assertEquals(record.retries, 1)
+        self.assertEquals(record.status_code, 200)
+
+    def test_get_delay_bounded(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+        for attempt in range(10):
+            delay = policy.get_delay(attempt)
+            self.assertTrue(0 <= delay <= 4)
+
+    def test_unexpected_error_not_retried(self):
+        policy = RetryPolicy()
+        self.assertFalse(policy.should_retry('get', 0, error=ValueError()))
+
+    def test_exists_check_failure_not_retried(self):
+        policy = RetryPolicy()
+        exists_check = Mock(side_effect=Exception('failed'))
+        response = Mock(status_code=503)
+        self.assertFalse(policy.should_retry('post', 0, response=response,
+                                             exists_check=exists_check))
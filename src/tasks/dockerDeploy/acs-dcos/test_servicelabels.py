@@ -0,0 +1,46 @@
+import unittest
+
+import servicelabels
+
+
+class ServiceLabelsTest(unittest.TestCase):
+    def test_parse_list(self):
+        labels = servicelabels.ServiceLabels(['Name=value=with=equals', 'novalue'])
+        self.assertEquals(labels.items, [('Name', 'value=with=equals'), ('novalue', '')])
+        self.assertEquals(labels.get('name'), 'value=with=equals')
+        self.assertEquals(labels.get('novalue'), '')
+        self.assertTrue('name' in labels)
+        self.assertFalse('Name' in labels)
+
+    def test_parse_dict(self):
+        labels = servicelabels.ServiceLabels({'Port': 1})
+        self.assertEquals(labels.get('port'), 1)
+        self.assertEquals(labels.get('missing', 'default'), 'default')
+        self.assertEquals(len(labels), 1)
+
+    def test_get_all(self):
+        labels = servicelabels.ServiceLabels(['vhost=a', 'VHOST=b', 'other=c'])
+        self.assertEquals(labels.get('vhost'), 'a')
+        self.assertEquals(labels.get_all('vhost'), ['a', 'b'])
+        self.assertEquals(labels.get_all('missing'), [])
+
+    def test_has_prefix(self):
+        labels = servicelabels.ServiceLabels(['com.microsoft.ACS.vhost=a'])
+        self.assertTrue(labels.has_prefix('com.microsoft.acs'))
+        self.assertFalse(labels.has_prefix('com.microsoft.acs.dcos'))
+
+    def test_parse_labels_cached(self):
+        labels = ['name=value']
+        parsed = servicelabels.parse_labels(labels)
+        self.assertTrue(servicelabels.parse_labels(labels) is parsed)
+        self.assertTrue(servicelabels.parse_labels(parsed) is parsed)
+        self.assertFalse(servicelabels.parse_labels(['name=value']) is parsed)
+
+        # Changed labels are parsed again
+        labels.append('other=value')
+        self.assertEquals(servicelabels.parse_labels(labels).get('other'), 'value')
+
+    def test_get_service_labels(self):
+        self.assertEquals(len(servicelabels.get_service_labels({'image': 'nginx'})), 0)
+        self.assertEquals(servicelabels.get_service_labels(
+            {'labels': {'name': 'value'}}).get('name'), 'value')
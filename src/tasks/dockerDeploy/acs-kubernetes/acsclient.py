@@ -1,13 +1,16 @@
+import copy
 import logging
 import os
 import socket
 import subprocess
+import threading
 import time
 from StringIO import StringIO
 
-import paramiko
 import requests
-from sshtunnel import SSHTunnelForwarder
+
+from requestobserver import RequestRecord, TruncatedPayload
+from retrypolicy import ExistsCheck, RetryPolicy
 
 
 class ACSClient(object):
@@ -23,6 +26,12 @@ class ACSClient(object):
         self.tunnel_server = None
         self.is_direct = False
         self.is_running = False
+        self.request_observers = []
+        self.retry_policy = RetryPolicy()
+        self.session = None
+        # Client the tunnel and connections belong to (see create_deploy_client)
+        self.parent = None
+        self._tunnel_lock = threading.Lock()
 
         # If master_url is provided, we have a direct connection
         if self.cluster_info.api_endpoint:
@@ -31,14 +40,44 @@ class ACSClient(object):
         else:
             logging.debug('Using SSH connection')
 
+    def create_deploy_client(self):
+        """
+        Gets a client for a single deployment: it uses the tunnel and the
+        connection pool of this client, but has its own retry policy (with a
+        new retry budget) and request observers, starting with the ones
+        added to this client
+        """
+        deploy_client = copy.copy(self)
+        deploy_client.parent = self.parent or self
+        deploy_client.request_observers = list(self.request_observers)
+        deploy_client.retry_policy = RetryPolicy()
+        return deploy_client
+
     def shutdown(self):
         """
         Stops the tunnel if its started
         """
+        if self.parent is not None:
+            # The tunnel and connections are closed with the parent
+            return
         if self.current_tunnel and self.is_running:
             logging.debug('Stopping SSH tunnel')
             self.current_tunnel[0].stop()
             self.is_running = False
+        if self.session:
+            self.session.close()
+            self.session = None
+
+    def use_connection_pool(self, pool_size=10):
+        """
+        Makes requests through a session with a connection pool, so
+        connections are reused (and can be shared by multiple threads)
+        """
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
     def _wait_for_tunnel(self, start_time, url):
         """
@@ -71,81 +110,214 @@ class ACSClient(object):
         private_key_file = StringIO()
         private_key_file.write(self.cluster_info.private_key)
         private_key_file.seek(0)
+        # paramiko is slow to import and only needed for SSH tunnels
+        import paramiko
         return paramiko.RSAKey.from_private_key(private_key_file, self.cluster_info.password)
 
     def _setup_tunnel_server(self):
         """
         Gets the local port to access the tunnel
         """
-        if not self.current_tunnel:
-            logging.debug('Create a new SSH tunnel')
-            local_port = self.get_available_local_port()
-            log = logging.getLogger()
-            previous_log_level = log.level
-            log.setLevel(logging.INFO)
-
-            forwarder = SSHTunnelForwarder(
-                ssh_address_or_host=(self.cluster_info.host,
-                                     int(self.cluster_info.port)),
-                ssh_username=self.cluster_info.username,
-                ssh_pkey=self._get_private_key(),
-                remote_bind_address=(
-                    'localhost', self.cluster_info.get_api_endpoint_port()),
-                local_bind_address=('0.0.0.0', int(local_port)),
-                logger=log)
-            forwarder.start()
-
-            start_time = time.time()
-            url = 'http://127.0.0.1:{}'.format(str(local_port))
-            self._wait_for_tunnel(start_time, url)
-
-            self.current_tunnel = (forwarder, int(local_port))
-            log.setLevel(previous_log_level)
+        if self.parent is not None:
+            return self.parent._setup_tunnel_server()
+        with self._tunnel_lock:
+            if not self.current_tunnel:
+                self._create_tunnel()
 
         return self.current_tunnel[1]
 
+    def _create_tunnel(self):
+        """
+        Creates the SSH tunnel
+        """
+        logging.debug('Create a new SSH tunnel')
+        from sshtunnel import SSHTunnelForwarder
+        local_port = self.get_available_local_port()
+        log = logging.getLogger()
+        previous_log_level = log.level
+        log.setLevel(logging.INFO)
+
+        forwarder = SSHTunnelForwarder(
+            ssh_address_or_host=(self.cluster_info.host,
+                                 int(self.cluster_info.port)),
+            ssh_username=self.cluster_info.username,
+            ssh_pkey=self._get_private_key(),
+            remote_bind_address=(
+                'localhost', self.cluster_info.get_api_endpoint_port()),
+            local_bind_address=('0.0.0.0', int(local_port)),
+            logger=log)
+        forwarder.start()
+
+        start_time = time.time()
+        url = 'http://127.0.0.1:{}'.format(str(local_port))
+        self._wait_for_tunnel(start_time, url)
+
+        self.current_tunnel = (forwarder, int(local_port))
+        log.setLevel(previous_log_level)
+
     def create_request_url(self, path):
         """
         Creates the request URL from provided path. Depending on which
         connection type was picked, it will create an SSH tunnel
         """
         if self.is_direct:
-            raise NotImplementedError("Direct connection is not implemented yet")
+            url = '{}/{}'.format(self.cluster_info.api_endpoint.rstrip('/'), path)
         else:
             local_port = self._setup_tunnel_server()
             url = 'http://127.0.0.1:{}/{}'.format(str(local_port), path)
         return url
 
-    def make_request(self, path, method, data=None, port=None, **kwargs):
+    def add_request_observer(self, observer):
+        """
+        Adds an observer (see requestobserver.RequestObserver) that gets
+        notified about every request made with this client
+        """
+        self.request_observers.append(observer)
+
+    def remove_request_observer(self, observer):
+        """
+        Removes an observer added with add_request_observer
+        """
+        if observer in self.request_observers:
+            self.request_observers.remove(observer)
+
+    def _notify_observers(self, record):
+        """
+        Passes the request record to all observers. Observers
+        should never break the request, so any exceptions are ignored
+        """
+        for observer in self.request_observers:
+            try:
+                observer.request_completed(record)
+            except Exception as observer_exc:
+                logging.debug('Request observer failed: %s', observer_exc)
+
+    def notify_event_stream_opened(self, stream_id, path):
         """
-        Makes an HTTP request with specified method
+        Notifies observers that an event stream (e.g. Marathon SSE
+        endpoint) was opened
+        """
+        for observer in self.request_observers:
+            try:
+                observer.event_stream_opened(stream_id, path)
+            except Exception as observer_exc:
+                logging.debug('Request observer failed: %s', observer_exc)
+
+    def notify_event_received(self, stream_id, data):
+        """
+        Notifies observers about an event received on an event stream
+        """
+        for observer in self.request_observers:
+            try:
+                observer.event_received(stream_id, data)
+            except Exception as observer_exc:
+                logging.debug('Request observer failed: %s', observer_exc)
+
+    def _get_payload_size(self, payload):
+        """
+        Gets the size of a request or response payload in bytes
+        """
+        if isinstance(payload, basestring):
+            return len(payload)
+        return 0
+
+    def _get_response_size(self, response, streamed=False):
+        """
+        Gets the size of the response body in bytes, from the Content-Length
+        header if there is one. The body of streamed responses is left to the
+        caller (it might not be read at all), so their size is 0 without it.
+        """
+        if response is None:
+            return 0
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            return int(headers.get('content-length'))
+        except (TypeError, ValueError):
+            pass
+        if streamed:
+            return 0
+        return self._get_payload_size(getattr(response, 'content', None))
+
+    def make_request(self, path, method, data=None, port=None, exists_check=None,
+                     content_type='application/json', **kwargs):
+        """
+        Makes an HTTP request with specified method. Failed requests are
+        retried according to the retry_policy; exists_check is a function that
+        returns True if the resource a POST request creates already exists
+        and is required for POST requests to be retried. If it confirms that a
+        failed attempt created the resource, None is returned instead of the
+        failed response (the caller gets the existing resource).
         """
         url = self.create_request_url(path)
-        logging.debug('%s: %s (DATA=%s)', method, url, data)
+        logging.debug('%s: %s (DATA=%s)', method, url, TruncatedPayload(data))
 
         if not hasattr(requests, method):
             raise Exception('Invalid method {}'.format(method))
 
-        method_to_call = getattr(requests, method)
+        method_to_call = getattr(self.session or requests, method)
         headers = {
-            'Content-type': 'application/json',
+            'Content-type': content_type,
         }
 
-        if not data:
-            response = method_to_call(
-                url, headers=headers, **kwargs)
-        else:
-            response = method_to_call(
-                url, data, headers=headers, **kwargs)
+        if exists_check is not None:
+            exists_check = ExistsCheck(exists_check)
+
+        response = None
+        status_code = None
+        response_bytes = 0
+        attempt = 0
+        start_time = time.time()
+        try:
+            while True:
+                try:
+                    if not data:
+                        response = method_to_call(
+                            url, headers=headers, **kwargs)
+                    else:
+                        response = method_to_call(
+                            url, data, headers=headers, **kwargs)
+                except Exception as request_exc:
+                    if not self.retry_policy.should_retry(
+                            method, attempt, error=request_exc, exists_check=exists_check):
+                        if exists_check is not None and exists_check.confirmed:
+                            break
+                        raise
+                    logging.info('Request %s %s failed (%s), retrying', method.upper(),
+                                 path, request_exc)
+                else:
+                    status_code = response.status_code
+                    if not self.retry_policy.should_retry(
+                            method, attempt, response=response, exists_check=exists_check):
+                        break
+                    logging.info('Request %s %s returned %s, retrying', method.upper(),
+                                 path, status_code)
+                self.retry_policy.wait(attempt)
+                attempt += 1
+
+            if self.request_observers:
+                response_bytes = self._get_response_size(response, kwargs.get('stream', False))
+        finally:
+            if self.request_observers:
+                self._notify_observers(RequestRecord(
+                    method, path, status_code, time.time() - start_time,
+                    request_bytes=self._get_payload_size(data),
+                    response_bytes=response_bytes,
+                    retries=attempt,
+                    response=response))
+
+        if exists_check is not None and exists_check.confirmed:
+            logging.info('Request %s %s failed, but it created the resource',
+                         method.upper(), path)
+            return None
         return response
 
-    def get_request(self, path):
+    def get_request(self, path, **kwargs):
         """
         Makes a GET request to an endpoint on the cluster
         :param path: Path part of the URL to make the request to
         :type path: String
         """
-        return self.make_request(path, 'get')
+        return self.make_request(path, 'get', **kwargs)
 
     def delete_request(self, path):
         """
@@ -155,13 +327,13 @@ class ACSClient(object):
         """
         return self.make_request(path, 'delete')
 
-    def post_request(self, path, post_data):
+    def post_request(self, path, post_data, **kwargs):
         """
         Makes a POST request to an endpoint on the cluster
         :param path: Path part of the URL to make the request to
         :type path: String
         """
-        return self.make_request(path, 'post', data=post_data)
+        return self.make_request(path, 'post', data=post_data, **kwargs)
 
     def put_request(self, path, put_data=None, **kwargs):
         """
@@ -171,6 +343,16 @@ class ACSClient(object):
         """
         return self.make_request(path, 'put', data=put_data, **kwargs)
 
+    def patch_request(self, path, patch_data, **kwargs):
+        """
+        Makes a PATCH request (strategic merge patch) to an endpoint on the cluster
+        :param path: Path part of the URL to make the request to
+        :type path: String
+        """
+        return self.make_request(
+            path, 'patch', data=patch_data,
+            content_type='application/strategic-merge-patch+json', **kwargs)
+
     def get_available_local_port(self):
         """
         Gets a random, available local port
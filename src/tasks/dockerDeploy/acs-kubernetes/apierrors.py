@@ -0,0 +1,100 @@
+class ApiError(Exception):
+    """
+    Request to the Kubernetes API failed. status_code is the HTTP status
+    and reason the reason from the Status object in the response (e.g.
+    'AlreadyExists'), if there was one.
+    """
+    def __init__(self, message, status_code=None, reason=None, details=None):
+        super(ApiError, self).__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.details = details
+
+
+class BadRequestError(ApiError):
+    pass
+
+
+class UnauthorizedError(ApiError):
+    pass
+
+
+class NotFoundError(ApiError):
+    pass
+
+
+class ConflictError(ApiError):
+    pass
+
+
+class AlreadyExistsError(ConflictError):
+    pass
+
+
+class InvalidError(ApiError):
+    pass
+
+
+class ServerError(ApiError):
+    pass
+
+
+# HTTP status -> error, statuses not in here raise ApiError (or ServerError for 5xx)
+ERRORS = {
+    400: BadRequestError,
+    401: UnauthorizedError,
+    403: UnauthorizedError,
+    404: NotFoundError,
+    409: ConflictError,
+    422: InvalidError
+}
+
+
+def is_success(response):
+    """
+    Checks the status code of the response, without decoding the body
+    """
+    return 200 <= response.status_code < 300
+
+
+def is_not_found(response):
+    """
+    Checks if the response is a 404, without decoding the body
+    """
+    return response.status_code == 404
+
+
+def get_error(response, action):
+    """
+    Gets the error for a failed response. Only the (small) Status object
+    of failed responses is decoded, for the reason and the message.
+    """
+    status = {}
+    try:
+        status = response.json()
+    except ValueError:
+        pass
+    if not isinstance(status, dict) or status.get('kind') != 'Status':
+        status = {}
+
+    reason = status.get('reason')
+    if response.status_code == 409 and reason == 'AlreadyExists':
+        error_class = AlreadyExistsError
+    elif response.status_code >= 500:
+        error_class = ServerError
+    else:
+        error_class = ERRORS.get(response.status_code, ApiError)
+    message = 'Failed {} ({}{}): {}'.format(
+        action, response.status_code, ' ' + reason if reason else '',
+        status.get('message') or 'no details')
+    return error_class(message, response.status_code, reason, status.get('details'))
+
+
+def check_response(response, action):
+    """
+    Raises an ApiError if the request failed, action describes the
+    request for the message (e.g. 'creating secret in namespace "default"')
+    """
+    if not is_success(response):
+        raise get_error(response, action)
+    return response
@@ -1,9 +1,12 @@
 import argparse
 import logging
+import socket
 import sys
 import traceback
 
-import dockercomposeparser
+import deployclient
+import deploymenttimings
+import startupprofile
 from clusterinfo import ClusterInfo
 from registryinfo import RegistryInfo
 from groupinfo import GroupInfo
@@ -71,6 +74,28 @@ def get_arg_parser():
     parser.add_argument('--verbose',
                         help='Turn on verbose logging',
                         action='store_true')
+    parser.add_argument('--slow-request-threshold', type=float, default=5.0,
+                        help='Log requests to the cluster that take longer than this (in seconds)')
+    parser.add_argument('--parallel-rollout',
+                        help='Create all deployments first and then wait for them to complete',
+                        action='store_true')
+    parser.add_argument('--record-file',
+                        help='Record all requests to the cluster to this file (for replaying)')
+    parser.add_argument('--daemon-socket',
+                        help='Submit the deployment to the deploy daemon listening on this ' \
+                             'Unix socket (see deploydaemon.py)')
+    parser.add_argument('--timings-file', default=deploymenttimings.DEFAULT_TIMINGS_FILE,
+                        help='File with the deployment timings of previous deployments, used ' \
+                             'for timeouts and progress estimates')
+    parser.add_argument('--checkpoint-file',
+                        help='Record the completed deployment steps in this file; if the ' \
+                             'deployment fails it is kept and running it again resumes it')
+    parser.add_argument('--plan',
+                        help='Only show what the deployment would do, without changing anything',
+                        action='store_true')
+    parser.add_argument('--profile-startup',
+                        help='Log how long it takes to import each module',
+                        action='store_true')
     return parser
 
 
@@ -111,6 +136,22 @@ if __name__ == '__main__':
     arguments = process_arguments()
     init_logger(arguments.verbose)
 
+    if arguments.daemon_socket and not arguments.record_file and not arguments.plan:
+        try:
+            sys.exit(deployclient.submit_job(arguments.daemon_socket, arguments))
+        except socket.error as socket_exc:
+            logging.warning('Deploy daemon is not available (%s), deploying without it',
+                            socket_exc)
+
+    # Deployment modules (and the libraries they use) are only imported
+    # once the arguments are valid and the deployment runs in this process
+    with startupprofile.ImportProfiler() as import_profiler:
+        import clusterrecording
+        import dockercomposeparser
+        from requestobserver import RequestStats, SlowRequestLogger
+    if arguments.profile_startup:
+        import_profiler.log_report()
+
     cluster_info = ClusterInfo(
         arguments.acs_host, arguments.acs_port, arguments.acs_username, arguments.acs_password,
         arguments.acs_private_key, arguments.api_endpoint_url, arguments.orchestrator)
@@ -121,13 +162,34 @@ if __name__ == '__main__':
     group_info = GroupInfo(arguments.group_name,
                            arguments.group_qualifier, arguments.group_version)
 
+    request_stats = RequestStats()
+    request_observers = [request_stats, SlowRequestLogger(arguments.slow_request_threshold)]
+    recorder = None
+    if arguments.record_file:
+        recorder = clusterrecording.ClusterRecorder()
+        request_observers.append(recorder)
+
+    timing_store = deploymenttimings.TimingStore(arguments.timings_file)
     try:
         with dockercomposeparser.DockerComposeParser(
-                arguments.compose_file, cluster_info, registry_info, group_info, arguments.deploy_ingress_controller) as compose_parser:
+                arguments.compose_file, cluster_info, registry_info, group_info,
+                arguments.deploy_ingress_controller,
+                request_observers=request_observers,
+                parallel_rollout=arguments.parallel_rollout,
+                timing_store=timing_store,
+                checkpoint_file=arguments.checkpoint_file) as compose_parser:
+            if arguments.plan:
+                compose_parser.plan().log()
+                sys.exit(0)
             compose_parser.deploy()
+            request_stats.log_summary()
+            logging.debug('Retry counters: %s', compose_parser.acs_client.retry_policy.counters)
             sys.exit(0)
     except Exception as deployment_exc:
         import traceback
         traceback.print_exc()
         logging.error('Error occurred during deployment: \n%s', deployment_exc)
         sys.exit(1)
+    finally:
+        if recorder:
+            recorder.save(arguments.record_file)
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+
+def get_digest(data):
+    """
+    Gets a digest of the (JSON serializable) data, independent of the key order
+    """
+    return hashlib.sha1(json.dumps(data, sort_keys=True)).hexdigest()
+
+
+class DeployCheckpoint(object):
+    """
+    Steps of a deployment that completed, kept in a JSON file so a failed
+    deployment can be resumed with the first step that didn't complete.
+    A step is only skipped if it completed with the same data (e.g. the
+    same deployment JSON) and for the same deployment_id (the namespace),
+    a checkpoint of another deployment is ignored.
+    """
+    def __init__(self, file_path, deployment_id):
+        self.file_path = file_path
+        self.deployment_id = deployment_id
+        self.steps = self._load()
+
+    def _load(self):
+        """
+        Loads the completed steps from the file (or returns no steps if
+        the file doesn't exist, can't be read or is for another deployment)
+        """
+        if not os.path.isfile(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (IOError, ValueError) as load_exc:
+            logging.warning('Ignoring deployment checkpoint "%s": %s', self.file_path, load_exc)
+            return {}
+        if checkpoint.get('deployment_id') != self.deployment_id:
+            logging.info('Ignoring deployment checkpoint "%s" of "%s"',
+                         self.file_path, checkpoint.get('deployment_id'))
+            return {}
+        return checkpoint.get('steps') or {}
+
+    def is_resumed(self):
+        """
+        True if steps of this deployment completed in a previous run
+        """
+        return bool(self.steps)
+
+    def is_done(self, step, data=None):
+        """
+        Checks if the step completed with the same data
+        """
+        return step in self.steps and self.steps[step] == get_digest(data)
+
+    def done(self, step, data=None):
+        """
+        Records that the step completed and saves the checkpoint
+        """
+        self.steps[step] = get_digest(data)
+        self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        temp_fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(temp_fd, 'w') as checkpoint_file:
+            json.dump({'deployment_id': self.deployment_id, 'steps': self.steps},
+                      checkpoint_file)
+        os.rename(temp_path, self.file_path)
+
+    def remove(self):
+        """
+        Removes the checkpoint, once the deployment completed
+        """
+        self.steps = {}
+        if os.path.isfile(self.file_path):
+            os.remove(self.file_path)
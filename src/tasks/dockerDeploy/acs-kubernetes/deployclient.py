@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+import socket
+
+# Arguments of deploy.py that are passed to the daemon with each job
+JOB_ARGUMENTS = ['compose_file', 'api_endpoint_url', 'orchestrator', 'group_name',
+                 'group_qualifier', 'group_version', 'deploy_ingress_controller',
+                 'registry_host', 'registry_username', 'registry_password', 'acs_host',
+                 'acs_port', 'acs_username', 'acs_password', 'acs_private_key', 'verbose',
+                 'slow_request_threshold', 'parallel_rollout', 'timings_file',
+                 'checkpoint_file']
+# Paths are made absolute, the daemon runs in another working directory
+PATH_ARGUMENTS = ['compose_file', 'timings_file', 'checkpoint_file']
+
+
+def submit_job(socket_path, arguments):
+    """
+    Sends the deployment job to the daemon, logs the messages it
+    sends back and returns the exit code (0 if deployment succeeded)
+    """
+    job_arguments = dict((name, getattr(arguments, name, None)) for name in JOB_ARGUMENTS)
+    for name in PATH_ARGUMENTS:
+        if job_arguments[name]:
+            job_arguments[name] = os.path.abspath(job_arguments[name])
+
+    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client_socket.connect(socket_path)
+    try:
+        client_socket.sendall(json.dumps({'command': 'deploy',
+                                          'arguments': job_arguments}) + '\n')
+        for line in client_socket.makefile('r'):
+            message = json.loads(line)
+            if message['type'] == 'log':
+                logging.log(message['level'], '%s', message['message'])
+            elif message['type'] == 'result':
+                logging.debug('Deploy daemon finished the job in %ss', message.get('duration'))
+                return 0 if message['succeeded'] else 1
+    finally:
+        client_socket.close()
+
+    logging.error('Deploy daemon closed the connection before the job completed')
+    return 1
@@ -0,0 +1,272 @@
+import argparse
+import json
+import logging
+import os
+import SocketServer
+import sys
+import threading
+import time
+
+import acsclient
+import deploy
+import deploymenttimings
+import dockercomposeparser
+from clusterinfo import ClusterInfo
+from groupinfo import GroupInfo
+from registryinfo import RegistryInfo
+from requestobserver import RequestStats, SlowRequestLogger
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Runs a daemon that keeps connections to Kubernetes clusters open and ' \
+                    'deploys jobs submitted by deploy.py --daemon-socket',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--socket',
+                        help='[required] Path of the Unix socket to listen on')
+    parser.add_argument('--verbose',
+                        help='Turn on verbose logging',
+                        action='store_true')
+    return parser
+
+
+class _ThreadingUnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients can go away in the middle of a job
+        logging.debug('Deploy daemon: client disconnected', exc_info=True)
+
+
+class _JobLogHandler(logging.Handler):
+    """
+    Forwards log records to the client that submitted the job
+    """
+    def __init__(self, send_message, level):
+        logging.Handler.__init__(self, level)
+        self._send_message = send_message
+
+    def emit(self, record):
+        try:
+            self._send_message({'type': 'log', 'level': record.levelno,
+                                'message': record.getMessage()})
+        except Exception:
+            # Client is gone, keep the deployment going
+            pass
+
+
+class _JobRequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Reads a single job (one line of JSON) and writes back log
+    messages followed by the result
+    """
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def send_message(message):
+            with write_lock:
+                self.wfile.write(json.dumps(message) + '\n')
+                self.wfile.flush()
+
+        line = self.rfile.readline()
+        try:
+            job = json.loads(line)
+        except ValueError:
+            send_message({'type': 'result', 'succeeded': False,
+                          'error': 'Invalid job: {}'.format(line.strip())})
+            return
+
+        if job.get('command') == 'status':
+            send_message(dict(self.server.deploy_daemon.get_status(), type='result',
+                              succeeded=True))
+            return
+        send_message(self.server.deploy_daemon.run_job(job.get('arguments', {}), send_message))
+
+
+class DeployDaemon(object):
+    """
+    Accepts deployment jobs over a Unix socket and runs them with
+    ACS clients that are kept open between jobs, so the SSH tunnel
+    and HTTP connections are reused.
+    Jobs are run one at a time, in the order they arrive.
+    """
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.counters = {'jobs': 0, 'failed_jobs': 0, 'clients': 0}
+        self._clients = {}
+        self._timing_stores = {}
+        self._job_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Starts listening on the socket
+        """
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        # Jobs include cluster credentials, so only the user can connect
+        # to the socket, from the moment it is created
+        umask = os.umask(0o177)
+        try:
+            self._server = _ThreadingUnixServer(self.socket_path, _JobRequestHandler)
+        finally:
+            os.umask(umask)
+        self._server.deploy_daemon = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.1,))
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info('Deploy daemon listening on "%s"', self.socket_path)
+
+    def stop(self):
+        """
+        Stops listening and closes all connections to the clusters
+        """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        for client in self._clients.values():
+            client.shutdown()
+        self._clients = {}
+
+    def serve_forever(self):
+        """
+        Runs until interrupted
+        """
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def get_status(self):
+        """
+        Gets the job counters and the number of open clients
+        """
+        return dict(self.counters, open_clients=len(self._clients))
+
+    def _get_client_key(self, arguments):
+        return tuple(arguments.get(name) for name in [
+            'api_endpoint_url', 'orchestrator', 'acs_host', 'acs_port', 'acs_username',
+            'acs_password', 'acs_private_key'])
+
+    def _get_acs_client(self, arguments):
+        """
+        Gets the ACS client for the cluster, creating it
+        if there is none yet
+        """
+        key = self._get_client_key(arguments)
+        if key not in self._clients:
+            client = acsclient.ACSClient(ClusterInfo(
+                arguments.get('acs_host'), arguments.get('acs_port'),
+                arguments.get('acs_username'), arguments.get('acs_password'),
+                arguments.get('acs_private_key'), arguments.get('api_endpoint_url'),
+                arguments.get('orchestrator')))
+            client.use_connection_pool()
+            self.counters['clients'] += 1
+            self._clients[key] = client
+        return self._clients[key]
+
+    def _drop_acs_client(self, arguments):
+        """
+        Closes the client, so the next job for the cluster
+        starts with a new tunnel and connections
+        """
+        client = self._clients.pop(self._get_client_key(arguments), None)
+        if client:
+            client.shutdown()
+
+    def run_job(self, arguments, send_message):
+        """
+        Deploys the job and returns the result message. Log
+        messages are passed to send_message while the job runs.
+        """
+        with self._job_lock:
+            self.counters['jobs'] += 1
+            log_handler = _JobLogHandler(
+                send_message, logging.DEBUG if arguments.get('verbose') else logging.INFO)
+            logging.root.addHandler(log_handler)
+            start_time = time.time()
+            acs_client = None
+            try:
+                # Each job gets its own retry budget and request observers
+                acs_client = self._get_acs_client(arguments).create_deploy_client()
+                self._deploy(arguments, acs_client)
+                return {'type': 'result', 'succeeded': True,
+                        'duration': round(time.time() - start_time, 3),
+                        'retry_counters': acs_client.retry_policy.counters}
+            except Exception as deployment_exc:
+                logging.error('Error occurred during deployment: %s', deployment_exc)
+                self.counters['failed_jobs'] += 1
+                self._drop_acs_client(arguments)
+                return {'type': 'result', 'succeeded': False, 'error': str(deployment_exc),
+                        'duration': round(time.time() - start_time, 3),
+                        'retry_counters': acs_client.retry_policy.counters if acs_client else None}
+            finally:
+                logging.root.removeHandler(log_handler)
+
+    def _get_timing_store(self, timings_file):
+        """
+        Gets the timing store for the file, timings of jobs
+        without a file are only kept in memory
+        """
+        if not timings_file in self._timing_stores:
+            self._timing_stores[timings_file] = deploymenttimings.TimingStore(timings_file)
+        return self._timing_stores[timings_file]
+
+    def _deploy(self, arguments, acs_client):
+        request_stats = RequestStats()
+        request_observers = [
+            request_stats, SlowRequestLogger(arguments.get('slow_request_threshold') or 5.0)]
+        for observer in request_observers:
+            acs_client.add_request_observer(observer)
+        timing_store = self._get_timing_store(arguments.get('timings_file'))
+        registry_info = RegistryInfo(
+            arguments.get('registry_host'), arguments.get('registry_username'),
+            arguments.get('registry_password'))
+        group_info = GroupInfo(
+            arguments.get('group_name'), arguments.get('group_qualifier'),
+            arguments.get('group_version'))
+        with dockercomposeparser.DockerComposeParser(
+                arguments.get('compose_file'), acs_client.cluster_info, registry_info,
+                group_info, arguments.get('deploy_ingress_controller'),
+                parallel_rollout=arguments.get('parallel_rollout'),
+                acs_client=acs_client, timing_store=timing_store,
+                checkpoint_file=arguments.get('checkpoint_file')) as compose_parser:
+            compose_parser.deploy()
+            # Deployment succeeded, don't remove it when leaving the 'with' block
+            compose_parser.cleanup_needed = False
+        request_stats.log_summary()
+        logging.debug('Retry counters: %s', acs_client.retry_policy.counters)
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    if arguments.socket is None:
+        get_arg_parser().error('argument --socket is required')
+
+    deploy.init_logger(arguments.verbose)
+    # Job log handlers decide what gets forwarded, the daemon's own
+    # output is filtered by the stream handler
+    for handler in logging.root.handlers:
+        handler.setLevel(logging.root.level)
+    logging.root.setLevel(logging.DEBUG)
+
+    DeployDaemon(arguments.socket).serve_forever()
+    sys.exit(0)
@@ -0,0 +1,109 @@
+import difflib
+import json
+import logging
+
+# Rough durations (in seconds) used to estimate how long a deployment takes:
+# creating an object is a single request, a deployment also waits for its
+# rollout to complete
+STEP_SECONDS = 1.0
+ROLLOUT_SECONDS = 30.0
+
+
+def filter_like(existing, target):
+    """
+    Returns the parts of existing that are also in target, so
+    fields added by the cluster (e.g. metadata.uid, status) don't
+    show up in the diff
+    """
+    if isinstance(existing, dict) and isinstance(target, dict):
+        return dict((key, filter_like(existing[key], target[key]))
+                    for key in target if key in existing)
+    if isinstance(existing, list) and isinstance(target, list) and \
+       len(existing) == len(target):
+        return [filter_like(e, t) for e, t in zip(existing, target)]
+    return existing
+
+
+class DeploymentPlan(object):
+    """
+    What a deployment would do, without doing it: the steps with their
+    estimated duration, the target objects, the replica counts and
+    the diff to what is currently deployed
+    """
+    def __init__(self, namespace, existing_namespace=None):
+        self.namespace = namespace
+        self.existing_namespace = existing_namespace
+        self.steps = []
+        self.replicas = {}
+        self.diffs = []
+        self.target = []
+
+    def add_step(self, description, estimated_duration=STEP_SECONDS):
+        """
+        Adds a deployment step
+        """
+        self.steps.append({'description': description,
+                           'estimated_duration': estimated_duration})
+
+    def add_diff(self, name, existing, target):
+        """
+        Adds the unified diff between the existing and target JSON
+        of an object (None if it doesn't exist)
+        """
+        diff = list(difflib.unified_diff(
+            self._to_lines(existing), self._to_lines(target),
+            fromfile='deployed/{}'.format(name), tofile='planned/{}'.format(name),
+            lineterm=''))
+        if diff:
+            self.diffs.append({'name': name, 'diff': diff})
+
+    def _to_lines(self, json_object):
+        if json_object is None:
+            return []
+        return json.dumps(json_object, indent=2, sort_keys=True,
+                          separators=(',', ': ')).splitlines()
+
+    def get_estimated_duration(self):
+        """
+        Gets the estimated duration of all steps (in seconds)
+        """
+        return sum([step['estimated_duration'] for step in self.steps])
+
+    def to_dict(self):
+        """
+        Gets the plan as a dictionary (e.g. for writing it to a JSON file)
+        """
+        return {
+            'namespace': self.namespace,
+            'existing_namespace': self.existing_namespace,
+            'steps': self.steps,
+            'replicas': self.replicas,
+            'diffs': self.diffs,
+            'target': self.target,
+            'estimated_duration': self.get_estimated_duration()
+        }
+
+    def log(self):
+        """
+        Logs the steps, replica counts and diffs
+        """
+        if self.existing_namespace:
+            logging.info('Plan for updating namespace "%s" to "%s":',
+                         self.existing_namespace, self.namespace)
+        else:
+            logging.info('Plan for deploying to namespace "%s":', self.namespace)
+
+        for index, step in enumerate(self.steps):
+            logging.info('  %s. %s (~%ss)', index + 1, step['description'],
+                         step['estimated_duration'])
+
+        logging.info('Replicas (deployed -> target):')
+        for name in sorted(self.replicas):
+            counts = self.replicas[name]
+            logging.info('  %s: %s -> %s', name, counts['deployed'], counts['target'])
+
+        for diff in self.diffs:
+            logging.info('\n'.join(diff['diff']))
+        if not self.diffs:
+            logging.info('No changes to the deployed services')
+        logging.info('Estimated duration: %ss', self.get_estimated_duration())
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+DEFAULT_TIMINGS_FILE = os.path.join(os.path.expanduser('~'), '.acs-deploy-timings.json')
+
+
+def get_percentile(values, percentile):
+    """
+    Gets the percentile (0-100) of the values, using the nearest rank
+    """
+    sorted_values = sorted(values)
+    index = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class TimingStore(object):
+    """
+    Stores how long it took for services to deploy (per group and service)
+    and uses it to compute adaptive timeouts and estimates. Timings are
+    kept in a JSON file, so they are available to later deployments.
+    """
+    # Number of timings kept for each service
+    max_samples = 50
+    # Number of timings needed before the timeout is adapted
+    min_samples = 5
+    # Timeout is the 99th percentile times timeout_factor,
+    # but at least min_timeout and at most max_timeout (in seconds)
+    timeout_factor = 3.0
+    min_timeout = 60
+    max_timeout = 30 * 60
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._pending = []
+        self.timings = self._load()
+
+    def _load(self):
+        """
+        Loads the timings from the file (or returns no timings if
+        the file doesn't exist or can't be read)
+        """
+        if not self.file_path or not os.path.isfile(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r') as timings_file:
+                return json.load(timings_file)
+        except (IOError, ValueError) as load_exc:
+            logging.warning('Ignoring deployment timings in "%s": %s', self.file_path, load_exc)
+            return {}
+
+    def _get_key(self, group, service):
+        return '{}/{}'.format(group.strip('/'), service)
+
+    def get_timings(self, group, service):
+        """
+        Gets the recorded timings (in seconds) for the service
+        """
+        with self._lock:
+            return list(self.timings.get(self._get_key(group, service), []))
+
+    def record(self, group, service, duration):
+        """
+        Records how long it took for the service to deploy
+        and saves all timings to the file
+        """
+        key = self._get_key(group, service)
+        with self._lock:
+            self._add_timing(self.timings, key, duration)
+            self._pending.append((key, duration))
+        self.save()
+
+    def _add_timing(self, timings, key, duration):
+        service_timings = timings.setdefault(key, [])
+        service_timings.append(round(duration, 3))
+        del service_timings[:-self.max_samples]
+
+    def save(self):
+        """
+        Adds the timings recorded since the last save to the file. The file is
+        re-read first, so timings saved by other deployments are not lost.
+        """
+        if not self.file_path:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            timings = self._load()
+            for key, duration in self._pending:
+                self._add_timing(timings, key, duration)
+            try:
+                directory = os.path.dirname(os.path.abspath(self.file_path))
+                temp_fd, temp_path = tempfile.mkstemp(dir=directory)
+                with os.fdopen(temp_fd, 'w') as timings_file:
+                    json.dump(timings, timings_file)
+                os.rename(temp_path, self.file_path)
+            except (IOError, OSError) as save_exc:
+                logging.warning('Failed saving deployment timings to "%s": %s',
+                                self.file_path, save_exc)
+                return
+            self._pending = []
+            self.timings = timings
+
+    def get_timeout(self, group, service, default):
+        """
+        Gets the max time (in seconds) to wait for the service to deploy,
+        or default if there are not enough timings yet
+        """
+        timings = self.get_timings(group, service)
+        if len(timings) < self.min_samples:
+            return default
+        timeout = get_percentile(timings, 99) * self.timeout_factor
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def get_estimate(self, group, service):
+        """
+        Gets the median time (in seconds) it took for the
+        service to deploy or None if there are no timings
+        """
+        timings = self.get_timings(group, service)
+        if not timings:
+            return None
+        return get_percentile(timings, 50)
@@ -1,18 +1,23 @@
 import json
 import logging
 import os
+import time
 
 import yaml
 
 import acsclient
+import deploymentplan
 import serviceparser
+from deploycheckpoint import DeployCheckpoint
 from ingress_controller import IngressController
 from kubernetes import Kubernetes
 
 
 class DockerComposeParser(object):
 
-    def __init__(self, compose_file, cluster_info, registry_info, group_info, deploy_ingress_controller):
+    def __init__(self, compose_file, cluster_info, registry_info, group_info,
+                 deploy_ingress_controller, request_observers=None, parallel_rollout=False,
+                 acs_client=None, timing_store=None, checkpoint_file=None):
         self.cleanup_needed = False
         self._ensure_docker_compose(compose_file)
         with open(compose_file, 'r') as compose_stream:
@@ -22,10 +27,26 @@ class DockerComposeParser(object):
         self.registry_info = registry_info
         self.group_info = group_info
 
-        self.acs_client = acsclient.ACSClient(self.cluster_info)
+        # A client passed in (e.g. shared by a batch deployment) is not shut down by the parser
+        self._owns_acs_client = acs_client is None
+        self.acs_client = acs_client or acsclient.ACSClient(self.cluster_info)
+        for observer in request_observers or []:
+            self.acs_client.add_request_observer(observer)
         self.kubernetes = Kubernetes(self.acs_client)
+        # Objects are listed once and watched during the run, instead of
+        # making a request for every exists check
+        self.kubernetes.start_cache()
+        # Timings of the services are kept per group, not per group version
+        self.kubernetes.timing_store = timing_store
+        self.kubernetes.timing_groups[self.group_info.get_namespace()] = \
+            self.group_info.get_id(include_version=False)
         self.deploy_ingress_controller = deploy_ingress_controller
+        self.parallel_rollout = parallel_rollout
         self.ingress_controller = IngressController(self.kubernetes)
+        # With a checkpoint file, the completed steps are recorded and a failed
+        # deployment is not removed, so running it again resumes it
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint = None
 
     def __enter__(self):
         """
@@ -46,7 +67,8 @@ class DockerComposeParser(object):
         """
         Shuts down the acs client if needed
         """
-        if self.acs_client:
+        self.kubernetes.stop_cache()
+        if self.acs_client and self._owns_acs_client:
             self.acs_client.shutdown()
 
     def _ensure_docker_compose(self, docker_compose_file):
@@ -129,18 +151,49 @@ class DockerComposeParser(object):
             "group_version": group_info.version,
             "name": group_info.get_namespace()
         }
-        logging.info('Creating namespace "%s"', group_info.get_namespace())
-        self.kubernetes.create_namespace(group_info.get_namespace(), labels)
+        namespace_json = {
+            "kind": "Namespace",
+            "apiVersion": "v1",
+            "metadata": {
+                "name": group_info.get_namespace(),
+                "labels": labels
+            }
+        }
+        self._apply_step('namespace', namespace_json, lambda: self._apply(
+            'namespaces', None, namespace_json))
 
-    def _predeployment_check(self):
+    def _apply(self, resource, namespace, obj, endpoint='api/v1', wait_for_complete=False):
+        """
+        Creates or updates the object on the cluster
+        """
+        result, _ = self.kubernetes.apply(
+            resource, namespace, obj, endpoint, wait_for_complete=wait_for_complete)
+        logging.info('%s "%s.%s" %s', obj['kind'], obj['metadata']['name'],
+                     namespace or '', result)
+
+    def _apply_step(self, step, data, apply_function):
+        """
+        Calls apply_function, unless the step already completed with the
+        same data in a previous run of this deployment (see checkpoint_file)
+        """
+        if self.checkpoint is not None and self.checkpoint.is_done(step, data):
+            logging.info('Skipping "%s", completed by a previous run', step)
+            return
+        apply_function()
+        if self.checkpoint is not None:
+            self.checkpoint.done(step, data)
+
+    def _predeployment_check(self, resumed_namespace=None):
         """
         Checks if services can be deployed and
         returns True if services are being updated or
-        False if this is the first deployment
+        False if this is the first deployment. The
+        resumed_namespace is the namespace of a failed
+        deployment that is resumed.
         """
         group_id = self.group_info.get_id(include_version=False)
-        namespaces = self.kubernetes.get_namespaces(
-            'group_id={}'.format(group_id))
+        namespaces = [namespace for namespace in self.kubernetes.get_namespaces(
+            'group_id={}'.format(group_id)) if namespace['metadata']['name'] != resumed_namespace]
         group_version = self.group_info.get_version()
         is_update = False
 
@@ -174,12 +227,10 @@ class DockerComposeParser(object):
         # TODO: Could registry be global; otherwise we are going to deploy
         # the secret on each service deployment because of a different
         # namespace
-        registry_secret = self.registry_info.create_secret_json()
-        if not self.kubernetes.secret_exists(self.registry_info.get_secret_name(), namespace):
-            logging.info('Deploying registry secret')
-            self.kubernetes.create_secret(registry_secret, namespace)
-        else:
-            logging.info('Registry secret already exists')
+        registry_secret = json.loads(self.registry_info.create_secret_json())
+        # The credentials are not written to the checkpoint
+        self._apply_step('secret', registry_secret['metadata'], lambda: self._apply(
+            'secrets', namespace, registry_secret))
 
     def _delete_all(self, namespace):
         """
@@ -191,16 +242,127 @@ class DockerComposeParser(object):
         self.kubernetes.delete_replicasets(namespace)
         self.kubernetes.delete_namespace(namespace)
 
+    def plan(self):
+        """
+        Computes what deploy() would do, without making any changes: the
+        steps, the target objects and replica counts and the diff to the
+        objects in the deployed namespace
+        """
+        is_update, _, existing_namespace = self._predeployment_check()
+        new_namespace = self.group_info.get_namespace()
+        plan = deploymentplan.DeploymentPlan(new_namespace, existing_namespace)
+        plan.add_step('Create namespace "{}"'.format(new_namespace))
+        plan.add_step('Create registry secret "{}"'.format(self.registry_info.get_secret_name()))
+
+        needs_ingress_controller, all_deployments = self._parse_compose()
+        if needs_ingress_controller and self.deploy_ingress_controller:
+            for name in self.ingress_controller.get_missing_deployments():
+                plan.add_step(
+                    'Create deployment "{}.{}"'.format(name, IngressController.DEFAULT_NAMESPACE),
+                    deploymentplan.STEP_SECONDS + deploymentplan.ROLLOUT_SECONDS)
+
+        existing = {'deployment': {}, 'service': {}, 'ingress': {}}
+        if is_update:
+            existing['deployment'] = self._get_by_name(
+                self.kubernetes.get_deployments(existing_namespace))
+            existing['service'] = self._get_by_name(
+                self.kubernetes.get_services(existing_namespace))
+            existing['ingress'] = self._get_by_name(
+                self.kubernetes.get_ingresses(existing_namespace))
+
+        rollout_duration = 0 if self.parallel_rollout else deploymentplan.ROLLOUT_SECONDS
+        for deployment_item in all_deployments:
+            service_name = deployment_item['service_name']
+            deployment_json = json.loads(deployment_item['deployment']['json'])
+            existing_deployment = existing['deployment'].pop(service_name, None)
+            deployed_replicas = 0
+            if existing_deployment:
+                deployed_replicas = existing_deployment['spec']['replicas']
+                deployment_json['spec']['replicas'] = deployed_replicas
+            plan.replicas[service_name] = {
+                'deployed': deployed_replicas,
+                'target': deployment_json['spec']['replicas']
+            }
+
+            plan.add_step('Create deployment "{}.{}"'.format(service_name, new_namespace),
+                          deploymentplan.STEP_SECONDS + rollout_duration)
+            plan.add_diff('deployment/{}'.format(service_name),
+                          deploymentplan.filter_like(existing_deployment, deployment_json)
+                          if existing_deployment else None, deployment_json)
+            plan.target.append(deployment_json)
+
+            for resource in ['service', 'ingress']:
+                if not deployment_item[resource]['json']:
+                    continue
+                target_json = json.loads(deployment_item[resource]['json'])
+                name = target_json['metadata']['name']
+                existing_json = existing[resource].pop(name, None)
+                plan.add_step('Create {} "{}.{}"'.format(resource, name, new_namespace))
+                plan.add_diff('{}/{}'.format(resource, name),
+                              deploymentplan.filter_like(existing_json, target_json)
+                              if existing_json else None, target_json)
+                plan.target.append(target_json)
+
+        if self.parallel_rollout and all_deployments:
+            # Rollouts run at the same time, so it's as long as the slowest one
+            plan.add_step('Wait for deployments in "{}" to complete'.format(new_namespace),
+                          deploymentplan.ROLLOUT_SECONDS)
+
+        # Objects that are not in the compose file anymore
+        for resource in ['deployment', 'service', 'ingress']:
+            for name, existing_json in sorted(existing[resource].items()):
+                plan.add_diff('{}/{}'.format(resource, name), existing_json, None)
+
+        if is_update:
+            plan.add_step('Delete namespace "{}"'.format(existing_namespace))
+        return plan
+
+    def _get_by_name(self, objects):
+        """
+        Gets a dictionary of the objects by their name
+        """
+        return dict((obj['metadata']['name'], obj) for obj in objects)
+
+    def _apply_deployment_item(self, deployment_item, deployment_json, namespace,
+                               wait_for_complete):
+        """
+        Creates or updates the service, deployment and ingress of a service
+        (the service first, so its environment variables are set in the pods)
+        """
+        beta_endpoint = self.kubernetes._beta_endpoint()
+        for item_key, resource, endpoint in [('service', 'services', 'api/v1'),
+                                             ('deployment', 'deployments', beta_endpoint),
+                                             ('ingress', 'ingresses', beta_endpoint)]:
+            if item_key == 'deployment':
+                target_json = deployment_json
+            elif deployment_item[item_key]['json']:
+                target_json = json.loads(deployment_item[item_key]['json'])
+            else:
+                continue
+            self._apply_step(
+                '{}/{}'.format(item_key, target_json['metadata']['name']), target_json,
+                lambda: self._apply(resource, namespace, target_json, endpoint,
+                                    wait_for_complete=wait_for_complete))
+
     def deploy(self):
         """
-        Deploys the services defined in docker-compose.yml file
+        Deploys the services defined in docker-compose.yml file. The objects are
+        applied (created, or updated if they exist), so deploying again after a
+        failure continues with what is already on the cluster.
         """
         new_namespace = self.group_info.get_namespace()
-        is_update, _, existing_namespace = self._predeployment_check()
+        if self.checkpoint_file:
+            self.checkpoint = DeployCheckpoint(self.checkpoint_file, new_namespace)
+        resumed = self.checkpoint is not None and self.checkpoint.is_resumed()
+        if resumed:
+            logging.info('Resuming deployment to namespace "%s"', new_namespace)
+        is_update, _, existing_namespace = self._predeployment_check(
+            new_namespace if resumed else None)
 
         # Create a new namespace - it's either a first deployment or an upgrade
         self._create_namespace(self.group_info)
-        self.cleanup_needed = True
+        # A failed deployment is kept for resuming, if there is a checkpoint
+        self.cleanup_needed = self.checkpoint is None
 
         self._deploy_registry_secret()
         needs_ingress_controller, all_deployments = self._parse_compose()
@@ -212,12 +374,16 @@ class DockerComposeParser(object):
         else:
             logging.info('Skipping NGINX Ingress Loadbalancer deployment')
 
-        if is_update:
-            for deployment_item in all_deployments:
-                service_name = deployment_item['service_name']
+        # With parallel rollout, all deployments are created first and
+        # we wait for them to complete at the end
+        wait_for_complete = not self.parallel_rollout
+        created_deployments = []
+        start_timestamps = {}
 
-                deployment_json = json.loads(
-                    deployment_item['deployment']['json'])
+        for deployment_item in all_deployments:
+            service_name = deployment_item['service_name']
+            deployment_json = json.loads(deployment_item['deployment']['json'])
+            if is_update:
                 if self.kubernetes.deployment_exists(service_name, existing_namespace):
                     existing_replicas = self.kubernetes.get_replicas(
                         existing_namespace, service_name)
@@ -227,38 +393,23 @@ class DockerComposeParser(object):
                 else:
                     logging.info('Deploying new service "%s"', service_name)
 
-                # Create the deployment
-                self.kubernetes.create_deployment(
-                    json.dumps(deployment_json), new_namespace, wait_for_complete=True)
-
-                # Create the service
-                service_json = deployment_item['service']['json']
-                if service_json:
-                    self.kubernetes.create_service(service_json, new_namespace)
+            start_timestamps[service_name] = time.time()
+            self._apply_deployment_item(
+                deployment_item, deployment_json, new_namespace, wait_for_complete)
+            created_deployments.append(service_name)
 
-                # Create ingress
-                ingress_json = deployment_item['ingress']['json']
-                if ingress_json:
-                    self.kubernetes.create_ingress(ingress_json, new_namespace)
+        if self.parallel_rollout:
+            self.kubernetes.wait_for_deployments_complete(
+                start_timestamps, new_namespace, created_deployments)
 
+        if is_update:
             logging.info('Remove previous deployment')
             self._delete_all(existing_namespace)
-        else:
-            for deployment_item in all_deployments:
-                service_json = deployment_item['service']['json']
-                if service_json:
-                    self.kubernetes.create_service(service_json, new_namespace)
-
-                deployment_json = deployment_item['deployment']['json']
-                self.kubernetes.create_deployment(
-                    deployment_json, new_namespace, wait_for_complete=True)
-
-                ingress_json = deployment_item['ingress']['json']
-                if ingress_json:
-                    self.kubernetes.create_ingress(ingress_json, new_namespace)
 
         if needs_ingress_controller and self.deploy_ingress_controller:
             logging.info(
                 'ExternalIP of NGINX Ingress Loadbalancer: "%s"',
                 self.ingress_controller.get_external_ip())
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
         logging.info('Deployment completed')
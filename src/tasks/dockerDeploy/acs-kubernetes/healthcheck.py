@@ -0,0 +1,136 @@
+import json
+import logging
+
+import servicelabels
+
+
+class HealthCheck(object):
+    """
+    Translates the health check labels (the same ones as on DC/OS) into
+    Kubernetes readiness and liveness probes
+    """
+    LABEL_PREFIXES = ['com.microsoft.acs.kubernetes.healthcheck',
+                      'com.microsoft.acs.dcos.marathon.healthcheck']
+    PATH_SUFFIX = '.path'
+    PORT_INDEX_SUFFIX = '.portindex'
+    COMMAND_SUFFIX = '.command'
+    HEALTH_CHECKS_SUFFIX = 's'
+
+    def __init__(self, labels):
+        if labels is None:
+            raise ValueError('Labels cannot be empty')
+        self.labels = self._get_health_check_labels(servicelabels.parse_labels(labels))
+
+    @staticmethod
+    def is_health_check_label(name):
+        """
+        True if the label is used for health checks
+        """
+        return any([name.lower().startswith(prefix) for prefix in HealthCheck.LABEL_PREFIXES])
+
+    @staticmethod
+    def get_default_health_check_config():
+        """
+        Gets the default (TCP) healthcheck config, with the same
+        fields and values as on DC/OS
+        """
+        return {
+            'portIndex': 0,
+            'protocol': 'TCP',
+            'gracePeriodSeconds': 300,
+            'intervalSeconds': 5,
+            'timeoutSeconds': 20,
+            'maxConsecutiveFailures': 3
+        }
+
+    def _get_health_check_labels(self, labels):
+        """
+        Gets the health check labels by their lowercase name without
+        prefix (e.g. '.path'), labels with the Kubernetes prefix win
+        """
+        health_check_labels = {}
+        for prefix in reversed(HealthCheck.LABEL_PREFIXES):
+            for suffix in ['', self.PATH_SUFFIX, self.PORT_INDEX_SUFFIX,
+                           self.COMMAND_SUFFIX, self.HEALTH_CHECKS_SUFFIX]:
+                if prefix + suffix in labels:
+                    health_check_labels[suffix] = labels.get(prefix + suffix)
+        return health_check_labels
+
+    def get_health_check_config(self):
+        """
+        Gets the health check config (in the Marathon format), or
+        None if there are no health check labels
+        """
+        healthcheck = None
+        if '' in self.labels or self.PATH_SUFFIX in self.labels or \
+            self.PORT_INDEX_SUFFIX in self.labels:
+            healthcheck = HealthCheck.get_default_health_check_config()
+            if self.PATH_SUFFIX in self.labels:
+                healthcheck['path'] = self.labels[self.PATH_SUFFIX]
+                healthcheck['protocol'] = 'HTTP'
+            if self.PORT_INDEX_SUFFIX in self.labels:
+                healthcheck['portIndex'] = int(self.labels[self.PORT_INDEX_SUFFIX])
+                healthcheck['protocol'] = 'HTTP'
+        elif self.COMMAND_SUFFIX in self.labels:
+            healthcheck = HealthCheck.get_default_health_check_config()
+            healthcheck['command'] = {'value': self.labels[self.COMMAND_SUFFIX]}
+            healthcheck['protocol'] = 'COMMAND'
+        elif self.HEALTH_CHECKS_SUFFIX in self.labels:
+            healthcheck = json.loads(self.labels[self.HEALTH_CHECKS_SUFFIX])
+            if isinstance(healthcheck, list):
+                # Kubernetes has a single readiness and liveness probe per container
+                if len(healthcheck) > 1:
+                    logging.warning('Only the first of %s health checks is used',
+                                    len(healthcheck))
+                healthcheck = healthcheck[0] if healthcheck else None
+        return healthcheck
+
+    def _get_handler(self, healthcheck, container_ports):
+        """
+        Gets the probe handler (httpGet, tcpSocket or exec)
+        """
+        protocol = healthcheck.get('protocol', 'HTTP').upper()
+        if protocol in ['COMMAND', 'MESOS_COMMAND']:
+            return {'exec': {'command': ['sh', '-c', healthcheck['command']['value']]}}
+
+        port_index = int(healthcheck.get('portIndex', 0))
+        if 'port' in healthcheck:
+            port = int(healthcheck['port'])
+        elif port_index < len(container_ports):
+            port = container_ports[port_index]
+        else:
+            raise ValueError('Health check port index {} is out of range ({} ports)'.format(
+                port_index, len(container_ports)))
+
+        if protocol in ['TCP', 'MESOS_TCP']:
+            return {'tcpSocket': {'port': port}}
+        return {'httpGet': {'path': healthcheck.get('path', '/'), 'port': port,
+                            'scheme': 'HTTPS' if 'HTTPS' in protocol else 'HTTP'}}
+
+    def get_probes(self, container_ports):
+        """
+        Gets the (readiness, liveness) probes for a container with the
+        container_ports, or (None, None) if there are no health check labels.
+        Pods are ready as soon as the check passes, but are only restarted
+        if it still fails after the grace period.
+        """
+        healthcheck = self.get_health_check_config()
+        if healthcheck is None:
+            return None, None
+
+        if 'httpGet' in healthcheck or 'tcpSocket' in healthcheck or 'exec' in healthcheck:
+            # Probe in the Kubernetes format, used as is
+            return dict(healthcheck), dict(healthcheck)
+
+        defaults = HealthCheck.get_default_health_check_config()
+        handler = self._get_handler(healthcheck, container_ports)
+        timing = {
+            'periodSeconds': int(healthcheck.get('intervalSeconds', defaults['intervalSeconds'])),
+            'timeoutSeconds': int(healthcheck.get('timeoutSeconds', defaults['timeoutSeconds'])),
+            'failureThreshold': int(healthcheck.get('maxConsecutiveFailures',
+                                                    defaults['maxConsecutiveFailures']))
+        }
+        readiness_probe = dict(handler, **timing)
+        liveness_probe = dict(handler, initialDelaySeconds=int(healthcheck.get(
+            'gracePeriodSeconds', defaults['gracePeriodSeconds'])), **timing)
+        return readiness_probe, liveness_probe
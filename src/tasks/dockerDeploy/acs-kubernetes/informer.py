@@ -0,0 +1,286 @@
+import copy
+import json
+import logging
+import threading
+
+import requests
+
+import apierrors
+
+
+def _get_resource_version(obj):
+    """
+    Gets the resource version of the object as a number, or None if it
+    doesn't have one (resource versions are opaque, but in practice they
+    are increasing numbers)
+    """
+    try:
+        return int(obj['metadata']['resourceVersion'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Informer(object):
+    """
+    Keeps the objects of one resource in a namespace (or the namespaces
+    themselves, with namespace None) in memory: they are listed once and
+    kept current with a watch stream.
+    """
+    # Time (in seconds) to wait before the watch is restarted after it failed
+    restart_delay = 1
+    # Time (in seconds) to wait for data on the watch stream, before it is reopened
+    read_timeout = 5 * 60
+
+    def __init__(self, kubernetes, resource, namespace, endpoint='api/v1'):
+        self.kubernetes = kubernetes
+        self.resource = resource
+        self.namespace = namespace
+        self.endpoint = endpoint
+        self.resource_version = None
+        self._objects = {}
+        self._lock = threading.Lock()
+        # Notified whenever the objects change
+        self._changed = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._response = None
+        self._thread = None
+
+    def _get_path(self):
+        """
+        Gets the path of the resource, relative to the endpoint
+        """
+        if self.namespace is None:
+            return self.resource
+        return 'namespaces/{}/{}'.format(self.namespace, self.resource)
+
+    def start(self):
+        """
+        Lists the objects and starts watching for changes
+        """
+        self._list()
+        self._thread = threading.Thread(target=self._watch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching for changes
+        """
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def get(self, name):
+        """
+        Gets a copy of the object with the name or None if it doesn't exist
+        """
+        with self._lock:
+            obj = self._objects.get(name)
+        return copy.deepcopy(obj)
+
+    def list(self):
+        """
+        Gets copies of all objects
+        """
+        with self._lock:
+            objects = list(self._objects.values())
+        return copy.deepcopy(objects)
+
+    def wait(self, timeout):
+        """
+        Waits until the objects change or the timeout (in seconds) expires
+        """
+        with self._lock:
+            self._changed.wait(timeout)
+
+    def update(self, obj):
+        """
+        Adds or updates the object, unless a newer version is already known
+        """
+        name = obj['metadata']['name']
+        with self._lock:
+            existing = self._objects.get(name)
+            if existing is not None and self._is_older(obj, existing):
+                return
+            self._objects[name] = obj
+            self._changed.notify_all()
+
+    def delete(self, name, obj=None):
+        """
+        Removes the object, unless obj is provided and the
+        known version is newer (i.e. it was created again)
+        """
+        with self._lock:
+            existing = self._objects.get(name)
+            if existing is None or (obj is not None and self._is_older(obj, existing)):
+                return
+            del self._objects[name]
+            self._changed.notify_all()
+
+    def clear(self):
+        """
+        Removes all objects
+        """
+        with self._lock:
+            self._objects = {}
+            self._changed.notify_all()
+
+    def _is_older(self, obj, existing):
+        version = _get_resource_version(obj)
+        existing_version = _get_resource_version(existing)
+        if version is None or existing_version is None:
+            return False
+        return version < existing_version
+
+    def _list(self):
+        """
+        Lists all objects and replaces the known ones
+        """
+        response = self.kubernetes.get_request(self._get_path(), self.endpoint)
+        if apierrors.is_not_found(response):
+            # Namespace doesn't exist (yet), objects are added by the watch
+            response = {}
+        else:
+            response = apierrors.check_response(response, 'listing {} in namespace "{}"'.format(
+                self.resource, self.namespace)).json()
+        items = response.get('items') or []
+        with self._lock:
+            self._objects = dict((obj['metadata']['name'], obj) for obj in items)
+            self.resource_version = response.get('metadata', {}).get('resourceVersion')
+            self._changed.notify_all()
+
+    def _watch(self):
+        """
+        Applies the events from the watch stream until the informer is
+        stopped. If the stream fails, the objects are listed again.
+        """
+        acs_client = self.kubernetes.acs_client
+        while not self._stopped.is_set():
+            path = '{}/watch/{}'.format(self.endpoint, self._get_path())
+            url = acs_client.create_request_url(path)
+            if self.resource_version:
+                url = '{}?resourceVersion={}'.format(url, self.resource_version)
+            try:
+                self._response = (acs_client.session or requests).get(
+                    url, stream=True, timeout=(30, self.read_timeout))
+                acs_client.notify_event_stream_opened(id(self), path)
+                for line in self._response.iter_lines(chunk_size=1024):
+                    if self._stopped.is_set():
+                        break
+                    if line:
+                        acs_client.notify_event_received(id(self), line)
+                        self._apply(json.loads(line))
+            except Exception as watch_exc:
+                if self._stopped.is_set():
+                    break
+                logging.debug('Watch on %s failed: %s', path, watch_exc)
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+
+            if self._stopped.wait(self.restart_delay):
+                break
+            try:
+                self._list()
+            except Exception as list_exc:
+                logging.debug('Listing %s failed: %s', self._get_path(), list_exc)
+
+    def _apply(self, event):
+        """
+        Applies a watch event
+        """
+        obj = event.get('object') or {}
+        if event.get('type') == 'ERROR':
+            # e.g. the resource version is too old, start from the current state
+            raise Exception('Watch error: {}'.format(obj.get('message')))
+        version = obj.get('metadata', {}).get('resourceVersion')
+        if event.get('type') in ['ADDED', 'MODIFIED']:
+            self.update(obj)
+        elif event.get('type') == 'DELETED':
+            self.delete(obj['metadata']['name'], obj)
+        if version:
+            self.resource_version = version
+
+
+class ClusterCache(object):
+    """
+    Informers for the resources and namespaces used during a deployment.
+    An informer is started the first time its objects are needed.
+    """
+    def __init__(self, kubernetes):
+        self.kubernetes = kubernetes
+        self._informers = {}
+        self._lock = threading.Lock()
+
+    def get_informer(self, resource, namespace, endpoint='api/v1'):
+        """
+        Gets the (started) informer for the resource in the namespace
+        """
+        key = (resource, namespace)
+        with self._lock:
+            informer = self._informers.get(key)
+            if informer is None:
+                informer = Informer(self.kubernetes, resource, namespace, endpoint)
+                informer.start()
+                self._informers[key] = informer
+        return informer
+
+    def get(self, resource, namespace, name, endpoint='api/v1'):
+        """
+        Gets the object or None if it doesn't exist
+        """
+        return self.get_informer(resource, namespace, endpoint).get(name)
+
+    def list(self, resource, namespace, endpoint='api/v1'):
+        """
+        Gets all objects of the resource in the namespace
+        """
+        return self.get_informer(resource, namespace, endpoint).list()
+
+    def wait(self, resource, namespace, timeout, endpoint='api/v1'):
+        """
+        Waits until objects of the resource in the namespace change
+        or the timeout (in seconds) expires
+        """
+        self.get_informer(resource, namespace, endpoint).wait(timeout)
+
+    def _get_started(self, resource, namespace):
+        with self._lock:
+            return self._informers.get((resource, namespace))
+
+    def update(self, resource, namespace, obj):
+        """
+        Updates the object in the informer (if it's started), so it's
+        known before the watch event arrives
+        """
+        informer = self._get_started(resource, namespace)
+        if informer is not None and obj.get('metadata', {}).get('name'):
+            informer.update(obj)
+
+    def delete(self, resource, namespace, name):
+        """
+        Removes the object from the informer (if it's started)
+        """
+        informer = self._get_started(resource, namespace)
+        if informer is not None:
+            informer.delete(name)
+
+    def clear(self, resource, namespace):
+        """
+        Removes all objects of the resource in the namespace
+        """
+        informer = self._get_started(resource, namespace)
+        if informer is not None:
+            informer.clear()
+
+    def stop(self):
+        """
+        Stops all informers
+        """
+        with self._lock:
+            informers = list(self._informers.values())
+            self._informers = {}
+        for informer in informers:
+            informer.stop()
@@ -2,6 +2,7 @@
 import os
 import json
 import logging
+import threading
 import time
 
 
@@ -26,6 +27,9 @@ class IngressController(object):
     DEFAULT_BACKEND_NAME = 'default-http-backend'
     NGINX_INGRESS_LB_NAME = 'nginx-ingress-controller'
 
+    # Makes sure concurrent deployments don't deploy the controller twice
+    _deploy_lock = threading.Lock()
+
     def __init__(self, kubernetes):
         self.kubernetes = kubernetes
 
@@ -35,13 +39,25 @@ class IngressController(object):
         if needed
         """
         start_timestamp = time.time()
-        logging.info('Deploying default backend')
-        self._ensure_default_backend()
-        logging.info('Deploying Nginx Ingress Load balancer')
-        self._ensure_nginx_ingress_lb()
+        with IngressController._deploy_lock:
+            logging.info('Deploying default backend')
+            self._ensure_default_backend()
+            logging.info('Deploying Nginx Ingress Load balancer')
+            self._ensure_nginx_ingress_lb()
+
+            if wait_for_external_ip:
+                self._wait_for_external_ip(start_timestamp)
 
-        if wait_for_external_ip:
-            self._wait_for_external_ip(start_timestamp)
+    def get_missing_deployments(self):
+        """
+        Gets the names of the default backend and Nginx Ingress load
+        balancer deployments that are not deployed yet
+        """
+        deployed = [deployment['metadata']['name'] for deployment in
+                    self.kubernetes.get_deployments(IngressController.DEFAULT_NAMESPACE)]
+        return [name for name in [IngressController.DEFAULT_BACKEND_NAME,
+                                  IngressController.NGINX_INGRESS_LB_NAME]
+                if name not in deployed]
 
     def get_external_ip(self):
         """
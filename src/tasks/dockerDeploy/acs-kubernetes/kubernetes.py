@@ -2,15 +2,68 @@ import json
 import logging
 import time
 
+import apierrors
+from deploymentplan import filter_like
+from informer import ClusterCache
+
+
+# Results of Kubernetes.apply
+APPLY_CREATED = 'created'
+APPLY_PATCHED = 'patched'
+APPLY_UNCHANGED = 'unchanged'
+
 
 class Kubernetes(object):
     """
     Class used for working with Kubernetes API
     """
     deployment_max_wait_time = 5 * 60
+    # How often (in seconds) to log the progress while waiting for deployments
+    progress_interval = 15
 
     def __init__(self, acs_client):
         self.acs_client = acs_client
+        # Optional deploymenttimings.TimingStore used for adaptive timeouts. Timings
+        # of deployments in the namespaces from timing_groups are recorded under the
+        # mapped name (e.g. the group ID without version), so they apply to later versions
+        self.timing_store = None
+        self.timing_groups = {}
+        # informer.ClusterCache, started with start_cache
+        self.cache = None
+
+    def start_cache(self):
+        """
+        Answers the exists checks and gets from objects that are listed
+        once (per resource and namespace) and kept current with watches
+        """
+        if self.cache is None:
+            self.cache = ClusterCache(self)
+
+    def stop_cache(self):
+        """
+        Stops the watches and makes requests for each check again
+        """
+        if self.cache is not None:
+            self.cache.stop()
+            self.cache = None
+
+    def _cache_update(self, resource, namespace, response):
+        """
+        Adds the created object to the cache, so it's known right away
+        """
+        if self.cache is not None:
+            self.cache.update(resource, namespace, response)
+
+    def _cache_delete(self, resource, namespace, name=None):
+        """
+        Removes the deleted object (or all objects) from the cache
+        """
+        if self.cache is None:
+            return
+        if name is None:
+            self.cache.clear(resource, namespace)
+        else:
+            self.cache.delete(resource, namespace, name)
 
     def _beta_endpoint(self):
         """
@@ -18,11 +71,11 @@ class Kubernetes(object):
         """
         return 'apis/extensions/v1beta1'
 
-    def get_request(self, path, endpoint='api/v1'):
+    def get_request(self, path, endpoint='api/v1', **kwargs):
         """
         Makes an HTTP GET request
         """
-        return self.acs_client.get_request('{}/{}'.format(endpoint, path.strip('/')))
+        return self.acs_client.get_request('{}/{}'.format(endpoint, path.strip('/')), **kwargs)
 
     def delete_request(self, path, endpoint='api/v1'):
         """
@@ -30,12 +83,12 @@ class Kubernetes(object):
         """
         return self.acs_client.delete_request('{}/{}'.format(endpoint, path.strip('/')))
 
-    def post_request(self, path, post_data, endpoint='api/v1'):
+    def post_request(self, path, post_data, endpoint='api/v1', **kwargs):
         """
         Makes an HTTP POST request
         """
         return self.acs_client.post_request('{}/{}'.format(endpoint, path.strip('/')),
-                                            post_data=post_data)
+                                            post_data=post_data, **kwargs)
 
     def put_request(self, path, put_data=None, endpoint='api/v1', **kwargs):
         """
@@ -44,18 +97,81 @@ class Kubernetes(object):
         return self.acs_client.put_request('{}/{}'.format(endpoint, path.strip('/')),
                                            put_data=put_data, **kwargs)
 
+    def patch_request(self, path, patch_data, endpoint='api/v1', **kwargs):
+        """
+        Makes an HTTP PATCH request with a strategic merge patch
+        """
+        return self.acs_client.patch_request('{}/{}'.format(endpoint, path.strip('/')),
+                                             patch_data=patch_data, **kwargs)
+
+    def _get_path(self, resource, namespace, name=None):
+        """
+        Gets the path of the object (or of all objects if name is None),
+        namespaces are the resource with namespace None
+        """
+        path = resource if namespace is None else 'namespaces/{}/{}'.format(namespace, resource)
+        if name is not None:
+            path = '{}/{}'.format(path, name)
+        return path
+
+    def get_object(self, resource, namespace, name, endpoint='api/v1'):
+        """
+        Gets the object or None if it doesn't exist
+        """
+        if self.cache is not None:
+            return self.cache.get(resource, namespace, name, endpoint)
+        path = self._get_path(resource, namespace, name)
+        response = self.get_request(path, endpoint)
+        if apierrors.is_not_found(response):
+            return None
+        return self._check_response(response, 'getting "{}"'.format(path)).json()
+
+    def apply(self, resource, namespace, obj, endpoint='api/v1', wait_for_complete=False):
+        """
+        Makes the object on the cluster look like obj: it's created if it
+        doesn't exist, patched (strategic merge) if it differs from obj and
+        left alone otherwise. The object is read once. Returns the result
+        (APPLY_CREATED, APPLY_PATCHED or APPLY_UNCHANGED) and the object.
+        """
+        name = obj['metadata']['name']
+        path = self._get_path(resource, namespace, name)
+        existing = self.get_object(resource, namespace, name, endpoint)
+        start_timestamp = time.time()
+        if existing is None:
+            logging.debug('Apply "%s": creating', path)
+            result = APPLY_CREATED
+            response = self._check_response(
+                self.post_request(self._get_path(resource, namespace), json.dumps(obj), endpoint),
+                'creating "{}"'.format(path)).json()
+        elif filter_like(existing, obj) != obj:
+            logging.debug('Apply "%s": patching', path)
+            result = APPLY_PATCHED
+            response = self._check_response(
+                self.patch_request(path, json.dumps(obj), endpoint),
+                'patching "{}"'.format(path)).json()
+        else:
+            logging.debug('Apply "%s": unchanged', path)
+            result = APPLY_UNCHANGED
+            response = existing
+        if result != APPLY_UNCHANGED:
+            self._cache_update(resource, namespace, response)
+
+        # An unchanged deployment may still be rolling out (e.g. when a
+        # failed deployment is resumed), so it's waited for as well
+        if wait_for_complete and resource == 'deployments':
+            self._wait_for_deployment_complete(start_timestamp, namespace, name)
+        return result, response
+
     def create_secret(self, secret_json, namespace):
         """
         Creates a secret on Kubernetes
         """
         logging.debug('Create secret in namespace "%s"', namespace)
         url = 'namespaces/{}/secrets'.format(namespace)
-        response = self.post_request(url, post_data=secret_json).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed creating a secret in namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed creating a secret in namespace "{}".'.format(namespace))
+        response = self._check_response(
+            self.post_request(url, post_data=secret_json),
+            'creating a secret in namespace "{}"'.format(namespace)).json()
+        self._cache_update('secrets', namespace, response)
         return response
 
     def secret_exists(self, name, namespace):
@@ -64,10 +180,9 @@ class Kubernetes(object):
         """
         logging.debug('Check if secret "%s.%s" exists',
                       name, namespace)
-        url = 'namespaces/{}/secrets/{}'.format(
-            namespace, name)
-        response = self.get_request(url).json()
-        return not self._has_failed(response)
+        if self.cache is not None:
+            return self.cache.get('secrets', namespace, name) is not None
+        return self._exists('namespaces/{}/secrets/{}'.format(namespace, name))
 
     def create_deployment(self, deployment_json, namespace, wait_for_complete=False):
         """
@@ -76,14 +191,10 @@ class Kubernetes(object):
         logging.debug('Create deployment in namespace "%s"', namespace)
         start_timestamp = time.time()
         url = 'namespaces/{}/deployments'.format(namespace)
-        response = self.post_request(
-            url, post_data=deployment_json, endpoint=self._beta_endpoint()).json()
-
-        if self._has_failed(response):
-            logging.debug(
-                'Failed creating a deployment in namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed creating a deployment in namespace "{}".'.format(namespace))
+        response = self._check_response(
+            self.post_request(url, post_data=deployment_json, endpoint=self._beta_endpoint()),
+            'creating a deployment in namespace "{}"'.format(namespace)).json()
+        self._cache_update('deployments', namespace, response)
 
         if wait_for_complete:
             self._wait_for_deployment_complete(
@@ -95,10 +206,11 @@ class Kubernetes(object):
         Checks if deployment exists in a namespace or not
         """
         logging.debug('Check if deployment "%s.%s" exists', name, namespace)
-        response = self.get_request(
-            'namespaces/{}/deployments/{}'.format(
-                namespace, name), self._beta_endpoint()).json()
-        return not self._has_failed(response)
+        if self.cache is not None:
+            return self.cache.get(
+                'deployments', namespace, name, self._beta_endpoint()) is not None
+        return self._exists(
+            'namespaces/{}/deployments/{}'.format(namespace, name), self._beta_endpoint())
 
     def delete_deployment(self, name, namespace):
         """
@@ -106,13 +218,10 @@ class Kubernetes(object):
         """
         logging.debug('Delete deployment "%s.%s', name, namespace)
         url = 'namespaces/{}/deployments/{}'.format(namespace, name)
-        response = self.delete_request(url).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed deleting deployment "%s" from namespace "%s": %s', name, namespace, response)
-            raise Exception(
-                'Failed deleting deployment "{}" from namespace "{}".', name, namespace)
-        return response
+        self._check_response(
+            self.delete_request(url, endpoint=self._beta_endpoint()),
+            'deleting deployment "{}" from namespace "{}"'.format(name, namespace))
+        self._cache_delete('deployments', namespace, name)
 
     def delete_deployments(self, namespace):
         """
@@ -120,14 +229,10 @@ class Kubernetes(object):
         """
         logging.debug('Delete all deployments from "%s"', namespace)
         url = 'namespaces/{}/deployments'.format(namespace)
-        response = self.delete_request(
-            url, endpoint=self._beta_endpoint()).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed deleting deployments from namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed deleting deployments from namespace "{}".'.format(namespace))
-        return response
+        self._check_response(
+            self.delete_request(url, endpoint=self._beta_endpoint()),
+            'deleting deployments from namespace "{}"'.format(namespace))
+        self._cache_delete('deployments', namespace)
 
     def delete_replicasets(self, namespace):
         """
@@ -135,14 +240,9 @@ class Kubernetes(object):
         """
         logging.debug('Delete replicasets from "%s"', namespace)
         url = 'namespaces/{}/replicasets'.format(namespace)
-        response = self.delete_request(
-            url, endpoint=self._beta_endpoint()).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed deleting replicasets from namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed deleting replicasets from namespace "{}".'.format(namespace))
-        return response
+        self._check_response(
+            self.delete_request(url, endpoint=self._beta_endpoint()),
+            'deleting replicasets from namespace "{}"'.format(namespace))
 
     def create_ingress(self, ingress_json, namespace):
         """
@@ -150,13 +250,10 @@ class Kubernetes(object):
         """
         logging.debug('Create ingress in "%s"', namespace)
         url = 'namespaces/{}/ingresses'.format(namespace)
-        response = self.post_request(
-            url, post_data=ingress_json, endpoint=self._beta_endpoint()).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed creating an ingress in namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed creating an ingress in namespace "{}".'.format(namespace))
+        response = self._check_response(
+            self.post_request(url, post_data=ingress_json, endpoint=self._beta_endpoint()),
+            'creating an ingress in namespace "{}"'.format(namespace)).json()
+        self._cache_update('ingresses', namespace, response)
         return response
 
     def delete_ingresses(self, namespace):
@@ -165,14 +262,10 @@ class Kubernetes(object):
         """
         logging.debug('Delete ingresses from namespace "%s"', namespace)
         url = 'namespaces/{}/ingresses'.format(namespace)
-        response = self.delete_request(
-            url, endpoint=self._beta_endpoint()).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed deleting ingresses from namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed deleting ingresses from namespace "{}".'.format(namespace))
-        return response
+        self._check_response(
+            self.delete_request(url, endpoint=self._beta_endpoint()),
+            'deleting ingresses from namespace "{}"'.format(namespace))
+        self._cache_delete('ingresses', namespace)
 
     def create_service(self, service_json, namespace):
         """
@@ -180,12 +273,10 @@ class Kubernetes(object):
         """
         logging.debug('Create a service in namespace "%s"', namespace)
         url = 'namespaces/{}/services'.format(namespace)
-        response = self.post_request(url, post_data=service_json).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed creating service in namespace "%s": %s', namespace, response)
-            raise Exception(
-                'Failed creating a service in namespace "{}".'.format(namespace))
+        response = self._check_response(
+            self.post_request(url, post_data=service_json),
+            'creating a service in namespace "{}"'.format(namespace)).json()
+        self._cache_update('services', namespace, response)
         return response
 
     def get_service(self, name, namespace):
@@ -193,8 +284,16 @@ class Kubernetes(object):
         Gets the service
         """
         logging.debug('Get service "%s.%s"', name, namespace)
+        if self.cache is not None:
+            service = self.cache.get('services', namespace, name)
+            if service is not None:
+                return service
         url = 'namespaces/{}/services/{}'.format(namespace, name)
-        return self.get_request(url).json()
+        response = self.get_request(url)
+        if not apierrors.is_not_found(response):
+            self._check_response(
+                response, 'getting service "{}" from namespace "{}"'.format(name, namespace))
+        return response.json()
 
     def delete_service(self, name, namespace):
         """
@@ -202,22 +301,19 @@ class Kubernetes(object):
         """
         logging.debug('Delete service "%s.%s"', name, namespace)
         url = 'namespaces/{}/services/{}'.format(namespace, name)
-        response = self.delete_request(url).json()
-        if self._has_failed(response):
-            logging.debug(
-                'Failed deleting service "%s" from namespace "%s": %s', name, namespace, response)
-            raise Exception(
-                'Failed deleting service "{}" from namespace "{}".'.format(name, namespace))
-        return response
+        self._check_response(
+            self.delete_request(url),
+            'deleting service "{}" from namespace "{}"'.format(name, namespace))
+        self._cache_delete('services', namespace, name)
 
     def service_exists(self, name, namespace):
         """
         Checks if service exists in the namespace
         """
         logging.debug('Check if service "%s.%s" exists', name, namespace)
-        url = 'namespaces/{}/services/{}'.format(namespace, name)
-        response = self.get_request(url).json()
-        return not self._has_failed(response)
+        if self.cache is not None:
+            return self.cache.get('services', namespace, name) is not None
+        return self._exists('namespaces/{}/services/{}'.format(namespace, name))
 
     def delete_services(self, namespace):
         """
@@ -225,11 +321,9 @@ class Kubernetes(object):
         """
         logging.debug('Delete all services from namespace "%s"', namespace)
         url = 'namespaces/{}/services'.format(namespace)
-        response = self.get_request(url).json()
-        if self._has_failed(response):
-            logging.debug('Failed deleting services: %s', response)
-            raise Exception(
-                'Failed deleting services from namespace "{}".'.format(namespace))
+        response = self._check_response(
+            self.get_request(url),
+            'deleting services from namespace "{}"'.format(namespace)).json()
         all_services = response['items']
 
         for service in all_services:
@@ -241,11 +335,9 @@ class Kubernetes(object):
         """
         Gets an array of namespaces based on the label_selector
         """
-        response = self.get_request(
-            'namespaces?labelSelector={}'.format(label_selector)).json()
-        if self._has_failed(response):
-            logging.debug('Failed getting namespaces: %s', response)
-            raise Exception('Failed getting namespaces.')
+        response = self._check_response(
+            self.get_request('namespaces?labelSelector={}'.format(label_selector)),
+            'getting namespaces').json()
 
         if 'items' in response:
             return response['items']
@@ -256,11 +348,19 @@ class Kubernetes(object):
         Deletes a namespace
         """
         logging.debug('Delete namespace "%s"', name)
-        response = self.delete_request('namespaces/{}'.format(name)).json()
-        if self._has_failed(response):
-            logging.debug('Failed deleting namespace "%s": %s', name, response)
-            raise Exception('Failed deleting namespace "{}".'.format(name))
-        return response
+        self._check_response(
+            self.delete_request('namespaces/{}'.format(name)),
+            'deleting namespace "{}"'.format(name))
+        self._cache_delete('namespaces', None, name)
+
+    def namespace_exists(self, name):
+        """
+        Checks if namespace exists
+        """
+        logging.debug('Check if namespace "%s" exists', name)
+        if self.cache is not None:
+            return self.cache.get('namespaces', None, name) is not None
+        return self._exists('namespaces/{}'.format(name))
 
     def create_namespace(self, name, labels):
         """
@@ -275,12 +375,14 @@ class Kubernetes(object):
                 "labels": labels
             }
         }
-        response = self.post_request(
-            'namespaces', post_data=json.dumps(namespace_json)).json()
-
-        if self._has_failed(response):
-            logging.debug('Failed creating namespace "%s": %s', name, response)
-            raise Exception('Failed creating namespace "{}".'.format(name))
+        response = self.post_request('namespaces', post_data=json.dumps(namespace_json),
+                                     exists_check=lambda: self.namespace_exists(name))
+        if response is None:
+            # The request failed after it created the namespace
+            response = self.get_request('namespaces/{}'.format(name))
+        response = self._check_response(
+            response, 'creating namespace "{}"'.format(name)).json()
+        self._cache_update('namespaces', None, response)
         return response
 
     def get_deployment(self, namespace, deployment_name):
@@ -288,15 +390,46 @@ class Kubernetes(object):
         Gets a specific deployment in a namespace
         """
         logging.debug('Get deployment "%s.%s', deployment_name, namespace)
-        response = self.get_request(
-            'namespaces/{}/deployments/{}'.format(
-                namespace, deployment_name), self._beta_endpoint()).json()
-        if self._has_failed(response):
-            logging.debug('Failed getting deployment "%s" from "%s": %s',
-                          deployment_name, namespace, response)
-            raise Exception('Failed getting deployment "{}" from namespace "{}".'.format(
-                deployment_name, namespace))
-        return response
+        if self.cache is not None:
+            deployment = self.cache.get(
+                'deployments', namespace, deployment_name, self._beta_endpoint())
+            if deployment is not None:
+                return deployment
+        return self._check_response(
+            self.get_request('namespaces/{}/deployments/{}'.format(
+                namespace, deployment_name), self._beta_endpoint()),
+            'getting deployment "{}" from namespace "{}"'.format(
+                deployment_name, namespace)).json()
+
+    def get_deployments(self, namespace):
+        """
+        Gets all deployments in a namespace
+        """
+        return self._get_items('deployments', namespace, self._beta_endpoint())
+
+    def get_services(self, namespace):
+        """
+        Gets all services in a namespace
+        """
+        return self._get_items('services', namespace)
+
+    def get_ingresses(self, namespace):
+        """
+        Gets all ingresses in a namespace
+        """
+        return self._get_items('ingresses', namespace, self._beta_endpoint())
+
+    def _get_items(self, resource, namespace, endpoint='api/v1'):
+        """
+        Gets all objects of a resource in a namespace
+        """
+        logging.debug('Get all %s from namespace "%s"', resource, namespace)
+        if self.cache is not None:
+            return self.cache.list(resource, namespace, endpoint)
+        response = self._check_response(
+            self.get_request('namespaces/{}/{}'.format(namespace, resource), endpoint),
+            'getting {} from namespace "{}"'.format(resource, namespace)).json()
+        return response.get('items') or []
 
     def get_replicas(self, namespace, deployment_name):
         """
@@ -308,41 +441,106 @@ class Kubernetes(object):
             if 'replicas' in deployment['spec']:
                 return deployment['spec']['replicas']
         raise Exception(
-            'Could not find replicas in deployment "{}" from namespace "{}".',
-            deployment_name, namespace)
+            'Could not find replicas in deployment "{}" from namespace "{}".'.format(
+                deployment_name, namespace))
+
+    def wait_for_deployments_complete(self, start_timestamps, namespace, deployment_names):
+        """
+        Waits for all provided deployments in the namespace to complete. The
+        timeout and the recorded timing of each deployment start at its own
+        start_timestamps entry (by deployment name).
+        """
+        for deployment_name in deployment_names:
+            self._wait_for_deployment_complete(
+                start_timestamps[deployment_name], namespace, deployment_name)
 
     def _wait_for_deployment_complete(self, start_timestamp, namespace, deployment_name):
+        """
+        Waits for the deployment to complete. With a timing store, the time it took
+        is recorded and previous timings are used for the timeout and the progress estimate.
+        """
         deployment = ''
         deployment_completed = False
         timeout_exceeded = False
+        timing_group = self.timing_groups.get(namespace, namespace)
+        max_wait = self.deployment_max_wait_time
+        estimate = None
+        if self.timing_store:
+            max_wait = self.timing_store.get_timeout(timing_group, deployment_name, max_wait)
+            estimate = self.timing_store.get_estimate(timing_group, deployment_name)
+        last_progress_timestamp = time.time()
 
         logging.info('Wait for deployment "%s.%s" to complete',
                      deployment_name, namespace)
         while not deployment_completed:
-            if self._wait_time_exceeded(self.deployment_max_wait_time, start_timestamp):
+            if self._wait_time_exceeded(max_wait, start_timestamp):
                 timeout_exceeded = True
                 break
+            if self._wait_time_exceeded(self.progress_interval, last_progress_timestamp):
+                self._log_progress('{}.{}'.format(deployment_name, namespace),
+                                   start_timestamp, max_wait, estimate)
+                last_progress_timestamp = time.time()
 
             deployment = self.get_deployment(namespace, deployment_name)
-            status = deployment['status']
-
-            if not status or 'observedGeneration' not in status or 'updatedReplicas' not in status:
-                time.sleep(1)
-                continue
-
-            if (status['observedGeneration'] >= deployment['metadata']['generation']) and\
-                    (status['updatedReplicas'] == deployment['spec']['replicas']):
+            if self._is_deployment_complete(deployment):
                 deployment_completed = True
                 break
-            time.sleep(1)
+            self._wait_for_change('deployments', namespace, 1, self._beta_endpoint())
 
         if timeout_exceeded:
             raise Exception(
-                'Timeout exceeded waiting for deployment to complete')
+                'Timeout exceeded waiting for deployment to complete ({}s)'.format(int(max_wait)))
 
         if deployment_completed:
             logging.info('Deployment "%s.%s" completed',
                          deployment_name, namespace)
+            if self.timing_store:
+                self.timing_store.record(
+                    timing_group, deployment_name, time.time() - start_timestamp)
+
+    def _is_deployment_complete(self, deployment):
+        """
+        Checks if the rollout of the deployment is complete, the same way
+        as kubectl rollout status: the controller observed the latest
+        generation, all replicas are updated, the old replicas are gone
+        and the updated replicas are available (i.e. pass the readiness
+        probe), so traffic is only switched to pods that are actually ready
+        """
+        status = deployment['status']
+        if not status or 'observedGeneration' not in status or 'updatedReplicas' not in status:
+            return False
+
+        updated_replicas = status['updatedReplicas']
+        return status['observedGeneration'] >= deployment['metadata']['generation'] and \
+            updated_replicas >= deployment['spec'].get('replicas', 1) and \
+            status.get('replicas', 0) == updated_replicas and \
+            status.get('availableReplicas', 0) >= updated_replicas
+
+    def _wait_for_change(self, resource, namespace, timeout, endpoint='api/v1'):
+        """
+        Waits for the objects to change (with the cache) or for the timeout
+        """
+        if self.cache is not None:
+            self.cache.wait(resource, namespace, timeout, endpoint)
+        else:
+            time.sleep(timeout)
+
+    def _log_progress(self, deployment_name, start_timestamp, max_wait, estimate):
+        """
+        Logs how long the deployment is running and how long it will
+        probably take (if known)
+        """
+        elapsed = time.time() - start_timestamp
+        if estimate is None:
+            logging.info('Waiting for deployment "%s": %ds elapsed, timeout in %ds',
+                         deployment_name, elapsed, max_wait - elapsed)
+        elif elapsed < estimate:
+            logging.info('Waiting for deployment "%s": %ds elapsed, about %ds remaining',
+                         deployment_name, elapsed, estimate - elapsed)
+        else:
+            logging.info('Waiting for deployment "%s": %ds elapsed, taking longer than ' \
+                         'usual (%ds), timeout in %ds', deployment_name, elapsed, estimate,
+                         max_wait - elapsed)
 
     def _wait_time_exceeded(self, max_wait, timestamp):
         """
@@ -350,11 +548,27 @@ class Kubernetes(object):
         """
         return time.time() - timestamp > max_wait
 
-    def _has_failed(self, response):
+    def _check_response(self, response, action):
+        """
+        Raises an apierrors.ApiError if the request failed. Only the status
+        code is checked, the body is decoded by the caller or for the error.
+        """
+        try:
+            return apierrors.check_response(response, action)
+        except apierrors.ApiError as api_error:
+            logging.debug('%s', api_error)
+            raise
+
+    def _exists(self, path, endpoint='api/v1'):
         """
-        Checks if the response failed (404) or not
+        Checks if the object exists from the status code of a GET request;
+        the response body is not read or decoded
         """
-        if response['kind'] == 'Status':
-            if 'code' in response and response['code'] == 404:
-                return True
-        return False
+        response = self.get_request(path, endpoint, stream=True)
+        try:
+            if apierrors.is_not_found(response):
+                return False
+            self._check_response(response, 'checking if "{}" exists'.format(path))
+            return True
+        finally:
+            response.close()
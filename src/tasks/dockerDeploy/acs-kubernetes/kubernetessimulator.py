@@ -0,0 +1,588 @@
+import BaseHTTPServer
+import collections
+import copy
+import json
+import logging
+import Queue
+import random
+import SocketServer
+import threading
+import time
+import urlparse
+import uuid
+
+
+def _is_named_list(value):
+    return isinstance(value, list) and \
+        all([isinstance(item, dict) and 'name' in item for item in value])
+
+
+def strategic_merge(target, patch):
+    """
+    Applies a strategic merge patch to target: dictionaries are merged,
+    lists of objects with a name (e.g. containers) are merged by name,
+    other lists are replaced and keys with a None value are removed
+    """
+    for key, value in patch.items():
+        existing = target.get(key)
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(existing, dict):
+            strategic_merge(existing, value)
+        elif value and existing and _is_named_list(value) and _is_named_list(existing):
+            items = dict((item['name'], item) for item in existing)
+            merged = []
+            for item in value:
+                if item['name'] in items:
+                    existing_item = items.pop(item['name'])
+                    strategic_merge(existing_item, item)
+                    merged.append(existing_item)
+                else:
+                    merged.append(copy.deepcopy(item))
+            # Items that are not in the patch are kept
+            merged.extend([item for item in existing if item['name'] in items])
+            target[key] = merged
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Watch clients disconnect without reading the whole stream
+        logging.debug('Simulator: connection from %s closed', client_address)
+
+
+class KubernetesSimulator(object):
+    """
+    In-process fake Kubernetes API server.
+
+    Implements the resources used by the Kubernetes deployment: v1 namespaces,
+    secrets and services, extensions/v1beta1 deployments, replicasets and
+    ingresses, and watch streams for all of them (that replay recent events
+    after the resourceVersion they are started with). Deployments roll out
+    replicas_per_step replicas every rollout_step_delay (min, max) seconds
+    and LoadBalancer services get an external IP after load_balancer_delay.
+    Objects can be changed with strategic merge patches (PATCH), a
+    deployment with a changed spec is rolled out again.
+    Replicas of deployments with a readiness probe only become ready and
+    available readiness_delay seconds after they were updated.
+    """
+    CORE_ENDPOINT = 'api/v1/'
+    BETA_ENDPOINT = 'apis/extensions/v1beta1/'
+
+    # Resource name -> (kind, endpoint)
+    RESOURCES = {
+        'namespaces': ('Namespace', CORE_ENDPOINT),
+        'secrets': ('Secret', CORE_ENDPOINT),
+        'services': ('Service', CORE_ENDPOINT),
+        'deployments': ('Deployment', BETA_ENDPOINT),
+        'replicasets': ('ReplicaSet', BETA_ENDPOINT),
+        'ingresses': ('Ingress', BETA_ENDPOINT)
+    }
+
+    # Number of events kept to replay them to watches started with a resourceVersion
+    event_history_size = 1000
+
+    def __init__(self, rollout_step_delay=(0.0, 0.0), replicas_per_step=1,
+                 load_balancer_delay=0.0, seed=None, tick_interval=0.05, port=0,
+                 readiness_delay=0.0):
+        self.rollout_step_delay = rollout_step_delay
+        self.replicas_per_step = replicas_per_step
+        self.load_balancer_delay = load_balancer_delay
+        self.readiness_delay = readiness_delay
+        self.tick_interval = tick_interval
+        self.stopped = False
+
+        # (resource, namespace) -> {name: object}, namespaces are stored with namespace None
+        self.objects = {}
+        self.counters = {
+            'requests': 0,
+            'watch_events': 0,
+            'rollout_steps': 0
+        }
+
+        self._random = random.Random(seed)
+        self._resource_version = 0
+        self._next_cluster_ip = 1
+        self._next_external_ip = 1
+        self._rollouts = {}
+        # (namespace, name) -> times at which updated replicas become ready
+        self._pending_ready = {}
+        self._load_balancers = {}
+        self._watchers = []
+        self._events = collections.deque(maxlen=self.event_history_size)
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', port), _SimulatorHandler)
+        self._server.simulator = self
+        self.port = self._server.server_address[1]
+        self._server_thread = threading.Thread(target=self._server.serve_forever, args=(0.1,))
+        self._server_thread.daemon = True
+        self._engine_thread = threading.Thread(target=self._run_engine)
+        self._engine_thread.daemon = True
+
+        for namespace in ['default', 'kube-system']:
+            self._create_object('namespaces', None, {'metadata': {'name': namespace}})
+
+    def get_url(self):
+        """
+        Gets the URL the simulator is listening on (use as API endpoint URL)
+        """
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def start(self):
+        """
+        Starts the simulator
+        """
+        self._server_thread.start()
+        self._engine_thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the simulator
+        """
+        self.stopped = True
+        self._stop_event.set()
+        self._server.shutdown()
+        self._server.server_close()
+        # Give open streams a moment to close, so their threads don't
+        # outlive the simulator
+        timeout = time.time() + 1
+        while self._watchers and time.time() < timeout:
+            time.sleep(0.01)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Watches
+
+    def watch(self, resource, namespace, resource_version=None):
+        """
+        Starts watching the resource and returns the queue events are put on.
+        Events newer than resource_version are put on the queue first.
+        """
+        event_queue = Queue.Queue()
+        with self._lock:
+            if resource_version:
+                for version, event_resource, event_namespace, event in self._events:
+                    if version > int(resource_version) and \
+                        self._is_watched(resource, namespace, event_resource, event_namespace):
+                        event_queue.put(copy.deepcopy(event))
+            self._watchers.append((resource, namespace, event_queue))
+        return event_queue
+
+    def unwatch(self, event_queue):
+        """
+        Stops watching
+        """
+        with self._lock:
+            self._watchers = [w for w in self._watchers if w[2] is not event_queue]
+
+    def _is_watched(self, watched_resource, watched_namespace, resource, namespace):
+        if watched_resource != resource:
+            return False
+        return watched_namespace is None or watched_namespace == namespace
+
+    def _notify(self, event_type, resource, namespace, obj):
+        event = {'type': event_type, 'object': copy.deepcopy(obj)}
+        self._events.append((self._resource_version, resource, namespace, event))
+        for watched_resource, watched_namespace, event_queue in self._watchers:
+            if not self._is_watched(watched_resource, watched_namespace, resource, namespace):
+                continue
+            self.counters['watch_events'] += 1
+            event_queue.put(copy.deepcopy(event))
+
+    # Objects
+
+    def get_objects(self, resource, namespace=None):
+        """
+        Gets the objects of a resource in the namespace
+        """
+        return self.objects.setdefault((resource, namespace), {})
+
+    def _status(self, code, reason, message, name=None, resource=None):
+        return code, {
+            'kind': 'Status',
+            'apiVersion': 'v1',
+            'metadata': {},
+            'status': 'Success' if code < 400 else 'Failure',
+            'message': message,
+            'reason': reason,
+            'details': {'name': name, 'kind': resource},
+            'code': code
+        }
+
+    def _not_found(self, resource, name):
+        return self._status(404, 'NotFound', '{} "{}" not found'.format(resource, name),
+                            name, resource)
+
+    def _next_resource_version(self):
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _create_object(self, resource, namespace, body):
+        kind, endpoint = self.RESOURCES[resource]
+        obj = copy.deepcopy(body)
+        metadata = obj.setdefault('metadata', {})
+        name = metadata.get('name')
+        if not name:
+            return self._status(422, 'Invalid', 'metadata.name is required', resource=resource)
+        objects = self.get_objects(resource, namespace)
+        if name in objects:
+            return self._status(409, 'AlreadyExists', '{} "{}" already exists'.format(
+                resource, name), name, resource)
+
+        obj['kind'] = kind
+        obj['apiVersion'] = 'extensions/v1beta1' if endpoint == self.BETA_ENDPOINT else 'v1'
+        metadata['uid'] = str(uuid.uuid4())
+        metadata['resourceVersion'] = self._next_resource_version()
+        metadata['creationTimestamp'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        metadata['generation'] = 1
+        if namespace is not None:
+            metadata['namespace'] = namespace
+        obj.setdefault('spec', {})
+        obj['status'] = {}
+
+        if resource == 'namespaces':
+            obj['status'] = {'phase': 'Active'}
+        elif resource == 'services':
+            obj['spec']['clusterIP'] = '10.0.{}.{}'.format(*divmod(self._next_cluster_ip, 256))
+            self._next_cluster_ip += 1
+            obj['status'] = {'loadBalancer': {}}
+            if obj['spec'].get('type') == 'LoadBalancer':
+                self._load_balancers[(namespace, name)] = time.time() + self.load_balancer_delay
+        elif resource == 'deployments':
+            obj['spec'].setdefault('replicas', 1)
+            self._rollouts[(namespace, name)] = None
+            self._create_replicaset(namespace, obj)
+
+        objects[name] = obj
+        self._notify('ADDED', resource, namespace, obj)
+        return 201, obj
+
+    def _create_replicaset(self, namespace, deployment):
+        template = deployment['spec'].get('template', {})
+        replicaset = {
+            'metadata': {
+                'name': '{}-{}'.format(deployment['metadata']['name'],
+                                       self._random.randint(1000000000, 9999999999)),
+                'labels': copy.deepcopy(template.get('metadata', {}).get('labels', {}))
+            },
+            'spec': {
+                'replicas': deployment['spec']['replicas'],
+                'template': copy.deepcopy(template)
+            }
+        }
+        self._create_object('replicasets', namespace, replicaset)
+
+    def _patch_object(self, resource, namespace, obj, patch):
+        name = obj['metadata']['name']
+        spec = copy.deepcopy(obj.get('spec'))
+        strategic_merge(obj, dict((key, value) for key, value in patch.items()
+                                  if key not in ['status', 'kind', 'apiVersion']))
+        obj['metadata']['name'] = name
+        if obj.get('spec') != spec:
+            obj['metadata']['generation'] = obj['metadata'].get('generation', 1) + 1
+            if resource == 'deployments':
+                obj['spec'].setdefault('replicas', 1)
+                if obj['spec'].get('template') != (spec or {}).get('template'):
+                    self._create_replicaset(namespace, obj)
+                # The new generation is rolled out
+                self._pending_ready.pop((namespace, name), None)
+                self._rollouts[(namespace, name)] = None
+        self._update_object(resource, namespace, obj)
+        return 200, obj
+
+    def _has_readiness_probe(self, deployment):
+        containers = deployment['spec'].get('template', {}).get('spec', {}).get('containers', [])
+        return any(['readinessProbe' in container for container in containers])
+
+    def _update_object(self, resource, namespace, obj):
+        obj['metadata']['resourceVersion'] = self._next_resource_version()
+        self._notify('MODIFIED', resource, namespace, obj)
+
+    def _delete_object(self, resource, namespace, name):
+        obj = self.get_objects(resource, namespace).pop(name, None)
+        if obj is None:
+            return None
+        if resource == 'deployments':
+            self._rollouts.pop((namespace, name), None)
+            self._pending_ready.pop((namespace, name), None)
+        elif resource == 'services':
+            self._load_balancers.pop((namespace, name), None)
+        obj['metadata']['resourceVersion'] = self._next_resource_version()
+        self._notify('DELETED', resource, namespace, obj)
+        return obj
+
+    def _delete_namespace(self, name):
+        for resource in self.RESOURCES:
+            if resource == 'namespaces':
+                continue
+            for object_name in list(self.get_objects(resource, name).keys()):
+                self._delete_object(resource, name, object_name)
+        obj = self._delete_object('namespaces', None, name)
+        obj['status'] = {'phase': 'Terminating'}
+        return obj
+
+    def _matches_selector(self, obj, label_selector):
+        if not label_selector:
+            return True
+        labels = obj['metadata'].get('labels') or {}
+        for requirement in label_selector.split(','):
+            key, _, value = requirement.partition('=')
+            if labels.get(key.strip()) != value.strip():
+                return False
+        return True
+
+    # Rollouts
+
+    def _run_engine(self):
+        """
+        Progresses deployment rollouts and load balancer provisioning
+        """
+        while not self._stop_event.wait(self.tick_interval):
+            with self._lock:
+                self._tick()
+
+    def _next_step_time(self):
+        low, high = self.rollout_step_delay
+        return time.time() + self._random.uniform(low, high)
+
+    def _tick(self):
+        now = time.time()
+        for key, next_step in list(self._rollouts.items()):
+            namespace, name = key
+            deployment = self.get_objects('deployments', namespace)[name]
+            status = deployment['status']
+            replicas = deployment['spec']['replicas']
+            if next_step is None:
+                # Controller observed the new generation
+                status.update({
+                    'observedGeneration': deployment['metadata']['generation'],
+                    'replicas': replicas,
+                    'updatedReplicas': 0,
+                    'readyReplicas': 0,
+                    'availableReplicas': 0,
+                    'unavailableReplicas': replicas
+                })
+                self._pending_ready.pop(key, None)
+            elif next_step <= now:
+                updated = min(status['updatedReplicas'] + self.replicas_per_step, replicas)
+                if self.readiness_delay and self._has_readiness_probe(deployment):
+                    self._pending_ready.setdefault(key, []).extend(
+                        [now + self.readiness_delay] * (updated - status['updatedReplicas']))
+                    status['updatedReplicas'] = updated
+                else:
+                    status.update({
+                        'updatedReplicas': updated,
+                        'readyReplicas': updated,
+                        'availableReplicas': updated,
+                        'unavailableReplicas': replicas - updated
+                    })
+                self.counters['rollout_steps'] += 1
+            else:
+                continue
+
+            if status['updatedReplicas'] >= replicas:
+                del self._rollouts[key]
+            else:
+                self._rollouts[key] = self._next_step_time()
+            self._update_object('deployments', namespace, deployment)
+
+        for key, ready_times in list(self._pending_ready.items()):
+            ready = len([ready_at for ready_at in ready_times if ready_at <= now])
+            if not ready:
+                continue
+            namespace, name = key
+            deployment = self.get_objects('deployments', namespace)[name]
+            status = deployment['status']
+            status['readyReplicas'] += ready
+            status['availableReplicas'] += ready
+            status['unavailableReplicas'] = \
+                deployment['spec']['replicas'] - status['availableReplicas']
+            if ready < len(ready_times):
+                self._pending_ready[key] = ready_times[ready:]
+            else:
+                del self._pending_ready[key]
+            self._update_object('deployments', namespace, deployment)
+
+        for key, ready_at in list(self._load_balancers.items()):
+            if ready_at > now:
+                continue
+            namespace, name = key
+            service = self.get_objects('services', namespace)[name]
+            service['status'] = {'loadBalancer': {'ingress': [
+                {'ip': '52.0.{}.{}'.format(*divmod(self._next_external_ip, 256))}]}}
+            self._next_external_ip += 1
+            del self._load_balancers[key]
+            self._update_object('services', namespace, service)
+
+    # API
+
+    def _parse_path(self, path):
+        """
+        Parses the API path and returns (resource, namespace, name, watch)
+        or None if path is not a known resource path
+        """
+        endpoint = None
+        for prefix in [self.CORE_ENDPOINT, self.BETA_ENDPOINT]:
+            if path.startswith(prefix):
+                endpoint = prefix
+        if endpoint is None:
+            return None
+
+        parts = [part for part in path[len(endpoint):].split('/') if part]
+        watch = False
+        if parts and parts[0] == 'watch':
+            watch = True
+            parts = parts[1:]
+
+        if not parts or parts[0] != 'namespaces' or len(parts) > 4:
+            return None
+        if len(parts) <= 2:
+            resource, namespace = 'namespaces', None
+            name = parts[1] if len(parts) == 2 else None
+        else:
+            resource, namespace = parts[2], parts[1]
+            name = parts[3] if len(parts) == 4 else None
+
+        if not resource in self.RESOURCES or self.RESOURCES[resource][1] != endpoint:
+            return None
+        return resource, namespace, name, watch
+
+    def handle_request(self, method, path, query, body):
+        """
+        Routes the request to the simulated API and returns (status, json)
+        """
+        self.counters['requests'] += 1
+        parsed_path = self._parse_path(path)
+        if parsed_path is None:
+            return self._status(404, 'NotFound', 'the server could not find the requested resource')
+
+        resource, namespace, name, _ = parsed_path
+        kind = self.RESOURCES[resource][0]
+        with self._lock:
+            if namespace is not None and not namespace in self.get_objects('namespaces'):
+                return self._not_found('namespaces', namespace)
+
+            objects = self.get_objects(resource, namespace)
+            if name is None:
+                if method == 'GET':
+                    selector = query.get('labelSelector', [None])[0]
+                    return 200, {
+                        'kind': '{}List'.format(kind),
+                        'apiVersion': 'v1',
+                        'metadata': {'resourceVersion': str(self._resource_version)},
+                        'items': [o for o in objects.values()
+                                  if self._matches_selector(o, selector)]
+                    }
+                if method == 'POST':
+                    return self._create_object(resource, namespace, body or {})
+                if method == 'DELETE' and resource != 'namespaces':
+                    deleted = [self._delete_object(resource, namespace, object_name)
+                               for object_name in list(objects.keys())]
+                    return 200, {'kind': '{}List'.format(kind), 'apiVersion': 'v1',
+                                 'metadata': {}, 'items': deleted}
+                return self._status(405, 'MethodNotAllowed', 'the server does not allow this method')
+
+            if not name in objects:
+                return self._not_found(resource, name)
+            if method == 'GET':
+                return 200, objects[name]
+            if method == 'PATCH':
+                return self._patch_object(resource, namespace, objects[name], body or {})
+            if method == 'DELETE':
+                if resource == 'namespaces':
+                    return 200, self._delete_namespace(name)
+                self._delete_object(resource, namespace, name)
+                return self._status(200, 'Deleted', '{} "{}" deleted'.format(resource, name),
+                                    name, resource)
+            return self._status(405, 'MethodNotAllowed', 'the server does not allow this method')
+
+
+class _SimulatorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    HTTP front-end for the KubernetesSimulator
+    """
+    # Watch responses use chunked transfer encoding, as the API server does
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        simulator = self.server.simulator
+        # Not using urlparse on the full path, as '//path' would be parsed as netloc
+        path, _, query_string = self.path.partition('?')
+        path = path.lstrip('/')
+        query = urlparse.parse_qs(query_string)
+
+        length = int(self.headers.getheader('content-length', 0))
+        body = None
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except ValueError:
+                self._send(*simulator._status(400, 'BadRequest', 'invalid JSON body'))
+                return
+
+        parsed_path = simulator._parse_path(path)
+        if self.command == 'GET' and parsed_path and parsed_path[2] is None and \
+            (parsed_path[3] or query.get('watch', ['false'])[0] == 'true'):
+            self._watch(simulator, parsed_path[0], parsed_path[1],
+                        query.get('resourceVersion', [None])[0])
+            return
+
+        self._send(*simulator.handle_request(self.command, path, query, body))
+
+    def _send(self, status, response_json):
+        body = json.dumps(response_json)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _watch(self, simulator, resource, namespace, resource_version=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.close_connection = 1
+        event_queue = simulator.watch(resource, namespace, resource_version)
+        try:
+            while not simulator.stopped:
+                try:
+                    event = event_queue.get(timeout=0.1)
+                except Queue.Empty:
+                    continue
+                chunk = json.dumps(event) + '\n'
+                self.wfile.write('{:x}\r\n{}\r\n'.format(len(chunk), chunk))
+                self.wfile.flush()
+            self.wfile.write('0\r\n\r\n')
+        except IOError:
+            # Client disconnected
+            pass
+        finally:
+            simulator.unwatch(event_queue)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def do_PATCH(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        logging.debug('Simulator: ' + format, *args)
@@ -0,0 +1,100 @@
+import collections
+import threading
+
+# Number of parsed label lists/dicts that are kept, so the labels of a service
+# are only parsed once, no matter how many helpers look at them
+CACHE_SIZE = 1024
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class ServiceLabels(object):
+    """
+    Labels of a service, parsed once from either the list ('name=value')
+    or the dict form. Label names are indexed by their lowercase name, so
+    use lowercase names when looking them up.
+    """
+    def __init__(self, labels=None):
+        # (name, value) pairs, in the original order and case
+        self.items = []
+        self._index = {}
+        for name, value in self._parse(labels or []):
+            self.items.append((name, value))
+            self._index.setdefault(name.lower(), []).append(value)
+
+    def _parse(self, labels):
+        if isinstance(labels, dict):
+            return list(labels.items())
+        parsed = []
+        for label in labels:
+            if '=' in label:
+                name, value = label.split('=', 1)
+                parsed.append((name, value))
+            else:
+                # label without a value
+                parsed.append((label, ''))
+        return parsed
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, name, default=None):
+        """
+        Gets the value of the first label with the (lowercase) name
+        """
+        values = self._index.get(name)
+        if not values:
+            return default
+        return values[0]
+
+    def get_all(self, name):
+        """
+        Gets the values of all labels with the (lowercase) name
+        """
+        return list(self._index.get(name, []))
+
+    def has_prefix(self, prefix):
+        """
+        Checks if any (lowercase) label name starts with prefix
+        """
+        for name in self._index:
+            if name.startswith(prefix):
+                return True
+        return False
+
+
+def parse_labels(labels):
+    """
+    Gets the parsed labels. Labels that were parsed before are returned from
+    the cache, as long as the same label list/dict is passed in.
+    """
+    if isinstance(labels, ServiceLabels):
+        return labels
+    if not labels:
+        return ServiceLabels()
+
+    key = id(labels)
+    with _cache_lock:
+        cached = _cache.pop(key, None)
+        # The cache holds a reference to the labels, so their id can't be reused
+        if cached is not None and cached[0] is labels and cached[1] == len(labels):
+            _cache[key] = cached
+            return cached[2]
+
+    parsed = ServiceLabels(labels)
+    with _cache_lock:
+        _cache[key] = (labels, len(labels), parsed)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return parsed
+
+
+def get_service_labels(service_info):
+    """
+    Gets the parsed labels of the service from docker-compose
+    """
+    return parse_labels(service_info.get('labels'))
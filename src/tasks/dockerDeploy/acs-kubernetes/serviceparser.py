@@ -3,6 +3,8 @@ import logging
 import pipes
 import re
 
+import servicelabels
+from healthcheck import HealthCheck
 from portparser import PortParser
 
 
@@ -17,6 +19,9 @@ class Parser(object):
         self.service_json = self._get_empty_service_json()
         self.ingress_rules = []
         self.service_added = False
+        # Service ports by name (see _get_service_ports)
+        self._service_ports = {}
+        self._indexed_service_ports = 0
         self.needs_ingress_controller = False
 
         self.port_parser = PortParser(self.service_info)
@@ -51,7 +56,7 @@ class Parser(object):
         self.deployment_json['spec']['template']['spec']['imagePullSecrets'].append({
             "name": name})
 
-    def _add_container_port(self, container_port):
+    def _add_container_port(self, container_port, protocol='tcp'):
         """
         Adds a container port
         """
@@ -61,8 +66,11 @@ class Parser(object):
             self.deployment_json['spec']['template'][
                 'spec']['containers'][0]['ports'] = []
 
-        self.deployment_json['spec']['template']['spec']['containers'][0]['ports'].append({
-            "containerPort": container_port})
+        port_entry = {"containerPort": container_port}
+        if protocol != 'tcp':
+            port_entry['protocol'] = protocol.upper()
+        self.deployment_json['spec']['template']['spec']['containers'][0]['ports'].append(
+            port_entry)
 
     def get_service_json(self):
         """
@@ -128,8 +136,30 @@ class Parser(object):
                 method_to_call = getattr(self, method_name)
                 method_to_call(key)
 
+        # Probes need the container ports, so they are added after all keys are parsed
+        self._add_probes()
         return json.dumps(self.deployment_json)
 
+    def _add_probes(self):
+        """
+        Adds the readiness and liveness probes (if any healthcheck labels are set)
+        """
+        if not 'labels' in self.service_info:
+            return
+        container = self.deployment_json['spec']['template']['spec']['containers'][0]
+        container_ports = [port['containerPort'] for port in container.get('ports', [])]
+        try:
+            readiness_probe, liveness_probe = HealthCheck(
+                servicelabels.get_service_labels(self.service_info)).get_probes(container_ports)
+        except ValueError as probe_exc:
+            logging.warning('Skipping health check for service "%s": %s',
+                            self.service_name, probe_exc)
+            return
+        if readiness_probe:
+            container['readinessProbe'] = readiness_probe
+        if liveness_probe:
+            container['livenessProbe'] = liveness_probe
+
     def _create_new_ingress_rule(self, host_name, service_port, service_name, path="/"):
         """
         Creates a new ingress rule and adds it to the list of rules.
@@ -183,6 +213,17 @@ class Parser(object):
             self._add_container_image(
                 self.service_name, self.service_info[key])
 
+    def _get_service_ports(self):
+        """
+        Gets the service ports (lists of port entries) by name. Ports added to
+        the service JSON since the last call are added to the index first.
+        """
+        ports = self.service_json['spec']['ports']
+        for port_entry in ports[self._indexed_service_ports:]:
+            self._service_ports.setdefault(port_entry['name'], []).append(port_entry)
+        self._indexed_service_ports = len(ports)
+        return self._service_ports
+
     def _get_port_name(self, port):
         """
         Gets the port name to use in the service
@@ -191,11 +232,11 @@ class Parser(object):
 
         # Check if the service already has a
         # port with this name
+        service_ports = self._get_service_ports()
         counter = 1
-        for port_entry in self.service_json['spec']['ports']:
-            if port_entry['name'] == port_name:
-                port_name = "port-{}-{}".format(port, counter)
-                counter = counter + 1
+        while port_name in service_ports:
+            port_name = "port-{}-{}".format(port, counter)
+            counter = counter + 1
         return port_name
 
     def _port_exists(self, port_tuple):
@@ -205,22 +246,20 @@ class Parser(object):
         if not port_tuple:
             return False
 
-        port_name = "port-{}".format(port_tuple[1])
-        for port_entry in self.service_json['spec']['ports']:
-            if port_entry['name'] == port_name and \
-                    port_entry['targetPort'] == port_tuple[0] and \
+        for port_entry in self._get_service_ports().get("port-{}".format(port_tuple[1]), []):
+            if port_entry['targetPort'] == port_tuple[0] and \
                     port_entry['port'] == port_tuple[1]:
                 return True
         return False
 
-    def _create_service(self, port_tuple):
+    def _create_service(self, port_tuple, protocol='tcp'):
         # TODO: Do we need to create multiple ports if we have 'expose' and
         # 'ports' key?
         self.service_added = True
         if not self._port_exists(port_tuple):
             self.service_json['spec']['ports'].append({
                 "name": self._get_port_name(port_tuple[1]),
-                "protocol": "TCP",
+                "protocol": protocol.upper(),
                 "targetPort": port_tuple[0],
                 "port": port_tuple[1]
             })
@@ -260,51 +299,35 @@ class Parser(object):
         Parses the 'expose' key
         """
         if key in self.service_info:
-            private_ports = self.port_parser.parse_private_ports()
-            for port_tuple in private_ports:
-                self._add_container_port(port_tuple[1])
-                self._create_service(port_tuple)
+            for port_spec in self.port_parser.parse_private_port_specs():
+                for port_tuple in port_spec.get_port_tuples():
+                    self._add_container_port(port_tuple[1], port_spec.protocol)
+                    self._create_service(port_tuple, port_spec.protocol)
 
     def _parse_ports(self, key):
         """
         Parses the 'ports' key
         """
         if key in self.service_info:
-            internal_ports = self.port_parser.parse_internal_ports()
-            for port_tuple in internal_ports:
-                # TODO: What do we do with host port???
-                # (hostPort:containerPort)
-                # targetPort == containerPort
-                self._add_container_port(port_tuple[1])
-                self._create_service(port_tuple)
+            for port_spec in self.port_parser.parse_internal_port_specs():
+                for port_tuple in port_spec.get_port_tuples():
+                    # TODO: What do we do with host port???
+                    # (hostPort:containerPort)
+                    # targetPort == containerPort
+                    self._add_container_port(port_tuple[1], port_spec.protocol)
+                    self._create_service(port_tuple, port_spec.protocol)
 
     def _parse_labels(self, key):
         """
         Parses the 'labels' key
         """
         if key in self.service_info:
-            # TODO (peterj): Parse healthcheck labels here
-            # # Add healthchecks (if any healthcheck labels are set)
-            # healthcheck_helper = healthcheck.HealthCheck(self.service_info[key])
-            # healthcheck_json = healthcheck_helper.get_health_check_config()
-            # if not healthcheck_json is None:
-            #     self.app_json['healthChecks'] = healthcheck_json
-
-            for label in self.service_info[key]:
-                if label.lower().startswith('com.microsoft.acs.kubernetes.vhost'):
+            # Healthcheck labels are turned into probes in _add_probes
+            for label_name, label_value in servicelabels.parse_labels(self.service_info[key]).items:
+                if label_name.lower().startswith('com.microsoft.acs.kubernetes.vhost') or \
+                    HealthCheck.is_health_check_label(label_name):
                     continue
-
-                if isinstance(self.service_info[key], dict):
-                    self._add_label(label, str(self.service_info[key][label]))
-                else:
-                    if '=' in label:
-                        label_split = label.split('=')
-                        label_name = label_split[0]
-                        label_value = label_split[1]
-                        self._add_label(label_name, str(label_value))
-                    else:
-                        # label without a value
-                        self._add_label(label, '')
+                self._add_label(label_name, str(label_value))
 
     def _get_empty_deployment_json(self):
         deployment_json = {
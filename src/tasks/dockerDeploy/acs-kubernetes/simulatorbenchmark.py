@@ -0,0 +1,152 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+
+import deploy
+import dockercomposeparser
+from clusterinfo import ClusterInfo
+from groupinfo import GroupInfo
+from ingress_controller import IngressController
+from kubernetessimulator import KubernetesSimulator
+from registryinfo import RegistryInfo
+from requestobserver import RequestStats
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Deploys a generated docker-compose file to the Kubernetes simulator ' \
+                    'and compares sequential and parallel rollout')
+    parser.add_argument('--services', type=int, default=200,
+                        help='Number of services in the generated docker-compose file')
+    parser.add_argument('--min-rollout-step', type=float, default=0.0,
+                        help='Minimum time (in seconds) between rollout steps')
+    parser.add_argument('--max-rollout-step', type=float, default=0.5,
+                        help='Maximum time (in seconds) between rollout steps')
+    parser.add_argument('--replicas-per-step', type=int, default=1,
+                        help='Number of replicas updated in each rollout step')
+    parser.add_argument('--load-balancer-delay', type=float, default=1.0,
+                        help='Time (in seconds) it takes to get the ExternalIP')
+    parser.add_argument('--strategy', choices=['sequential', 'parallel', 'both'], default='both',
+                        help='Rollout strategy to benchmark')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Make a request for every exists check instead of watching objects')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Random seed, for repeatable runs')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log deployment progress')
+    return parser
+
+
+def create_compose_file(directory, services):
+    """
+    Creates a docker-compose file with the provided number of services
+    """
+    compose_data = {'version': '2', 'services': {}}
+    for i in range(services):
+        compose_data['services']['service-{}'.format(i)] = {
+            'image': 'nginx',
+            'expose': [80]
+        }
+    compose_file = os.path.join(directory, 'docker-compose.yml')
+    with open(compose_file, 'w') as compose_stream:
+        yaml.safe_dump(compose_data, compose_stream)
+    return compose_file
+
+
+def _create_simulator(arguments):
+    return KubernetesSimulator(
+        rollout_step_delay=(arguments.min_rollout_step, arguments.max_rollout_step),
+        replicas_per_step=arguments.replicas_per_step,
+        load_balancer_delay=arguments.load_balancer_delay,
+        seed=arguments.seed)
+
+
+def _get_results(duration, request_stats, simulator):
+    totals = request_stats.get_totals()
+    return {
+        'duration': round(duration, 3),
+        'requests': totals['count'],
+        'request_bytes': totals['request_bytes'],
+        'response_bytes': totals['response_bytes'],
+        'rollout_steps': simulator.counters['rollout_steps'],
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def run_ingress_controller_benchmark(arguments):
+    """
+    Deploys the ingress controller and returns the results
+    """
+    request_stats = RequestStats()
+    with _create_simulator(arguments) as simulator:
+        cluster_info = ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes')
+        with dockercomposeparser.DockerComposeParser(
+                arguments.compose_file, cluster_info, RegistryInfo('registry', 'user', 'pass'),
+                GroupInfo('benchmark', 'simulator', '1'), True,
+                request_observers=[request_stats]) as compose_parser:
+            if arguments.no_cache:
+                compose_parser.kubernetes.stop_cache()
+            start_time = time.time()
+            IngressController(compose_parser.kubernetes).deploy(wait_for_external_ip=True)
+            duration = time.time() - start_time
+        return _get_results(duration, request_stats, simulator)
+
+
+def run_deploy_benchmark(arguments, parallel_rollout):
+    """
+    Deploys the first and an updated version of the compose
+    file and returns the results
+    """
+    results = {}
+    with _create_simulator(arguments) as simulator:
+        cluster_info = ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes')
+        for version in ['1', '2']:
+            request_stats = RequestStats()
+            with dockercomposeparser.DockerComposeParser(
+                    arguments.compose_file, cluster_info, RegistryInfo('registry', 'user', 'pass'),
+                    GroupInfo('benchmark', 'simulator', version), False,
+                    request_observers=[request_stats],
+                    parallel_rollout=parallel_rollout) as compose_parser:
+                if arguments.no_cache:
+                    compose_parser.kubernetes.stop_cache()
+                start_time = time.time()
+                compose_parser.deploy()
+                duration = time.time() - start_time
+                compose_parser.cleanup_needed = False
+            results['deploy' if version == '1' else 'update'] = \
+                _get_results(duration, request_stats, simulator)
+    return results
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    deploy.init_logger(arguments.verbose)
+    if not arguments.verbose:
+        logging.root.setLevel(logging.WARNING)
+
+    # Ingress controller JSON files are loaded relative to the working directory
+    os.chdir(os.path.dirname(os.path.realpath(__file__)))
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        arguments.compose_file = create_compose_file(temp_dir, arguments.services)
+        results = {'ingress_controller': run_ingress_controller_benchmark(arguments)}
+        if arguments.strategy in ['sequential', 'both']:
+            results['sequential'] = run_deploy_benchmark(arguments, parallel_rollout=False)
+        if arguments.strategy in ['parallel', 'both']:
+            results['parallel'] = run_deploy_benchmark(arguments, parallel_rollout=True)
+    finally:
+        shutil.rmtree(temp_dir)
+    sys.stdout.write(json.dumps(results, indent=2) + '\n')
+    sys.exit(0)
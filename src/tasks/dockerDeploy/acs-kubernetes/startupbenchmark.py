@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Scenarios are run in a new interpreter each time, 'interpreter' is the baseline
+SCENARIOS = [
+    ('interpreter', ['-c', 'pass']),
+    ('invalid_arguments', ['deploy.py']),
+    ('startup', ['deploy.py', '--compose-file', 'missing-docker-compose.yml',
+                 '--api-endpoint-url', 'http://127.0.0.1', '--orchestrator', 'kubernetes',
+                 '--group-name', 'benchmark', '--group-qualifier', 'startup',
+                 '--group-version', '1']),
+    ('tunnel_modules', ['-c', 'import paramiko, sshtunnel'])
+]
+
+
+def get_arg_parser():
+    """
+    Sets up the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        description='Measures how long deploy.py takes to start (without ' \
+                    'deploying anything) and checks it against a budget')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of runs for each scenario')
+    parser.add_argument('--budget', type=float, default=0.5,
+                        help='Max time (in seconds) the startup can add on top of the ' \
+                             'interpreter startup')
+    return parser
+
+
+def run_scenario(scenario_args, runs):
+    """
+    Runs the scenario and returns the run times
+    """
+    run_times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start_time = time.time()
+            subprocess.call([sys.executable, '-W', 'ignore'] + scenario_args,
+                            cwd=script_dir, stdout=devnull, stderr=devnull)
+            run_times.append(time.time() - start_time)
+    return run_times
+
+
+def run_benchmark(arguments):
+    """
+    Runs all scenarios and returns the results
+    """
+    results = {}
+    for name, scenario_args in SCENARIOS:
+        run_times = sorted(run_scenario(scenario_args, arguments.runs))
+        results[name] = {
+            'median': round(run_times[len(run_times) // 2], 3),
+            'min': round(run_times[0], 3),
+            'max': round(run_times[-1], 3)
+        }
+
+    startup_overhead = results['startup']['median'] - results['interpreter']['median']
+    results['startup_overhead'] = round(startup_overhead, 3)
+    results['budget'] = arguments.budget
+    results['within_budget'] = startup_overhead <= arguments.budget
+    return results
+
+
+if __name__ == '__main__':
+    arguments = get_arg_parser().parse_args()
+    results = run_benchmark(arguments)
+    sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+    sys.exit(0 if results['within_budget'] else 1)
@@ -0,0 +1,89 @@
+import json
+import unittest
+
+import requests
+from mock import Mock, PropertyMock, patch
+
+import acsclient
+import apierrors
+from clusterinfo import ClusterInfo
+from kubernetes import Kubernetes
+from kubernetessimulator import KubernetesSimulator
+
+
+class ApiErrorsTest(unittest.TestCase):
+    def _get_response(self, status_code, body):
+        response = Mock(status_code=status_code)
+        response.json.return_value = body
+        return response
+
+    def _get_kubernetes(self, simulator):
+        return Kubernetes(acsclient.ACSClient(ClusterInfo(
+            None, None, None, None, None, simulator.get_url(), 'kubernetes')))
+
+    def test_success_not_decoded(self):
+        response = self._get_response(201, {})
+        self.assertEquals(apierrors.check_response(response, 'creating'), response)
+        self.assertFalse(response.json.called)
+
+    def test_error_classes(self):
+        status = {'kind': 'Status', 'reason': 'AlreadyExists', 'message': 'exists'}
+        self.assertRaises(apierrors.AlreadyExistsError, apierrors.check_response,
+                          self._get_response(409, status), 'creating')
+        status['reason'] = 'Conflict'
+        self.assertRaises(apierrors.ConflictError, apierrors.check_response,
+                          self._get_response(409, status), 'updating')
+        self.assertRaises(apierrors.InvalidError, apierrors.check_response,
+                          self._get_response(422, status), 'creating')
+        self.assertRaises(apierrors.ServerError, apierrors.check_response,
+                          self._get_response(503, {}), 'creating')
+
+    def test_error_without_status(self):
+        response = self._get_response(500, None)
+        response.json.side_effect = ValueError('No JSON object could be decoded')
+        error = apierrors.get_error(response, 'creating a service')
+        self.assertEquals(error.status_code, 500)
+        self.assertIsNone(error.reason)
+        self.assertEquals(str(error), 'Failed creating a service (500): no details')
+
+    def test_create_existing(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            service_json = json.dumps({'metadata': {'name': 'web'}})
+            kubernetes.create_service(service_json, 'default')
+            with self.assertRaises(apierrors.AlreadyExistsError) as context:
+                kubernetes.create_service(service_json, 'default')
+            self.assertEquals(context.exception.status_code, 409)
+            self.assertRaises(apierrors.InvalidError, kubernetes.create_service,
+                              json.dumps({'metadata': {}}), 'default')
+
+    def test_delete_missing(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            self.assertRaises(apierrors.NotFoundError,
+                              kubernetes.delete_service, 'missing', 'default')
+
+    def test_exists_not_decoded(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_service(json.dumps({'metadata': {'name': 'web'}}), 'default')
+            response = Mock(wraps=kubernetes.get_request('namespaces/default/services/web'))
+            response.status_code = 200
+            kubernetes.get_request = Mock(return_value=response)
+            self.assertTrue(kubernetes.service_exists('web', 'default'))
+            self.assertFalse(response.json.called)
+            response.close.assert_called_once_with()
+
+    def test_exists_body_not_read(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_service(json.dumps({'metadata': {'name': 'web'}}), 'default')
+            # Observers (e.g. the request stats) don't read the body either
+            observer = Mock()
+            kubernetes.acs_client.add_request_observer(observer)
+            with patch.object(requests.models.Response, 'content',
+                              new_callable=PropertyMock) as mock_content:
+                self.assertTrue(kubernetes.service_exists('web', 'default'))
+                self.assertFalse(kubernetes.service_exists('missing', 'default'))
+            self.assertFalse(mock_content.called)
+            self.assertEquals(observer.request_completed.call_count, 2)
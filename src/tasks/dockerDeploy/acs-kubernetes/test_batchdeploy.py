@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import yaml
+from mock import Mock, patch
+
+import acsclient
+import batchdeploy
+from clusterinfo import ClusterInfo
+from kubernetessimulator import KubernetesSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class BatchDeployTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_yaml(self, file_name, data):
+        file_path = os.path.join(self.temp_dir, file_name)
+        with open(file_path, 'w') as yaml_stream:
+            yaml.safe_dump(data, yaml_stream)
+        return file_path
+
+    def _create_manifest(self, groups):
+        self._write_yaml('docker-compose.yml', {
+            'version': '2',
+            'services': {'web': {'image': 'nginx', 'expose': [80]}}
+        })
+        return self._write_yaml('manifest.yml', {
+            'defaults': {'compose_file': 'docker-compose.yml', 'group_qualifier': 'qualifier',
+                         'registry_host': 'registry', 'registry_username': 'username',
+                         'registry_password': 'password'},
+            'groups': [{'group_name': name, 'group_version': 1} for name in groups]
+        })
+
+    def test_load_manifest(self):
+        groups = batchdeploy.load_manifest(self._create_manifest(['app1', 'app2']))
+        self.assertEquals([g['group_name'] for g in groups], ['app1', 'app2'])
+        self.assertEquals(groups[1]['compose_file'],
+                          os.path.join(self.temp_dir, 'docker-compose.yml'))
+        self.assertEquals(groups[1]['group_version'], '1')
+        self.assertEquals(groups[1]['registry_username'], 'username')
+
+    def test_load_manifest_missing_key(self):
+        manifest_file = self._write_yaml('manifest.yml', {'groups': [{'group_name': 'app'}]})
+        self.assertRaises(ValueError, batchdeploy.load_manifest, manifest_file)
+
+    def test_load_manifest_optional_registry(self):
+        manifest_file = self._write_yaml('manifest.yml', {'groups': [{
+            'compose_file': 'docker-compose.yml', 'group_name': 'app',
+            'group_qualifier': 'qualifier', 'group_version': '1'}]})
+        self.assertIsNone(batchdeploy.load_manifest(manifest_file)[0]['registry_host'])
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_deploy_all(self, mock_sleep):
+        groups = batchdeploy.load_manifest(self._create_manifest(['app1', 'app2', 'app3']))
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01),
+                                 tick_interval=0.01) as simulator:
+            arguments = Mock(api_endpoint_url=simulator.get_url(), orchestrator='kubernetes',
+                             acs_host=None, acs_port=None, acs_username=None,
+                             acs_password=None, acs_private_key=None, parallelism=2,
+                             deploy_ingress_controller=False, parallel_rollout=False,
+                             timings_file=None)
+            results = batchdeploy.deploy_all(arguments, groups)
+            for name in ['app1-1', 'app2-1', 'app3-1']:
+                self.assertEquals(len(simulator.get_objects('deployments', name)), 1)
+
+        for result in results:
+            self.assertTrue(result['succeeded'])
+            self.assertTrue(result['requests'] > 0)
+            self.assertEquals(result['retry_counters']['retries'], 0)
+
+    @patch('batchdeploy.dockercomposeparser.DockerComposeParser')
+    def test_deploy_group_helper_thread_requests(self, mock_parser):
+        def deploy():
+            acs_client = mock_parser.call_args[1]['acs_client']
+            helper = threading.Thread(target=acs_client.get_request, args=('api/v1/namespaces',))
+            helper.start()
+            helper.join()
+
+        mock_parser.return_value.__enter__.return_value.deploy.side_effect = deploy
+        group = batchdeploy.load_manifest(self._create_manifest(['app1']))[0]
+        with KubernetesSimulator(tick_interval=0.01) as simulator:
+            acs_client = acsclient.ACSClient(ClusterInfo(
+                None, None, None, None, None, simulator.get_url(), 'kubernetes'))
+            result = batchdeploy.deploy_group(
+                Mock(deploy_ingress_controller=False, parallel_rollout=False), acs_client, group)
+
+        self.assertTrue(result['succeeded'])
+        self.assertEquals(result['requests'], 1)
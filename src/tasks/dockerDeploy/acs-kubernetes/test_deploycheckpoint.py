@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deploycheckpoint import DeployCheckpoint
+
+
+class DeployCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_resume(self):
+        checkpoint = DeployCheckpoint(self.file_path, 'group-1')
+        self.assertFalse(checkpoint.is_resumed())
+        checkpoint.done('namespace', {'name': 'group-1'})
+        checkpoint.done('deployment/web', {'replicas': 2})
+
+        checkpoint = DeployCheckpoint(self.file_path, 'group-1')
+        self.assertTrue(checkpoint.is_resumed())
+        self.assertTrue(checkpoint.is_done('namespace', {'name': 'group-1'}))
+        # Data changed since the step completed
+        self.assertFalse(checkpoint.is_done('deployment/web', {'replicas': 3}))
+        self.assertFalse(checkpoint.is_done('service/web'))
+
+        checkpoint.remove()
+        self.assertFalse(os.path.isfile(self.file_path))
+
+    def test_other_deployment_ignored(self):
+        DeployCheckpoint(self.file_path, 'group-1').done('namespace')
+        self.assertFalse(DeployCheckpoint(self.file_path, 'group-2').is_resumed())
+
+    def test_invalid_file_ignored(self):
+        with open(self.file_path, 'w') as checkpoint_file:
+            checkpoint_file.write('{')
+        self.assertFalse(DeployCheckpoint(self.file_path, 'group-1').is_resumed())
@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import time
+import unittest
+
+import yaml
+from mock import Mock, patch
+
+import deployclient
+import deploydaemon
+from kubernetessimulator import KubernetesSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class DeployDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, 'deploy.sock')
+        self.compose_file = os.path.join(self.temp_dir, 'docker-compose.yml')
+        with open(self.compose_file, 'w') as compose_stream:
+            yaml.safe_dump({'version': '2',
+                            'services': {'web': {'image': 'nginx', 'expose': [80]}}},
+                           compose_stream)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_arguments(self, api_endpoint_url, group_version):
+        return Mock(compose_file=self.compose_file, api_endpoint_url=api_endpoint_url,
+                    orchestrator='kubernetes', group_name='group', group_qualifier='qualifier',
+                    group_version=group_version, deploy_ingress_controller=False,
+                    registry_host='registry', registry_username='username',
+                    registry_password='password', acs_host=None, acs_port=None,
+                    acs_username=None, acs_password=None, acs_private_key=None, verbose=False,
+                    slow_request_threshold=5.0, parallel_rollout=False, timings_file=None,
+                    checkpoint_file=None)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_submit_jobs(self, mock_sleep):
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01),
+                                 tick_interval=0.01) as simulator:
+            with deploydaemon.DeployDaemon(self.socket_path) as daemon:
+                for version in ['1', '2']:
+                    exit_code = deployclient.submit_job(
+                        self.socket_path, self._get_arguments(simulator.get_url(), version))
+                    self.assertEquals(exit_code, 0)
+                status = daemon.get_status()
+            self.assertEquals(len(simulator.get_objects('deployments', 'group-2')), 1)
+
+        self.assertEquals(status['jobs'], 2)
+        self.assertEquals(status['clients'], 1)
+
+    def test_socket_permissions(self):
+        server_bind = deploydaemon._ThreadingUnixServer.server_bind
+        modes = []
+
+        def bind_and_stat(server):
+            server_bind(server)
+            modes.append(stat.S_IMODE(os.stat(self.socket_path).st_mode))
+
+        umask = os.umask(0o022)
+        try:
+            with patch.object(deploydaemon._ThreadingUnixServer, 'server_bind', bind_and_stat):
+                with deploydaemon.DeployDaemon(self.socket_path):
+                    self.assertEquals(os.umask(0o022), 0o022)
+        finally:
+            os.umask(umask)
+        self.assertEquals(modes, [0o600])
+
+    def test_status(self):
+        with deploydaemon.DeployDaemon(self.socket_path):
+            client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client_socket.connect(self.socket_path)
+            client_socket.sendall(json.dumps({'command': 'status'}) + '\n')
+            status = json.loads(client_socket.makefile('r').readline())
+            client_socket.close()
+        self.assertEquals(status['jobs'], 0)
+        self.assertEquals(status['open_clients'], 0)
+
+    @patch('deployclient.socket.socket')
+    def test_submit_job_paths(self, mock_socket):
+        mock_socket.return_value.makefile.return_value = [
+            json.dumps({'type': 'result', 'succeeded': True}) + '\n']
+        arguments = self._get_arguments('http://localhost', '1')
+        arguments.timings_file = 'timings.json'
+        arguments.checkpoint_file = 'checkpoint.json'
+        self.assertEquals(deployclient.submit_job(self.socket_path, arguments), 0)
+        job = json.loads(mock_socket.return_value.sendall.call_args[0][0])
+        self.assertEquals(job['arguments']['timings_file'], os.path.abspath('timings.json'))
+        self.assertEquals(job['arguments']['checkpoint_file'],
+                          os.path.abspath('checkpoint.json'))
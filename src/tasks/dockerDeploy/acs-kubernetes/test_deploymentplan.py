@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import yaml
+from mock import patch
+
+import deploymentplan
+import dockercomposeparser
+from clusterinfo import ClusterInfo
+from groupinfo import GroupInfo
+from kubernetessimulator import KubernetesSimulator
+from registryinfo import RegistryInfo
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class DeploymentPlanTest(unittest.TestCase):
+    def test_filter_like(self):
+        existing = {'metadata': {'name': 'web', 'uid': '1'}, 'spec': {'replicas': 2},
+                    'status': {}}
+        target = {'metadata': {'name': 'web'}, 'spec': {'replicas': 1, 'paused': False}}
+        self.assertEquals(deploymentplan.filter_like(existing, target),
+                          {'metadata': {'name': 'web'}, 'spec': {'replicas': 2}})
+
+    def test_add_diff(self):
+        plan = deploymentplan.DeploymentPlan('group-2', 'group-1')
+        plan.add_diff('same', {'a': 1}, {'a': 1})
+        plan.add_diff('removed', {'a': 1}, None)
+        self.assertEquals([diff['name'] for diff in plan.diffs], ['removed'])
+        self.assertTrue('-  "a": 1' in plan.diffs[0]['diff'])
+
+    def test_estimated_duration(self):
+        plan = deploymentplan.DeploymentPlan('group-1')
+        plan.add_step('first')
+        plan.add_step('second', 10)
+        self.assertEquals(plan.get_estimated_duration(), deploymentplan.STEP_SECONDS + 10)
+
+
+class DockerComposeParserPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _create_compose_file(self, services):
+        compose_file = os.path.join(self.temp_dir, 'docker-compose.yml')
+        with open(compose_file, 'w') as compose_stream:
+            yaml.safe_dump({'version': '2', 'services': services}, compose_stream)
+        return compose_file
+
+    def _get_parser(self, simulator, compose_file, version, parallel_rollout=False):
+        return dockercomposeparser.DockerComposeParser(
+            compose_file,
+            ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes'),
+            RegistryInfo('registry', 'username', 'password'),
+            GroupInfo('group', 'qualifier', version), False,
+            parallel_rollout=parallel_rollout)
+
+    def test_plan_first_deployment(self):
+        compose_file = self._create_compose_file({
+            'web': {'image': 'nginx', 'expose': [80]},
+            'worker': {'image': 'worker'}})
+        with KubernetesSimulator(tick_interval=0.01) as simulator:
+            with self._get_parser(simulator, compose_file, '1') as compose_parser:
+                plan = compose_parser.plan()
+            self.assertEquals(simulator.counters['requests'], 1)
+            self.assertEquals(simulator.get_objects('namespaces').keys().count('group-1'), 0)
+
+        self.assertIsNone(plan.existing_namespace)
+        self.assertEquals(plan.replicas['web'], {'deployed': 0, 'target': 1})
+        self.assertEquals(sorted([diff['name'] for diff in plan.diffs]),
+                          ['deployment/web', 'deployment/worker', 'service/web'])
+        # Namespace, secret, 2 deployments and 1 service
+        self.assertEquals(len(plan.steps), 5)
+        self.assertEquals(plan.get_estimated_duration(),
+                          5 * deploymentplan.STEP_SECONDS + 2 * deploymentplan.ROLLOUT_SECONDS)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_plan_update(self, mock_sleep):
+        compose_file = self._create_compose_file({
+            'web': {'image': 'nginx', 'expose': [80]},
+            'worker': {'image': 'worker'}})
+        with KubernetesSimulator(tick_interval=0.01) as simulator:
+            with self._get_parser(simulator, compose_file, '1') as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+            simulator.get_objects('deployments', 'group-1')['web']['spec']['replicas'] = 3
+
+            compose_file = self._create_compose_file({
+                'web': {'image': 'nginx:1.13', 'expose': [80]}})
+            requests = simulator.counters['requests']
+            with self._get_parser(simulator, compose_file, '2',
+                                  parallel_rollout=True) as compose_parser:
+                plan = compose_parser.plan()
+            # Namespaces and deployments, services and ingresses of the deployed namespace
+            self.assertEquals(simulator.counters['requests'] - requests, 4)
+            self.assertEquals(simulator.get_objects('namespaces').keys().count('group-2'), 0)
+
+        self.assertEquals(plan.existing_namespace, 'group-1')
+        self.assertEquals(plan.replicas, {'web': {'deployed': 3, 'target': 3}})
+        self.assertEquals([diff['name'] for diff in plan.diffs],
+                          ['deployment/web', 'deployment/worker'])
+        self.assertTrue('+            "image": "nginx:1.13",' in plan.diffs[0]['diff'])
+        self.assertEquals(plan.steps[-1]['description'], 'Delete namespace "group-1"')
+        self.assertEquals(plan.get_estimated_duration(),
+                          5 * deploymentplan.STEP_SECONDS + deploymentplan.ROLLOUT_SECONDS)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_plan_same_version(self, mock_sleep):
+        compose_file = self._create_compose_file({'web': {'image': 'nginx'}})
+        with KubernetesSimulator(tick_interval=0.01) as simulator:
+            with self._get_parser(simulator, compose_file, '1') as compose_parser:
+                compose_parser.deploy()
+                compose_parser.cleanup_needed = False
+            with self._get_parser(simulator, compose_file, '1') as compose_parser:
+                self.assertRaises(Exception, compose_parser.plan)
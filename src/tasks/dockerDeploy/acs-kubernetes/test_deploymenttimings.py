@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+import acsclient
+import deploymenttimings
+from clusterinfo import ClusterInfo
+from kubernetes import Kubernetes
+from kubernetessimulator import KubernetesSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class TimingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.timings_file = os.path.join(self.temp_dir, 'timings.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_timeout(self):
+        store = deploymenttimings.TimingStore()
+        for _ in range(store.min_samples - 1):
+            store.record('group', 'web', 100)
+        # Not enough timings yet
+        self.assertEquals(store.get_timeout('group', 'web', 300), 300)
+
+        store.record('group', 'web', 100)
+        self.assertEquals(store.get_timeout('group', 'web', 300), 100 * store.timeout_factor)
+        self.assertEquals(store.get_estimate('group', 'web'), 100)
+
+    def test_get_timeout_limits(self):
+        store = deploymenttimings.TimingStore()
+        for _ in range(store.min_samples):
+            store.record('group', 'fast', 1)
+            store.record('group', 'slow', store.max_timeout)
+        self.assertEquals(store.get_timeout('group', 'fast', 300), store.min_timeout)
+        self.assertEquals(store.get_timeout('group', 'slow', 300), store.max_timeout)
+
+    def test_save_merges_timings(self):
+        first_store = deploymenttimings.TimingStore(self.timings_file)
+        second_store = deploymenttimings.TimingStore(self.timings_file)
+        first_store.record('group', 'web', 1)
+        second_store.record('group', 'web', 2)
+
+        with open(self.timings_file) as timings_file:
+            self.assertEquals(json.load(timings_file), {'group/web': [1, 2]})
+
+
+class KubernetesTimingsTest(unittest.TestCase):
+    def _get_kubernetes(self, simulator, timing_store):
+        kubernetes = Kubernetes(acsclient.ACSClient(
+            ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes')))
+        kubernetes.timing_store = timing_store
+        kubernetes.timing_groups['group-2'] = 'group'
+        kubernetes.create_namespace('group-2', {})
+        return kubernetes
+
+    def _get_deployment_json(self, replicas=1):
+        return json.dumps({
+            'metadata': {'name': 'web'},
+            'spec': {'replicas': replicas, 'template': {'metadata': {'labels': {'app': 'web'}}}}
+        })
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_deploy_records_timings(self, mock_sleep):
+        timing_store = deploymenttimings.TimingStore()
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01),
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator, timing_store)
+            kubernetes.create_deployment(
+                self._get_deployment_json(), 'group-2', wait_for_complete=True)
+        self.assertEquals(timing_store.timings.keys(), ['group/web'])
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_parallel_timings(self, mock_sleep):
+        timing_store = deploymenttimings.TimingStore()
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01),
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator, timing_store)
+            kubernetes.create_deployment(self._get_deployment_json(), 'group-2')
+            api_json = json.loads(self._get_deployment_json())
+            api_json['metadata']['name'] = 'api'
+            kubernetes.create_deployment(json.dumps(api_json), 'group-2')
+            # Each deployment is timed from its own start
+            kubernetes.wait_for_deployments_complete(
+                {'web': time.time() - 60, 'api': time.time()}, 'group-2', ['web', 'api'])
+        self.assertTrue(timing_store.timings['group/web'][0] >= 60)
+        self.assertTrue(timing_store.timings['group/api'][0] < 30)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_adaptive_timeout(self, mock_sleep):
+        timing_store = deploymenttimings.TimingStore()
+        timing_store.min_timeout = 0.1
+        for _ in range(timing_store.min_samples):
+            timing_store.record('group', 'web', 0.01)
+
+        with KubernetesSimulator(rollout_step_delay=(5.0, 5.0),
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator, timing_store)
+            start_time = time.time()
+            self.assertRaises(Exception, kubernetes.create_deployment,
+                              self._get_deployment_json(), 'group-2', wait_for_complete=True)
+            self.assertTrue(time.time() - start_time < 2)
+
+    @patch('logging.info')
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_progress(self, mock_sleep, mock_info):
+        with KubernetesSimulator(rollout_step_delay=(0.1, 0.1),
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator, None)
+            kubernetes.progress_interval = 0.05
+            kubernetes.create_deployment(
+                self._get_deployment_json(replicas=3), 'group-2', wait_for_complete=True)
+
+        messages = [call[0][0] for call in mock_info.call_args_list]
+        self.assertTrue('Waiting for deployment "%s": %ds elapsed, timeout in %ds' in messages)
@@ -0,0 +1,149 @@
+import json
+import time
+import unittest
+
+from mock import Mock, patch
+
+import acsclient
+import healthcheck
+from clusterinfo import ClusterInfo
+from kubernetes import Kubernetes
+from kubernetessimulator import KubernetesSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class HealthCheckTests(unittest.TestCase):
+    def test_none_labels(self):
+        self.assertRaises(ValueError, healthcheck.HealthCheck, None)
+
+    def test_no_health_check(self):
+        health_check = healthcheck.HealthCheck({'label1': 'value1'})
+        self.assertIsNone(health_check.get_health_check_config())
+        self.assertEquals(health_check.get_probes([80]), (None, None))
+
+    def test_is_health_check_label(self):
+        self.assertTrue(healthcheck.HealthCheck.is_health_check_label(
+            'com.microsoft.acs.kubernetes.healthcheck.path'))
+        self.assertTrue(healthcheck.HealthCheck.is_health_check_label(
+            'com.microsoft.acs.dcos.marathon.healthchecks'))
+        self.assertFalse(healthcheck.HealthCheck.is_health_check_label(
+            'com.microsoft.acs.kubernetes.vhost'))
+
+    def test_tcp_probes(self):
+        health_check = healthcheck.HealthCheck(['com.microsoft.acs.kubernetes.healthcheck'])
+        readiness_probe, liveness_probe = health_check.get_probes([8080])
+        self.assertEquals(readiness_probe, {
+            'tcpSocket': {'port': 8080},
+            'periodSeconds': 5,
+            'timeoutSeconds': 20,
+            'failureThreshold': 3
+        })
+        self.assertEquals(liveness_probe, dict(readiness_probe, initialDelaySeconds=300))
+
+    def test_http_probes(self):
+        health_check = healthcheck.HealthCheck({
+            'com.microsoft.acs.kubernetes.healthcheck.path': '/health',
+            'com.microsoft.acs.kubernetes.healthcheck.portindex': '1'})
+        readiness_probe, _ = health_check.get_probes([80, 8080])
+        self.assertEquals(readiness_probe['httpGet'],
+                          {'path': '/health', 'port': 8080, 'scheme': 'HTTP'})
+
+    def test_command_probes(self):
+        health_check = healthcheck.HealthCheck(
+            ['com.microsoft.acs.dcos.marathon.healthcheck.command=curl -f localhost:80/a=b'])
+        readiness_probe, _ = health_check.get_probes([])
+        self.assertEquals(readiness_probe['exec'],
+                          {'command': ['sh', '-c', 'curl -f localhost:80/a=b']})
+
+    def test_kubernetes_label_wins(self):
+        health_check = healthcheck.HealthCheck({
+            'com.microsoft.acs.dcos.marathon.healthcheck.path': '/dcos',
+            'com.microsoft.acs.kubernetes.healthcheck.path': '/kubernetes'})
+        self.assertEquals(health_check.get_health_check_config()['path'], '/kubernetes')
+
+    def test_marathon_json_probes(self):
+        health_check = healthcheck.HealthCheck({
+            'com.microsoft.acs.kubernetes.healthchecks': json.dumps([{
+                'protocol': 'HTTP', 'path': '/ping', 'portIndex': 0,
+                'intervalSeconds': 10, 'maxConsecutiveFailures': 5,
+                'gracePeriodSeconds': 60}])})
+        readiness_probe, liveness_probe = health_check.get_probes([3000])
+        self.assertEquals(readiness_probe, {
+            'httpGet': {'path': '/ping', 'port': 3000, 'scheme': 'HTTP'},
+            'periodSeconds': 10,
+            'timeoutSeconds': 20,
+            'failureThreshold': 5
+        })
+        self.assertEquals(liveness_probe['initialDelaySeconds'], 60)
+
+    def test_kubernetes_json_probes(self):
+        probe = {'httpGet': {'path': '/ready', 'port': 80}, 'periodSeconds': 2}
+        health_check = healthcheck.HealthCheck({
+            'com.microsoft.acs.kubernetes.healthchecks': json.dumps(probe)})
+        self.assertEquals(health_check.get_probes([]), (probe, probe))
+
+    def test_port_index_out_of_range(self):
+        health_check = healthcheck.HealthCheck({
+            'com.microsoft.acs.kubernetes.healthcheck.portindex': '1'})
+        self.assertRaises(ValueError, health_check.get_probes, [80])
+
+
+class KubernetesReadinessTest(unittest.TestCase):
+    def _get_deployment_json(self, readiness_probe):
+        container = {'name': 'web', 'image': 'nginx'}
+        if readiness_probe:
+            container['readinessProbe'] = {'tcpSocket': {'port': 80}}
+        return json.dumps({
+            'metadata': {'name': 'web'},
+            'spec': {'replicas': 2, 'template': {
+                'metadata': {'labels': {'app': 'web'}},
+                'spec': {'containers': [container]}}}
+        })
+
+    def _deploy(self, readiness_probe):
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01), readiness_delay=0.3,
+                                 tick_interval=0.01) as simulator:
+            kubernetes = Kubernetes(acsclient.ACSClient(
+                ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes')))
+            kubernetes.create_namespace('group-1', {})
+            start_time = time.time()
+            kubernetes.create_deployment(
+                self._get_deployment_json(readiness_probe), 'group-1', wait_for_complete=True)
+            status = simulator.get_objects('deployments', 'group-1')['web']['status']
+        return time.time() - start_time, status
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_wait_for_available_replicas(self, mock_sleep):
+        duration, status = self._deploy(readiness_probe=True)
+        self.assertTrue(duration >= 0.3)
+        self.assertEquals(status['availableReplicas'], 2)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_wait_without_readiness_probe(self, mock_sleep):
+        duration, status = self._deploy(readiness_probe=False)
+        self.assertTrue(duration < 0.3)
+        self.assertEquals(status['availableReplicas'], 2)
+
+    def test_deployment_complete(self):
+        kubernetes = Kubernetes(Mock())
+
+        def is_complete(**status):
+            deployment = {'metadata': {'generation': 2}, 'spec': {'replicas': 2},
+                          'status': dict({'observedGeneration': 2, 'replicas': 2,
+                                          'updatedReplicas': 2, 'availableReplicas': 2},
+                                         **status)}
+            return kubernetes._is_deployment_complete(deployment)
+
+        self.assertTrue(is_complete())
+        self.assertFalse(is_complete(observedGeneration=1))
+        self.assertFalse(is_complete(updatedReplicas=1, replicas=1))
+        # Old replicas are still terminating
+        self.assertFalse(is_complete(replicas=3))
+        self.assertFalse(is_complete(availableReplicas=1))
+        self.assertFalse(kubernetes._is_deployment_complete(
+            {'metadata': {'generation': 1}, 'spec': {'replicas': 2}, 'status': {}}))
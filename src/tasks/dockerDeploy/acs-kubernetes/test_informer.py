@@ -0,0 +1,113 @@
+import json
+import time
+import unittest
+
+from mock import patch
+
+import acsclient
+from clusterinfo import ClusterInfo
+from informer import Informer
+from kubernetes import Kubernetes
+from kubernetessimulator import KubernetesSimulator
+
+_sleep = time.sleep
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class InformerTest(unittest.TestCase):
+    def _get_kubernetes(self, simulator):
+        return Kubernetes(acsclient.ACSClient(ClusterInfo(
+            None, None, None, None, None, simulator.get_url(), 'kubernetes')))
+
+    def _wait_until(self, condition):
+        timeout = time.time() + 5
+        while not condition() and time.time() < timeout:
+            _sleep(0.01)
+        return condition()
+
+    def test_list_and_watch(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_service(json.dumps({'metadata': {'name': 'web'}}), 'default')
+
+            informer = Informer(self._get_kubernetes(simulator), 'services', 'default')
+            informer.start()
+            try:
+                self.assertEquals(informer.get('web')['metadata']['name'], 'web')
+                kubernetes.create_service(json.dumps({'metadata': {'name': 'api'}}), 'default')
+                kubernetes.delete_service('web', 'default')
+                self.assertTrue(self._wait_until(
+                    lambda: [s['metadata']['name'] for s in informer.list()] == ['api']))
+            finally:
+                informer.stop()
+
+    def test_missing_namespace(self):
+        with KubernetesSimulator() as simulator:
+            informer = Informer(self._get_kubernetes(simulator), 'secrets', 'group-1')
+            informer.start()
+            try:
+                self.assertEquals(informer.list(), [])
+                kubernetes = self._get_kubernetes(simulator)
+                kubernetes.create_namespace('group-1', {})
+                kubernetes.create_secret(json.dumps({'metadata': {'name': 'registry'}}), 'group-1')
+                self.assertTrue(self._wait_until(lambda: informer.get('registry') is not None))
+            finally:
+                informer.stop()
+
+    def test_older_versions_ignored(self):
+        informer = Informer(None, 'services', 'default')
+        informer.update({'metadata': {'name': 'web', 'resourceVersion': '5'}})
+        informer.update({'metadata': {'name': 'web', 'resourceVersion': '3'}})
+        self.assertEquals(informer.get('web')['metadata']['resourceVersion'], '5')
+        informer.delete('web', {'metadata': {'name': 'web', 'resourceVersion': '4'}})
+        self.assertIsNotNone(informer.get('web'))
+        informer.delete('web')
+        self.assertIsNone(informer.get('web'))
+
+    def test_exists_checks_from_cache(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.start_cache()
+            try:
+                self.assertFalse(kubernetes.secret_exists('registry', 'default'))
+                kubernetes.create_secret(json.dumps({'metadata': {'name': 'registry'}}), 'default')
+                requests = simulator.counters['requests']
+                for _ in range(10):
+                    self.assertTrue(kubernetes.secret_exists('registry', 'default'))
+                    self.assertFalse(kubernetes.service_exists('web', 'default'))
+                    self.assertTrue(kubernetes.namespace_exists('default'))
+                # Only the first service and namespace checks list the objects
+                self.assertEquals(simulator.counters['requests'], requests + 2)
+            finally:
+                kubernetes.stop_cache()
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_wait_for_deployment_from_cache(self, mock_sleep):
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01), tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.start_cache()
+            try:
+                self.assertFalse(kubernetes.deployment_exists('app', 'default'))
+                requests = simulator.counters['requests']
+                kubernetes.create_deployment(json.dumps({
+                    'metadata': {'name': 'app'},
+                    'spec': {'replicas': 3, 'template': {'metadata': {'labels': {'app': 'app'}}}}
+                }), 'default', wait_for_complete=True)
+                self.assertEquals(kubernetes.get_replicas('default', 'app'), 3)
+                # Rollout progress comes from the watch, not from polling
+                self.assertEquals(simulator.counters['requests'], requests + 1)
+            finally:
+                kubernetes.stop_cache()
+
+    def test_watch_replays_events(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            version = kubernetes.get_request('namespaces/default/services').json()[
+                'metadata']['resourceVersion']
+            kubernetes.create_service(json.dumps({'metadata': {'name': 'web'}}), 'default')
+            event_queue = simulator.watch('services', 'default', version)
+            self.assertEquals(event_queue.get(timeout=1)['type'], 'ADDED')
+            simulator.unwatch(event_queue)
@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+import yaml
+from mock import patch
+
+import acsclient
+import dockercomposeparser
+import kubernetes as kubernetes_module
+from clusterinfo import ClusterInfo
+from groupinfo import GroupInfo
+from ingress_controller import IngressController
+from kubernetes import Kubernetes
+from kubernetessimulator import KubernetesSimulator, strategic_merge
+from registryinfo import RegistryInfo
+
+_sleep = time.sleep
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+def _short_sleep(seconds):
+    _sleep(min(seconds, 0.01))
+
+
+class KubernetesSimulatorTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _get_cluster_info(self, simulator):
+        return ClusterInfo(None, None, None, None, None, simulator.get_url(), 'kubernetes')
+
+    def _get_kubernetes(self, simulator):
+        return Kubernetes(acsclient.ACSClient(self._get_cluster_info(simulator)))
+
+    def _get_deployment_json(self, name, replicas=1):
+        return json.dumps({
+            'apiVersion': 'extensions/v1beta1',
+            'kind': 'Deployment',
+            'metadata': {'name': name},
+            'spec': {'replicas': replicas,
+                     'template': {'metadata': {'labels': {'app': name}}}}
+        })
+
+    def _create_compose_file(self, services):
+        compose_data = {'version': '2', 'services': {}}
+        for i in range(services):
+            compose_data['services']['service-{}'.format(i)] = {
+                'image': 'nginx',
+                'expose': [80]
+            }
+        compose_file = os.path.join(self.temp_dir, 'docker-compose.yml')
+        with open(compose_file, 'w') as compose_stream:
+            yaml.safe_dump(compose_data, compose_stream)
+        return compose_file
+
+    def test_namespaces(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_namespace('group-1', {'group_id': 'group', 'group_version': '1'})
+            self.assertTrue(kubernetes.namespace_exists('group-1'))
+            self.assertFalse(kubernetes.namespace_exists('group-2'))
+
+            namespaces = kubernetes.get_namespaces('group_id=group')
+            self.assertEquals([n['metadata']['name'] for n in namespaces], ['group-1'])
+            self.assertEquals(kubernetes.get_namespaces('group_id=other'), [])
+
+            kubernetes.delete_namespace('group-1')
+            self.assertFalse(kubernetes.namespace_exists('group-1'))
+
+    def test_namespace_created_by_failed_request(self):
+        post = requests.post
+
+        def post_and_fail(*args, **kwargs):
+            post(*args, **kwargs)
+            raise requests.exceptions.ConnectionError('connection dropped')
+
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            with patch('acsclient.requests.post', side_effect=post_and_fail):
+                namespace = kubernetes.create_namespace('group-1', {'group_id': 'group'})
+            self.assertEquals(namespace['metadata']['name'], 'group-1')
+            self.assertEquals(
+                kubernetes.acs_client.retry_policy.counters['duplicate_prevented'], 1)
+
+    def test_not_found(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            response = kubernetes.get_service('missing', 'default')
+            self.assertEquals(response['kind'], 'Status')
+            self.assertEquals(response['code'], 404)
+            self.assertFalse(kubernetes.secret_exists('missing', 'default'))
+            self.assertFalse(kubernetes.deployment_exists('missing', 'default'))
+
+    def test_deployments_only_on_beta_endpoint(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_deployment(self._get_deployment_json('app'), 'default')
+            response = kubernetes.get_request('namespaces/default/deployments/app').json()
+            self.assertEquals(response['code'], 404)
+            self.assertTrue(kubernetes.deployment_exists('app', 'default'))
+
+    def test_create_existing(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_deployment(self._get_deployment_json('app'), 'default')
+            response = kubernetes.post_request(
+                'namespaces/default/deployments', self._get_deployment_json('app'),
+                endpoint='apis/extensions/v1beta1')
+            self.assertEquals(response.status_code, 409)
+
+    def test_strategic_merge(self):
+        target = {'metadata': {'name': 'app', 'labels': {'a': '1', 'b': '2'}},
+                  'spec': {'containers': [{'name': 'web', 'image': 'web:1', 'ports': [1]},
+                                          {'name': 'log', 'image': 'log:1'}]}}
+        strategic_merge(target, {'metadata': {'labels': {'a': None, 'c': '3'}},
+                                 'spec': {'containers': [{'name': 'web', 'image': 'web:2',
+                                                          'ports': [2]}]}})
+        self.assertEquals(target, {
+            'metadata': {'name': 'app', 'labels': {'b': '2', 'c': '3'}},
+            'spec': {'containers': [{'name': 'web', 'image': 'web:2', 'ports': [2]},
+                                    {'name': 'log', 'image': 'log:1'}]}})
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_apply(self, mock_sleep):
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01),
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            deployment = json.loads(self._get_deployment_json('app', replicas=2))
+            endpoint = 'apis/extensions/v1beta1'
+            result, _ = kubernetes.apply('deployments', 'default', deployment, endpoint,
+                                         wait_for_complete=True)
+            self.assertEquals(result, kubernetes_module.APPLY_CREATED)
+
+            requests_before = simulator.counters['requests']
+            result, _ = kubernetes.apply('deployments', 'default', deployment, endpoint)
+            self.assertEquals(result, kubernetes_module.APPLY_UNCHANGED)
+            self.assertEquals(simulator.counters['requests'], requests_before + 1)
+
+            deployment['spec']['template']['metadata']['labels']['version'] = '2'
+            result, response = kubernetes.apply('deployments', 'default', deployment, endpoint,
+                                                wait_for_complete=True)
+            self.assertEquals(result, kubernetes_module.APPLY_PATCHED)
+            self.assertEquals(response['metadata']['generation'], 2)
+            deployment = kubernetes.get_deployment('default', 'app')
+            self.assertEquals(deployment['status']['observedGeneration'], 2)
+            self.assertEquals(deployment['status']['updatedReplicas'], 2)
+            self.assertEquals(len(simulator.get_objects('replicasets', 'default')), 2)
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_rollout(self, mock_sleep):
+        with KubernetesSimulator(rollout_step_delay=(0.01, 0.01), replicas_per_step=2,
+                                 tick_interval=0.01) as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            kubernetes.create_deployment(
+                self._get_deployment_json('app', replicas=5), 'default', wait_for_complete=True)
+
+            deployment = kubernetes.get_deployment('default', 'app')
+            self.assertEquals(deployment['status']['updatedReplicas'], 5)
+            self.assertEquals(deployment['status']['availableReplicas'], 5)
+            self.assertEquals(simulator.counters['rollout_steps'], 3)
+
+            replicasets = kubernetes.get_request(
+                'namespaces/default/replicasets', 'apis/extensions/v1beta1').json()
+            self.assertEquals(len(replicasets['items']), 1)
+            kubernetes.delete_replicasets('default')
+            kubernetes.delete_deployments('default')
+            self.assertFalse(kubernetes.deployment_exists('app', 'default'))
+
+    def test_watch(self):
+        with KubernetesSimulator() as simulator:
+            kubernetes = self._get_kubernetes(simulator)
+            response = requests.get(
+                simulator.get_url() + '/api/v1/watch/namespaces/default/services', stream=True)
+            lines = response.iter_lines()
+            # Wait for the watch to be registered
+            while not simulator._watchers:
+                _sleep(0.01)
+
+            kubernetes.create_service(json.dumps({'metadata': {'name': 'web'}}), 'default')
+            kubernetes.delete_service('web', 'default')
+            events = [json.loads(next(lines)) for _ in range(2)]
+            response.close()
+
+        self.assertEquals([e['type'] for e in events], ['ADDED', 'DELETED'])
+        self.assertEquals(events[0]['object']['metadata']['name'], 'web')
+
+    @patch('ingress_controller.time.sleep', side_effect=_short_sleep)
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_ingress_controller_deploy(self, mock_sleep, mock_ingress_sleep):
+        with KubernetesSimulator(load_balancer_delay=0.05, tick_interval=0.01) as simulator:
+            ingress_controller = IngressController(self._get_kubernetes(simulator))
+            with patch('ingress_controller.os.getcwd', return_value=test_root):
+                ingress_controller.deploy(wait_for_external_ip=True)
+            self.assertEquals(ingress_controller.get_external_ip(), '52.0.0.1')
+            self.assertEquals(sorted(simulator.get_objects('deployments', 'default').keys()),
+                              [IngressController.DEFAULT_BACKEND_NAME,
+                               IngressController.NGINX_INGRESS_LB_NAME])
+
+    def _deploy(self, simulator, compose_file, version, parallel_rollout):
+        with dockercomposeparser.DockerComposeParser(
+                compose_file, self._get_cluster_info(simulator),
+                RegistryInfo('registry', 'username', 'password'),
+                GroupInfo('group', 'qualifier', version), False,
+                parallel_rollout=parallel_rollout) as compose_parser:
+            compose_parser.deploy()
+            compose_parser.cleanup_needed = False
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_deploy_resume(self, mock_sleep):
+        compose_file = self._create_compose_file(3)
+        checkpoint_file = os.path.join(self.temp_dir, 'checkpoint.json')
+        apply_calls = []
+        original_apply = Kubernetes.apply
+
+        def failing_apply(kubernetes, resource, namespace, obj, *args, **kwargs):
+            apply_calls.append('{}/{}'.format(resource, obj['metadata']['name']))
+            if len(apply_calls) == 5:
+                raise Exception('Connection reset')
+            return original_apply(kubernetes, resource, namespace, obj, *args, **kwargs)
+
+        def create_parser(simulator):
+            return dockercomposeparser.DockerComposeParser(
+                compose_file, self._get_cluster_info(simulator),
+                RegistryInfo('registry', 'username', 'password'),
+                GroupInfo('group', 'qualifier', '1'), False, checkpoint_file=checkpoint_file)
+
+        with KubernetesSimulator(tick_interval=0.01) as simulator:
+            with patch('kubernetes.Kubernetes.apply', failing_apply):
+                with self.assertRaises(Exception):
+                    with create_parser(simulator) as compose_parser:
+                        compose_parser.deploy()
+                # The namespace is kept for resuming
+                self.assertEquals(len(simulator.get_objects('services', 'group-1')), 1)
+                self.assertTrue(os.path.isfile(checkpoint_file))
+
+                del apply_calls[:]
+                with create_parser(simulator) as compose_parser:
+                    compose_parser.deploy()
+                    compose_parser.cleanup_needed = False
+
+            # Namespace, secret and the first service and deployment are not applied again
+            self.assertEquals(len(apply_calls), 4)
+            self.assertEquals(len(simulator.get_objects('deployments', 'group-1')), 3)
+            self.assertEquals(len(simulator.get_objects('services', 'group-1')), 3)
+            self.assertFalse(os.path.isfile(checkpoint_file))
+
+    @patch('kubernetes.time.sleep', side_effect=_short_sleep)
+    def test_deploy_compose_sequential_and_parallel(self, mock_sleep):
+        compose_file = self._create_compose_file(5)
+        with KubernetesSimulator(rollout_step_delay=(0.05, 0.05),
+                                 tick_interval=0.01) as simulator:
+            self._deploy(simulator, compose_file, '1', parallel_rollout=False)
+            self.assertEquals(len(simulator.get_objects('deployments', 'group-1')), 5)
+            self.assertEquals(len(simulator.get_objects('services', 'group-1')), 5)
+
+            # Update removes the previous namespace
+            self._deploy(simulator, compose_file, '2', parallel_rollout=True)
+            self.assertEquals(simulator.get_objects('namespaces').keys().count('group-1'), 0)
+            deployments = simulator.get_objects('deployments', 'group-2')
+            self.assertEquals(len(deployments), 5)
+            for deployment in deployments.values():
+                self.assertEquals(deployment['status']['updatedReplicas'], 1)
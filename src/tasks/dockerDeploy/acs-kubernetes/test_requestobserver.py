@@ -0,0 +1,23 @@
+import unittest
+
+from requestobserver import get_path_template
+
+
+class RequestObserverTest(unittest.TestCase):
+    def test_get_path_template(self):
+        self.assertEquals(get_path_template('api/v1/namespaces?labelSelector=group_id=app'),
+                          'api/v1/namespaces')
+        self.assertEquals(get_path_template('api/v1/namespaces/app-1'), 'api/v1/namespaces/{ns}')
+        self.assertEquals(get_path_template('api/v1/namespaces/app-1/secrets/registry'),
+                          'api/v1/namespaces/{ns}/secrets/{name}')
+        self.assertEquals(
+            get_path_template('apis/extensions/v1beta1/namespaces/app-1/deployments/web/status'),
+            'apis/extensions/v1beta1/namespaces/{ns}/deployments/{name}/status')
+        self.assertEquals(
+            get_path_template('apis/extensions/v1beta1/watch/namespaces/app-1/deployments'),
+            'apis/extensions/v1beta1/watch/namespaces/{ns}/deployments')
+        self.assertEquals(get_path_template('api/v1/nodes/node-1'), 'api/v1/nodes/{name}')
+        self.assertEquals(get_path_template('version'), 'version')
+
+    def test_get_path_template_empty(self):
+        self.assertEquals(get_path_template(None), '')
@@ -1152,3 +1152,59 @@ class ServiceParserTests(unittest.TestCase):
         service_parser = self._get_default_parser(service_info)
         actual = service_parser.get_deployment_json()
         self.assertEquals(actual, json.dumps(expected))
+
+    def test_parse_labels_ignore_healthcheck(self):
+        service_info = {
+            'labels': [
+                'my_label=label_value',
+                'com.microsoft.acs.kubernetes.healthcheck.command=curl -f localhost'
+            ],
+            'image': 'some_image',
+        }
+        service_parser = self._get_default_parser(service_info)
+        service_parser._parse_labels('labels')
+        actual = service_parser.deployment_json['spec']['template']['metadata']['labels']
+        self.assertEquals(actual, {
+            'com.microsoft.acs.k8s.service_name': 'my_service',
+            'my_label': 'label_value'
+        })
+
+    def test_get_deployment_json_probes(self):
+        service_info = {
+            'labels': {
+                'com.microsoft.acs.kubernetes.healthcheck.path': '/health'
+            },
+            'image': 'some_image',
+            'expose': ['8080']
+        }
+        service_parser = self._get_default_parser(service_info)
+        deployment_json = json.loads(service_parser.get_deployment_json())
+        container = deployment_json['spec']['template']['spec']['containers'][0]
+        self.assertEquals(container['readinessProbe'], {
+            'httpGet': {'path': '/health', 'port': 8080, 'scheme': 'HTTP'},
+            'periodSeconds': 5,
+            'timeoutSeconds': 20,
+            'failureThreshold': 3
+        })
+        self.assertEquals(container['livenessProbe']['initialDelaySeconds'], 300)
+
+    def test_get_deployment_json_probes_no_ports(self):
+        service_info = {
+            'labels': {'com.microsoft.acs.kubernetes.healthcheck': ''},
+            'image': 'some_image'
+        }
+        service_parser = self._get_default_parser(service_info)
+        deployment_json = json.loads(service_parser.get_deployment_json())
+        container = deployment_json['spec']['template']['spec']['containers'][0]
+        self.assertFalse('readinessProbe' in container)
+
+    def test_create_service_port_range(self):
+        service_parser = self._get_default_parser({'image': 'some_image'})
+        for port in range(8000, 9000):
+            service_parser._create_service((port, port))
+        service_parser._create_service((8500, 8500))
+        service_parser._create_service((8501, 8500))
+
+        port_names = [port_entry['name'] for port_entry in service_parser.service_json['spec']['ports']]
+        self.assertEquals(len(port_names), 1001)
+        self.assertEquals(port_names[-1], 'port-8500-1')
@@ -0,0 +1,72 @@
+import __builtin__
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mock import patch
+
+import startupprofile
+
+test_root = os.path.dirname(os.path.realpath(__file__))
+
+
+class ImportProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        sys.path.insert(0, self.temp_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir)
+        for module_name in ['profiled_module', 'profiled_dependency']:
+            sys.modules.pop(module_name, None)
+        shutil.rmtree(self.temp_dir)
+
+    def _write_module(self, module_name, contents):
+        with open(os.path.join(self.temp_dir, module_name + '.py'), 'w') as module_file:
+            module_file.write(contents)
+
+    def test_import_timings(self):
+        self._write_module('profiled_dependency', 'import time\ntime.sleep(0.05)\n')
+        self._write_module('profiled_module', 'import profiled_dependency\n')
+        original_import = __builtin__.__import__
+
+        with startupprofile.ImportProfiler() as import_profiler:
+            import profiled_module
+            # Already imported, not measured again
+            import profiled_dependency
+
+        self.assertEquals(__builtin__.__import__, original_import)
+        report = import_profiler.get_report()
+        self.assertEquals([entry['module'] for entry in report[:2]],
+                          ['profiled_module', 'profiled_dependency'])
+        self.assertTrue(report[0]['cumulative'] >= 0.05)
+        self.assertTrue(report[0]['self'] < 0.05)
+        self.assertTrue(report[1]['self'] >= 0.05)
+        self.assertTrue(import_profiler.total_time >= 0.05)
+
+    def test_failed_import(self):
+        with startupprofile.ImportProfiler() as import_profiler:
+            self.assertRaises(ImportError, __import__, 'missing_profiled_module')
+        self.assertEquals(import_profiler.get_report(), [])
+
+    @patch('logging.log')
+    def test_log_report(self, mock_log):
+        self._write_module('profiled_module', 'x = 1\n')
+        with startupprofile.ImportProfiler() as import_profiler:
+            import profiled_module
+        import_profiler.log_report(count=1)
+        # Summary, header and one module
+        self.assertEquals(mock_log.call_count, 3)
+        self.assertEquals(mock_log.call_args[0][2], 'profiled_module')
+
+    def test_tunnel_modules_not_imported(self):
+        # paramiko and sshtunnel are only needed when a tunnel is created
+        output = subprocess.check_output(
+            [sys.executable, '-W', 'ignore', '-c',
+             'import sys, dockercomposeparser; ' \
+             'print(sorted(set(["paramiko", "sshtunnel"]) & set(sys.modules)))'],
+            cwd=test_root)
+        self.assertEquals(output.strip(), '[]')